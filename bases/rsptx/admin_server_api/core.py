@@ -10,6 +10,7 @@
 #
 # Standard library
 # ----------------
+from contextlib import asynccontextmanager
 import os
 import pathlib
 
@@ -23,6 +24,8 @@ from fastapi.staticfiles import StaticFiles
 from rsptx.exceptions.core import add_exception_handlers
 from rsptx.templates import template_folder
 from rsptx.auth.session import auth_manager
+from rsptx.lti1p1.core import close_lti1p1_http_session
+from rsptx.lti1p3.core import close_lti1p3_http_session
 
 from .routers import lti1p3
 from .routers import lti1p1
@@ -42,7 +45,17 @@ from .routers import root
 kwargs = {}
 if root_path := os.environ.get("ROOT_PATH"):
     kwargs["root_path"] = root_path
-app = FastAPI(**kwargs)  # type: ignore
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    yield
+    # Release the pooled HTTP clients used to send LTI grades.
+    await close_lti1p1_http_session()
+    await close_lti1p3_http_session()
+
+
+app = FastAPI(lifespan=lifespan, **kwargs)  # type: ignore
 
 # Anything that gets to this server with /staticAssets gets served from the staticAssets folder
 template_dir = pathlib.Path(template_folder)
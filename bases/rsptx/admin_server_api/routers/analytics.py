@@ -10,6 +10,7 @@ import json
 import uuid
 from typing import Optional
 
+import numpy as np
 import pandas as pd
 import redis as redis_lib
 from fastapi import (
@@ -23,9 +24,11 @@ from fastapi import (
 )
 from fastapi.responses import HTMLResponse, JSONResponse, StreamingResponse
 from sqlalchemy import create_engine
+from sqlalchemy.engine import Engine
 
 from rsptx.auth.session import auth_manager
 from rsptx.configuration import settings
+from rsptx.db.crud import refresh_activity_rollup, rollup_needs_backfill
 from rsptx.endpoint_validators import instructor_role_required, with_course
 from rsptx.logging import rslogger
 from rsptx.templates import format_course_datetime, get_shared_templates
@@ -69,6 +72,22 @@ def _get_redis() -> redis_lib.Redis:
     return redis_lib.from_url(settings.redis_uri, decode_responses=True)
 
 
+# Database engine
+# ---------------------------------------------------------------------------
+# The reports read through pandas, which wants a synchronous engine. One is
+# shared by every report in the process so each one checks out a pooled
+# connection instead of building an engine and opening a fresh connection.
+
+_engine: Optional[Engine] = None
+
+
+def _get_engine() -> Engine:
+    global _engine
+    if _engine is None:
+        _engine = create_engine(settings.dburl, pool_pre_ping=True)
+    return _engine
+
+
 def _task_key(task_id: str) -> str:
     return f"subchapoverview:{task_id}"
 
@@ -88,17 +107,6 @@ def _get_task(r: redis_lib.Redis, task_id: str) -> Optional[dict]:
 # Background report generation
 # ---------------------------------------------------------------------------
 
-ANSWER_TABLES = [
-    "mchoice_answers",
-    "fitb_answers",
-    "parsons_answers",
-    "codelens_answers",
-    "clickablearea_answers",
-    "splice_answers",
-    "dragndrop_answers",
-    "unittest_answers",
-]
-
 # Subset that have a boolean `correct` column (used by student drilldown)
 CORRECT_ANSWER_TABLES = [
     "mchoice_answers",
@@ -126,7 +134,7 @@ def _build_report(
     """Run in a BackgroundTask. Writes result JSON to Redis."""
     r = _get_redis()
     try:
-        engine = create_engine(settings.dburl)
+        engine = _get_engine()
 
         if tablekind == "correctcount":
             data = _make_correct_count(engine, course_name, base_course, chapter)
@@ -153,13 +161,30 @@ def _chapter_clause_for_chapters(chapter: str, chap_labs: list) -> str:
     return f"and chapters.chapter_label = '{chapter}'"
 
 
-def _student_label(last_name: str, first_name: str, username: str) -> str:
+def _student_label(last_name, first_name, username):
     """Build the "Last, First (username)" column label used by the activity tables.
 
     subchapoverview.js extracts the username from the trailing parens to build a
-    link to the student_detail drilldown page, so the format matters.
+    link to the student_detail drilldown page, so the format matters. Works on
+    plain strings and, element-wise, on ``pd.Series`` of them.
     """
-    return f"{last_name}, {first_name} ({username})"
+    return last_name + ", " + first_name + " (" + username + ")"
+
+
+def _not_lti_anonymous(column: str) -> str:
+    """SQL condition excluding LTI anonymous users (38+ digit @ usernames)."""
+    return f"{column} !~ '^[0-9]{{38,}}@'"
+
+
+def _int_text(values: pd.Series, missing: str = "") -> pd.Series:
+    """Render numbers as integer strings, with ``missing`` for nulls."""
+    numbers = np.trunc(pd.to_numeric(values, errors="coerce")).astype("Int64")
+    return numbers.astype("string").fillna(missing)
+
+
+def _format_timestamps(values: pd.Series) -> pd.Series:
+    """Render timestamps as ``YYYY-MM-DD HH:MM``, with blanks for nulls."""
+    return pd.to_datetime(values).dt.strftime("%Y-%m-%d %H:%M").fillna("")
 
 
 def _enrolled_students(engine, course_name: str) -> pd.DataFrame:
@@ -169,32 +194,24 @@ def _enrolled_students(engine, course_name: str) -> pd.DataFrame:
     produces no column at all and silently disappears from the report. This is
     used to backfill those students.
     """
-    students = pd.read_sql_query(
-        """
+    return pd.read_sql_query(
+        f"""
         select distinct auth_user.username, auth_user.first_name, auth_user.last_name
         from auth_user
         join user_courses on user_courses.user_id = auth_user.id
         join courses on courses.id = user_courses.course_id
         where courses.course_name = %(course_name)s
+            and {_not_lti_anonymous("auth_user.username")}
         """,
         engine,
         params={"course_name": course_name},
     )
 
-    if students.empty:
-        return students
-
-    # Remove LTI anonymous users (38+ digit @ usernames)
-    return students[~students.username.str.contains(r"^\d{38,}@", regex=True)]
-
 
 def _pad_with_enrolled(pt: pd.DataFrame, labels: list, fill_value) -> pd.DataFrame:
     """Add a column for each missing label, then sort the columns by name."""
-    for label in labels:
-        if label not in pt.columns:
-            pt[label] = fill_value
-
-    return pt[sorted(pt.columns, key=lambda col: str(col).lower())]
+    columns = sorted(set(pt.columns).union(labels), key=lambda col: str(col).lower())
+    return pt.reindex(columns=columns, fill_value=fill_value)
 
 
 def _make_activity_table(
@@ -205,74 +222,35 @@ def _make_activity_table(
     tablekind: str,
     tz_offset_hours: float,
 ) -> list:
-    """Builds sccount / dividmin / dividmax pivot tables."""
+    """Builds sccount / dividmin / dividmax pivot tables.
+
+    Reads the per-question summaries in ``activity_rollup`` rather than the raw
+    ``useinfo`` events; see ``rsptx.db.crud.rollup``.
+    """
     ch_clause = _chapter_clause_for_useinfo(chapter)
+    # Each rollup row already summarises a student's events on one question,
+    # so the pivot below reduces those summaries the same way it reduced events.
+    timestamp = "last_seen" if tablekind == "dividmax" else "first_seen"
 
     data = pd.read_sql_query(
         f"""
-        select sid, first_name, last_name, useinfo.timestamp, div_id, chapter, subchapter
-        from useinfo
+        select sid, first_name, last_name, {timestamp} as timestamp, events,
+            div_id, chapter, subchapter
+        from activity_rollup
         join questions on div_id = name and base_course = %(base_course)s {ch_clause}
-        join auth_user on username = useinfo.sid
-        where useinfo.course_id = %(course_name)s and active = 'T'
+        join auth_user on username = activity_rollup.sid
+        where activity_rollup.course_name = %(course_name)s and events > 0
+            and active = 'T' and {_not_lti_anonymous("activity_rollup.sid")}
         """,
         engine,
         params={"base_course": base_course, "course_name": course_name},
         parse_dates=["timestamp"],
     )
 
-    # Remove LTI anonymous users (38+ digit @ usernames)
-    data = data[~data.sid.str.contains(r"^\d{38,}@", regex=True)]
-
-    # Apply timezone offset
-    tdoff = pd.Timedelta(hours=tz_offset_hours)
-    data["timestamp"] = data["timestamp"].map(lambda x: x - tdoff)
-
-    # Build student label — must match _student_label(), which is used to
-    # backfill students with no recorded activity.
-    data["sid"] = (
-        data["last_name"] + ", " + data["first_name"] + " (" + data["sid"] + ")"
-    )
-
-    if tablekind == "sccount":
-        values = "div_id"
-        afunc = "nunique"
-        idxlist = ["chapter", "subchapter"]
-    elif tablekind == "dividmin":
-        values = "timestamp"
-        afunc = "min"
-        idxlist = ["chapter", "subchapter", "div_id"]
-    elif tablekind == "dividmax":
-        values = "timestamp"
-        afunc = "max"
-        idxlist = ["chapter", "subchapter", "div_id"]
-    else:
-        values = "timestamp"
-        afunc = "count"
-        idxlist = ["chapter", "subchapter", "div_id"]
-
     if data.empty:
         rslogger.warning(f"Empty dataframe for subchapoverview {course_name}/{chapter}")
         return []
 
-    pt = data.pivot_table(index=idxlist, values=values, columns="sid", aggfunc=afunc)
-
-    if pt.empty:
-        return []
-
-    # Students with no recorded activity produce no column in the pivot, which
-    # made them vanish from the report entirely. Backfill them so the report
-    # lists the whole roster. Counts get 0; timestamp tables get a blank cell.
-    enrolled = _enrolled_students(engine, course_name)
-    pt = _pad_with_enrolled(
-        pt,
-        [
-            _student_label(row.last_name, row.first_name, row.username)
-            for row in enrolled.itertuples(index=False)
-        ],
-        0 if tablekind == "sccount" else None,
-    )
-
     # Pull chapter/subchapter ordering info
     if chapter == "all":
         ch_join_clause = ""
@@ -302,6 +280,65 @@ def _make_activity_table(
         params={"base_course": base_course},
     )
 
+    return _shape_activity_table(
+        data,
+        _enrolled_students(engine, course_name),
+        cmap,
+        act_count,
+        tablekind,
+        tz_offset_hours,
+    )
+
+
+def _shape_activity_table(
+    data: pd.DataFrame,
+    enrolled: pd.DataFrame,
+    cmap: pd.DataFrame,
+    act_count: pd.DataFrame,
+    tablekind: str,
+    tz_offset_hours: float,
+) -> list:
+    """Pivot the rows read by :func:`_make_activity_table` into report records."""
+    # Apply timezone offset
+    data["timestamp"] = data["timestamp"] - pd.Timedelta(hours=tz_offset_hours)
+
+    # Build student label — the same one used to backfill students with no
+    # recorded activity.
+    data["sid"] = _student_label(data["last_name"], data["first_name"], data["sid"])
+
+    if tablekind == "sccount":
+        values = "div_id"
+        afunc = "nunique"
+        idxlist = ["chapter", "subchapter"]
+    elif tablekind == "dividmin":
+        values = "timestamp"
+        afunc = "min"
+        idxlist = ["chapter", "subchapter", "div_id"]
+    elif tablekind == "dividmax":
+        values = "timestamp"
+        afunc = "max"
+        idxlist = ["chapter", "subchapter", "div_id"]
+    else:
+        values = "events"
+        afunc = "sum"
+        idxlist = ["chapter", "subchapter", "div_id"]
+
+    pt = data.pivot_table(index=idxlist, values=values, columns="sid", aggfunc=afunc)
+
+    if pt.empty:
+        return []
+
+    # Students with no recorded activity produce no column in the pivot, which
+    # made them vanish from the report entirely. Backfill them so the report
+    # lists the whole roster. Counts get 0; timestamp tables get a blank cell.
+    pt = _pad_with_enrolled(
+        pt,
+        _student_label(
+            enrolled["last_name"], enrolled["first_name"], enrolled["username"]
+        ).tolist(),
+        0 if tablekind == "sccount" else None,
+    )
+
     if tablekind != "sccount":
         pt = pt.reset_index(2)
 
@@ -320,33 +357,18 @@ def _make_activity_table(
         how="left",
     )
 
-    def _to_int(x):
-        try:
-            return int(x)
-        except (ValueError, TypeError):
-            return ""
-
+    label = (
+        _int_text(mtbl["chapter_num"])
+        + "."
+        + _int_text(mtbl["sub_chapter_num"])
+        + " "
+        + mtbl["chapter_label"].astype(str)
+        + "/"
+        + mtbl["sub_chapter_label"].astype(str)
+    )
     if tablekind == "sccount":
-        mtbl["chapter_label"] = mtbl.apply(
-            lambda row: "{}.{} {}/{} ({})".format(
-                _to_int(row.chapter_num),
-                _to_int(row.sub_chapter_num),
-                row.chapter_label,
-                row.sub_chapter_label,
-                int(row.act_count - 1) if pd.notna(row.get("act_count")) else "?",
-            ),
-            axis=1,
-        )
-    else:
-        mtbl["chapter_label"] = mtbl.apply(
-            lambda row: "{}.{} {}/{}".format(
-                _to_int(row.chapter_num),
-                _to_int(row.sub_chapter_num),
-                row.chapter_label,
-                row.sub_chapter_label,
-            ),
-            axis=1,
-        )
+        label = label + " (" + _int_text(mtbl["act_count"] - 1, missing="?") + ")"
+    mtbl["chapter_label"] = label.astype(object)
 
     # Keep chapter_label + student columns only
     neworder = mtbl.columns.to_list()
@@ -362,33 +384,28 @@ def _make_correct_count(
     base_course: str,
     chapter: str,
 ) -> list:
-    """Builds the correctcount pivot table from all answer tables."""
-    union_parts = "\n    union\n    ".join(
-        f"(select div_id, sid, correct, percent from {tbl} where course_name = %(course_name)s)"
-        for tbl in ANSWER_TABLES
-    )
-    df = pd.read_sql_query(
+    """Builds the correctcount pivot table: how many questions in each
+    subchapter every student has answered correctly at least once."""
+    correct = pd.read_sql_query(
         f"""
-        select div_id, sid, correct, percent, chapter, subchapter
-        from (
-            {union_parts}
-        ) as T
+        select div_id, sid, correct, chapter, subchapter
+        from activity_rollup
         join questions on div_id = name and base_course = %(base_course)s
+            {_chapter_clause_for_useinfo(chapter)}
+        where activity_rollup.course_name = %(course_name)s and correct = 'T'
         """,
         engine,
         params={"course_name": course_name, "base_course": base_course},
     )
 
-    if chapter == "all":
-        correct = df[df.correct == "T"]
-    else:
-        correct = df[(df.correct == "T") & (df.chapter == chapter)]
-
-    correct = correct.drop_duplicates()
-
     if correct.empty:
         return []
 
+    return _shape_correct_count(correct, _enrolled_students(engine, course_name))
+
+
+def _shape_correct_count(correct: pd.DataFrame, enrolled: pd.DataFrame) -> list:
+    """Pivot the rows read by :func:`_make_correct_count` into report records."""
     mtbl = correct.pivot_table(
         index="subchapter",
         columns="sid",
@@ -396,20 +413,11 @@ def _make_correct_count(
         aggfunc="count",
         fill_value=0,
     )
+    # Ensure all enrolled students appear (even those with 0 correct)
+    mtbl = _pad_with_enrolled(mtbl, enrolled["username"].tolist(), 0)
     mtbl = mtbl.reset_index().rename(columns={"subchapter": "chapter_label"})
     mtbl.sort_values("chapter_label", inplace=True)
 
-    # Ensure all enrolled students appear (even those with 0 correct)
-    enrolled = _enrolled_students(engine, course_name)
-    for username in enrolled["username"].tolist():
-        if username not in mtbl.columns:
-            mtbl[username] = 0
-
-    student_cols = sorted(
-        (col for col in mtbl.columns if col != "chapter_label"), key=lambda x: x.lower()
-    )
-    mtbl = mtbl[["chapter_label"] + student_cols]
-
     return json.loads(mtbl.to_json(orient="records", date_format="iso"))
 
 
@@ -462,8 +470,8 @@ def _build_student_detail(
 
     # Apply timezone offset
     if not activity.empty:
-        activity["first_visit"] = activity["first_visit"].map(lambda x: x - tdoff)
-        activity["last_visit"] = activity["last_visit"].map(lambda x: x - tdoff)
+        activity["first_visit"] = activity["first_visit"] - tdoff
+        activity["last_visit"] = activity["last_visit"] - tdoff
 
     # ------------------------------------------------------------------
     # 2. Answers from all graded answer tables
@@ -482,20 +490,20 @@ def _build_student_detail(
     )
 
     if not answers.empty:
+        answers["is_correct"] = answers["correct"] == "T"
         ans_agg = (
             answers.groupby("div_id")
             .agg(
                 attempts=("correct", "count"),
-                correct_count=("correct", lambda x: (x == "T").sum()),
-                last_answer=(
-                    "timestamp",
-                    lambda x: (
-                        (x.max() - tdoff).isoformat() if pd.notna(x.max()) else None
-                    ),
-                ),
+                correct_count=("is_correct", "sum"),
+                last_answer=("timestamp", "max"),
             )
             .reset_index()
         )
+        # One isoformat call per question, not per answer.
+        ans_agg["last_answer"] = (ans_agg["last_answer"] - tdoff).map(
+            pd.Timestamp.isoformat, na_action="ignore"
+        )
         ans_agg["ever_correct"] = ans_agg["correct_count"] > 0
     else:
         ans_agg = pd.DataFrame(
@@ -533,13 +541,12 @@ def _build_student_detail(
         detail["last_visit"] = detail["last_visit"].dt.strftime("%Y-%m-%d %H:%M")
 
         # Human-readable correct column
-        def _correct_label(row):
-            if pd.isna(row.get("attempts")) or row["attempts"] == 0:
-                return ""
-            return "Yes" if row["ever_correct"] else "No"
-
-        detail["correct"] = detail.apply(_correct_label, axis=1)
         detail["attempts"] = detail["attempts"].fillna(0).astype(int)
+        detail["correct"] = np.where(
+            detail["attempts"] == 0,
+            "",
+            np.where(detail["ever_correct"] == True, "Yes", "No"),  # noqa: E712
+        )
         detail = detail.rename(
             columns={
                 "div_id": "Exercise",
@@ -654,7 +661,7 @@ async def get_subchapoverview(
     course=None,
 ):
     """Serve the chapter overview report shell page."""
-    engine = create_engine(settings.dburl)
+    engine = _get_engine()
     chapters_df = pd.read_sql_query(
         """
         select chapter_name, chapter_label
@@ -718,6 +725,16 @@ async def generate_subchapoverview(
     r = _get_redis()
     _set_task(r, task_id, {"status": "pending"})
 
+    # Background tasks run in order, so the report sees the rollup brought up
+    # to date first -- unless that means the first pass over the whole term,
+    # which is too slow to run ahead of a report.
+    if await rollup_needs_backfill():
+        rslogger.warning(
+            "The activity rollup has not been built; chapter overview reports "
+            "will be incomplete until `rsmanage rollup` is run."
+        )
+    else:
+        background_tasks.add_task(refresh_activity_rollup)
     background_tasks.add_task(
         _build_report,
         task_id=task_id,
@@ -816,7 +833,7 @@ def _build_assignment_report(
     """Run in a BackgroundTask. Builds per-question stats for an assignment."""
     r = _get_redis()
     try:
-        engine = create_engine(settings.dburl)
+        engine = _get_engine()
         data = _make_assignment_table(
             engine, assignment_id, course_name, tz_offset_hours
         )
@@ -868,7 +885,7 @@ def _make_assignment_table(
 
     # 2. Enrolled students (non-LTI, non-instructor)
     enrolled = pd.read_sql_query(
-        """
+        f"""
         SELECT DISTINCT u.username, u.first_name, u.last_name
         FROM user_courses uc
         JOIN auth_user u ON u.id = uc.user_id
@@ -881,14 +898,12 @@ def _make_assignment_table(
                 SELECT id FROM courses WHERE course_name = %(course_name)s
             )
           )
+          AND {_not_lti_anonymous("u.username")}
         ORDER BY u.last_name, u.first_name, u.username
         """,
         engine,
         params={"course_name": course_name},
     )
-    enrolled = enrolled[
-        ~enrolled["username"].str.contains(r"^\d{38,}@", regex=True, na=False)
-    ]
     n_enrolled = len(enrolled)
 
     # 3. Interaction data from useinfo
@@ -908,12 +923,8 @@ def _make_assignment_table(
         parse_dates=["first_interaction", "last_interaction"],
     )
     if not interactions.empty:
-        interactions["first_interaction"] = interactions["first_interaction"].map(
-            lambda x: x - tdoff
-        )
-        interactions["last_interaction"] = interactions["last_interaction"].map(
-            lambda x: x - tdoff
-        )
+        interactions["first_interaction"] = interactions["first_interaction"] - tdoff
+        interactions["last_interaction"] = interactions["last_interaction"] - tdoff
 
     # 4. Per-question scores from question_grades (use grades table as primary source)
     scores = pd.read_sql_query(
@@ -949,10 +960,11 @@ def _make_assignment_table(
         )
 
     if not scores.empty:
+        scores["is_correct"] = scores["score"] > 0
         score_stats = (
             scores.groupby("div_id")
             .agg(
-                n_correct=("score", lambda x: (x > 0).sum()),
+                n_correct=("is_correct", "sum"),
                 n_attempted=("score", "count"),
                 avg_score=("score", "mean"),
             )
@@ -976,13 +988,8 @@ def _make_assignment_table(
     # 6. Per-student score pivot (student label → score per question)
     # Build label map for all enrolled students regardless of whether they have scores.
     if not enrolled.empty:
-        enrolled["label"] = (
-            enrolled["last_name"]
-            + ", "
-            + enrolled["first_name"]
-            + " ("
-            + enrolled["username"]
-            + ")"
+        enrolled["label"] = _student_label(
+            enrolled["last_name"], enrolled["first_name"], enrolled["username"]
         )
         label_map = dict(zip(enrolled["username"], enrolled["label"]))
     else:
@@ -1005,9 +1012,10 @@ def _make_assignment_table(
         score_pivot = pd.DataFrame({"div_id": list(div_ids)})
 
     # Ensure every enrolled student has a column, even with no scores at all.
-    for label in label_map.values():
-        if label not in score_pivot.columns:
-            score_pivot[label] = None
+    missing = [label for label in label_map.values() if label not in score_pivot]
+    score_pivot = score_pivot.reindex(
+        columns=score_pivot.columns.tolist() + missing, fill_value=None
+    )
 
     # 7. Merge everything onto the questions frame
     result = questions[["div_id", "question_type", "points", "sorting_priority"]].copy()
@@ -1027,15 +1035,8 @@ def _make_assignment_table(
     result["n_never_tried"] = result["n_never_tried"].fillna(n_enrolled).astype(int)
     result["avg_score"] = result["avg_score"].fillna(0.0).round(2)
 
-    def _fmt_ts(x):
-        try:
-            return x.strftime("%Y-%m-%d %H:%M") if pd.notna(x) else ""
-        except Exception:
-            return ""
-
-    if "first_interaction" in result.columns:
-        result["first_interaction"] = result["first_interaction"].map(_fmt_ts)
-        result["last_interaction"] = result["last_interaction"].map(_fmt_ts)
+    result["first_interaction"] = _format_timestamps(result["first_interaction"])
+    result["last_interaction"] = _format_timestamps(result["last_interaction"])
 
     result = result.sort_values("sorting_priority")
 
@@ -1127,12 +1128,8 @@ def _build_assignment_student_detail(
         parse_dates=["first_interaction", "last_interaction"],
     )
     if not interactions.empty:
-        interactions["first_interaction"] = interactions["first_interaction"].map(
-            lambda x: x - tdoff
-        )
-        interactions["last_interaction"] = interactions["last_interaction"].map(
-            lambda x: x - tdoff
-        )
+        interactions["first_interaction"] = interactions["first_interaction"] - tdoff
+        interactions["last_interaction"] = interactions["last_interaction"] - tdoff
 
     scores = pd.read_sql_query(
         """
@@ -1162,17 +1159,10 @@ def _build_assignment_student_detail(
 
     result["interactions"] = result["interactions"].fillna(0).astype(int)
 
-    def _fmt_ts(x):
-        try:
-            return x.strftime("%Y-%m-%d %H:%M") if pd.notna(x) else ""
-        except Exception:
-            return ""
-
-    result["first_interaction"] = result["first_interaction"].map(_fmt_ts)
-    result["last_interaction"] = result["last_interaction"].map(_fmt_ts)
-    result["score"] = result["score"].apply(
-        lambda x: round(float(x), 2) if pd.notna(x) else ""
-    )
+    result["first_interaction"] = _format_timestamps(result["first_interaction"])
+    result["last_interaction"] = _format_timestamps(result["last_interaction"])
+    score = pd.to_numeric(result["score"]).round(2)
+    result["score"] = score.astype(object).where(score.notna(), "")
     result = result.sort_values("sorting_priority")
     result = result.rename(
         columns={
@@ -1216,7 +1206,7 @@ async def get_assignmentoverview(
     If ``assignment_id`` is supplied as a query parameter the template will
     pre-select that assignment and auto-generate the report on page load.
     """
-    engine = create_engine(settings.dburl)
+    engine = _get_engine()
     assignments_df = pd.read_sql_query(
         """
         SELECT a.id, a.name, a.duedate, a.points
@@ -1362,7 +1352,7 @@ async def get_assignment_student_detail(
         except Exception:
             rslogger.warning("Could not parse RS_info cookie for tz_offset")
 
-    engine = create_engine(settings.dburl)
+    engine = _get_engine()
 
     student_row = pd.read_sql_query(
         """
@@ -1458,7 +1448,7 @@ async def get_student_detail(
         except Exception:
             rslogger.warning("Could not parse RS_info cookie for tz_offset")
 
-    engine = create_engine(settings.dburl)
+    engine = _get_engine()
 
     # Basic student info
     student_row = pd.read_sql_query(
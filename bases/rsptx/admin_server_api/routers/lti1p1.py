@@ -515,7 +515,7 @@ async def _launch_assignment(
     )
     if assignment.released and first_link and result_source_did and outcome_url:
         try:
-            send_lti1p1_grade(
+            await send_lti1p1_grade(
                 assignment.points,
                 score,
                 lti_record.consumer,
@@ -126,6 +126,17 @@ describe("SmartSearchExercises", () => {
     hookReturn.searchParams.sorting.order = 1;
   });
 
+  it("sorts by Name ascending when the results are ranked by relevance", async () => {
+    hookReturn.searchParams.sorting.field = "relevance";
+
+    renderWithMantine(<SmartSearchExercises />);
+    await userEvent.click(screen.getByText("Name"));
+
+    expect(hookReturn.updateSorting).toHaveBeenCalledWith("name", 1);
+
+    hookReturn.searchParams.sorting.field = "name";
+  });
+
   it("dispatches the selected exercise when a row checkbox is toggled", async () => {
     renderWithMantine(<SmartSearchExercises />);
     await userEvent.click(screen.getByRole("checkbox", { name: "Select Ex One" }));
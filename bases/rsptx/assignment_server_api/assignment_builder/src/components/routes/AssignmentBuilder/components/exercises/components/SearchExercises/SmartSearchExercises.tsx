@@ -127,8 +127,12 @@ export const SmartSearchExercises = ({
   const globalTerms = typeof globalValue === "string" ? globalValue.split(" ").filter(Boolean) : [];
   const selectedTypes = ((filters.question_type as FilterMetaValue).value as string[]) ?? [];
 
+  // "relevance" is not a column, so no header shows a sort arrow for it.
   const sorting: SortingState = useMemo(
-    () => [{ id: searchParams.sorting.field, desc: searchParams.sorting.order === -1 }],
+    () =>
+      searchParams.sorting.field === "relevance"
+        ? []
+        : [{ id: searchParams.sorting.field, desc: searchParams.sorting.order === -1 }],
     [searchParams.sorting.field, searchParams.sorting.order]
   );
 
@@ -82,7 +82,7 @@ describe("useSmartExerciseSearch", () => {
       expect(result.current.searchParams.page).toBe(0);
       expect(result.current.searchParams.limit).toBe(20);
       expect(result.current.searchParams.use_base_course).toBe(true);
-      expect(result.current.searchParams.sorting).toEqual({ field: "name", order: 1 });
+      expect(result.current.searchParams.sorting).toEqual({ field: "relevance", order: 1 });
       expect(result.current.searchParams.filters).toEqual({});
     });
 
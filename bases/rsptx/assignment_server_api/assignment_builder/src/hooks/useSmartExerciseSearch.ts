@@ -43,9 +43,10 @@ export const useSmartExerciseSearch = (initialParams?: Partial<ExercisesSearchRe
     page: 0,
     limit: 20,
 
-    // Sorting
+    // Sorting -- "relevance" ranks a global search best match first until a
+    // column is chosen
     sorting: {
-      field: "name",
+      field: "relevance",
       order: 1
     },
 
@@ -20,6 +20,8 @@ import {
   useGetGradebookQuery,
   useSetManualTotalMutation,
   GRADEBOOK_CSV_URL,
+  GRADEBOOK_DATA_URL,
+  decodeColumnarGradebook,
   gradebookCsvFilename
 } from "./grader.logic.api";
 import type {
@@ -31,6 +33,7 @@ import type {
   Accommodation,
   RosterStudent,
   RegradeDiffItem,
+  GradebookColumnarResponse,
   GradebookResponse,
   SetManualTotalRequest,
   SetManualTotalResponse
@@ -871,6 +874,34 @@ describe("getGradebook", () => {
     expect(result.averages["1"]).toBe(8);
     expect(result.show_points).toBe(false);
   });
+
+  it("asks for the columnar encoding", () => {
+    expect(GRADEBOOK_DATA_URL).toBe("/assignment/instructor/grader/gradebook/data?format=columnar");
+  });
+
+  it("expands the columnar encoding into cells", () => {
+    const columnar: GradebookColumnarResponse = {
+      assignments: [
+        { id: 7, name: "A1", points: 10, duedate: null, released: true },
+        { id: 9, name: "A2", points: 5, duedate: null, released: false }
+      ],
+      students: [
+        { sid: "s1", name: "Stu One" },
+        { sid: "s2", name: "Stu Two" }
+      ],
+      cells: { student: [0, 1, 1], assignment: [0, 0, 1], score: [8, null, 4], manual_total: [2] },
+      averages: [8, 4],
+      show_points: true
+    };
+    const result = decodeColumnarGradebook(columnar);
+    expect(result.cells).toEqual([
+      { sid: "s1", assignment_id: 7, score: 8, released: true, manual_total: false },
+      { sid: "s2", assignment_id: 7, score: null, released: true, manual_total: false },
+      { sid: "s2", assignment_id: 9, score: 4, released: false, manual_total: true }
+    ]);
+    expect(result.averages).toEqual({ "7": 8, "9": 4 });
+    expect(result.show_points).toBe(true);
+  });
 });
 
 describe("gradebook CSV helpers", () => {
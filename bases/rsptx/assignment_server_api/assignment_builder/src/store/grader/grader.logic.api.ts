@@ -208,6 +208,51 @@ export interface GradebookResponse {
   show_points: boolean;
 }
 
+/** The gradebook as sent with ``format=columnar``: the cells are parallel arrays
+ * of positions in ``students`` and ``assignments``, and ``manual_total`` lists
+ * the positions in those arrays of the hand-set totals. */
+export interface GradebookColumnarResponse {
+  assignments: GradebookAssignment[];
+  students: GradebookStudent[];
+  cells: {
+    student: number[];
+    assignment: number[];
+    score: (number | null)[];
+    manual_total: number[];
+  };
+  averages: (number | null)[];
+  show_points: boolean;
+}
+
+export const GRADEBOOK_DATA_URL = "/assignment/instructor/grader/gradebook/data?format=columnar";
+
+/** Expand the columnar gradebook into the one-object-per-cell form the grader
+ * pages work with. */
+export const decodeColumnarGradebook = (g: GradebookColumnarResponse): GradebookResponse => {
+  const manual = new Set(g.cells.manual_total);
+  const cells: GradebookCell[] = g.cells.score.map((score, i) => {
+    const assignment = g.assignments[g.cells.assignment[i]];
+    return {
+      sid: g.students[g.cells.student[i]].sid,
+      assignment_id: assignment.id,
+      score,
+      released: assignment.released,
+      manual_total: manual.has(i)
+    };
+  });
+  const averages: Record<string, number | null> = {};
+  g.assignments.forEach((a, i) => {
+    averages[String(a.id)] = g.averages[i];
+  });
+  return {
+    assignments: g.assignments,
+    students: g.students,
+    cells,
+    averages,
+    show_points: g.show_points
+  };
+};
+
 /** One question's worth of a single student's assignment breakdown. */
 export interface StudentAssignmentQuestionScore {
   id: number;
@@ -484,12 +529,15 @@ export const graderApi = createApi({
       }
     }),
     getGradebook: build.query<GradebookResponse, void>({
+      // The server answers with an ETag, so a refetch of an unchanged gradebook
+      // is revalidated by the browser and comes back as a 304.
       query: () => ({
         method: "GET",
-        url: "/assignment/instructor/grader/gradebook/data"
+        url: GRADEBOOK_DATA_URL
       }),
       providesTags: ["Gradebook"],
-      transformResponse: (r: DetailResponse<GradebookResponse>) => r.detail
+      transformResponse: (r: DetailResponse<GradebookColumnarResponse>) =>
+        decodeColumnarGradebook(r.detail)
     }),
     getStudentAssignmentScores: build.query<
       StudentAssignmentScoresResponse,
@@ -9,6 +9,7 @@
 #
 # Standard library
 # ----------------
+from contextlib import asynccontextmanager
 import os
 import pathlib
 
@@ -28,6 +29,8 @@ from rsptx.exceptions.core import add_exception_handlers
 from rsptx.logging import rslogger
 from rsptx.templates import template_folder
 from rsptx.auth.session import auth_manager
+from rsptx.lti1p1.core import close_lti1p1_http_session
+from rsptx.lti1p3.core import close_lti1p3_http_session
 
 # FastAPI setup
 # =============
@@ -35,7 +38,17 @@ from rsptx.auth.session import auth_manager
 kwargs = {}
 if root_path := os.environ.get("ROOT_PATH"):
     kwargs["root_path"] = root_path
-app = FastAPI(**kwargs)  # type: ignore
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    yield
+    # Release the pooled HTTP clients used to send LTI grades.
+    await close_lti1p1_http_session()
+    await close_lti1p3_http_session()
+
+
+app = FastAPI(lifespan=lifespan, **kwargs)  # type: ignore
 
 
 # We can mount various "apps" with mount.  Anything that gets to this server with /staticAssets
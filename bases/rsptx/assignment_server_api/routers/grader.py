@@ -1,9 +1,10 @@
 import csv
 import io
-from typing import Any, List, Optional
+import zlib
+from typing import Any, AsyncIterator, List, Literal, Optional
 
 from fastapi import APIRouter, Depends, Query, Request, status
-from fastapi.responses import StreamingResponse
+from fastapi.responses import Response, StreamingResponse
 from pydantic import BaseModel
 from sqlalchemy import select, func, and_, or_
 
@@ -13,7 +14,8 @@ from rsptx.db.crud import (
     fetch_assignment_questions,
     fetch_course,
     fetch_course_instructors,
-    fetch_gradebook,
+    fetch_gradebook_columns,
+    fetch_gradebook_snapshot,
     fetch_grade,
     fetch_interaction_useinfo,
     fetch_one_assignment,
@@ -23,6 +25,7 @@ from rsptx.db.crud import (
     create_question_grade_entry,
     is_interaction_event,
     set_manual_total,
+    stream_gradebook_rows,
     update_question_grade_entry,
     update_assignment_released,
     update_assignment_threshold,
@@ -48,7 +51,7 @@ from rsptx.grading_helpers.answer_tables import (
 )
 from rsptx.grading_helpers.regrade import (
     RegradeOptions,
-    regrade_batch,
+    regrade_bulk,
     recompute_totals_for,
 )
 
@@ -826,7 +829,7 @@ async def regrade_preview(
         recompute_totals=payload.recompute_totals,
         which_to_grade_override=payload.which_to_grade_override,
     )
-    report = await regrade_batch(
+    report = await regrade_bulk(
         course, sids, questions, assignment, options, dry_run=True
     )
     return make_json_response(status=status.HTTP_200_OK, detail=report.dict())
@@ -857,7 +860,7 @@ async def regrade_run(
         recompute_totals=payload.recompute_totals,
         which_to_grade_override=payload.which_to_grade_override,
     )
-    report = await regrade_batch(
+    report = await regrade_bulk(
         course,
         sids,
         questions,
@@ -1099,67 +1102,165 @@ def _display_score(score: float, points: float, show_points: bool) -> float:
     return round(score / points * 100, 2)
 
 
-def _gradebook_to_csv(data: dict) -> str:
-    """Render the gradebook as CSV in the same units the on-screen gradebook uses:
-    a percent of each assignment's points, or raw points when the course has set
-    the ``show_points`` attribute.
-    """
-    output = io.StringIO()
-    writer = csv.writer(output)
-    assignments = data["assignments"]
-    show_points = bool(data.get("show_points"))
-
+def _csv_header(assignments: List[dict], show_points: bool) -> List[str]:
     def column_name(assignment: dict) -> str:
         if show_points:
             return f"{assignment['name']} ({assignment['points']} pts)"
         return f"{assignment['name']} (%)"
 
-    writer.writerow(
+    return (
         ["Student"]
         + [column_name(a) for a in assignments]
         + ["Total" if show_points else "Total (%)"]
     )
-    scores = {
-        (cell["sid"], cell["assignment_id"]): cell["score"] for cell in data["cells"]
-    }
+
+
+def _csv_row(
+    name: str, scores: dict, assignments: List[dict], show_points: bool
+) -> List[str]:
+    """One student's CSV row from their assignment id -> score map."""
+    row = [name]
+    earned = 0.0
+    possible = 0.0
+    graded = False
+    for assignment in assignments:
+        score = scores.get(assignment["id"])
+        if score is None:
+            row.append("")
+            continue
+        points = assignment["points"] or 0
+        row.append(_format_score(_display_score(score, points, show_points)))
+        earned += score
+        possible += points
+        graded = True
+    # The total is a percent of only the assignments this student was graded
+    # on, so ungraded work does not read as a zero.
+    row.append(
+        _format_score(_display_score(earned, possible, show_points)) if graded else ""
+    )
+    return row
+
+
+def _gradebook_to_csv(data: dict) -> str:
+    """Render the gradebook as CSV in the same units the on-screen gradebook uses:
+    a percent of each assignment's points, or raw points when the course has set
+    the ``show_points`` attribute.
+    """
+    output = io.StringIO()
+    writer = csv.writer(output)
+    assignments = data["assignments"]
+    show_points = bool(data.get("show_points"))
+    writer.writerow(_csv_header(assignments, show_points))
+    scores: dict = {}
+    for cell in data["cells"]:
+        scores.setdefault(cell["sid"], {})[cell["assignment_id"]] = cell["score"]
     for student in data["students"]:
-        row = [student["name"]]
-        earned = 0.0
-        possible = 0.0
-        graded = False
-        for assignment in assignments:
-            score = scores.get((student["sid"], assignment["id"]))
-            if score is None:
-                row.append("")
-                continue
-            points = assignment["points"] or 0
-            row.append(_format_score(_display_score(score, points, show_points)))
-            earned += score
-            possible += points
-            graded = True
-        # The total is a percent of only the assignments this student was graded
-        # on, so ungraded work does not read as a zero.
-        row.append(
-            _format_score(_display_score(earned, possible, show_points))
-            if graded
-            else ""
+        writer.writerow(
+            _csv_row(
+                student["name"],
+                scores.get(student["sid"], {}),
+                assignments,
+                show_points,
+            )
         )
-        writer.writerow(row)
     return output.getvalue()
 
 
+#: Students per chunk of the streamed CSV export.
+CSV_CHUNK_ROWS = 200
+
+
+async def _gradebook_csv_chunks(course_id: int) -> AsyncIterator[bytes]:
+    """The gradebook CSV, as ``_gradebook_to_csv`` writes it, in chunks of
+    ``CSV_CHUNK_ROWS`` students read as they come off the database cursor."""
+    show_points, assignments = await fetch_gradebook_columns(course_id)
+    output = io.StringIO()
+    writer = csv.writer(output)
+    writer.writerow(_csv_header(assignments, show_points))
+    pending = 0
+    async for student, scores in stream_gradebook_rows(course_id):
+        writer.writerow(_csv_row(student["name"], scores, assignments, show_points))
+        pending += 1
+        if pending >= CSV_CHUNK_ROWS:
+            yield output.getvalue().encode()
+            output.seek(0)
+            output.truncate()
+            pending = 0
+    yield output.getvalue().encode()
+
+
+async def _gzip_chunks(chunks: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+    """Gzip a byte stream as it goes, one compressed chunk per input chunk."""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+    async for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+
+def _accepts_gzip(accept_encoding: Optional[str]) -> bool:
+    """Whether an ``Accept-Encoding`` header allows gzip (a ``q=0`` refuses it)."""
+    for coding in (accept_encoding or "").split(","):
+        name, _, params = coding.partition(";")
+        if name.strip().lower() not in ("gzip", "x-gzip", "*"):
+            continue
+        q = params.strip().lower()
+        if not q.startswith("q="):
+            return True
+        try:
+            return float(q[2:]) > 0
+        except ValueError:
+            return False
+    return False
+
+
+def _etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Whether an ``If-None-Match`` header names ``etag`` (compared weakly, as
+    RFC 9110 asks for conditional GETs)."""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    return any(
+        tag.strip().removeprefix("W/") == etag for tag in if_none_match.split(",")
+    )
+
+
 @router.get("/gradebook/data")
 @instructor_role_required()
-async def get_gradebook(request: Request, user=Depends(auth_manager)):
+async def get_gradebook(
+    request: Request,
+    fmt: Literal["cells", "columnar"] = Query("cells", alias="format"),
+    user=Depends(auth_manager),
+):
     """Return the gradebook matrix (assignments x students) for the caller's
     course: assignments, students, per-cell scores, and per-assignment averages.
 
+    ``format=columnar`` sends the cells as parallel arrays of student and
+    assignment positions instead of one object per cell (see
+    ``GradebookSnapshot.to_columnar``), which is several times smaller for a
+    large course.
+
+    The response carries an ETag; a request whose ``If-None-Match`` names it
+    gets a bodiless 304, so re-opening an unchanged gradebook costs nothing.
+
     Served under ``/gradebook/data`` (not ``/gradebook``) so the single-segment
     SPA deep link ``/grader/gradebook`` falls through to the React app instead of
     being shadowed by this JSON endpoint.
     """
-    data = await fetch_gradebook(user.course_name)
-    return make_json_response(status=status.HTTP_200_OK, detail=data)
+    snapshot = await fetch_gradebook_snapshot(user.course_id)
+    body, etag = snapshot.encode(fmt)
+    # no-cache: the browser may keep the copy, but must revalidate it each time.
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if _etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    # The same envelope make_json_response produces, around the cached body.
+    return Response(
+        content=b'{"detail":' + body + b"}",
+        media_type="application/json",
+        headers=headers,
+    )
 
 
 @router.get("/gradebook.csv")
@@ -1167,9 +1268,11 @@ async def get_gradebook(request: Request, user=Depends(auth_manager)):
 async def get_gradebook_csv(request: Request, user=Depends(auth_manager)):
     """Stream the gradebook as a CSV download (one row per student, one column
     per assignment plus a total column).
+
+    Rows are read through a database cursor and sent as they are written, so a
+    large course's export is never held in memory whole. A client that accepts
+    gzip gets the CSV gzip-encoded.
     """
-    data = await fetch_gradebook(user.course_name)
-    content = _gradebook_to_csv(data)
     safe_course = "".join(
         c if c.isalnum() or c in ("-", "_") else "-" for c in user.course_name
     )
@@ -1177,11 +1280,15 @@ async def get_gradebook_csv(request: Request, user=Depends(auth_manager)):
     rslogger.info(
         f"Gradebook CSV exported by {user.username} course={user.course_name}"
     )
-    return StreamingResponse(
-        iter([content]),
-        media_type="text/csv",
-        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
-    )
+    headers = {
+        "Content-Disposition": f'attachment; filename="{filename}"',
+        "Vary": "Accept-Encoding",
+    }
+    body = _gradebook_csv_chunks(user.course_id)
+    if _accepts_gzip(request.headers.get("accept-encoding")):
+        body = _gzip_chunks(body)
+        headers["Content-Encoding"] = "gzip"
+    return StreamingResponse(body, media_type="text/csv", headers=headers)
 
 
 class GradebookUnitsRequest(BaseModel):
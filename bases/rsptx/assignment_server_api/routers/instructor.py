@@ -22,14 +22,15 @@ from fastapi.responses import (
     JSONResponse,
     StreamingResponse,
 )
-from sqlalchemy import create_engine
+from fastapi.concurrency import run_in_threadpool
 from pydantic import BaseModel
-from typing import List, Optional, Annotated
+from typing import Dict, List, Optional, Tuple, Annotated
 
 # Local application imports
 # -------------------------
 
 from rsptx.db.crud import (
+    GradebookPageRows,
     create_invoice_request,
     delete_lti_course,
     duplicate_assignment,
@@ -47,6 +48,9 @@ from rsptx.db.crud import (
     upsert_deadline_exception,
     create_question,
     fetch_course,
+    fetch_course_practice,
+    fetch_gradebook_page_rows,
+    fetch_practice_completion_counts,
     fetch_users_for_course,
     create_code_entry,
     fetch_subchapters,
@@ -295,174 +299,57 @@ def aggregate_peer_votes(votes: List[str]):
     return {"counts": counts}
 
 
-@router.get("/gradebook")
-async def get_assignment_gb(
-    request: Request, user=Depends(auth_manager), response_class=HTMLResponse
-):
-    # get the course
-    course = await fetch_course(user.course_name)
-    course_attrs = await fetch_all_course_attributes(course.id)
-    show_points = course_attrs.get("show_points", "false") == "true"
-
-    if settings.server_config == "development":
-        dburl = settings.dev_dburl
-    elif settings.server_config == "production":
-        dburl = settings.dburl
-    eng = create_engine(dburl)
-
-    user_is_instructor = await is_instructor(request, user=user)
-    if not user_is_instructor:
-        return RedirectResponse(url="/")
-
-    classid = course.id
-
-    df = pd.read_sql(
-        """
-    select score, points, assignments.id as assignment, auth_user.id as sid, is_submit
-    from auth_user join grades on (auth_user.id = grades.auth_user)
-    join assignments on (grades.assignment = assignments.id)
-        where points is not null
-            and assignments.course = %s
-            and auth_user.id not in (
-                select instructor from course_instructor where course = %s
-            )
-    order by last_name, first_name, assignments.duedate, assignments.id
-    """,
-        eng,
-        params=(classid, classid),
-    )
-
-    assignments = pd.read_sql(
-        """
-    select id, name, points from assignments where course = %s order by duedate, id
-                    """,
-        eng,
-        params=(classid,),
-    )
-
-    students = pd.read_sql(
-        """
-        select auth_user.id, username, first_name, last_name, email from auth_user join user_courses on auth_user.id = user_id
-        join courses on user_courses.course_id = courses.id
-                where courses.id = %s
-                    and auth_user.id not in (
-                        select instructor from course_instructor where course = %s
-                    )
-                order by last_name, first_name
-        """,
-        eng,
-        params=(classid, classid),
-    )
-
-    # Spaced practice grading, copied from the old gradebook logic.
-    # Get the spaced practice settings for this course.
-    practice_setting = pd.read_sql(
-        """
-        select spacing, day_points, max_practice_days, question_points, max_practice_questions
-        from course_practice
-        where course_name = %s
-          and end_date is not null
-        order by id desc
-        limit 1
-        """,
-        eng,
-        params=(course.course_name,),
+def _practice_grades(
+    counts: Dict[int, int],
+    points_per_unit: float,
+    max_units: int,
+    total_points: float,
+    show_points: bool,
+) -> pd.Series:
+    """Each student's spaced practice grade, formatted for the gradebook table.
+
+    :param counts: completed practice days or questions, by auth_user id
+    :return: the grade as text by auth_user id; empty when the practice is
+        worth no points
+    """
+    completed = pd.Series(counts, dtype="float64")
+    if not total_points:
+        return pd.Series("", index=completed.index, dtype=object)
+    earned = points_per_unit * completed.clip(upper=max_units)
+    if not show_points:
+        earned = 100 * earned / total_points
+    return earned.map("{0:.2f}".format)
+
+
+def _shape_assignment_gradebook(
+    rows: GradebookPageRows,
+    show_points: bool,
+    practice: Optional[Tuple[float, pd.Series]],
+) -> Tuple[str, dict, dict]:
+    """Pivot the gradebook page's rows into its HTML table.
+
+    Pure pandas work with no I/O, run off the event loop.
+
+    :param practice: the spaced practice column's total points and each
+        student's grade (see :func:`_practice_grades`), or None when the course
+        does not grade practice
+    :return: the table's HTML, each student's full name by username, and each
+        assignment column's id by its header
+    """
+    df = pd.DataFrame(rows.scores, columns=["score", "assignment", "sid"])
+    df["score"] = df["score"].astype("float64")
+    students = pd.DataFrame(
+        rows.students, columns=["id", "username", "first_name", "last_name", "email"]
     )
 
-    # This dictionary will store each user's practice grade by user_id.
-    practice_by_user_id = {}
-    show_practice = False
-    practice_total_points = 0.0
-
-    def format_practice_grade(points_received, total_possible_points):
-        # If there are no possible points, return an empty string to avoid division by zero.
-        if not total_possible_points:
-            return ""
-        # Format the grade based on whether we are showing points or percentage.
-        if show_points:
-            return "{0:.2f}".format(points_received)
-
-        return "{0:.2f}".format(100 * points_received / total_possible_points)
-
-    # Only calculate practice grades if this course has practice settings
-    if not practice_setting.empty:
-        show_practice = True
-        ps = practice_setting.iloc[0]
-
-        # If spacing is 1, grade practice based on completed practice days.
-        if ps.spacing == 1:
-            practice_counts = pd.read_sql(
-                """
-                select user_id, count(*) as practice_completion_count
-                from user_topic_practice_completion
-                where course_name = %s
-                group by user_id
-                """,
-                eng,
-                params=(course.course_name,),
-            )
-
-            # Calculate the total possible points for practice days.
-            practice_total_points = float(ps.day_points or 0) * float(
-                ps.max_practice_days or 0
-            )
-
-            # Loop through each student with completed practice questions and calculate
-            # their spaced practice grade based on the number of questions they completed.
-            max_days = int(ps.max_practice_days or 0)
-            points_per_day = float(ps.day_points or 0)
-            for _, prow in practice_counts.iterrows():
-                completion_count = int(prow.practice_completion_count or 0)
-                points_received = points_per_day * min(completion_count, max_days)
-                practice_by_user_id[prow.user_id] = format_practice_grade(
-                    points_received, practice_total_points
-                )
-
-        # Otherwise, grade practice based on the number of completed questions.
-        else:
-            practice_counts = pd.read_sql(
-                """
-                select user_id, count(*) as practice_completion_count
-                from user_topic_practice_log
-                where course_name = %s
-                  and q != 0
-                  and q != -1
-                group by user_id
-                """,
-                eng,
-                params=(course.course_name,),
-            )
-            practice_total_points = float(ps.question_points or 0) * float(
-                ps.max_practice_questions or 0
-            )
-
-            # Loop through each student with completed practice questions and calculate
-            # their spaced practice grade based on the number of questions they completed.
-            max_questions = int(ps.max_practice_questions or 0)
-            points_per_question = float(ps.question_points or 0)
-            for _, prow in practice_counts.iterrows():
-                completion_count = int(prow.practice_completion_count or 0)
-                points_received = points_per_question * min(
-                    completion_count, max_questions
-                )
-                practice_by_user_id[prow.user_id] = format_practice_grade(
-                    points_received, practice_total_points
-                )
-    apoints = {}
-    for ix, row in assignments.iterrows():
-        rslogger.debug(f"AROW = {row['name']}, {row.points}")
-        apoints[row["name"]] = row.points if row.points is not None else 0
-
-    assignments.index = assignments.id
-    aname = assignments.name.to_dict()
+    apoints = {
+        name: points if points is not None else 0
+        for _, name, points in rows.assignments
+    }
+    aname = {aid: name for aid, name, _ in rows.assignments}
     # Reverse lookup so we can map a rendered column back to its assignment id.
     aid_by_name = {name: aid for aid, name in aname.items()}
-    students["full_name"] = students.first_name + " " + students.last_name
     students.index = students.id
-    sfirst = students.first_name.to_dict()
-    slast = students.last_name.to_dict()
-    semail = students.email.to_dict()
-    suser = students.username.to_dict()
     pt = df.pivot(index="sid", columns="assignment", values="score").rename(
         columns=aname
     )
@@ -495,22 +382,22 @@ async def get_assignment_gb(
         if c in aid_by_name:
             assignment_id_by_column[display_name] = aid_by_name[c]
 
-    pt["first_name"] = pt.index.map(sfirst)
-    pt["last_name"] = pt.index.map(slast)
-    pt["email"] = pt.index.map(semail)
-    pt["username"] = pt.index.map(suser)
+    # pt now has the students' rows, in the students' order.
+    for column in ["first_name", "last_name", "email", "username"]:
+        pt[column] = students[column].to_numpy()
 
     # These are the columns that should always show first.
     base_cols = ["first_name", "last_name", "email", "username"]
 
     # Only add the Practice column if spaced practice is actually configured.
-    if show_practice:
+    if practice is not None:
+        practice_total_points, practice_grades = practice
         if show_points:
             practice_col = f"Practice ({practice_total_points:g} pts)"
         else:
             practice_col = "Practice (%)"
 
-        pt[practice_col] = pt.index.map(lambda sid: practice_by_user_id.get(sid, ""))
+        pt[practice_col] = practice_grades.reindex(pt.index, fill_value="")
         base_cols.append(practice_col)
 
     pt["_last_name_missing"] = pt["last_name"].fillna("").str.strip().eq("")
@@ -525,27 +412,75 @@ async def get_assignment_gb(
     pt = pt.drop(columns=["sid"], axis=1)
     pt.columns.name = None
 
-    names = {}
-    for ix, row in pt.iterrows():
-        if isinstance(row.first_name, str) and isinstance(row.last_name, str):
-            names[row.username] = row.first_name + " " + row.last_name
+    named = pt[
+        pt.first_name.map(lambda v: isinstance(v, str))
+        & pt.last_name.map(lambda v: isinstance(v, str))
+    ]
+    names = dict(zip(named.username, named.first_name + " " + named.last_name))
 
-    # pt = pt.drop(columns=["username"], axis=1)
-    templates = get_shared_templates()
     # rename the columns in cols to cols_plus_points
     rename_dict = {old: new for old, new in zip(cols, display_cols)}
     pt = pt.rename(columns=rename_dict)
 
+    table_html = pt.to_html(
+        table_id="table",
+        columns=base_cols + display_cols,
+        index=False,
+        na_rep="",
+        formatters=formatter_map,
+    )
+    return table_html, names, assignment_id_by_column
+
+
+@router.get("/gradebook")
+async def get_assignment_gb(
+    request: Request, user=Depends(auth_manager), response_class=HTMLResponse
+):
+    user_is_instructor = await is_instructor(request, user=user)
+    if not user_is_instructor:
+        return RedirectResponse(url="/")
+
+    # get the course
+    course = await fetch_course(user.course_name)
+    course_attrs = await fetch_all_course_attributes(course.id)
+    show_points = course_attrs.get("show_points", "false") == "true"
+
+    rows = await fetch_gradebook_page_rows(course.id)
+
+    # Spaced practice grading, copied from the old gradebook logic.
+    # Get the spaced practice settings for this course.
+    ps = await fetch_course_practice(course.course_name, with_end_date=True)
+    practice = None
+    if ps is not None:
+        # If spacing is 1, grade practice based on completed practice days.
+        # Otherwise, grade practice based on the number of completed questions.
+        by_day = ps.spacing == 1
+        counts = await fetch_practice_completion_counts(course.course_name, by_day)
+        if by_day:
+            points_per_unit = float(ps.day_points or 0)
+            max_units = int(ps.max_practice_days or 0)
+        else:
+            points_per_unit = float(ps.question_points or 0)
+            max_units = int(ps.max_practice_questions or 0)
+        practice_total_points = points_per_unit * max_units
+        practice = (
+            practice_total_points,
+            _practice_grades(
+                counts, points_per_unit, max_units, practice_total_points, show_points
+            ),
+        )
+
+    # Pivoting and rendering a large course takes long enough to hold up every
+    # other request on this worker, so it runs in the thread pool.
+    table_html, names, assignment_id_by_column = await run_in_threadpool(
+        _shape_assignment_gradebook, rows, show_points, practice
+    )
+
+    templates = get_shared_templates()
     return templates.TemplateResponse(
         "assignment/instructor/gradebook.html",
         {
-            "table_html": pt.to_html(
-                table_id="table",
-                columns=base_cols + display_cols,
-                index=False,
-                na_rep="",
-                formatters=formatter_map,
-            ),
+            "table_html": table_html,
             "pt": names,
             "course": course,
             "user": user.username,
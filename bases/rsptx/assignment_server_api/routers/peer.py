@@ -51,6 +51,7 @@ from rsptx.endpoint_validators import instructor_role_required, with_course
 from rsptx.logging import rslogger
 from rsptx.response_helpers.core import (
     get_webpack_static_imports,
+    peer_channel,
 )
 from rsptx.templates import get_shared_templates
 
@@ -223,7 +224,7 @@ async def get_peer_dashboard(
             "course_name": course.course_name,
             "div_id": current_question.name,
         }
-        r.publish("peermessages", json.dumps(mess))
+        r.publish(peer_channel(course.course_name), json.dumps(mess))
         r.hset(f"{course.course_name}_state", "current_phase", json.dumps(mess))
         r.delete(f"assignment_{assignment_id}_state")
     except Exception as e:
@@ -887,7 +888,7 @@ async def make_pairs(
                 "answer": json.dumps(pdict),
                 "course_name": course.course_name,
             }
-            r.publish("peermessages", json.dumps(mess))
+            r.publish(peer_channel(course.course_name), json.dumps(mess))
 
         # Store per-student phase so reconnecting students catch up to the right UI.
         # Text-chat and verbal (face-chat) students get different phases in A/B mode,
@@ -939,7 +940,7 @@ async def make_pairs(
                     "group": display_group,
                     "course_name": course.course_name,
                 }
-                r.publish("peermessages", json.dumps(mess))
+                r.publish(peer_channel(course.course_name), json.dumps(mess))
                 r.hset(
                     state_key,
                     p,
@@ -1255,7 +1256,7 @@ async def publish_message(
 
     try:
         r = redis.from_url(os.environ.get("REDIS_URI", "redis://redis:6379/0"))
-        r.publish("peermessages", json.dumps(data))
+        r.publish(peer_channel(course.course_name), json.dumps(data))
 
         # Store phase-change control messages so reconnecting students can catch up
         if data.get("type") == "control" and data.get("message") in (
@@ -1418,16 +1419,41 @@ async def send_lti_scores(
     """
     Send LTI scores for all students in the assignment.
     Mirrors web2py peer.send_lti_scores.
+
+    Returns what happened to each student's score: ``sent`` is how many the
+    LMS accepted, ``failed`` and ``skipped`` map a username to the reason its
+    score did not reach the LMS.
     """
     from rsptx.lti1p3.core import attempt_lti1p3_score_updates
 
     rslogger.info(f"Sending LTI scores for assignment {assignment_id}")
     try:
-        await attempt_lti1p3_score_updates(assignment_id, force=True)
+        report = await attempt_lti1p3_score_updates(assignment_id, force=True)
     except Exception as e:
         rslogger.error(f"Error sending LTI scores: {e}")
         return JSONResponse(status_code=500, content={"ok": False, "error": str(e)})
-    return JSONResponse(content="success")
+    if report is None:
+        return JSONResponse(
+            status_code=404,
+            content={
+                "ok": False,
+                "error": "this assignment is not linked to an LMS assignment",
+            },
+        )
+
+    usernames = {s.id: s.username for s in await fetch_course_students(course.id)}
+    rslogger.info(
+        f"LTI scores for assignment {assignment_id}: {len(report.sent)} sent, "
+        f"{len(report.failed)} failed, {len(report.skipped)} skipped"
+    )
+    return JSONResponse(
+        content={
+            "ok": not report.failed,
+            "sent": len(report.sent),
+            "failed": {usernames.get(k, str(k)): v for k, v in report.failed.items()},
+            "skipped": {usernames.get(k, str(k)): v for k, v in report.skipped.items()},
+        }
+    )
 
 
 @router.post("/api/toggle_async")
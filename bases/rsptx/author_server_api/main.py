@@ -43,6 +43,7 @@ from rsptx.author_server_api.worker import (
     anonymize_data_dump,
 )
 from rsptx.auth.session import is_instructor
+from rsptx.data_extract.core import EXPORT_FORMATS, ready_exports
 from rsptx.db.models import CoursesValidator
 from rsptx.exceptions.core import add_exception_handlers
 from rsptx.endpoint_validators import author_role_required
@@ -191,7 +192,7 @@ async def logfiles(request: Request, user=Depends(auth_manager)):
                         "%Y-%m-%d %H:%M;%S", time.localtime(x.stat().st_mtime)
                     )
                 )
-                for x in lf_path.iterdir()
+                for x in ready_exports(lf_path)
             }
         else:
             ready_files = []
@@ -399,7 +400,7 @@ async def anondata(request: Request, book: str, user=Depends(auth_manager)):
     lf_path = pathlib.Path("downloads", "datashop", user.username)
     logger.debug(f"WORKING DIR = {lf_path}")
     if lf_path.exists():
-        ready_files = [x for x in lf_path.iterdir()]
+        ready_files = ready_exports(lf_path)
     else:
         ready_files = []
 
@@ -534,17 +535,34 @@ async def do_deploy(payload=Body(...)):
     return JSONResponse({"task_id": task.id})
 
 
+def _bad_export_format(fmt) -> Optional[JSONResponse]:
+    """A 400 for an export format the worker cannot write, so a typo is
+    reported to the caller instead of failing later in the Celery task."""
+    if isinstance(fmt, str) and fmt in EXPORT_FORMATS:
+        return None
+    return JSONResponse(
+        {"detail": f"Unknown format {fmt!r}; use one of {sorted(EXPORT_FORMATS)}"},
+        status_code=status.HTTP_400_BAD_REQUEST,
+    )
+
+
 @app.post("/author/dumpUseinfo", status_code=201)
 async def dump_useinfo(payload=Body(...), user=Depends(auth_manager)):
     classname = payload["classname"]
-    task = useinfo_to_csv.delay(classname, user.username)
+    fmt = payload.get("format", "csv")
+    if error := _bad_export_format(fmt):
+        return error
+    task = useinfo_to_csv.delay(classname, user.username, fmt)
     return JSONResponse({"task_id": task.id})
 
 
 @app.post("/author/dumpCode", status_code=201)
 async def dump_code(payload=Body(...), user=Depends(auth_manager)):
     classname = payload["classname"]
-    task = code_to_csv.delay(classname, user.username)
+    fmt = payload.get("format", "csv")
+    if error := _bad_export_format(fmt):
+        return error
+    task = code_to_csv.delay(classname, user.username, fmt)
     return JSONResponse({"task_id": task.id})
 
 
@@ -556,7 +574,7 @@ async def check_downloads(request: Request, kind: str, user=Depends(auth_manager
     lf_path = pathlib.Path("downloads", kind, user.username)
     logger.debug(f"WORKING DIR = {lf_path}")
     if lf_path.exists():
-        ready_files = [x.name for x in lf_path.iterdir()]
+        ready_files = [x.name for x in ready_exports(lf_path)]
     else:
         ready_files = []
 
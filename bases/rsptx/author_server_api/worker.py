@@ -22,6 +22,7 @@ from sqlalchemy import create_engine
 
 # Third Party
 # -----------
+import billiard
 from celery import Celery
 from celery.exceptions import Ignore
 import pandas as pd
@@ -30,6 +31,7 @@ import pandas as pd
 # -----------------
 from rsptx.build_tools.core import _build_runestone_book, _build_ptx_book
 from rsptx.data_extract.anonymizeCourseData import Anonymizer
+from rsptx.data_extract.core import export_query
 
 # Set up logging
 
@@ -432,62 +434,82 @@ def deploy_book(self, book):
     return True
 
 
+def _export_course_log(task, query, classname, username, table, fmt):
+    """
+    Stream one course's rows of ``table`` into the user's logfiles folder,
+    reporting progress on ``task`` as each chunk is written.
+    """
+    os.chdir("/usr/src/app")
+    dburl = os.environ.get("DEV_DBURL")
+    eng = create_engine(dburl)
+    p = pathlib.Path("downloads", "logfiles", username)
+    p.mkdir(parents=True, exist_ok=True)
+    task.update_state(state="QUERYING", meta={"current": "extracting from database"})
+
+    def progress(rows):
+        task.update_state(
+            state="WRITING", meta={"current": f"{rows:,} rows written", "rows": rows}
+        )
+
+    try:
+        rows = export_query(
+            eng,
+            query,
+            dict(cname=classname),
+            p / f"{classname}_{table}",
+            fmt=fmt,
+            progress=progress,
+        )
+    finally:
+        eng.dispose()
+    logger.debug(f"Exported {rows} {table} rows for {classname}")
+    done = "csv.zip file created" if fmt == "csv" else f"{fmt} file created"
+    task.update_state(state="SUCCESS", meta={"current": done, "rows": rows})
+    return True
+
+
 @celery.task(bind=True, name="useinfo_to_csv")
-def useinfo_to_csv(self, classname, username):
+def useinfo_to_csv(self, classname, username, fmt="csv"):
     """
     Extract useinfo data from the database and save it to a CSV file.
 
     :param self: celery task
     :param classname: course name
     :param username: username for the CSV file
+    :param fmt: ``csv`` for a zipped CSV file or ``parquet``
     :return: True if extraction succeeds, False otherwise
     """
-    os.chdir("/usr/src/app")
-    dburl = os.environ.get("DEV_DBURL")
-    eng = create_engine(dburl)
-    self.update_state(state="QUERYING", meta={"current": "extracting from database"})
-    df = pd.read_sql_query(
+    return _export_course_log(
+        self,
         """select * from useinfo where course_id = %(cname)s order by id""",
-        params=dict(cname=classname),
-        con=eng,
+        classname,
+        username,
+        "useinfo",
+        fmt,
     )
-    p = pathlib.Path("downloads", "logfiles", username)
-    p.mkdir(parents=True, exist_ok=True)
-    p = p / f"{classname}_useinfo.csv.zip"
-    self.update_state(state="WRITING", meta={"current": "creating csv.zip file"})
-    df.to_csv(p, index=False, compression={"method": "zip"})
-    self.update_state(state="SUCCESS", meta={"current": "csv.zip file created"})
-    return True
 
 
 @celery.task(bind=True, name="code_to_csv")
-def code_to_csv(self, classname, username):
+def code_to_csv(self, classname, username, fmt="csv"):
     """
     Extract code data from the database and save it to a CSV file.
 
     :param self: celery task
     :param classname: course name
     :param username: username for the CSV file
+    :param fmt: ``csv`` for a zipped CSV file or ``parquet``
     :return: True if extraction succeeds, False otherwise
     """
-    os.chdir("/usr/src/app")
-    dburl = os.environ.get("DEV_DBURL")
-    eng = create_engine(dburl)
-    self.update_state(state="QUERYING", meta={"current": "extracting from database"})
-    df = pd.read_sql_query(
+    return _export_course_log(
+        self,
         """select acid, code, emessage, course_id, sid, timestamp, comment, language
         from code join courses on code.course_id = courses.id
         where courses.course_name = %(cname)s order by code.id""",
-        params=dict(cname=classname),
-        con=eng,
+        classname,
+        username,
+        "code",
+        fmt,
     )
-    p = pathlib.Path("downloads", "logfiles", username)
-    p.mkdir(parents=True, exist_ok=True)
-    p = p / f"{classname}_code.csv.zip"
-    self.update_state(state="WRITING", meta={"current": "creating csv.zip file"})
-    df.to_csv(p, index=False, compression={"method": "zip"})
-    self.update_state(state="SUCCESS", meta={"current": "csv.zip file created"})
-    return True
 
 
 @celery.task(bind=True, name="anonymize_data_dump")
@@ -504,6 +526,9 @@ def anonymize_data_dump(self, **kwargs):
     del kwargs["basecourse"]
     username = kwargs["user"]
     del kwargs["user"]
+    # Courses anonymized at once; never more than the machine has cores.
+    workers = int(kwargs.pop("workers", os.environ.get("DATASHOP_WORKERS", 1)))
+    workers = max(1, min(workers, os.cpu_count() or 1))
     a = Anonymizer(basecourse, config.dburl, **kwargs)
     # if kwargs has a specific course then skip the course selection
     print("Choosing Courses")
@@ -512,21 +537,24 @@ def anonymize_data_dump(self, **kwargs):
     print("Getting Users")
     self.update_state(state="WORKING", meta={"current": "Anonymizing users"})
     a.get_users()
-    print("Getting user activities")
-    self.update_state(state="WORKING", meta={"current": "Processing user activities"})
-    a.get_user_activities()
-    print("sessionizing")
-    self.update_state(state="WORKING", meta={"current": "Sessionizing the data"})
-    a.sessionize_data()
-    print("combining to datashop")
-    self.update_state(
-        state="WORKING", meta={"current": "combining all data (be patient)"}
-    )
-    a.create_datashop_data()
-    self.update_state(state="WORKING", meta={"current": "Writing datashop file"})
     p = pathlib.Path("downloads", "datashop", username)
     p.mkdir(parents=True, exist_ok=True)
-    a.write_datashop(path=p)
+
+    def progress(done, total, course):
+        self.update_state(
+            state="WORKING",
+            meta={"current": f"Anonymized course {done} of {total} ({course})"},
+        )
+
+    # Each course is processed and written out before the next is loaded.
+    # Celery's pool processes are daemons, which the standard library will not
+    # let start worker processes of their own; billiard's will.
+    a.export_datashop(
+        path=p,
+        progress=progress,
+        workers=workers,
+        mp_context=billiard.get_context("fork"),
+    )
     self.update_state(state="SUCCESS", meta={"current": "Ready for download"})
     return True
 
@@ -51,6 +51,10 @@ from fastapi.staticfiles import StaticFiles
 from rsptx.logging import rslogger
 from rsptx.configuration import settings
 from rsptx.db.async_session import term_models
+from rsptx.db.crud import useinfo_writer
+from rsptx.grading_helpers.lti_push import lti_outbox_dispatcher
+from rsptx.lti1p1.core import close_lti1p1_http_session
+from rsptx.lti1p3.core import close_lti1p3_http_session
 
 try:
     from rsptx.lp_sim_builder.feedback import init_graders
@@ -95,10 +99,20 @@ async def lifespan(app: FastAPI):
     init_graders()
     # Start the anonymous, opt-out usage telemetry background task.
     telemetry_task = asyncio.create_task(telemetry_loop())
+    # Page views are logged through a batched write-behind queue.
+    useinfo_writer.start()
+    # Real-time LTI grade pushes are sent from a shared, durable outbox.
+    lti_outbox_dispatcher.start()
     yield
     # Clean up the ML models and release the resources
     rslogger.info("Book Server is Shutting Down")
     telemetry_task.cancel()
+    await discuss.peer_hub.stop()
+    await lti_outbox_dispatcher.stop()
+    await close_lti1p1_http_session()
+    await close_lti1p3_http_session()
+    # Drain buffered page views before the engine goes away.
+    await useinfo_writer.stop()
     await term_models()
 
 
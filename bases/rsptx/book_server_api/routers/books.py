@@ -44,21 +44,17 @@ from pydantic import StringConstraints
 from rsptx.logging import rslogger
 from rsptx.configuration import settings
 from rsptx.db.crud import (
-    create_useinfo_entry,
-    fetch_chapter_for_subchapter,
     fetch_course,
-    fetch_library_book,
     fetch_library_books,
-    fetch_page_activity_counts,
-    fetch_reading_assignment_spec,
-    fetch_all_course_attributes,
-    fetch_subchapters,
+    fetch_page_activity,
+    fetch_page_context,
     get_courses_per_basecourse,
     get_students_per_basecourse,
+    queue_useinfo_entry,
 )
 from rsptx.db.models import UseinfoValidation
 from rsptx.auth.session import is_instructor
-from rsptx.templates import template_folder
+from rsptx.templates import get_book_templates, template_folder
 from rsptx.response_helpers import safe_join
 from rsptx.response_helpers.core import canonical_utcnow
 from typing_extensions import Annotated
@@ -235,21 +231,23 @@ async def serve_page(
     # need to use lowercase true and false.
     if user:
         logged_in = "true"
-        user_is_instructor = await is_instructor(request)
         serve_ad = False
     else:
         logged_in = "false"
-        activity_info = {}
-        user_is_instructor = False
         serve_ad = True
 
-    course_row = await fetch_course(course_name)
+    # The course row, its attributes, the instructor check, the PreTeXt chapter
+    # and the library main page all come back from a single query.
+    page_ctx = await fetch_page_context(
+        course_name, pagepath, user_id=user.id if user else None
+    )
     # check for some error conditions
-    if not course_row:
+    if not page_ctx:
         return RedirectResponse(
             url=f"/admin/auth/my_courses?bad_course={course_name}", status_code=307
         )
     else:
+        course_row = page_ctx.course
         # The course requires a login but the user is not logged in.
         # Send the course and the page they wanted so the sign-in page can name
         # the course, return them here afterwards, and offer the base course in
@@ -279,57 +277,44 @@ async def serve_page(
                 url=f"/admin/auth/my_courses?requested_course={course_name}&current_course={user.course_name}&requested_path={pagepath}"
             )
     # proceed with the knowledge that course_row is defined after this point.
+    user_is_instructor = page_ctx.is_instructor
+
+    course_attrs = page_ctx.course_attrs
+    # course_attrs will always return a dictionary, even if an empty one.
+    rslogger.debug(f"HEY COURSE ATTRS: {course_attrs}")
+    markup_system = page_ctx.markup_system
 
-    # The template path comes from the base course's name.
-    templates = Jinja2Templates(
-        directory=safe_join(
+    # The template path comes from the base course's name. Environments are
+    # pooled per book so compiled pages survive between requests; PreTeXt
+    # books get their custom delimiters when the environment is created.
+    templates = get_book_templates(
+        course_row.base_course,
+        markup_system,
+        safe_join(
             settings.book_path,
             course_row.base_course,
             "published",
             course_row.base_course,
         ),
+        bytecode_cache_dir=settings.book_template_bytecode_cache or None,
+        pool_size=settings.book_template_pool_size,
+        extra_globals={"URL": URL} if markup_system == "PreTeXt" else None,
     )
-    course_attrs = await fetch_all_course_attributes(course_row.id)
-    # course_attrs will always return a dictionary, even if an empty one.
-    rslogger.debug(f"HEY COURSE ATTRS: {course_attrs}")
-    # TODO set custom delimiters for PreTeXt books (https://stackoverflow.com/questions/33775085/is-it-possible-to-change-the-default-double-curly-braces-delimiter-in-polymer)
-    # Books built with lots of LaTeX math in them are troublesome as they tend to have many instances
-    # of ``{{`` and ``}}`` which conflicts with the default Jinja2 start stop delimiters. Rather than
-    # escaping all of the latex math the PreTeXt built books use different delimiters for the templates
-    # templates.env is a reference to a Jinja2 Environment object
-    # try - templates.env.block_start_string = "@@@+"
-    # try - templates.env.block_end_string = "@@@-"
-
-    if course_attrs.get("markup_system", "RST") == "PreTeXt":
-        rslogger.debug(f"PRETEXT book found at path {pagepath}")
-        templates.env.variable_start_string = "~._"
-        templates.env.variable_end_string = "_.~"
-        templates.env.comment_start_string = "@@#"
-        templates.env.comment_end_string = "#@@"
-        templates.env.globals.update({"URL": URL})
-    # rslogger.debug(f"template cache size {templates.env.cache_size}")
 
     # enable compare me can be set per course if its not set provide a default of true
     if "enable_compare_me" not in course_attrs:
         course_attrs["enable_compare_me"] = "true"
 
-    subchapter = os.path.basename(os.path.splitext(pagepath)[0])
-    rslogger.debug(f"SUBCHAPTER IS {subchapter}")
-    if course_attrs.get("markup_system", "RST") == "PreTeXt":
-        chapter = await fetch_chapter_for_subchapter(subchapter, course_row.base_course)
-    else:
-        chapter = os.path.split(os.path.split(pagepath)[0])[1]
+    if markup_system == "PreTeXt":
+        rslogger.debug(f"PRETEXT book found at path {pagepath}")
+    rslogger.debug(f"CHAPTER IS {page_ctx.chapter} / {page_ctx.subchapter}")
 
-    rslogger.debug(f"CHAPTER IS {chapter} / {subchapter}")
-    if user:
-        activity_info = await fetch_page_activity_counts(
-            chapter, subchapter, course_row.base_course, course_name, user.username
-        )
-        assignment__spec = await fetch_reading_assignment_spec(
-            chapter, subchapter, course_row.id
-        )
-        if assignment__spec:
-            activity_info["assignment_spec"] = dict(**assignment__spec._mapping)
+    # The progress bar counts, reading assignment spec and subchapter menu are
+    # independent of one another and are fetched concurrently.
+    page_ctx = await fetch_page_activity(
+        page_ctx, username=user.username if user else None
+    )
+    activity_info = page_ctx.activity_info
 
     reading_list = []
     if RS_info:
@@ -342,7 +327,9 @@ async def serve_page(
 
     #   TODO: provide the template google_ga as well as ad servings stuff
     #   settings.google_ga
-    await create_useinfo_entry(
+    # Nothing here needs the row back, so the page view goes through the
+    # batched write-behind queue instead of its own transaction.
+    await queue_useinfo_entry(
         UseinfoValidation(
             event="page",
             act="view",
@@ -357,7 +344,7 @@ async def serve_page(
     else:
         canonical_host = os.environ.get("RUNESTONE_HOST", "localhost")
 
-    subchapter_list = await fetch_subchaptoc(course_row.base_course, chapter)
+    subchapter_list = _subchaptoc(page_ctx.subchapters)
     # TODO: restore the contributed questions list ``questions`` for books (only fopp) that
     # show the contributed questions list on an Exercises page.
 
@@ -399,8 +386,7 @@ async def serve_page(
 
     # If the pagepath is empty, we want to serve the default main_page
     if pagepath.strip() == "":
-        lib_entry = await fetch_library_book(course_row.base_course)
-        pagepath = lib_entry.main_page if lib_entry else "index.html"
+        pagepath = page_ctx.main_page or "index.html"
 
     headers = {"Cache-Control": "no-cache, no-store, must-revalidate"}
     context = dict(
@@ -526,13 +512,9 @@ def XML(arg):
     return arg
 
 
-async def fetch_subchaptoc(course: str, chap: str):
-    res = await fetch_subchapters(course, chap)
+def _subchaptoc(subchapters):
     toclist = []
-    for row in res:
-        rslogger.debug(f"row = {row}")
-        sc_url = f"{row[0]}.html"
-        title = row[1]
-        toclist.append(dict(subchap_uri=sc_url, title=title))
+    for label, title in subchapters:
+        toclist.append(dict(subchap_uri=f"{label}.html", title=title))
 
     return toclist
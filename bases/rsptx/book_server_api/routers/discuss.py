@@ -14,20 +14,29 @@
 # We will use redis pubsub model to support a fast production environment.
 #
 # We have one end point called ``websocket_endpoint`` that browsers open a websocket with
-# this connection is only for the page to RECEIVE messages.  The endpoint is also a redis
-# subscriber to the "peermessages" channel.
+# this connection is only for the page to RECEIVE messages.  The endpoint registers the
+# socket with this worker's ``PeerHub``, which is the worker's only redis subscriber.
+# Each course has its own channel (see ``peer_channel``), and the hub is subscribed to
+# exactly the courses that have a socket open on this worker.
 #
 # We have a second endpoint called ``send_message`` that accepts a json formatted message
 # package.  This could be a broadcast text message, or could be a special control mesage
 # that allows the instructor to move the students through the peer process.  The ``send_message``
 # endpoint is the redis producer.
 #
-# The producer sends the message into the redis queue and then all copies of the consumer
-# look at the message.  If the recipient of that message is connected to that instance
-# then the message is sent to the recipient and all other instance ignore that message.
-# If the message is a broadcast message then all instances of the consumer forward that
-# message to all connected parties.
+# The producer sends the message into the course's channel and then every hub with a
+# student from that course looks at the message.  If the recipients of that message are connected to that
+# worker then the message is sent to them and all other workers ignore it.  If the
+# message is a broadcast message then every hub forwards it to all of its sockets in
+# that course.
+#
+# Each worker holds one connection no matter how many students it serves, and
+# works out a message's recipients once -- from a briefly cached copy of the
+# course's partner map -- rather than once per connected socket.  Fan-out cost is
+# proportional to the number of recipients, not to the size of the lecture.
 
+import asyncio
+import contextlib
 import json
 import os
 import time
@@ -35,8 +44,7 @@ import time
 #
 # Third-party imports
 # -------------------
-from typing import Dict, Optional, Any
-from multi_await import multi_await  # type: ignore
+from typing import Dict, List, Optional, Any, Tuple
 
 from redis import asyncio as aioredis
 
@@ -60,7 +68,7 @@ from rsptx.db.crud import create_useinfo_entry
 from rsptx.db.models import UseinfoValidation
 from rsptx.validation.schemas import PeerMessage
 from ..localconfig import local_settings
-from rsptx.response_helpers.core import canonical_utcnow
+from rsptx.response_helpers.core import canonical_utcnow, peer_channel
 
 # Routing
 # =======
@@ -78,15 +86,25 @@ templates = Jinja2Templates(
 class ConnectionManager:
     def __init__(self):
         self.active_connections: Dict[str, WebSocket] = {}
+        # username -> the course the socket was opened for
+        self.courses: Dict[str, str] = {}
 
-    async def connect(self, user: str, websocket: WebSocket):
+    async def connect(
+        self, user: str, websocket: WebSocket, course_name: Optional[str] = None
+    ):
         await websocket.accept()
         rslogger.info(f"PEERCOM {os.getpid()}: {user} connected to websocket")
         self.active_connections[user] = websocket
-
-    def disconnect(self, sockid: str):
-        if sockid in self.active_connections:
+        self.courses[user] = course_name
+
+    def disconnect(self, sockid: str, websocket: Optional[WebSocket] = None):
+        # A page reload opens the new socket before the old one closes; don't
+        # let the old socket's disconnect remove its replacement.
+        if sockid in self.active_connections and (
+            websocket is None or self.active_connections[sockid] is websocket
+        ):
             del self.active_connections[sockid]
+            self.courses.pop(sockid, None)
 
     async def send_personal_message(
         self,
@@ -108,25 +126,218 @@ class ConnectionManager:
                 f"PEERCOM {os.getpid()}: {to} is not connected here {self.active_connections}"
             )
 
-    async def broadcast(self, message: str) -> None:
-        rslogger.info(
-            f"PEERCOM Broadcast: {os.getpid()}: {self.active_connections=} {message=}"
-        )
-        to_remove = []
-        for key, connection in self.active_connections.items():
-            rslogger.info(f"PEERCOM {os.getpid()}: sending to {key}@{connection}")
+    async def broadcast(
+        self, message: Dict[str, Any], course_name: Optional[str] = None
+    ) -> None:
+        """Send ``message`` to every socket here, or only those in ``course_name``."""
+        targets = {
+            key: connection
+            for key, connection in self.active_connections.items()
+            if course_name is None or self.courses.get(key) == course_name
+        }
+        rslogger.info(f"PEERCOM Broadcast: {os.getpid()}: {list(targets)} {message=}")
+
+        async def send(key, connection):
             try:
                 await connection.send_json(message)
             except Exception as e:
-                rslogger.info(f"PEERCOM {os.getpid()}: Failed to send {e}")
-                to_remove.append(key)
-        for key in to_remove:
-            del self.active_connections[key]
+                rslogger.info(f"PEERCOM {os.getpid()}: Failed to send to {key}: {e}")
+                self.disconnect(key, connection)
+
+        await asyncio.gather(*(send(k, c) for k, c in targets.items()))
+
+
+# Fan-out hub
+# ===========
+#: How long a course's partner map is reused before it is read from redis again.
+PARTNER_CACHE_SECONDS = 5.0
+#: Pairing publishes a burst of ``enableChat`` messages right after rewriting the
+#: partner map; a map older than this is reloaded when one arrives.
+PAIRING_REFRESH_SECONDS = 1.0
+#: Control messages that announce a new pairing, addressed by ``to``.
+PAIRING_MESSAGES = ("enableChat", "enableFaceChat")
+
+
+class PeerHub:
+    """Receive this worker's peer messages over one redis connection and
+    deliver each to the local sockets it is addressed to.
+
+    The hub subscribes to a course's channel when the first socket for that
+    course connects here and unsubscribes when the last one goes away.
+    """
+
+    def __init__(self, connections: ConnectionManager):
+        self.connections = connections
+        self._redis: Optional[aioredis.Redis] = None
+        self._task: Optional[asyncio.Task] = None
+        self._pubsub: Optional[aioredis.client.PubSub] = None
+        # course_name -> number of sockets open here for it
+        self._courses: Dict[str, int] = {}
+        self._wakeup = asyncio.Event()
+        # course_name -> (monotonic load time, {sid: [partner sids]})
+        self._partners: Dict[str, Tuple[float, Dict[str, List[str]]]] = {}
+
+    def _client(self) -> aioredis.Redis:
+        if self._redis is None:
+            self._redis = aioredis.from_url(settings.redis_uri, decode_responses=True)
+        return self._redis
+
+    def ensure_started(self) -> None:
+        """Start the subscription, if it is not already running."""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def join(self, course_name: str) -> None:
+        """Count a new socket for ``course_name``, subscribing if it is the first."""
+        count = self._courses.get(course_name, 0)
+        self._courses[course_name] = count + 1
+        if count == 0 and self._pubsub is not None:
+            try:
+                await self._pubsub.subscribe(peer_channel(course_name))
+            except Exception as e:
+                # The run loop resubscribes to every course when it reconnects.
+                rslogger.error(f"PEERCOM {os.getpid()}: subscribe failed {e}")
+        self._wakeup.set()
+        self.ensure_started()
+
+    async def leave(self, course_name: str) -> None:
+        """Forget a closed socket, unsubscribing after the course's last one."""
+        count = self._courses.get(course_name, 0) - 1
+        if count > 0:
+            self._courses[course_name] = count
+            return
+        self._courses.pop(course_name, None)
+        self._partners.pop(course_name, None)
+        if self._pubsub is not None:
+            with contextlib.suppress(Exception):
+                await self._pubsub.unsubscribe(peer_channel(course_name))
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self._task
+            self._task = None
+        if self._redis is not None:
+            await self._redis.close()
+            self._redis = None
+
+    async def _run(self) -> None:
+        while True:
+            if not self._courses:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+            pubsub = self._client().pubsub()
+            # Publish the pubsub and take the course list in one step, so a
+            # course joining while we subscribe is subscribed by ``join``.
+            self._pubsub = pubsub
+            try:
+                await pubsub.subscribe(*(peer_channel(c) for c in self._courses))
+                rslogger.info(f"PEERCOM {os.getpid()}: hub subscribed {self._courses}")
+                while self._courses:
+                    pmess = await pubsub.get_message(
+                        ignore_subscribe_messages=True, timeout=1.0
+                    )
+                    if pmess is None or pmess["type"] != "message":
+                        continue
+                    try:
+                        await self.dispatch(json.loads(pmess["data"]))
+                    except Exception as e:
+                        rslogger.error(
+                            f"PEERCOM {os.getpid()}: failed to deliver {pmess}: {e}"
+                        )
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                rslogger.error(f"PEERCOM {os.getpid()}: pubsub fail {e}; resubscribing")
+                await asyncio.sleep(1)
+            finally:
+                self._pubsub = None
+                with contextlib.suppress(Exception):
+                    await pubsub.close()
+
+    async def partners(
+        self, course_name: str, sid: str, max_age: float = PARTNER_CACHE_SECONDS
+    ) -> Optional[List[str]]:
+        """Return ``sid``'s partners from the course's cached partner map."""
+        cached = self._partners.get(course_name)
+        if cached is None or time.monotonic() - cached[0] > max_age:
+            raw = await self._client().hgetall(f"partnerdb_{course_name}")
+            cached = (
+                time.monotonic(),
+                {k: json.loads(v) for k, v in raw.items()},
+            )
+            self._partners[course_name] = cached
+        return cached[1].get(sid)
+
+    async def dispatch(self, data: Dict[str, Any]) -> None:
+        """Deliver one published message to its recipients on this worker."""
+        local = self.connections.active_connections
+        if data["broadcast"]:
+            await self.connections.broadcast(data, data.get("course_name"))
+            return
+
+        mess_from = data["from"]
+        is_pairing = data["message"] in PAIRING_MESSAGES
+        partner_list = await self.partners(
+            data["course_name"],
+            mess_from,
+            max_age=PAIRING_REFRESH_SECONDS if is_pairing else PARTNER_CACHE_SECONDS,
+        )
+        # enableFaceChat targets verbal-discussion students who are
+        # intentionally not in partnerdb, so don't treat the missing
+        # partner list as an error for it.
+        is_facechat = data["message"] == "enableFaceChat"
+        if not partner_list and not is_facechat:
+            rslogger.error(
+                f"PEERCOM {os.getpid()}: Failed to find a partner for {mess_from}"
+            )
+            if mess_from in local:
+                try:
+                    mess = {
+                        "type": "text",
+                        "from": mess_from,
+                        "message": "Could not find a partner for you",
+                        "time": time.time(),
+                        "broadcast": False,
+                        "course_name": data["course_name"],
+                        "div_id": data["div_id"],
+                    }
+                    await self.connections.send_personal_message(mess_from, mess)
+                except KeyError:
+                    rslogger.error(
+                        f"PEERCOM Not enough data to construct a message: {data}"
+                    )
+
+        if is_pairing:
+            to = data.get("to", None)
+            if to in local:
+                await self.connections.send_personal_message(to, data)
+        elif partner_list:
+            for username in partner_list:
+                if username not in local:
+                    continue
+                await self.connections.send_personal_message(username, data)
+                # log the message
+                # todo - we should not log messages that are 'control' messages
+                # These individual control messages update partner and answer
+                if data["type"] != "control":
+                    await create_useinfo_entry(
+                        UseinfoValidation(
+                            event="sendmessage",
+                            act=f"to:{username}:{data['message']}",
+                            div_id=data["div_id"],
+                            course_id=data["course_name"],
+                            sid=mess_from,
+                            timestamp=canonical_utcnow(),
+                        )
+                    )
 
 
-# this is good for prototyping, but we will need to integrate with
-# Redis or a DB for production where we have multiple servers
+# The sockets connected to this worker, and the hub that feeds them.
 manager = ConnectionManager()
+peer_hub = PeerHub(manager)
 local_users = set()
 
 
@@ -182,137 +393,25 @@ async def websocket_endpoint(websocket: WebSocket, uname: str):
     # local_users is a global/module variable shared by all  requests served
     # by the same worker process.
     local_users.add(username)
-    await manager.connect(username, websocket)
-    rslogger.info(
-        f"PEERCOM Connecting {username} peer instruction redis to {settings.redis_uri}"
-    )
-    r = aioredis.from_url(settings.redis_uri)
-    subscriber = r.pubsub()
-
-    async def my_get_message():
-        return await subscriber.get_message(timeout=1.0, ignore_subscribe_messages=True)
-
-    await subscriber.subscribe("peermessages")
-
-    # multi_await `Docs and links here <http://www.hydrogen18.com/blog/python-await-multiple.html>`_ acts like
-    # the generic sockets select statement, returning a result from get as soon
-    # as ANY of our async functions have a result available.
-    async with multi_await() as mawait:
-        mawait.add(my_get_message)
-        mawait.add(websocket.receive_text)
+    course_name = authed_user.course_name
+    await manager.connect(username, websocket, course_name)
+    await peer_hub.join(course_name)
 
+    # Messages reach the socket from the hub; all this loop has to do is notice
+    # when the page goes away.
+    try:
         while True:
-            # Wait for something to happen
-            # get returns two lists one of completions and one of failures
-            complete, failures = await mawait.get()
-            # i == 0 --> pubsub message
-            # i == 1 --> websocket message
-            pmess, wsres = complete
-            psfail, wsfail = failures
-
-            if wsfail is not None:
-                rslogger.info(f"PEERCOMM websocket fail {wsfail} for {username}")
-                # The fail is more than likely a runtime error from a page close or refresh
-                # RuntimeError('Cannot call "receive" once a disconnect message has been received.')
-                manager.disconnect(username)
-                return
-
-            if psfail is not None:
-                rslogger.error(f"PEERCOM pubsub fail {psfail} for {username}")
-                # probably do not want to return
-
-            # handle message from the pubsub queue
-            if pmess is not None:
-                rslogger.info(f"PEERCOM handle pubsub mess {os.getpid()}: {pmess=}")
-                if pmess["type"] == "message":
-                    # This is a message sent into the channel, our stuff is in
-                    # the ``data`` field of the redis message
-                    data = json.loads(pmess["data"])
-                else:
-                    rslogger.error(
-                        f"PEERCOM {os.getpid()}: unknown message type {pmess['type']}"
-                    )
-                    continue
-                if data["broadcast"]:
-                    await manager.broadcast(data)
-                else:
-                    # because **every** connection runs this same loop
-                    # we only want to send a non-broadcast message if
-                    # it is to **ourself**. So the to in the message should be username
-                    # check to see
-                    mess_from = data["from"]
-                    partner_list = await r.hget(
-                        f"partnerdb_{data['course_name']}", mess_from
-                    )
-                    # enableFaceChat targets verbal-discussion students who are
-                    # intentionally not in partnerdb, so don't treat the missing
-                    # partner list as an error for it.
-                    is_facechat = data["message"] == "enableFaceChat"
-                    if partner_list:
-                        partner_list = json.loads(partner_list)
-                    elif not is_facechat:
-                        try:
-                            mess = {
-                                "type": "text",
-                                "from": mess_from,
-                                "message": "Could not find a partner for you",
-                                "time": time.time(),
-                                "broadcast": False,
-                                "course_name": data["course_name"],
-                                "div_id": data["div_id"],
-                            }
-                            await manager.send_personal_message(mess_from, mess)
-                        except KeyError:
-                            rslogger.error(
-                                f"PEERCOM Not enough data to construct a message: {data}"
-                            )
-
-                        rslogger.error(
-                            f"PEERCOM {os.getpid()}: Failed to find a partner for {mess_from}"
-                        )
-                    if (
-                        data["message"] in ("enableChat", "enableFaceChat")
-                        and data.get("to", None) == username
-                    ):
-                        await manager.send_personal_message(username, data)
-                    elif (
-                        data["message"] not in ("enableChat", "enableFaceChat")
-                        and partner_list
-                        and username in partner_list
-                    ):
-                        await manager.send_personal_message(username, data)
-                        # log the message
-                        # todo - we should not log messages that are 'control' messages
-                        # These individual control messages update partner and answer
-                        if data["type"] != "control":
-                            await create_useinfo_entry(
-                                UseinfoValidation(
-                                    event="sendmessage",
-                                    act=f"to:{username}:{data['message']}",
-                                    div_id=data["div_id"],
-                                    course_id=data["course_name"],
-                                    sid=mess_from,
-                                    timestamp=canonical_utcnow(),
-                                )
-                            )
-                    else:
-                        if not partner_list:
-                            rslogger.info(
-                                f"PEERCOM {os.getpid()}: {mess_from=} has no partner list"
-                            )
-                        else:
-                            rslogger.info(
-                                f"PEERCOM {os.getpid()}: {mess_from=} is not {username}"
-                            )
-
-            if wsres is not None:
-                rslogger.info(
-                    f"PEERCOM {os.getpid()}: We don't expect in coming websock messages but got: {wsres}"
-                )
-                # TODO: now that we have multi-await working it *may* be more
-                # efficient to go back to sending all peer messages by websocket
-                # and putting them into the subscriber queue here rather than
-                # having a separate endpoint.
+            wsres = await websocket.receive_text()
+            rslogger.info(
+                f"PEERCOM {os.getpid()}: We don't expect in coming websock messages but got: {wsres}"
+            )
+    except Exception as wsfail:
+        # The fail is more than likely a runtime error from a page close or refresh
+        # RuntimeError('Cannot call "receive" once a disconnect message has been received.')
+        rslogger.info(f"PEERCOMM websocket fail {wsfail} for {username}")
+    finally:
+        manager.disconnect(username, websocket)
+        await peer_hub.leave(course_name)
 
 
 @router.post("/send_message")
@@ -326,8 +425,12 @@ async def send_message(packet: PeerMessage, request: Request):
             content={"detail": "Not authenticated"},
         )
     packet.sender = user.username
+    # Messages travel on the sender's course channel and say which course they
+    # belong to, so hubs only deliver them to that course's sockets.
+    data = packet.model_dump()
+    data["course_name"] = user.course_name
     r = aioredis.from_url(settings.redis_uri)
     try:
-        await r.publish("peermessages", packet.model_dump_json())
+        await r.publish(peer_channel(user.course_name), json.dumps(data))
     finally:
         await r.close()
@@ -58,6 +58,7 @@ from rsptx.db.crud import (
     fetch_group,
     fetch_instructor_courses,
     fetch_library_book,
+    fetch_lti_outbox_stats,
     fetch_users_for_course,
     fetch_membership,
     fetch_user,
@@ -66,6 +67,7 @@ from rsptx.db.crud import (
     create_membership,
     is_author,
     is_editor,
+    refresh_activity_rollup,
     update_user,
     update_library_book,
 )
@@ -1134,8 +1136,15 @@ async def grade(config, course, pset, enforce):
 @click.option(
     "--preserve_user_ids", is_flag=True, help="Preserve user ids in the datashop export"
 )
+@click.option(
+    "--workers",
+    default=1,
+    help="Number of courses to anonymize at the same time, each in its own process",
+)
 @pass_config
-async def datashop(config, basecourse, sample_size, course_list, preserve_user_ids):
+async def datashop(
+    config, basecourse, sample_size, course_list, preserve_user_ids, workers
+):
     """Export the course data to the datashop format"""
     if not sample_size:
         sample_size = await click.prompt("Sample size", default=0)
@@ -1163,13 +1172,10 @@ async def datashop(config, basecourse, sample_size, course_list, preserve_user_i
     print(a.chosen_courses)
     print("Getting Users")
     a.get_users()
-    print("Getting user activities")
-    a.get_user_activities()
-    print("sessionizing")
-    a.sessionize_data()
-    print("combining to datashop")
-    a.create_datashop_data()
-    a.write_datashop()
+    a.export_datashop(
+        progress=lambda done, total, course: print(f"{done}/{total}: {course}"),
+        workers=workers,
+    )
 
 
 #
@@ -1220,7 +1226,9 @@ async def fixtotals(
     Manually graded questions used to be written to question_grades without
     rolling up into grades.score, so any assignment graded by hand before that
     fix can show a stale total in the gradebook and in the LMS. This recomputes
-    each student's total from their per-question grades.
+    each student's total from their per-question grades. It is also the full
+    reconciliation pass for totals kept incrementally while grading (see the
+    incremental_totals setting); run it with --dry-run to audit them.
 
     Totals an instructor pinned with "Set total" (manual_total) are left alone,
     assignment thresholds are applied, and corrected scores are pushed to any
@@ -1367,6 +1375,43 @@ async def fixtotals(
         click.echo("Dry run -- nothing was written. Re-run without --dry-run to apply.")
 
 
+@cli.command()
+@pass_config
+async def rollup(config):
+    """Bring the activity rollup behind the chapter overview reports up to date.
+
+    Run it once after upgrading: until the rollup has been built, the reports
+    leave the first pass over every logged event to this command and come out
+    incomplete. After that each report brings the rollup up to date itself;
+    running this from cron keeps report generation quick on busy servers.
+    """
+    await init_models()
+    try:
+        await refresh_activity_rollup()
+        click.echo("Activity rollup is up to date.")
+    finally:
+        await term_models()
+
+
+@cli.command()
+@pass_config
+async def ltioutbox(config):
+    """Show how many LTI grade pushes are waiting to be sent.
+
+    The book servers send them in the background. A growing queue, or an old
+    oldest entry, means an LMS is failing or no server is draining it.
+    """
+    await init_models()
+    try:
+        stats = await fetch_lti_outbox_stats()
+    finally:
+        await term_models()
+    click.echo(f"Waiting:   {stats['depth']}")
+    click.echo(f"Due now:   {stats['due']}")
+    click.echo(f"Retrying:  {stats['retrying']}")
+    click.echo(f"Oldest:    {stats['oldest_seconds']:.0f}s")
+
+
 @cli.command()
 @pass_config
 def db(config):
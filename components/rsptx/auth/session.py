@@ -26,7 +26,7 @@ from fastapi_login import LoginManager
 # Local application imports
 # -------------------------
 from rsptx.configuration import settings
-from rsptx.db.crud import fetch_instructor_courses, fetch_user
+from rsptx.db.crud import fetch_instructor_courses, fetch_session_user
 from rsptx.db.models import AuthUserValidator
 
 
@@ -125,8 +125,11 @@ async def _load_user(user_id: str) -> AuthUserValidator:
     fetch a user object from the database. This is designed to work with the
     original web2py auth_user schema but make it easier to migrate to a new
     database by simply returning a user object.
+
+    This runs on every authenticated request, so the user comes from
+    ``user_cache`` (see ``rsptx.db.crud.user``) rather than a fresh query.
     """
-    return await fetch_user(user_id)
+    return await fetch_session_user(user_id)
 
 
 # The ``user_loader`` decorator doesn't propagate type hints. Fix this manually.
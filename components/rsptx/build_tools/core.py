@@ -40,7 +40,7 @@ from sqlalchemy.sql import text
 from rsptx.logging import rslogger
 from rsptx.configuration import settings
 from rsptx.db.models import Library, LibraryValidator
-from rsptx.db.crud import update_source_code_sync
+from rsptx.db.crud import server_feedback_cache, update_source_code_sync
 from rsptx.response_helpers.core import canonical_utcnow
 
 
@@ -517,6 +517,8 @@ def update_library(
         )
         with Session.begin() as session:
             session.execute(stmt)
+    # The build rewrote the book's questions, and with them their server feedback.
+    server_feedback_cache.invalidate_sync(course)
     return True
 
 
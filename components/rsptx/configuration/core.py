@@ -69,6 +69,14 @@ class Settings(BaseSettings):
     # _`book_path`: specify the directory to serve books from. For now, default to serving from the same place as the Runestone server, since the server uses some of these files.
     book_path: Path = runestone_path / "books"
 
+    # Book pages are rendered from a per-process pool of Jinja environments, one
+    # per (base course, markup system); see ``rsptx.templates.get_book_templates``.
+    # ``book_template_pool_size`` bounds how many books a worker keeps compiled
+    # pages for. Set ``book_template_bytecode_cache`` to a writable directory to
+    # also cache compiled pages on disk, so a fresh worker skips compilation.
+    book_template_pool_size: int = 64
+    book_template_bytecode_cache: str = ""
+
     # The path to store error logs.
     error_path: Path = Path(os.environ.get("BOOK_PATH", "/usr/books")) / "tickets"
 
@@ -134,6 +142,65 @@ class Settings(BaseSettings):
     # The docker-compose.yml file will set the REDIS_URI environment variable
     redis_uri: str = "redis://localhost:6379/0"
 
+    # Page views are logged to ``useinfo`` through a write-behind buffer (see
+    # ``rsptx.db.crud.rslogging.UseinfoWriter``). Rows are written in one batch
+    # when ``useinfo_batch_size`` have accumulated or every
+    # ``useinfo_flush_seconds``; a full buffer of ``useinfo_max_buffer`` rows
+    # makes the next caller wait for a flush.
+    useinfo_batch_size: int = 200
+    useinfo_flush_seconds: float = 1.0
+    useinfo_max_buffer: int = 5000
+
+    # ``is_assigned`` answers from a per-course cache of assignment questions
+    # (see ``rsptx.db.crud.assignment.scoring_spec_cache``). Edits invalidate it
+    # on every worker through Redis; this is the most seconds an entry is reused
+    # regardless, which bounds staleness if Redis is unavailable.
+    scoring_spec_cache_seconds: float = 60.0
+
+    # ``is_server_feedback`` answers from a per-base-course cache of decoded
+    # question feedback (see ``rsptx.db.crud.crud.server_feedback_cache``).
+    # Question edits and book builds invalidate it through Redis; as above, this
+    # bounds staleness if Redis is unavailable.
+    server_feedback_cache_seconds: float = 300.0
+
+    # Which LTI version a course uses, its LTI 1.1 key and its LTI 1.3 grading
+    # links are cached (see ``rsptx.db.crud.lti.lti_cache``). Every LTI linking
+    # or unlinking path invalidates it through Redis; as above, this bounds
+    # staleness if Redis is unavailable.
+    lti_cache_seconds: float = 300.0
+
+    # Scores are sent to an LTI 1.3 platform at most ``lti1p3_send_concurrency``
+    # requests at a time and, if ``lti1p3_requests_per_second`` is above zero,
+    # no faster than that. Both limits are per platform (issuer) and shared by
+    # every batch a worker sends, so a bulk sync cannot trip an LMS's API limits.
+    lti1p3_send_concurrency: int = 8
+    lti1p3_requests_per_second: float = 0.0
+
+    # Every authenticated request loads its user, and most then load the
+    # user's current course. Both come from per-process caches (see
+    # ``rsptx.db.crud.user.user_cache`` and ``rsptx.db.crud.course.course_cache``)
+    # of up to ``session_cache_size`` entries each. Writes through the crud
+    # functions invalidate them through Redis; as above, this bounds staleness
+    # if Redis is unavailable or a row is changed some other way.
+    session_cache_seconds: float = 30.0
+    session_cache_size: int = 10000
+
+    # With ``incremental_totals`` on, grading an answer adjusts the student's
+    # assignment total by that question's change in score instead of re-summing
+    # every question grade (see ``rsptx.grading_helpers.core.compute_total_score``).
+    # ``incremental_totals_verify_rate`` is the fraction of those updates that
+    # are also checked against a full recompute, and corrected if they drifted.
+    # ``rsmanage fixtotals --dry-run`` reconciles whole courses on demand.
+    incremental_totals: bool = True
+    incremental_totals_verify_rate: float = 0.01
+
+    # The instructor gradebook is served from a per-course snapshot (see
+    # ``rsptx.db.crud.gradebook``) of up to ``gradebook_cache_size`` courses per
+    # worker. Grade writes patch it and other edits invalidate it; this bounds
+    # how long it can miss a grade written by the legacy server.
+    gradebook_cache_seconds: float = 60.0
+    gradebook_cache_size: int = 256
+
     # Select normal mode or a high-stakes assessment mode (for administering a examination). In this mode, answers to supported question types are not shown.
     is_exam: bool = False
 
@@ -3,24 +3,81 @@
 
 import os
 import datetime
+import io
 import random
 import re
+import tempfile
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
 import pandas as pd
 import pathlib
 from sqlalchemy import create_engine
-from tqdm import tqdm
 
 
-tqdm.pandas(desc="Progress...")
+#: A gap longer than this between two of a student's events starts a new session.
+SESSION_GAP = pd.Timedelta(60, "minutes")
+#: The most a ``code`` row's timestamp may differ from a ``useinfo`` row's for
+#: the code to be attached to that event.
+CODE_MATCH_WINDOW = pd.Timedelta(5, "seconds")
+
+DATASHOP_COLUMNS = [
+    "Time",
+    "Anon Student Id",
+    "Action",
+    "Problem Name",
+    "Class",
+    "Level (Chapter)",
+    "Level (SubChapter)",
+    "Session Id",
+    "Problem View",
+    "Selection",
+    "Input",
+    "Feedback Text",
+    "Feedback Classification",
+    "CF (Code)",
+    "CF (Week No)",
+    "CF (Institution)",
+]
+
+
+def map_unique(values, func):
+    """
+    Apply ``func`` to each *distinct* value of ``values`` rather than to every
+    row. Log columns repeat a few thousand values across millions of rows, so
+    this is far cheaper than ``values.map(func)``.
+    """
+    mapping = {v: func(v) for v in values.dropna().unique()}
+    result = values.map(mapping)
+    missing = values.isna()
+    if missing.any():
+        result = result.where(~missing, func(None))
+    return result
 
 
-def remove_names(row):
-    code = row.code
-    if row.first_name in row.code:
-        code = code.replace(row.first_name, "AnonFirstName")
-    if row.last_name in row.code:
-        code = code.replace(row.last_name, "AnonLastName")
-    return code
+def remove_names(code_df):
+    """
+    Replace each student's first and last name in their code with
+    ``AnonFirstName`` / ``AnonLastName``.
+
+    :param code_df: DataFrame with ``code``, ``first_name`` and ``last_name``
+        columns, one row per code submission
+    :return: Series of anonymized code, aligned with ``code_df``
+    """
+    anon = code_df.code.copy()
+    # One vectorized replace per student rather than one Python call per row.
+    for (first, last), idx in code_df.groupby(
+        ["first_name", "last_name"], sort=False
+    ).groups.items():
+        code = anon.loc[idx]
+        # An empty name would otherwise be "found" between every character.
+        if first:
+            code = code.str.replace(first, "AnonFirstName", regex=False)
+        if last:
+            code = code.str.replace(last, "AnonLastName", regex=False)
+        anon.loc[idx] = code
+    return anon
 
 
 def anon_page(name):
@@ -33,36 +90,17 @@ def anon_page(name):
     return name
 
 
-def get_chap(row):
-    divid = row["Problem Name"]
-    if row.Selection == "page":
-        parts = divid.split("/")
-        if len(parts) >= 2:
-            return parts[-2]
-    else:
-        return row["Level (Chapter)"]
-
-
-def get_subchap(row):
-    divid = row["Problem Name"]
-    if row.Selection == "page":
-        parts = divid.split("/")
-        if len(parts) >= 1:
-            return parts[-1].replace(".html", "")
-    else:
-        return row["Level (SubChapter)"]
-
-
-def find_closest(sid, acid, time, poss):
+def set_page_levels(datashop):
     """
-    Given an sid, acid, time triple find the closest match in time from the code DF
+    For page views, take the chapter and subchapter from the page path in
+    ``Problem Name``; other events keep the ones from the ``questions`` table.
     """
-    try:
-        candidates = poss.loc[(sid, acid)]
-        idx = candidates.index.get_loc(time, method="nearest")
-        return candidates.iloc[idx].name
-    except Exception:
-        return pd.NaT
+    page = datashop.Selection == "page"
+    parts = datashop.loc[page, "Problem Name"].str.split("/")
+    datashop.loc[page, "Level (Chapter)"] = parts.str[-2]
+    datashop.loc[page, "Level (SubChapter)"] = parts.str[-1].str.replace(
+        ".html", "", regex=False
+    )
 
 
 def get_error_detail(mess):
@@ -90,6 +128,17 @@ def fbclass(mess):
     return mess
 
 
+def _replace_user_field(acts, user_map, field):
+    """Map the ``field``-th ``:``-separated part of each act through ``user_map``."""
+    if field == 0:
+        parts = acts.str.extract(r"^([^:]*)(.*)$", flags=re.S)
+        return parts[0].map(user_map).fillna("Anonymous") + parts[1]
+    parts = acts.str.extract(r"^([^:]*):([^:]*)(.*)$", flags=re.S)
+    anon = parts[0] + ":" + parts[1].map(user_map).fillna("Anonymous") + parts[2]
+    # Acts without a second field are left as they are.
+    return anon.fillna(acts)
+
+
 class Anonymizer:
     def __init__(
         self,
@@ -115,6 +164,8 @@ class Anonymizer:
         print(f"include basecourse = {include_basecourse}")
         self.include_basecourse = include_basecourse
         self.preserve_username = preserve_user_ids
+        # Session ids keep counting up from one course to the next.
+        self.sess_count = 0
 
         if specific_course:
             if isinstance(specific_course, list):
@@ -238,25 +289,31 @@ class Anonymizer:
 
         self.inst_set = set(instructors.username)
 
-        self.user_map = {}
-        self.user_num = 1
-        self.user_df["anon_user"] = self.user_df.username.map(self.anonymize_user)
-        self.user_df["is_instructor"] = self.user_df.username.map(
-            lambda x: x in self.inst_set
-        )
-
-        self.course_map = {}
-        self.course_num = 1
-        self.user_df["anon_course"] = self.user_df.course_name.map(
-            self.anonymize_course
+        # Students are numbered in the order they first appear; instructors
+        # are marked for removal.
+        usernames = pd.unique(self.user_df.username)
+        is_instructor = np.isin(usernames, list(self.inst_set))
+        students = usernames[~is_instructor]
+        if self.preserve_username:
+            self.user_map = dict(zip(students, students))
+        else:
+            self.user_map = dict(zip(students, range(1, len(students) + 1)))
+        self.user_map.update(dict.fromkeys(usernames[is_instructor], "REMOVEME"))
+        self.user_num = len(students) + 1
+        self.user_df["anon_user"] = self.user_df.username.map(self.user_map)
+        self.user_df["is_instructor"] = self.user_df.username.isin(self.inst_set)
+
+        course_names = pd.unique(self.user_df.course_name)
+        self.course_map = dict(zip(course_names, range(1, len(course_names) + 1)))
+        self.course_num = len(course_names) + 1
+        self.user_df["anon_course"] = self.user_df.course_name.map(self.course_map)
+
+        self.anon_to_base = dict(
+            zip(self.user_df.anon_course, self.user_df.base_course)
         )
 
-        self.anon_to_base = {}
-        for idx, row in self.user_df.iterrows():
-            self.anon_to_base[row.anon_course] = row.base_course
-
-        self.user_df["anon_institution"] = self.user_df.institution.map(
-            self.anonymize_institution
+        self.user_df["anon_institution"] = map_unique(
+            self.user_df.institution, self.anonymize_institution
         )
 
         # self.user_df.to_csv("user_key.csv", index=False, header=True)
@@ -292,42 +349,59 @@ class Anonymizer:
         else:
             return "unclassified"
 
-    # this should be called like useinfo['act'] = useinfo.apply(self.anonymize_sendmessage, axis=1)
-    def anonymize_sendmessage(self, row):
-        if row.event == "sendmessage":
-            act_parts = row.act.split(":")
-            act_parts[1] = str(self.user_map.get(act_parts[1], "Anonymous"))
-            return ":".join(act_parts)
-        else:
-            return row.act
-
-    def anonymize_ratepeer(self, row):
-        if row.event == "ratepeer":
-            act_parts = row.act.split(":")
-            act_parts[0] = str(self.user_map.get(act_parts[0], "Anonymous"))
-            return ":".join(act_parts)
-        else:
-            return row.act
-
-    def anonymize_peergroup(self, row):
-        if row.event == "peergroup":
-            act_parts = row.act.split(":")
-            # grouplist:user,user,user
-            if len(act_parts) < 2:
-                return row.act
-            users = act_parts[1].split(",")
-            users = [str(self.user_map.get(u, "Anonymous")) for u in users]
-            act_parts[1] = ",".join(users)
-            return ":".join(act_parts)
-        else:
-            return row.act
-
-    def get_user_activities(self):
+    def anonymize_peer_acts(self, useinfo):
+        """
+        Replace the usernames embedded in the ``act`` of peer instruction
+        events with their anonymous ids:
+
+        * ``sendmessage`` -- ``message:<to user>:...``
+        * ``ratepeer`` -- ``<peer>:...``
+        * ``peergroup`` -- ``grouplist:<user>,<user>,...``
+
+        :return: Series, the new ``act`` column
+        """
+        user_map = {k: str(v) for k, v in self.user_map.items()}
+        acts = useinfo.act.copy()
+
+        sent = useinfo.event == "sendmessage"
+        acts[sent] = _replace_user_field(acts[sent], user_map, 1)
+        rated = useinfo.event == "ratepeer"
+        acts[rated] = _replace_user_field(acts[rated], user_map, 0)
+
+        grouped = useinfo.event == "peergroup"
+        parts = acts[grouped].str.extract(r"^([^:]*):([^:]*)(.*)$", flags=re.S)
+        parts = parts.dropna()
+        if len(parts):
+            members = (
+                parts[1]
+                .str.split(",")
+                .explode()
+                .map(user_map)
+                .fillna("Anonymous")
+                .groupby(level=0)
+                .agg(",".join)
+            )
+            acts[parts.index] = parts[0] + ":" + members + parts[2]
+        return acts
+
+    def anonymize_sids(self, sids):
+        """Map usernames to anonymous ids; anyone unknown becomes ``REMOVEME``."""
+        return map_unique(sids, lambda sid: self.user_map.get(sid, "REMOVEME"))
+
+    def _in_list(self, courses):
+        return f"""({','.join([f"'{x}'" for x in courses])})"""
+
+    def get_user_activities(self, courses=None):
+        """
+        Load and anonymize the activity, code and answers of ``courses`` --
+        by default every chosen course.
+        """
+        in_course_list = self._in_list(courses) if courses else self.in_course_list
         useinfo = pd.read_sql_query(
             f"""
         select useinfo.timestamp, sid, event, act, div_id, course_id, base_course, chapter, subchapter
             from useinfo left outer join questions on useinfo.div_id = questions.name and questions.base_course = '{self.BASECOURSE}'
-            where course_id in {self.in_course_list}
+            where course_id in {in_course_list}
         """,
             con=self.eng,
         )
@@ -335,7 +409,7 @@ class Anonymizer:
         code = pd.read_sql_query(
             f"""
         select * from code join courses on code.course_id = courses.id
-        where course_name in {self.in_course_list}""",
+        where course_name in {in_course_list}""",
             self.eng,
         )
 
@@ -352,7 +426,7 @@ class Anonymizer:
         for tbl in answer_tables:
             tdf = pd.read_sql_query(
                 f"""
-            select * from {tbl}_answers where course_name in {self.in_course_list}
+            select * from {tbl}_answers where course_name in {in_course_list}
             """,
                 self.eng,
             )
@@ -361,12 +435,8 @@ class Anonymizer:
 
         all_answers = pd.concat(answer_df)
 
-        all_answers["sid"] = all_answers.sid.map(
-            lambda x: self.user_map.get(x, "REMOVEME")
-        )
-        all_answers["course_name"] = all_answers.course_name.map(
-            lambda x: self.course_map.get(x)
-        )
+        all_answers["sid"] = self.anonymize_sids(all_answers.sid)
+        all_answers["course_name"] = all_answers.course_name.map(self.course_map)
 
         all_answers = all_answers[
             [
@@ -387,17 +457,17 @@ class Anonymizer:
         #
         # Students often use their own name as a variable, or add their name as a comment.  This should eliminate names.  Our strategy is simple, we know the first and last name of the student associated with each piece of code.  If replace their first and/or last name with an anonymous equivalent.  This should not break any code, but if it does it should be pretty obvious what the issue is and what was broken
 
-        code_withnames = code.merge(self.user_df, left_on="sid", right_on="username")
+        users = self.user_df[["username", "first_name", "last_name", "course_name"]]
+        code_withnames = code.merge(
+            users.drop_duplicates("username"), left_on="sid", right_on="username"
+        )
+        code_withnames = code_withnames.rename(columns={"course_name_x": "course_name"})
         if len(code_withnames) > 0:
-            code_withnames["anon_code"] = code_withnames.progress_apply(
-                remove_names, axis=1
-            )
+            code_withnames["anon_code"] = remove_names(code_withnames)
 
-            code_withnames["sid"] = code_withnames.sid.map(
-                lambda x: self.user_map.get(x, "REMOVEME")
-            )
-            code_withnames["course_name_y"] = code_withnames.course_name_y.map(
-                lambda x: self.course_map.get(x)
+            code_withnames["sid"] = self.anonymize_sids(code_withnames.sid)
+            code_withnames["course_name_y"] = code_withnames.course_name.map(
+                self.course_map
             )
             code_withnames = code_withnames[
                 ["acid", "anon_code", "sid", "course_name_y", "timestamp", "emessage"]
@@ -406,17 +476,13 @@ class Anonymizer:
             code_withnames["anon_code"] = ""
             code_withnames["course_name_y"] = ""
 
-        useinfo["sid"] = useinfo.sid.map(lambda x: self.user_map.get(x, "REMOVEME"))
-        useinfo["course_id"] = useinfo.course_id.map(lambda x: self.course_map.get(x))
-        useinfo["base_course"] = useinfo.course_id.map(
-            lambda x: self.anon_to_base.get(x)
-        )
+        useinfo["sid"] = self.anonymize_sids(useinfo.sid)
+        useinfo["course_id"] = useinfo.course_id.map(self.course_map)
+        useinfo["base_course"] = useinfo.course_id.map(self.anon_to_base)
         # anonymize act field for peer events
-        useinfo["act"] = useinfo.apply(self.anonymize_sendmessage, axis=1)
-        useinfo["act"] = useinfo.apply(self.anonymize_ratepeer, axis=1)
-        useinfo["act"] = useinfo.apply(self.anonymize_peergroup, axis=1)
+        useinfo["act"] = self.anonymize_peer_acts(useinfo)
 
-        useinfo["div_id"] = useinfo.div_id.map(anon_page)
+        useinfo["div_id"] = map_unique(useinfo.div_id, anon_page)
 
         # ## Remove names that could not be anonymized
         useinfo = useinfo[useinfo.sid != "REMOVEME"]
@@ -452,46 +518,20 @@ class Anonymizer:
     # For example, a 30 minute gap likely means the student has gone away and come back but we could make that an hour.  Some experimenting is needed and google analytics show that the average time on page for some pages is 30 minutes!
     def sessionize_data(self):
         self.useinfo = self.useinfo.sort_values(["sid", "timestamp"])
-        self.useinfo["session"] = 0
-        self.useinfo["problem_view"] = 0
-
-        self.mins10 = pd.Timedelta(10, "minutes")
-        self.mins15 = pd.Timedelta(15, "minutes")
-        self.mins20 = pd.Timedelta(20, "minutes")
-        self.mins30 = pd.Timedelta(30, "minutes")
-        self.mins60 = pd.Timedelta(60, "minutes")
 
-        # The below is very expensive for long operations.  Maybe we could rewrite it with a rolling function
-
-        self.useinfo["tdiff"] = self.useinfo.timestamp.diff()
-        if self.preserve_username:
-            self.useinfo["sdiff"] = (
-                self.useinfo.sid.ne(self.useinfo.sid.shift()).bfill().astype(int)
-            )
-        else:
-            self.useinfo["sdiff"] = self.useinfo.sid.diff()
-        self.sess_count = 0
-        self.useinfo["session"] = self.useinfo.progress_apply(self.sessionize, axis=1)
-        self.student_problem_ct = {}
-        self.useinfo["problem_view"] = self.useinfo.progress_apply(
-            self.actcount, axis=1
+        # A session starts at each student's first event and after every gap
+        # longer than SESSION_GAP.
+        new_session = self.useinfo.sid.ne(self.useinfo.sid.shift()) | (
+            self.useinfo.timestamp.diff() > SESSION_GAP
         )
-
-    def sessionize(self, row):
-        if row.tdiff > self.mins60 or row.sdiff != 0:
-            self.sess_count += 1
-
-        return self.sess_count
-
-    def actcount(self, row):
-        if row.sid not in self.student_problem_ct:
-            self.student_problem_ct[row.sid] = {}
-        self.student_problem_ct[row.sid][row.div_id] = (
-            self.student_problem_ct[row.sid].get(row.div_id, 0) + 1
+        self.useinfo["session"] = new_session.cumsum() + self.sess_count
+        if len(self.useinfo):
+            self.sess_count = int(self.useinfo["session"].iloc[-1])
+        # How many times, so far, the student has worked on this div_id.
+        self.useinfo["problem_view"] = (
+            self.useinfo.groupby(["sid", "div_id"], sort=False, dropna=False).cumcount()
+            + 1
         )
-        return self.student_problem_ct[row.sid][row.div_id]
-
-    # In[61]:
 
     def create_datashop_data(self):
         useinfo_w_answers = self.useinfo.merge(
@@ -503,10 +543,14 @@ class Anonymizer:
 
         useinfo_w_answers = useinfo_w_answers.drop_duplicates()
 
+        # Matching on the course too keeps a student enrolled in two of the
+        # chosen courses from having every event counted twice.
         useinfo_w_answers = useinfo_w_answers.merge(
-            self.user_df[["anon_user", "term_start_date", "anon_institution"]],
-            left_on="sid",
-            right_on="anon_user",
+            self.user_df[
+                ["anon_user", "anon_course", "term_start_date", "anon_institution"]
+            ],
+            left_on=["sid", "course_id"],
+            right_on=["anon_user", "anon_course"],
         )
 
         useinfo_w_answers.term_start_date = pd.to_datetime(
@@ -552,67 +596,19 @@ class Anonymizer:
             "CF (Institution)",
         ]
 
-        useinfo_w_answers["Level (Chapter)"] = useinfo_w_answers.apply(get_chap, axis=1)
-        useinfo_w_answers["Level (SubChapter)"] = useinfo_w_answers.apply(
-            get_subchap, axis=1
-        )
+        set_page_levels(useinfo_w_answers)
 
         # ## Find the nearest timestamps in `code`
-
-        # Create a Multi-Index out of sid, acid and timestamp.  This will allow us to efficiently grab all of the rows for an (sid, acid) pair that will be indexed by timestamp.
         #
-        # Then we can use `get_loc` with `method='nearest'` to find the timestamp closest to the given timestamp.  `get_loc` returns the numeric index of that row, so we need to use iloc to grab the actual row.  since the timestamp is the index we use `.name` to return the index value, which is the timestamp we are after.
-
-        poss = self.code_withnames.sort_values(["sid", "acid", "timestamp"]).set_index(
-            ["sid", "acid"]
-        )
-
-        poss = poss.reset_index()
-        poss = poss.set_index(["sid", "acid", "timestamp"])
+        # Each event is matched with the same student's run of the same
+        # activecode closest to it in time, if that run is less than
+        # CODE_MATCH_WINDOW away.
+        y = self._attach_code(useinfo_w_answers)
 
-        # the last idea to speed this up is to try to index the timestamps and then use get_loc(ts, method='nearest') to search the index.
-        useinfo_w_answers["closest_time"] = useinfo_w_answers.progress_apply(
-            lambda row: find_closest(
-                row["Anon Student Id"], row["Problem Name"], row["Time"], poss
-            ),
-            axis=1,
-        )
-
-        td_5sec = pd.Timedelta(5, "seconds")
-        useinfo_w_answers.closest_time = useinfo_w_answers.progress_apply(
-            lambda x: (
-                x.closest_time
-                if not pd.isna(x.closest_time)
-                and not pd.isna(x.Time)
-                and abs(x.closest_time - x.Time) < td_5sec
-                else pd.NaT
-            ),
-            axis=1,
-        )
-
-        # pd.to_datetime(useinfo_w_answers.closest_time)
-        useinfo_w_answers[
-            abs(useinfo_w_answers.closest_time - useinfo_w_answers.Time) < td_5sec
-        ]
-
-        y = useinfo_w_answers.merge(
-            self.code_withnames,
-            left_on=["Anon Student Id", "Problem Name", "closest_time"],
-            right_on=["sid", "acid", "timestamp"],
-            how="left",
-        )
-
-        y["CF (Code)"] = y.apply(
-            lambda row: row.anon_code if not pd.isna(row.anon_code) else "", axis=1
-        )
+        y["CF (Code)"] = y.anon_code.fillna("")
 
-        y["Feedback Classification"] = y.apply(
-            lambda row: (
-                row.emessage
-                if not pd.isna(row.emessage)
-                else row["Feedback Classification"]
-            ),
-            axis=1,
+        y["Feedback Classification"] = y.emessage.where(
+            y.emessage.notna(), y["Feedback Classification"]
         )
 
         y = y.drop_duplicates()
@@ -623,8 +619,8 @@ class Anonymizer:
         #
         # **Feedback Classification**		A further classification of the outcome. See action_evaluation / classification in the Guide. Note that if Feedback Classification has a value, Feedback Text must have a value as well.	≤ 255
 
-        y["Feedback Text"] = y["Feedback Classification"].map(get_error_detail)
-        y["Feedback Classification"] = y["Feedback Classification"].map(fbclass)
+        y["Feedback Text"] = map_unique(y["Feedback Classification"], get_error_detail)
+        y["Feedback Classification"] = map_unique(y["Feedback Classification"], fbclass)
 
         # **Warning** pandas treats string columsn as objects and when you export them you have to be careful about the newlines.  Some spreadsheets like Numbers and Sheets deal with it just fine, but Excel and -- Data Shop - the target for this notebook do not.  Therefore we can use the trick below for the feedback text and code to ensure that the newlines end up in the string as \n
         y["Input"] = y["Input"].astype("str")
@@ -633,60 +629,180 @@ class Anonymizer:
         y.Action = y.Action.str.replace("\n", "")
         y.Input = y.Input.str.replace("nan", "")
 
-        self.datashop = y[
-            [
-                "Time",
-                "Anon Student Id",
-                "Action",
-                "Problem Name",
-                "Class",
-                "Level (Chapter)",
-                "Level (SubChapter)",
-                "Session Id",
-                "Problem View",
-                "Selection",
-                "Input",
-                "Feedback Text",
-                "Feedback Classification",
-                "CF (Code)",
-                "CF (Week No)",
-                "CF (Institution)",
-            ]
-        ]
+        self.datashop = y[DATASHOP_COLUMNS]
 
-    def write_datashop(self, path="./"):
+    def _attach_code(self, events):
+        """
+        Left-join ``events`` with the ``anon_code`` and ``emessage`` of the
+        nearest-in-time ``code`` row for the same (student, activecode).
+        """
+        code = self.code_withnames[["sid", "acid", "timestamp", "anon_code"]].assign(
+            emessage=self.code_withnames.emessage
+        )
+        code = code.dropna(subset=["timestamp", "acid"]).rename(
+            columns={"sid": "Anon Student Id", "acid": "Problem Name"}
+        )
+        if code.empty:
+            return events.assign(timestamp=pd.NaT, anon_code=np.nan, emessage=np.nan)
+        code["Anon Student Id"] = code["Anon Student Id"].astype(
+            events["Anon Student Id"].dtype
+        )
+        timed = events.Time.notna() & events["Problem Name"].notna()
+        matched = pd.merge_asof(
+            events[timed].sort_values("Time"),
+            code.sort_values("timestamp"),
+            left_on="Time",
+            right_on="timestamp",
+            by=["Anon Student Id", "Problem Name"],
+            direction="nearest",
+            tolerance=CODE_MATCH_WINDOW,
+        )
+        # merge_asof's tolerance is inclusive; the window is not.
+        too_far = (matched.timestamp - matched.Time).abs() >= CODE_MATCH_WINDOW
+        matched.loc[too_far, ["anon_code", "emessage"]] = np.nan
+        return pd.concat([matched, events[~timed]], ignore_index=True)
+
+    def _datashop_name(self):
         now = datetime.datetime.now()
         formatted_date = now.strftime("%Y-%m-%d-%H-%M")
         if len(self.COURSE_LIST) == 1:
-            fname = f"{self.COURSE_LIST[0]}_datashop_{formatted_date}.tab.zip"
-        else:
-            fname = f"{self.BASECOURSE}_datashop_{formatted_date}.tab.zip"
-        p = pathlib.Path(path, fname)
+            return f"{self.COURSE_LIST[0]}_datashop_{formatted_date}.tab.zip"
+        return f"{self.BASECOURSE}_datashop_{formatted_date}.tab.zip"
+
+    def write_datashop(self, path="./"):
+        p = pathlib.Path(path, self._datashop_name())
         self.datashop.to_csv(
             p,
             sep="\t",
             index=False,
             compression="infer",
-            columns=[
-                "Time",
-                "Anon Student Id",
-                "Action",
-                "Problem Name",
-                "Class",
-                "Level (Chapter)",
-                "Level (SubChapter)",
-                "Session Id",
-                "Problem View",
-                "Selection",
-                "Input",
-                "Feedback Text",
-                "Feedback Classification",
-                "CF (Code)",
-                "CF (Week No)",
-                "CF (Institution)",
-            ],
+            columns=DATASHOP_COLUMNS,
         )
 
+    def course_datashop(self, course):
+        """
+        Anonymize one course and build its datashop rows.
+
+        :return: DataFrame, or None if the course has no activity
+        """
+        self.get_user_activities([course])
+        datashop = None
+        if not self.useinfo.empty:
+            self.sessionize_data()
+            self.create_datashop_data()
+            datashop = self.datashop
+            del self.datashop
+        del self.useinfo, self.code_withnames, self.all_answers
+        return datashop
+
+    def __getstate__(self):
+        # Sent to the worker processes of :meth:`export_datashop`; an engine's
+        # pooled connections cannot be shared with another process.
+        state = self.__dict__.copy()
+        state["eng"] = self.eng.url.render_as_string(hide_password=False)
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.eng = create_engine(state["eng"])
+
+    def _course_datashops(self, courses, workers, mp_context):
+        """Yield each course's datashop rows (or None), in the order of ``courses``."""
+        if workers <= 1:
+            for course in courses:
+                yield self.course_datashop(course)
+            return
+
+        with tempfile.TemporaryDirectory(prefix="datashop-") as tmp:
+            with ProcessPoolExecutor(workers, mp_context=mp_context) as pool:
+                futures = [
+                    pool.submit(
+                        _write_course_datashop,
+                        self,
+                        course,
+                        pathlib.Path(tmp, f"{i}.pkl"),
+                    )
+                    for i, course in enumerate(courses)
+                ]
+                for future in futures:
+                    part, sessions = future.result()
+                    if part is None:
+                        yield None
+                        continue
+                    # Each worker numbers its course's sessions from 1; shift
+                    # them to follow on from the previous course, exactly as a
+                    # single process would have numbered them.
+                    datashop = pd.read_pickle(part)
+                    part.unlink()
+                    datashop["Session Id"] += self.sess_count
+                    self.sess_count += sessions
+                    yield datashop
+
+    def export_datashop(self, path="./", progress=None, workers=1, mp_context=None):
+        """
+        Anonymize the chosen courses one at a time and write them all to one
+        datashop file.
+
+        Only one course's activity is in memory at once, so the memory needed
+        depends on the largest course rather than on the size of the sample.
+        Call :meth:`choose_courses` and :meth:`get_users` first; the users of
+        every course are anonymized together so ids are consistent across
+        courses.
+
+        With ``workers`` > 1 the courses are processed in that many worker
+        processes at once. The file is identical to the one a single process
+        writes: courses are still appended in order, and session ids are
+        renumbered to match.
+
+        :param path: the directory to write the file in
+        :param progress: called with ``(courses done, total, course name)``
+            after each course
+        :param workers: how many courses to process at the same time
+        :param mp_context: the multiprocessing context for the worker
+            processes; the default is Python's
+        :return: pathlib.Path, the file written
+        """
+        p = pathlib.Path(path, self._datashop_name())
+        courses = self.chosen_courses
+        datashops = self._course_datashops(courses, workers, mp_context)
+        with zipfile.ZipFile(p, "w", compression=zipfile.ZIP_DEFLATED) as zf:
+            with zf.open(p.name.removesuffix(".zip"), "w", force_zip64=True) as raw:
+                with io.TextIOWrapper(raw, encoding="utf-8", newline="") as out:
+                    header = True
+                    for done, datashop in enumerate(datashops, start=1):
+                        if datashop is not None:
+                            datashop.to_csv(
+                                out,
+                                sep="\t",
+                                index=False,
+                                header=header,
+                                columns=DATASHOP_COLUMNS,
+                            )
+                            header = False
+                        del datashop
+                        if progress:
+                            progress(done, len(courses), courses[done - 1])
+        return p
+
+
+def _write_course_datashop(anonymizer, course, part):
+    """
+    Worker process entry point for :meth:`Anonymizer.export_datashop`: pickle
+    one course's datashop rows to ``part``.
+
+    :return: ``(part, number of sessions)``, or ``(None, 0)`` if the course
+        has no activity
+    """
+    anonymizer.sess_count = 0
+    try:
+        datashop = anonymizer.course_datashop(course)
+    finally:
+        anonymizer.eng.dispose()
+    if datashop is None:
+        return None, 0
+    datashop.to_pickle(part)
+    return part, anonymizer.sess_count
+
 
 if __name__ == "__main__":
     a = Anonymizer(
@@ -701,10 +817,5 @@ if __name__ == "__main__":
     print(a.chosen_courses)
     print("Getting Users")
     a.get_users()
-    print("Getting user activities")
-    a.get_user_activities()
-    print("sessionizing")
-    a.sessionize_data()
-    print("combining to datashop")
-    a.create_datashop_data()
-    a.write_datashop()
+    print("Anonymizing and writing each course")
+    a.export_datashop()
@@ -0,0 +1,139 @@
+"""
+Stream large query results to compressed files.
+
+The raw log exports (every ``useinfo`` or ``code`` row for a course) can run
+to tens of millions of rows for a course that has been taught for years.
+:func:`export_query` never holds more than one chunk of them: rows come off a
+server-side cursor ``chunk_rows`` at a time and each chunk is appended to the
+output before the next is read, so memory stays flat however large the
+course is.
+
+The file is written under a temporary name ending in :data:`PARTIAL_SUFFIX`
+and renamed into place when it is complete. The download lists go through
+:func:`ready_exports`, which leaves those names out, so they never offer an
+export that is still being written -- or one whose worker was killed before
+it could clean up.
+"""
+
+import io
+import os
+import pathlib
+import zipfile
+from typing import Any, Callable, Dict, List, Optional, Union
+
+import pandas as pd
+from sqlalchemy.engine import Engine
+from sqlalchemy.sql.elements import TextClause
+
+#: Rows read from the database and written out at a time.
+EXPORT_CHUNK_ROWS = 50000
+
+#: Formats :func:`export_query` can write, with the suffix each adds to the file.
+EXPORT_FORMATS = {"csv": ".csv.zip", "parquet": ".parquet"}
+
+#: Added to the name of an export while it is being written.
+PARTIAL_SUFFIX = ".partial"
+
+
+def ready_exports(directory: Union[str, os.PathLike]) -> List[pathlib.Path]:
+    """
+    List the files in ``directory`` that are ready to download.
+
+    :param directory: a ``downloads/<kind>/<user>`` folder; it must exist
+    :return: list of pathlib.Path, every file but the partially written ones
+    """
+    return [x for x in pathlib.Path(directory).iterdir() if x.suffix != PARTIAL_SUFFIX]
+
+
+def _write_csv_zip(chunks, path: pathlib.Path, member: str, progress) -> int:
+    rows = 0
+    with zipfile.ZipFile(path, "w", compression=zipfile.ZIP_DEFLATED) as zf:
+        # force_zip64 since the final size is not known up front.
+        with zf.open(member, "w", force_zip64=True) as raw:
+            with io.TextIOWrapper(raw, encoding="utf-8", newline="") as out:
+                header = True
+                for chunk in chunks:
+                    chunk.to_csv(out, header=header, index=False)
+                    header = False
+                    rows += len(chunk)
+                    if progress:
+                        progress(rows)
+    return rows
+
+
+def _write_parquet(chunks, path: pathlib.Path, progress) -> int:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    rows = 0
+    writer = None
+    try:
+        for chunk in chunks:
+            if writer is None:
+                schema = pa.Schema.from_pandas(chunk, preserve_index=False)
+                # A column that is entirely NULL in the first chunk has no type
+                # yet; every such column in these tables holds text.
+                for i, field in enumerate(schema):
+                    if pa.types.is_null(field.type):
+                        schema = schema.set(i, field.with_type(pa.string()))
+                writer = pq.ParquetWriter(path, schema, compression="zstd")
+            writer.write_table(
+                pa.Table.from_pandas(chunk, schema=writer.schema, preserve_index=False)
+            )
+            rows += len(chunk)
+            if progress:
+                progress(rows)
+    finally:
+        if writer is not None:
+            writer.close()
+    return rows
+
+
+def export_query(
+    eng: Engine,
+    query: Union[str, TextClause],
+    params: Dict[str, Any],
+    path: Union[str, os.PathLike],
+    fmt: str = "csv",
+    chunk_rows: int = EXPORT_CHUNK_ROWS,
+    progress: Optional[Callable[[int], None]] = None,
+) -> int:
+    """
+    Write the result of ``query`` to ``path`` without loading it all at once.
+
+    :param eng: Engine, the database to read from
+    :param query: str or TextClause, the SQL to run
+    :param params: dict, parameters for ``query``
+    :param path: the file to create, *without* the format's suffix
+    :param fmt: str, a key of :data:`EXPORT_FORMATS` -- ``csv`` for a zipped
+        CSV file, ``parquet`` for a zstd compressed Parquet file
+    :param chunk_rows: int, how many rows to hold in memory at a time
+    :param progress: called with the number of rows written after each chunk
+    :return: int, the number of rows written
+    """
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"Unknown export format {fmt!r}")
+    path = pathlib.Path(path)
+    final = path.with_name(path.name + EXPORT_FORMATS[fmt])
+    partial = final.with_name(final.name + PARTIAL_SUFFIX)
+
+    # stream_results asks the driver for a server-side cursor, so only the
+    # current chunk is ever transferred.
+    with eng.connect().execution_options(stream_results=True) as conn:
+        chunks = pd.read_sql_query(
+            query,
+            conn,
+            params=params,
+            chunksize=chunk_rows,
+            dtype_backend="numpy_nullable",
+        )
+        try:
+            if fmt == "csv":
+                rows = _write_csv_zip(chunks, partial, path.name + ".csv", progress)
+            else:
+                rows = _write_parquet(chunks, partial, progress)
+        except BaseException:
+            partial.unlink(missing_ok=True)
+            raise
+    os.replace(partial, final)
+    return rows
@@ -0,0 +1,249 @@
+# ***********************************************
+# |docname| - Versioned caches for hot-path lookups
+# ***********************************************
+# Some lookups on the answer and page paths change only when an instructor or
+# author edits something, yet were re-queried on every request. They are kept
+# in per-process caches, and invalidated across every worker through a version
+# counter per key stored in Redis:
+#
+# * A reader fetches the key's current version (one Redis ``GET``) and reuses
+#   its cached value only if it was loaded under that same version.
+# * A writer calls :meth:`VersionedCache.invalidate`, which drops the local
+#   copy and ``INCR``\ s the counter so every other worker reloads on its next
+#   lookup.
+#
+# A writer that knows exactly what it changed can call :meth:`VersionedCache.patch`
+# instead, which bumps the counter the same way but applies the change to this
+# worker's copy rather than dropping it -- provided no other write has been
+# counted since that copy was loaded.
+#
+# A cache can instead share one counter across all its keys, for data that is
+# read by many keys but changed rarely and from many places: any write then
+# reloads every key, which is simpler than working out which ones it touched.
+#
+# Concurrent misses on the same key in one process share a single load, so a
+# cold cache -- after a deploy, say -- does not send a burst of identical
+# queries to the database.
+#
+# Redis is not required. If it cannot be reached the cache keeps working on
+# its own: local invalidation still applies, and entries expire after the
+# cache's TTL, which bounds how long another worker can serve a stale value.
+#
+# Imports
+# =======
+# These are listed in the order prescribed by `PEP 8`_.
+#
+# Standard library
+# ----------------
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Tuple
+
+# Third-party imports
+# -------------------
+import redis
+from redis import asyncio as aioredis
+
+# Local application imports
+# -------------------------
+from rsptx.configuration import settings
+from rsptx.logging import rslogger
+
+#: After a failed Redis call, how long to run on TTLs alone before trying again.
+#: Keeps an outage from adding a connection timeout to every lookup.
+REDIS_RETRY_SECONDS = 30.0
+
+_redis: Optional[aioredis.Redis] = None
+_redis_down_until = 0.0
+
+
+def _get_redis() -> Optional[aioredis.Redis]:
+    global _redis
+    if time.monotonic() < _redis_down_until:
+        return None
+    if _redis is None:
+        _redis = aioredis.from_url(
+            settings.redis_uri,
+            decode_responses=True,
+            socket_timeout=0.5,
+            socket_connect_timeout=0.5,
+        )
+    return _redis
+
+
+def _redis_failed(e: Exception) -> None:
+    global _redis_down_until
+    _redis_down_until = time.monotonic() + REDIS_RETRY_SECONDS
+    rslogger.warning(f"cache: Redis unavailable, falling back to TTLs: {e}")
+
+
+async def fetch_shared_version(name: str) -> Optional[str]:
+    """Return the shared version counter ``name``, or None if Redis is unavailable.
+
+    A counter that has never been bumped reads as ``"0"``.
+    """
+    r = _get_redis()
+    if r is None:
+        return None
+    try:
+        return await r.get(name) or "0"
+    except Exception as e:
+        _redis_failed(e)
+        return None
+
+
+async def bump_shared_version(name: str) -> Optional[str]:
+    """Increment the shared version counter ``name``; never raises.
+
+    :return: the new version, or None if Redis is unavailable
+    """
+    r = _get_redis()
+    if r is None:
+        return None
+    try:
+        return str(await r.incr(name))
+    except Exception as e:
+        _redis_failed(e)
+        return None
+
+
+def bump_shared_version_sync(name: str) -> None:
+    """A blocking :func:`bump_shared_version`, for code that runs outside an
+    event loop such as the book build; never raises."""
+    try:
+        r = redis.from_url(
+            settings.redis_uri, socket_timeout=0.5, socket_connect_timeout=0.5
+        )
+        try:
+            r.incr(name)
+        finally:
+            r.close()
+    except Exception as e:
+        rslogger.warning(f"cache: could not bump {name}, falling back to TTLs: {e}")
+
+
+class VersionedCache:
+    """A size-bounded LRU of values that are invalidated across workers.
+
+    :param namespace: prefix for this cache's Redis version counters
+    :param ttl: the most seconds a value is reused without being reloaded
+    :param maxsize: the most keys kept in this process
+    :param per_key: keep a version counter per key; if False, one counter
+        covers the whole cache and invalidating any key reloads them all
+    """
+
+    def __init__(
+        self, namespace: str, ttl: float, maxsize: int = 1024, per_key: bool = True
+    ):
+        self.namespace = namespace
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self.per_key = per_key
+        # key -> (shared version at load time, monotonic load time, value)
+        self._entries: "OrderedDict[Hashable, Tuple[Optional[str], float, Any]]" = (
+            OrderedDict()
+        )
+        # (key, version) -> the load in progress
+        self._loading: Dict[Tuple[Hashable, Optional[str]], asyncio.Future] = {}
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+
+    def _version_name(self, key: Hashable) -> str:
+        if not self.per_key:
+            return f"rs:cachever:{self.namespace}"
+        return f"rs:cachever:{self.namespace}:{key}"
+
+    async def get(self, key: Hashable, loader: Callable[[], Awaitable[Any]]) -> Any:
+        """Return the cached value for ``key``, calling ``loader`` on a miss."""
+        # Read the version *before* loading, so a write that lands during the
+        # load leaves this entry one version behind and it is reloaded next time.
+        version = await fetch_shared_version(self._version_name(key))
+        now = time.monotonic()
+        entry = self._entries.get(key)
+        if entry is not None and entry[0] == version and now - entry[1] < self.ttl:
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[2]
+
+        flight = self._loading.get((key, version))
+        if flight is not None:
+            self.coalesced += 1
+            try:
+                return await asyncio.shield(flight)
+            except asyncio.CancelledError:
+                if not flight.cancelled():
+                    raise
+                # The load was abandoned by the caller that started it.
+
+        self.misses += 1
+        flight = asyncio.get_running_loop().create_future()
+        self._loading[(key, version)] = flight
+        try:
+            value = await loader()
+        except asyncio.CancelledError:
+            flight.cancel()
+            raise
+        except Exception as e:
+            flight.set_exception(e)
+            # Mark it retrieved; nobody may be waiting on it.
+            flight.exception()
+            raise
+        finally:
+            self._loading.pop((key, version), None)
+        flight.set_result(value)
+        self._entries[key] = (version, now, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+        return value
+
+    async def invalidate(self, key: Hashable) -> None:
+        """Forget ``key`` here and tell every other worker to reload it."""
+        self._entries.pop(key, None)
+        await bump_shared_version(self._version_name(key))
+
+    async def patch(self, key: Hashable, change: Callable[[Any], None]) -> None:
+        """Record a write to ``key`` that this process can apply in place.
+
+        Every other worker reloads ``key``, as after :meth:`invalidate`. This
+        process keeps its copy and calls ``change`` on it, but only if the copy
+        is exactly one write behind: if another write was counted since it was
+        loaded, which this process has not seen, the copy is dropped instead.
+        ``change`` must not await.
+        """
+        version = await bump_shared_version(self._version_name(key))
+        entry = self._entries.get(key)
+        if entry is None:
+            return
+        loaded_under = entry[0]
+        if version is None:
+            # Without Redis, versions stay None and only the TTL applies.
+            current = loaded_under is None
+        else:
+            current = loaded_under is not None and int(loaded_under) + 1 == int(version)
+        if not current:
+            self._entries.pop(key, None)
+            return
+        change(entry[2])
+        self._entries[key] = (version, entry[1], entry[2])
+
+    def invalidate_sync(self, key: Hashable) -> None:
+        """A blocking :meth:`invalidate`, for code that runs outside an event loop."""
+        self._entries.pop(key, None)
+        bump_shared_version_sync(self._version_name(key))
+
+    async def invalidate_all(self) -> None:
+        """Forget every key here and on every other worker.
+
+        Only for a cache made with ``per_key=False``, which has one counter
+        to bump.
+        """
+        assert not self.per_key, "invalidate_all needs a cache with per_key=False"
+        self._entries.clear()
+        await bump_shared_version(self._version_name(None))
+
+    def clear(self) -> None:
+        """Forget every key in this process only."""
+        self._entries.clear()
@@ -8,15 +8,20 @@ from .crud import (
     delete_api_token,
     fetch_all_api_tokens,
     fetch_api_token,
+    invalidate_server_feedback,
     is_server_feedback,
+    server_feedback_cache,
     is_interaction_event,
     EVENT2TABLE,
     INTERACTION_ACTS,
     INTERACTION_ONLY_EVENTS,
 )
 from .user import (
+    fetch_session_user,
     fetch_user,
     fetch_user_by_email,
+    invalidate_user_cache,
+    user_cache,
     create_user,
     update_user,
     delete_user,
@@ -44,7 +49,6 @@ from .assignment import (
     fetch_assignments,
     fetch_deadline_exception,
     fetch_grade,
-    fetch_gradebook,
     fetch_late_students_for_assignment,
     fetch_student_assignment_scores,
     fetch_one_assignment,
@@ -53,6 +57,8 @@ from .assignment import (
     has_submissions_after_deadline,
     fetch_reading_assignment_data,
     get_repo_path,
+    increment_grade_score,
+    invalidate_scoring_specs,
     remove_assignment_questions,
     reorder_assignment_questions,
     update_assignment,
@@ -65,6 +71,7 @@ from .assignment import (
     set_manual_total,
     upsert_deadline_exception,
     upsert_grade,
+    upsert_grade_totals,
 )
 
 from .course import (
@@ -72,6 +79,7 @@ from .course import (
     create_course_instructor,
     create_instructor_course_entry,
     create_user_course_entry,
+    course_cache,
     delete_course_completely,
     delete_course_instructor,
     delete_user_course_entry,
@@ -103,6 +111,21 @@ from .course_attrs import (
     get_course_origin,
 )
 
+from .gradebook import (
+    GRADEBOOK_FORMATS,
+    GradebookPageRows,
+    GradebookSnapshot,
+    fetch_enrolled_course_ids,
+    fetch_gradebook,
+    fetch_gradebook_columns,
+    fetch_gradebook_page_rows,
+    fetch_gradebook_snapshot,
+    gradebook_cache,
+    invalidate_gradebooks,
+    record_grades,
+    stream_gradebook_rows,
+)
+
 from .book import (
     create_user_chapter_progress_entry,
     create_user_state_entry,
@@ -119,6 +142,12 @@ from .book import (
     update_user_state,
 )
 
+from .page import (
+    PageContext,
+    fetch_page_activity,
+    fetch_page_context,
+)
+
 from .group import (
     create_group,
     create_editor_for_basecourse,
@@ -176,6 +205,9 @@ from .lti import (
     fetch_lti1p3_grading_data_for_assignment,
     fetch_lti1p3_user,
     fetch_lti1p3_users_for_course,
+    invalidate_lti_cache,
+    Lti1p3GradingData,
+    lti_cache,
     upsert_lti1p1_grade_link,
     upsert_lti1p3_assignment,
     upsert_lti1p3_config,
@@ -185,6 +217,16 @@ from .lti import (
     validate_user_credentials,
 )
 
+from .lti_outbox import (
+    ClaimedScore,
+    claim_lti_scores,
+    complete_lti_scores,
+    discard_lti_scores,
+    enqueue_lti_score,
+    fetch_lti_outbox_stats,
+    retry_lti_scores,
+)
+
 from .peer import (
     fetch_last_useinfo_peergroup,
     get_peer_votes,
@@ -201,6 +243,7 @@ from .practice import (
     delete_one_user_topic_practice,
     fetch_course_practice,
     fetch_one_user_topic_practice,
+    fetch_practice_completion_counts,
     fetch_qualified_questions,
 )
 
@@ -229,8 +272,12 @@ from .question import (
     search_exercises,
     update_question,
     update_question_grade_entry,
+    QuestionGradeChange,
+    rescore_question_grade,
 )
 
+from .rollup import refresh_activity_rollup, rollup_needs_backfill
+
 from .rsfiles import (
     fetch_source_code,
     update_source_code,
@@ -248,6 +295,9 @@ from .rslogging import (
     create_answer_table_entry,
     create_code_entry,
     create_useinfo_entry,
+    queue_useinfo_entry,
+    useinfo_writer,
+    UseinfoWriter,
     fetch_code,
     fetch_code_for_sid,
     fetch_interaction_useinfo,
@@ -263,6 +313,7 @@ from .rslogging import (
 from .scoring import (
     fetch_answers,
     fetch_assignment_scores,
+    fetch_assignment_score_totals,
     fetch_reading_assignment_spec,
     is_assigned,
 )
@@ -308,7 +359,6 @@ __all__ += [
     "fetch_all_deadline_exceptions",
     "fetch_deadline_exception",
     "fetch_grade",
-    "fetch_gradebook",
     "fetch_one_assignment",
     "fetch_assignment_by_name",
     "fetch_problem_data",
@@ -317,6 +367,8 @@ __all__ += [
     "fetch_reading_assignment_data",
     "get_repo_path",
     "has_submissions_after_deadline",
+    "increment_grade_score",
+    "invalidate_scoring_specs",
     "remove_assignment_questions",
     "reorder_assignment_questions",
     "update_assignment",
@@ -329,6 +381,23 @@ __all__ += [
     "set_manual_total",
     "upsert_deadline_exception",
     "upsert_grade",
+    "upsert_grade_totals",
+]
+
+# from .gradebook
+__all__ += [
+    "GRADEBOOK_FORMATS",
+    "GradebookPageRows",
+    "GradebookSnapshot",
+    "fetch_enrolled_course_ids",
+    "fetch_gradebook",
+    "fetch_gradebook_columns",
+    "fetch_gradebook_page_rows",
+    "fetch_gradebook_snapshot",
+    "gradebook_cache",
+    "invalidate_gradebooks",
+    "record_grades",
+    "stream_gradebook_rows",
 ]
 
 # from .crud
@@ -342,7 +411,9 @@ __all__ += [
     "delete_api_token",
     "fetch_all_api_tokens",
     "fetch_api_token",
+    "invalidate_server_feedback",
     "is_server_feedback",
+    "server_feedback_cache",
     "is_interaction_event",
     "EVENT2TABLE",
     "INTERACTION_ACTS",
@@ -398,6 +469,9 @@ __all__ += [
     "fetch_lti1p3_grading_data_for_assignment",
     "fetch_lti1p3_user",
     "fetch_lti1p3_users_for_course",
+    "invalidate_lti_cache",
+    "Lti1p3GradingData",
+    "lti_cache",
     "upsert_lti1p1_grade_link",
     "upsert_lti1p3_assignment",
     "upsert_lti1p3_config",
@@ -407,6 +481,16 @@ __all__ += [
     "validate_user_credentials",
 ]
 
+# from .lti_outbox
+__all__ += [
+    "ClaimedScore",
+    "claim_lti_scores",
+    "complete_lti_scores",
+    "discard_lti_scores",
+    "enqueue_lti_score",
+    "fetch_lti_outbox_stats",
+    "retry_lti_scores",
+]
 # from .book
 __all__ += [
     "create_user_chapter_progress_entry",
@@ -424,12 +508,20 @@ __all__ += [
     "update_user_state",
 ]
 
+# from .page
+__all__ += [
+    "PageContext",
+    "fetch_page_activity",
+    "fetch_page_context",
+]
+
 # from .course
 __all__ += [
     "create_course",
     "create_course_instructor",
     "create_instructor_course_entry",
     "create_user_course_entry",
+    "course_cache",
     "delete_course_completely",
     "delete_course_instructor",
     "delete_user_course_entry",
@@ -489,6 +581,7 @@ __all__ += [
     "delete_one_user_topic_practice",
     "fetch_course_practice",
     "fetch_one_user_topic_practice",
+    "fetch_practice_completion_counts",
     "fetch_qualified_questions",
 ]
 
@@ -518,8 +611,12 @@ __all__ += [
     "search_exercises",
     "update_question",
     "update_question_grade_entry",
+    "QuestionGradeChange",
+    "rescore_question_grade",
 ]
 
+# from .rollup
+__all__ += ["refresh_activity_rollup", "rollup_needs_backfill"]
 # from .rsfiles
 __all__ += [
     "fetch_source_code",
@@ -539,6 +636,9 @@ __all__ += [
     "create_answer_table_entry",
     "create_code_entry",
     "create_useinfo_entry",
+    "queue_useinfo_entry",
+    "useinfo_writer",
+    "UseinfoWriter",
     "fetch_code",
     "fetch_code_for_sid",
     "fetch_interaction_useinfo",
@@ -555,6 +655,7 @@ __all__ += [
 __all__ += [
     "fetch_answers",
     "fetch_assignment_scores",
+    "fetch_assignment_score_totals",
     "fetch_reading_assignment_spec",
     "is_assigned",
 ]
@@ -576,8 +677,11 @@ __all__ += [
 ]
 # from .user
 __all__ += [
+    "fetch_session_user",
     "fetch_user",
     "fetch_user_by_email",
+    "invalidate_user_cache",
+    "user_cache",
     "create_user",
     "update_user",
     "delete_user",
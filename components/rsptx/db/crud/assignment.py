@@ -1,5 +1,5 @@
 import datetime
-from typing import NamedTuple, Optional, List
+from typing import Dict, NamedTuple, Optional, List
 from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
 from fastapi import HTTPException, status
 from asyncpg.exceptions import UniqueViolationError
@@ -13,7 +13,19 @@ from rsptx.data_types.autograde import AutogradeOptions, default_autograde_for
 from rsptx.response_helpers.core import canonical_utcnow
 
 import logging
-from sqlalchemy import select, update, delete, and_, or_, func, asc, desc, case
+from sqlalchemy import (
+    select,
+    update,
+    delete,
+    insert,
+    and_,
+    or_,
+    func,
+    asc,
+    desc,
+    case,
+    bindparam,
+)
 from sqlalchemy.exc import IntegrityError
 from .question import fetch_question_count_per_subchapter
 
@@ -25,7 +37,6 @@ from ..models import (
     AssignmentQuestionValidator,
     AuthUser,
     CourseAttribute,
-    CourseInstructor,
     Courses,
     DeadlineException,
     DeadlineExceptionValidator,
@@ -35,14 +46,64 @@ from ..models import (
     Question,
     QuestionGrade,
     Useinfo,
-    UserCourse,
 )
 
 from ..async_session import async_session
+from ..cache import VersionedCache
+from .gradebook import invalidate_gradebooks, record_grades
+from rsptx.configuration import settings
 
 rslogger = logging.getLogger(__name__)
 
 
+# Scoring spec cache
+# ------------------
+# ``is_assigned`` (see ``scoring.py``) runs on every graded answer, but what it
+# reads -- which assignments a question is on, for how many points, due when --
+# only changes when an instructor edits an assignment. It answers from a
+# per-course map loaded once and kept in this cache; every function below that
+# changes those fields calls :func:`invalidate_scoring_specs` for the course,
+# which also drops the course's gradebook (see ``gradebook.py``).
+scoring_spec_cache = VersionedCache(
+    "scoring_spec", ttl=settings.scoring_spec_cache_seconds, maxsize=4096
+)
+
+
+async def invalidate_scoring_specs(course_id: Optional[int]) -> None:
+    """
+    Drop the cached scoring specs and gradebook for a course on every worker.
+
+    :param course_id: int, the id of the course whose assignments changed
+    """
+    if course_id is not None:
+        await scoring_spec_cache.invalidate(course_id)
+        await invalidate_gradebooks([course_id])
+
+
+async def _courses_owning(
+    assignment_ids: Optional[List[int]] = None,
+    assignment_question_ids: Optional[List[int]] = None,
+) -> List[int]:
+    """Return the ids of the courses owning the given assignments or assignment questions."""
+    query = select(Assignment.course).distinct()
+    if assignment_ids:
+        query = query.where(Assignment.id.in_(assignment_ids))
+    elif assignment_question_ids:
+        query = query.join(
+            AssignmentQuestion, AssignmentQuestion.assignment_id == Assignment.id
+        ).where(AssignmentQuestion.id.in_(assignment_question_ids))
+    else:
+        return []
+    async with async_session() as session:
+        return list((await session.execute(query)).scalars().all())
+
+
+async def _invalidate_scoring_specs_for(assignment_ids: List[int]) -> None:
+    """Invalidate the scoring specs of every course owning ``assignment_ids``."""
+    for course_id in await _courses_owning(assignment_ids=assignment_ids):
+        await invalidate_scoring_specs(course_id)
+
+
 def is_assignment_visible_to_students(assignment: Assignment) -> bool:
     """
     Check if an assignment is currently visible to students based on visible, visible_on, and hidden_on fields.
@@ -660,6 +721,7 @@ async def create_assignment(assignment: AssignmentValidator) -> AssignmentValida
     new_assignment = Assignment(**assignment.dict())
     async with async_session.begin() as session:
         session.add(new_assignment)
+    await invalidate_gradebooks([new_assignment.course])
 
     return AssignmentValidator.from_orm(new_assignment)
 
@@ -684,6 +746,7 @@ async def update_assignment(assignment: AssignmentValidator, pi_update=False) ->
     )
     async with async_session.begin() as session:
         await session.execute(stmt)
+    await invalidate_scoring_specs(assignment.course)
 
 
 async def update_assignment_released(assignment_id: int, released: bool) -> None:
@@ -699,6 +762,7 @@ async def update_assignment_released(assignment_id: int, released: bool) -> None
     )
     async with async_session.begin() as session:
         await session.execute(stmt)
+    await invalidate_gradebooks(await _courses_owning(assignment_ids=[assignment_id]))
 
 
 async def update_assignment_threshold(
@@ -732,6 +796,7 @@ async def create_assignment_question(
     new_assignment_question = AssignmentQuestion(**assignmentQuestion.dict())
     async with async_session.begin() as session:
         session.add(new_assignment_question)
+    await _invalidate_scoring_specs_for([new_assignment_question.assignment_id])
 
     return AssignmentQuestionValidator.from_orm(new_assignment_question)
 
@@ -866,6 +931,9 @@ async def update_multiple_assignment_questions(
 
         await session.commit()
 
+    await _invalidate_scoring_specs_for(
+        list({q.assignment_id for q in updated_questions})
+    )
     return updated_questions
 
 
@@ -878,6 +946,7 @@ async def update_assignment_question(
     new_assignment_question = AssignmentQuestion(**assignmentQuestion.dict())
     async with async_session.begin() as session:
         await session.merge(new_assignment_question)
+    await _invalidate_scoring_specs_for([new_assignment_question.assignment_id])
 
     return AssignmentQuestionValidator.from_orm(new_assignment_question)
 
@@ -986,6 +1055,7 @@ async def update_assignment_exercises(
 
         # Step 6: Apply changes
         await session.commit()
+        await invalidate_scoring_specs(assignment.course)
 
         # Log the result
         rslogger.debug(f"Added questions: {new_questions}")
@@ -1043,6 +1113,7 @@ async def add_assignment_question(
         assignment.updated_date = canonical_utcnow()
 
         await session.commit()
+        await invalidate_scoring_specs(assignment.course)
 
 
 async def reorder_assignment_questions(question_ids: List[int]):
@@ -1064,9 +1135,13 @@ async def remove_assignment_questions(assignment_ids: List[int]):
     """
     Remove all assignment questions for the given assignment ids (assignment_ids)
     """
+    # Resolve the owning courses before the rows are gone.
+    course_ids = await _courses_owning(assignment_question_ids=assignment_ids)
     stmt = delete(AssignmentQuestion).where(AssignmentQuestion.id.in_(assignment_ids))
     async with async_session.begin() as session:
         await session.execute(stmt)
+    for course_id in course_ids:
+        await invalidate_scoring_specs(course_id)
 
 
 async def fetch_problem_data(assignment_id: int, course_name: str) -> list:
@@ -1154,154 +1229,6 @@ async def fetch_all_grades_for_assignment(
         return [GradeValidator.from_orm(a) for a in res.scalars()]
 
 
-async def fetch_gradebook(course_name: str) -> dict:
-    """
-    Build the gradebook matrix for a course: every assignment, every enrolled
-    student (instructors excluded), and the per-(student, assignment) total score
-    from the ``grades`` table, plus the class average per assignment.
-
-    Additive read-only aggregation used only by the Assignment Builder grader. It
-    does not modify any shared fetch_* function.
-
-    :param course_name: str, the course name
-    :return: dict with ``assignments``, ``students``, ``cells``, ``averages`` and
-        ``show_points``
-    """
-    from .course import fetch_course
-    from .course_attrs import course_attr_is_true, fetch_all_course_attributes
-
-    course = await fetch_course(course_name)
-    # Grades are shown as a percent of each assignment's points unless the course
-    # has opted into raw points.
-    course_attrs = await fetch_all_course_attributes(course.id)
-    show_points = course_attr_is_true(course_attrs, "show_points")
-
-    async with async_session() as session:
-        assignment_rows = (
-            (
-                await session.execute(
-                    select(Assignment)
-                    .where(Assignment.course == course.id)
-                    .order_by(Assignment.duedate, Assignment.id)
-                )
-            )
-            .scalars()
-            .all()
-        )
-        assignment_ids = [a.id for a in assignment_rows]
-
-        points_map: dict = {}
-        if assignment_ids:
-            points_result = await session.execute(
-                select(
-                    AssignmentQuestion.assignment_id,
-                    func.sum(AssignmentQuestion.points),
-                )
-                .where(AssignmentQuestion.assignment_id.in_(assignment_ids))
-                .group_by(AssignmentQuestion.assignment_id)
-            )
-            for aid, total in points_result.all():
-                points_map[aid] = int(total or 0)
-
-        instructor_ids = set(
-            (
-                await session.execute(
-                    select(CourseInstructor.instructor).where(
-                        CourseInstructor.course == course.id
-                    )
-                )
-            )
-            .scalars()
-            .all()
-        )
-
-        student_rows = (
-            (
-                await session.execute(
-                    select(AuthUser)
-                    .join(UserCourse, UserCourse.user_id == AuthUser.id)
-                    .where(UserCourse.course_id == course.id)
-                    .order_by(
-                        AuthUser.last_name, AuthUser.first_name, AuthUser.username
-                    )
-                )
-            )
-            .scalars()
-            .all()
-        )
-        students = [s for s in student_rows if s.id not in instructor_ids]
-        id_to_sid = {s.id: s.username for s in students}
-
-        grade_rows = []
-        if assignment_ids:
-            grade_rows = (
-                await session.execute(
-                    select(
-                        Grade.auth_user,
-                        Grade.assignment,
-                        Grade.score,
-                        Grade.manual_total,
-                    ).where(Grade.assignment.in_(assignment_ids))
-                )
-            ).all()
-
-    released_map = {a.id: bool(a.released) for a in assignment_rows}
-    assignments = [
-        {
-            "id": a.id,
-            "name": a.name,
-            "points": points_map.get(a.id, 0),
-            "duedate": a.duedate.isoformat() if a.duedate else None,
-            "released": bool(a.released),
-        }
-        for a in assignment_rows
-    ]
-    student_list = [
-        {
-            "sid": s.username,
-            "name": f"{s.first_name} {s.last_name}".strip() or s.username,
-        }
-        for s in students
-    ]
-
-    cells = []
-    sums: dict = {}
-    for auth_user, assignment_id, score, manual_total in grade_rows:
-        sid = id_to_sid.get(auth_user)
-        if sid is None:
-            continue
-        cells.append(
-            {
-                "sid": sid,
-                "assignment_id": assignment_id,
-                "score": score,
-                "released": released_map.get(assignment_id, False),
-                "manual_total": bool(manual_total),
-            }
-        )
-        if score is not None:
-            bucket = sums.setdefault(assignment_id, [0.0, 0])
-            bucket[0] += score
-            bucket[1] += 1
-
-    averages = {
-        str(a.id): (
-            round(sums[a.id][0] / sums[a.id][1], 2)
-            if a.id in sums and sums[a.id][1]
-            else None
-        )
-        for a in assignment_rows
-    }
-
-    return {
-        "assignments": assignments,
-        "students": student_list,
-        "cells": cells,
-        "averages": averages,
-        "show_points": show_points,
-    }
-
-
 async def fetch_grade(userid: int, assignmentid: int) -> Optional[GradeValidator]:
     """
     Fetch the Grade object for the given user and assignment.
@@ -1344,11 +1271,114 @@ async def upsert_grade(grade: GradeValidator) -> GradeValidator:
         rslogger.error(f"IntegrityError: {e} id = {new_grade.id}")
         success = False
     if success:
+        await record_grades(
+            new_grade.assignment,
+            {new_grade.auth_user: (new_grade.score, new_grade.manual_total)},
+        )
         return GradeValidator.from_orm(new_grade)
     else:
         return await fetch_grade(grade.auth_user, grade.assignment)
 
 
+async def upsert_grade_totals(
+    assignment_id: int, updates: Dict[int, float], inserts: Dict[int, float]
+) -> None:
+    """
+    Write many students' assignment totals in one transaction.
+
+    :param assignment_id: int, the assignment id
+    :param updates: Dict[int, float], new total by auth_user id, for students
+        who already have a grades row
+    :param inserts: Dict[int, float], total by auth_user id, for students who
+        do not; their rows are created with ``manual_total`` off
+    """
+    grades = Grade.__table__
+    update_stmt = (
+        update(grades)
+        .where(
+            (grades.c.auth_user == bindparam("uid"))
+            & (grades.c.assignment == assignment_id)
+        )
+        .values(score=bindparam("total"))
+    )
+    rows = [
+        dict(auth_user=uid, assignment=assignment_id, score=total, manual_total=False)
+        for uid, total in inserts.items()
+    ]
+    try:
+        async with async_session.begin() as session:
+            if updates:
+                await session.execute(
+                    update_stmt,
+                    [dict(uid=uid, total=total) for uid, total in updates.items()],
+                )
+            if rows:
+                await session.execute(insert(grades), rows)
+    except (IntegrityError, UniqueViolationError) as e:
+        # A student's first graded answer created their row in the meantime;
+        # write the new rows one at a time instead.
+        rslogger.info(f"Bulk grade insert collided, retrying row by row: {e}")
+        async with async_session.begin() as session:
+            if updates:
+                await session.execute(
+                    update_stmt,
+                    [dict(uid=uid, total=total) for uid, total in updates.items()],
+                )
+        await record_grades(
+            assignment_id, {uid: (total, None) for uid, total in updates.items()}
+        )
+        for row in rows:
+            existing = await fetch_grade(row["auth_user"], assignment_id)
+            if existing:
+                existing.score = row["score"]
+                await upsert_grade(existing)
+            else:
+                await upsert_grade(GradeValidator(**row))
+    else:
+        changes = {uid: (total, None) for uid, total in updates.items()}
+        changes.update({uid: (total, False) for uid, total in inserts.items()})
+        await record_grades(assignment_id, changes)
+
+
+async def increment_grade_score(
+    userid: int, assignmentid: int, delta: float
+) -> Optional[float]:
+    """
+    Add ``delta`` to a student's assignment total in one atomic statement.
+
+    Only an automatically maintained total can be adjusted this way. Nothing is
+    changed, and None is returned, when the student has no grades row yet, when
+    the total is pinned (``manual_total``), or when the assignment uses
+    threshold scoring, whose total is not a plain sum; the caller then falls
+    back to a full recompute.
+
+    :param userid: int, the auth_user id
+    :param assignmentid: int, the assignment id
+    :param delta: float, the change in one question's score
+    :return: Optional[float], the new total, or None if nothing was updated
+    """
+    no_threshold = select(Assignment.id).where(
+        (Assignment.id == assignmentid)
+        & or_(Assignment.threshold_pct.is_(None), Assignment.threshold_pct == 0)
+    )
+    stmt = (
+        update(Grade)
+        .where(
+            (Grade.auth_user == userid)
+            & (Grade.assignment == assignmentid)
+            & (Grade.manual_total == False)  # noqa: E712
+            & Grade.assignment.in_(no_threshold)
+        )
+        .values(score=func.coalesce(Grade.score, 0) + delta)
+        .returning(Grade.score)
+    )
+    async with async_session.begin() as session:
+        score = (await session.execute(stmt)).scalar_one_or_none()
+    if score is not None:
+        await record_grades(assignmentid, {userid: (score, None)})
+    return score
+
+
 async def set_manual_total(
     userid: int,
     assignmentid: int,
@@ -1384,14 +1414,17 @@ async def set_manual_total(
 
 
 async def delete_assignment(assignment_id: int) -> None:
+    course_id = None
     try:
         async with async_session.begin() as session:
             assignment = await session.get(Assignment, assignment_id)
             if assignment:
+                course_id = assignment.course
                 await session.delete(assignment)
     except Exception as e:
         rslogger.error(f"Unable to remove assignment {assignment_id}. {e}")
         raise e
+    await invalidate_scoring_specs(course_id)
 
 
 async def duplicate_assignment(
@@ -1485,8 +1518,10 @@ async def duplicate_assignment(
         rslogger.debug(
             f"Successfully duplicated assignment {original_assignment_id} as {new_assignment.id}"
         )
+        result = AssignmentValidator.from_orm(new_assignment), new_name
 
-        return AssignmentValidator.from_orm(new_assignment), new_name
+    await invalidate_scoring_specs(course_id)
+    return result
 
 
 def term_start_utc(
@@ -2244,6 +2279,7 @@ async def import_assignment(
         f"into {target_course.course_name} as {result.id} ({new_name}) with "
         f"{len(rows_to_import)} questions, {skipped_readings} readings skipped"
     )
+    await invalidate_scoring_specs(result.course)
     return ImportedAssignment(result, new_name, skipped_readings, duedate_warning)
 
 
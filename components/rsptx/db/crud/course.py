@@ -29,20 +29,43 @@ from ..models import (
     Useinfo,
 )
 from ..async_session import async_session
+from ..cache import VersionedCache
+from .gradebook import fetch_enrolled_course_ids, invalidate_gradebooks
+from .user import invalidate_user_cache, user_cache
+from rsptx.configuration import settings
 from rsptx.logging import rslogger
 
 
 # Courses
 # -------
+# Most authenticated requests load the user's current course by name right
+# after loading the user, so :func:`fetch_course` answers from ``course_cache``.
+# Courses change rarely and from few places, so the cache has one version
+# counter: every function here that writes ``courses`` reloads them all.
+course_cache = VersionedCache(
+    "courses",
+    ttl=settings.session_cache_seconds,
+    maxsize=settings.session_cache_size,
+    per_key=False,
+)
+
+
 async def fetch_course(course_name: str) -> CoursesValidator:
     """
     Fetches a course by its name.
 
+    The result comes from ``course_cache`` and is shared with other requests,
+    so treat it as read-only.
+
     :param course_name: The name of the course to be fetched.
     :type course_name: str
     :return: A CoursesValidator instance representing the fetched course.
     :rtype: CoursesValidator
     """
+    return await course_cache.get(course_name, lambda: _load_course(course_name))
+
+
+async def _load_course(course_name: str) -> CoursesValidator:
     query = select(Courses).where(Courses.course_name == course_name)
     async with async_session() as session:
         res = await session.execute(query)
@@ -137,9 +160,14 @@ async def create_course(course_info: CoursesValidator) -> None:
     :type course_info: CoursesValidator
     :return: None
     """
+    from .crud import invalidate_feedback_course
+
     new_course = Courses(**course_info.dict())
     async with async_session.begin() as session:
         session.add(new_course)
+    # A request for this course name may have been answered "no such course".
+    await course_cache.invalidate_all()
+    await invalidate_feedback_course(course_info.course_name)
     return new_course
 
 
@@ -226,6 +254,8 @@ async def create_user_course_entry(user_id: int, course_id: int) -> UserCourse:
     new_uc = UserCourse(user_id=user_id, course_id=course_id)
     async with async_session.begin() as session:
         session.add(new_uc)
+    await invalidate_user_cache([user_id])
+    await invalidate_gradebooks([course_id])
 
     return new_uc
 
@@ -242,6 +272,8 @@ async def delete_user_course_entry(user_id: int, course_id: int) -> None:
     )
     async with async_session.begin() as session:
         await session.execute(query)
+    await invalidate_user_cache([user_id])
+    await invalidate_gradebooks([course_id])
 
 
 # -----------------------------------------------------------------------
@@ -348,6 +380,25 @@ async def delete_course_completely(course_name: str) -> bool:
     :param course_name: str, the name of the course to delete
     :return: bool, True if the course was deleted, False if it did not exist
     """
+    moved = await _delete_course_completely(course_name)
+    if moved is None:
+        return False
+    # Only once the transaction has committed, so no worker can reload and
+    # keep the old rows.
+    await course_cache.invalidate_all()
+    for username in moved:
+        await user_cache.invalidate(username)
+    # The moved students now appear in the base course's gradebook.
+    if moved:
+        await invalidate_gradebooks(
+            await fetch_enrolled_course_ids(AuthUser.username.in_(moved))
+        )
+    return True
+
+
+async def _delete_course_completely(course_name: str) -> Optional[List[str]]:
+    """Run the deletion; return the usernames of the students moved out of
+    the course, or None if there is no such course."""
     # A single transaction: if any step fails, nothing is deleted.
     async with async_session.begin() as session:
         course_result = await session.execute(
@@ -357,7 +408,7 @@ async def delete_course_completely(course_name: str) -> bool:
 
         if not course:
             rslogger.warning(f"Course {course_name} not found for deletion")
-            return False
+            return None
 
         course_id = course.id
         rslogger.info(f"Starting deletion of course: {course_name} (ID: {course_id})")
@@ -411,6 +462,15 @@ async def delete_course_completely(course_name: str) -> bool:
         #    constraint requirement, but it has to happen while we still know
         #    which students were enrolled.
         rslogger.info("Updating student enrollments...")
+        moved = (
+            (
+                await session.execute(
+                    select(AuthUser.username).where(AuthUser.course_id == course_id)
+                )
+            )
+            .scalars()
+            .all()
+        )
         await session.execute(
             update(AuthUser)
             .where(AuthUser.course_id == course_id)
@@ -440,7 +500,7 @@ async def delete_course_completely(course_name: str) -> bool:
         await session.execute(delete(Courses).where(Courses.id == course_id))
 
         rslogger.info(f"Successfully deleted course: {course_name}")
-        return True
+        return list(moved)
 
 
 async def delete_course_instructor(course_id: int, instructor_id: int) -> None:
@@ -459,6 +519,7 @@ async def delete_course_instructor(course_id: int, instructor_id: int) -> None:
     async with async_session() as session:
         await session.execute(stmt)
         await session.commit()
+    await invalidate_gradebooks([course_id])
 
 
 async def create_course_instructor(course_id: int, instructor_id: int) -> None:
@@ -472,6 +533,7 @@ async def create_course_instructor(course_id: int, instructor_id: int) -> None:
     new_entry = CourseInstructor(course=course_id, instructor=instructor_id)
     async with async_session.begin() as session:
         session.add(new_entry)
+    await invalidate_gradebooks([course_id])
 
 
 async def update_course_settings(course_id: int, setting: str, value: str) -> None:
@@ -566,6 +628,10 @@ async def update_course_settings(course_id: int, setting: str, value: str) -> No
                 session.add(new_attr)
 
         await session.commit()
+    if setting in ["new_date", "allow_pairs", "downloads_enabled", "timezone"]:
+        await course_cache.invalidate_all()
+    elif setting == "show_points":
+        await invalidate_gradebooks([course_id])
 
 
 async def fetch_available_students_for_instructor_add(
@@ -679,6 +745,7 @@ async def create_instructor_course_entry(iid: int, cid: int) -> CourseInstructor
         if ci is None:
             ci = CourseInstructor(course=cid, instructor=iid)
             session.add(ci)
+    await invalidate_gradebooks([cid])
     return ci
 
 
@@ -2,6 +2,7 @@ from sqlalchemy import select
 
 from ..models import CourseAttribute, Courses
 from ..async_session import async_session
+from .gradebook import invalidate_gradebooks
 from rsptx.logging import rslogger
 
 
@@ -50,6 +51,8 @@ async def create_course_attribute(course_id: int, attr: str, value: str):
     new_attr = CourseAttribute(course_id=course_id, attr=attr, value=value)
     async with async_session.begin() as session:
         session.add(new_attr)
+    if attr == "show_points":
+        await invalidate_gradebooks([course_id])
 
 
 async def copy_course_attributes(basecourse_id: int, new_course_id: int):
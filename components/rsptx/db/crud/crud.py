@@ -18,7 +18,7 @@ turned into reusable functions that are defined in this file.
 import datetime
 import hashlib
 import json
-from typing import Dict, Optional, Any
+from typing import Dict, NamedTuple, Optional, Any
 import traceback
 
 # Third-party imports
@@ -30,8 +30,10 @@ from starlette.requests import Request
 
 # Local application imports
 # -------------------------
+from rsptx.configuration import settings
 from rsptx.logging import rslogger
 from ..async_session import async_session
+from ..cache import VersionedCache
 from rsptx.response_helpers.core import canonical_utcnow
 from rsptx.db.models import (
     AuthUserValidator,
@@ -105,41 +107,101 @@ def is_interaction_event(event: str, act: str) -> bool:
 
 # Server-side grading
 # -------------------
+# ``is_server_feedback`` runs on every answer event, yet almost every question
+# is graded on the client and has no feedback at all. The feedback of a base
+# course's server-graded questions is decoded once into a per-base-course map
+# and kept in ``server_feedback_cache``; a question missing from the map is
+# graded on the client. Question edits and book builds call
+# :func:`invalidate_server_feedback` (or its blocking twin) for the base course.
+server_feedback_cache = VersionedCache(
+    "server_feedback", ttl=settings.server_feedback_cache_seconds, maxsize=512
+)
+# course_name -> the course's base course and ``login_required`` flag, neither of
+# which changes after the course is created. A name with no course is cached as
+# None too; ``create_course`` calls :func:`invalidate_feedback_course`.
+_feedback_course_cache = VersionedCache(
+    "feedback_course", ttl=settings.server_feedback_cache_seconds, maxsize=4096
+)
+
+
+class _FeedbackCourse(NamedTuple):
+    base_course: str
+    login_required: bool
+
+
+async def invalidate_server_feedback(base_course: Optional[str]) -> None:
+    """
+    Drop the cached server feedback for a base course on every worker.
+
+    :param base_course: str, the base course whose questions changed
+    """
+    if base_course:
+        await server_feedback_cache.invalidate(base_course)
+
+
+async def invalidate_feedback_course(course_name: str) -> None:
+    """
+    Forget, on every worker, what is known about a course for server feedback.
+
+    :param course_name: str, a course that has just been created
+    """
+    await _feedback_course_cache.invalidate(course_name)
+
+
+async def _load_feedback_course(course: str) -> Optional[_FeedbackCourse]:
+    query = select(Courses.base_course, Courses.login_required).where(
+        Courses.course_name == course
+    )
+    async with async_session() as session:
+        row = (await session.execute(query)).first()
+    return row and _FeedbackCourse(row.base_course, bool(row.login_required))
+
+
+async def _load_server_feedback(base_course: str) -> Dict[str, Dict[str, Any]]:
+    query = select(Question.name, Question.feedback).where(
+        (Question.base_course == base_course)
+        & Question.feedback.is_not(None)
+        & (Question.feedback != "")
+    )
+    async with async_session() as session:
+        rows = (await session.execute(query)).all()
+
+    feedback: Dict[str, Dict[str, Any]] = {}
+    for name, blob in rows:
+        if name in feedback:
+            continue
+        try:
+            feedback[name] = json.loads(blob)
+        except json.JSONDecodeError as e:
+            # Leave it out, so the question is graded on the client.
+            rslogger.error(
+                f"Failed to decode feedback for div_id {name} in {base_course}: {e}"
+            )
+    return feedback
+
+
 # Return the feedback associated with this question if this question should be graded on the server instead of on the client; otherwise, return None.
 async def is_server_feedback(div_id: str, course: str) -> Optional[Dict[str, Any]]:
     """
     Check if server feedback is available for the given div id (div_id) and course name (course).
     If server feedback is available and login is required, return the decoded feedback.
 
+    The returned dict is shared with other callers and must not be modified.
+
     :param div_id: str, the id of the div element
     :param course: str, the name of the course
     :return: Optional[Dict[str, Any]], a dictionary representing the decoded feedback (if available)
     """
-    # Get the information about this question.
-    query = (
-        select(Question, Courses)
-        .where(Question.name == div_id)
-        .join(Courses, Question.base_course == Courses.base_course)
-        .where(Courses.course_name == course)
+    info = await _feedback_course_cache.get(
+        course, lambda: _load_feedback_course(course)
     )
-    async with async_session() as session:
-        query_results = (await session.execute(query)).first()
-
-        # Get the feedback, if it exists.
-        feedback = query_results and query_results.Question.feedback
-        # If there's feedback and a login is required (necessary for server-side grading), return the decoded feedback.
-        try:
-            if feedback and query_results.Courses.login_required:
-                # Decode the feedback from JSON.
-                return json.loads(feedback)
-        except json.JSONDecodeError as e:
-            rslogger.error(
-                f"Failed to decode feedback for div_id {div_id} in course {course}: {e}"
-            )
-            # If decoding fails, we log the error and return None.
-            return None
-        # Otherwise, grade on the client.
+    # Server-side grading needs a login; otherwise, grade on the client.
+    if not info or not info.login_required:
         return None
+    feedback = await server_feedback_cache.get(
+        info.base_course, lambda: _load_server_feedback(info.base_course)
+    )
+    return feedback.get(div_id)
 
 
 # Development and Testing Utils
@@ -0,0 +1,561 @@
+"""
+The instructor gradebook: every assignment in a course against every student.
+
+Building the matrix reads the course's assignments, their question points, its
+instructors, its roster and every ``grades`` row, which for a large course is a
+few hundred thousand rows -- too much to redo each time the grader page is
+refreshed. Each course's matrix is instead kept as a :class:`GradebookSnapshot`
+in ``gradebook_cache``:
+
+* A grade write (``upsert_grade``, ``upsert_grade_totals``,
+  ``increment_grade_score``, and so ``set_manual_total``) calls
+  :func:`record_grades`, which patches the changed cells into this worker's
+  snapshot and makes every other worker reload theirs.
+* Anything else the matrix shows -- the assignments, the roster, the
+  instructors, student names, the ``show_points`` attribute -- calls
+  :func:`invalidate_gradebooks` for the courses it changed.
+
+A snapshot also keeps its encoded JSON, so until the next change every request
+for it is answered without touching the database or re-encoding, and the
+ETag that goes with it lets a client that already has it get a 304.
+"""
+
+import hashlib
+import json
+from dataclasses import dataclass, field
+from typing import (
+    Any,
+    AsyncIterator,
+    Dict,
+    Iterable,
+    List,
+    NamedTuple,
+    Optional,
+    Tuple,
+)
+
+from sqlalchemy import func, select
+
+from ..models import (
+    Assignment,
+    AssignmentQuestion,
+    AuthUser,
+    CourseInstructor,
+    Grade,
+    UserCourse,
+)
+from ..async_session import async_session
+from ..cache import VersionedCache
+from rsptx.configuration import settings
+
+#: The encodings :meth:`GradebookSnapshot.encode` can produce.
+GRADEBOOK_FORMATS = ("cells", "columnar")
+
+gradebook_cache = VersionedCache(
+    "gradebook",
+    ttl=settings.gradebook_cache_seconds,
+    maxsize=settings.gradebook_cache_size,
+)
+
+# Grade writes name the assignment, not the course, but the snapshot to patch
+# is the course's. An assignment never moves to another course, so this map
+# never goes stale; it is only kept from growing without bound.
+_ASSIGNMENT_COURSES_MAX = 100000
+_assignment_courses: Dict[int, int] = {}
+
+
+@dataclass
+class GradebookSnapshot:
+    """One course's gradebook, as held in ``gradebook_cache``.
+
+    The cached object is shared by every request in the worker; only
+    :func:`record_grades` changes it.
+    """
+
+    course_id: int
+    show_points: bool
+    #: dicts with ``id``, ``name``, ``points``, ``duedate``, ``released``
+    assignments: List[dict]
+    #: dicts with ``sid`` and ``name``; instructors are left out
+    students: List[dict]
+    #: assignment id -> its position in ``assignments``
+    assignment_index: Dict[int, int]
+    #: auth_user id -> the student's position in ``students``
+    student_index: Dict[int, int]
+    #: (student position, assignment position) -> (score, manual_total)
+    grades: Dict[Tuple[int, int], Tuple[Optional[float], bool]]
+    # format -> (encoded body, ETag); emptied by every change
+    _encoded: Dict[str, Tuple[bytes, str]] = field(default_factory=dict)
+
+    def set_grades(
+        self,
+        assignment_id: int,
+        changes: Dict[int, Tuple[Optional[float], Optional[bool]]],
+    ) -> None:
+        """Apply new totals for one assignment; see :func:`record_grades`."""
+        col = self.assignment_index.get(assignment_id)
+        if col is None:
+            return
+        for user_id, (score, manual_total) in changes.items():
+            row = self.student_index.get(user_id)
+            if row is None:
+                # An instructor, or someone no longer enrolled.
+                continue
+            if manual_total is None:
+                manual_total = self.grades.get((row, col), (None, False))[1]
+            self.grades[(row, col)] = (score, bool(manual_total))
+        self._encoded.clear()
+
+    def _averages(self) -> List[Optional[float]]:
+        sums = [0.0] * len(self.assignments)
+        counts = [0] * len(self.assignments)
+        for (_, col), (score, _) in self.grades.items():
+            if score is not None:
+                sums[col] += score
+                counts[col] += 1
+        return [round(s / n, 2) if n else None for s, n in zip(sums, counts)]
+
+    def to_cells(self) -> dict:
+        """The gradebook with one dict per cell, as ``fetch_gradebook`` returns it."""
+        averages = self._averages()
+        cells = []
+        for (row, col), (score, manual_total) in sorted(self.grades.items()):
+            assignment = self.assignments[col]
+            cells.append(
+                {
+                    "sid": self.students[row]["sid"],
+                    "assignment_id": assignment["id"],
+                    "score": score,
+                    "released": assignment["released"],
+                    "manual_total": manual_total,
+                }
+            )
+        return {
+            "assignments": [dict(a) for a in self.assignments],
+            "students": [dict(s) for s in self.students],
+            "cells": cells,
+            "averages": {
+                str(a["id"]): avg for a, avg in zip(self.assignments, averages)
+            },
+            "show_points": self.show_points,
+        }
+
+    def to_columnar(self) -> dict:
+        """
+        The gradebook with the cells as parallel arrays.
+
+        ``cells`` holds ``student`` and ``assignment`` -- positions in
+        ``students`` and ``assignments`` -- and ``score``, one entry per graded
+        cell, plus ``manual_total``, the positions in those arrays of the cells
+        whose total was set by hand. ``averages`` is in the order of
+        ``assignments``. Whether a cell is released is its assignment's
+        ``released``.
+        """
+        rows, cols, scores, manual = [], [], [], []
+        for i, ((row, col), (score, manual_total)) in enumerate(
+            sorted(self.grades.items())
+        ):
+            rows.append(row)
+            cols.append(col)
+            scores.append(score)
+            if manual_total:
+                manual.append(i)
+        return {
+            "assignments": [dict(a) for a in self.assignments],
+            "students": [dict(s) for s in self.students],
+            "cells": {
+                "student": rows,
+                "assignment": cols,
+                "score": scores,
+                "manual_total": manual,
+            },
+            "averages": self._averages(),
+            "show_points": self.show_points,
+        }
+
+    def encode(self, fmt: str = "cells") -> Tuple[bytes, str]:
+        """
+        Return the gradebook as JSON, and a strong ETag for it.
+
+        The result is kept until the snapshot next changes. The ETag is a hash
+        of the body, so every worker gives the same gradebook the same tag.
+
+        :param fmt: str, ``cells`` for :meth:`to_cells`, ``columnar`` for
+            :meth:`to_columnar`
+        :return: tuple of the UTF-8 JSON body and its quoted ETag
+        """
+        if fmt not in GRADEBOOK_FORMATS:
+            raise ValueError(f"Unknown gradebook format {fmt!r}")
+        encoded = self._encoded.get(fmt)
+        if encoded is None:
+            data = self.to_cells() if fmt == "cells" else self.to_columnar()
+            body = json.dumps(data, separators=(",", ":")).encode()
+            etag = f'"{hashlib.blake2b(body, digest_size=16).hexdigest()}"'
+            encoded = self._encoded[fmt] = (body, etag)
+        return encoded
+
+
+async def _fetch_assignments(session, course_id: int):
+    """A course's assignments by due date, and a map of assignment id to the
+    sum of its questions' points, which is what the gradebook counts them as
+    being worth."""
+    assignment_rows = (
+        (
+            await session.execute(
+                select(Assignment)
+                .where(Assignment.course == course_id)
+                .order_by(Assignment.duedate, Assignment.id)
+            )
+        )
+        .scalars()
+        .all()
+    )
+    points_map: dict = {}
+    if assignment_rows:
+        points_result = await session.execute(
+            select(
+                AssignmentQuestion.assignment_id,
+                func.sum(AssignmentQuestion.points),
+            )
+            .where(
+                AssignmentQuestion.assignment_id.in_([a.id for a in assignment_rows])
+            )
+            .group_by(AssignmentQuestion.assignment_id)
+        )
+        for aid, total in points_result.all():
+            points_map[aid] = int(total or 0)
+    return assignment_rows, points_map
+
+
+def _student_name(student) -> str:
+    return f"{student.first_name} {student.last_name}".strip() or student.username
+
+
+async def _load_gradebook(course_id: int) -> GradebookSnapshot:
+    from .course_attrs import course_attr_is_true, fetch_all_course_attributes
+
+    # Grades are shown as a percent of each assignment's points unless the course
+    # has opted into raw points.
+    course_attrs = await fetch_all_course_attributes(course_id)
+    show_points = course_attr_is_true(course_attrs, "show_points")
+
+    async with async_session() as session:
+        assignment_rows, points_map = await _fetch_assignments(session, course_id)
+        assignment_ids = [a.id for a in assignment_rows]
+
+        instructor_ids = set(
+            (
+                await session.execute(
+                    select(CourseInstructor.instructor).where(
+                        CourseInstructor.course == course_id
+                    )
+                )
+            )
+            .scalars()
+            .all()
+        )
+
+        student_rows = (
+            await session.execute(
+                select(
+                    AuthUser.id,
+                    AuthUser.username,
+                    AuthUser.first_name,
+                    AuthUser.last_name,
+                )
+                .join(UserCourse, UserCourse.user_id == AuthUser.id)
+                .where(UserCourse.course_id == course_id)
+                .order_by(AuthUser.last_name, AuthUser.first_name, AuthUser.username)
+            )
+        ).all()
+        students = [s for s in student_rows if s.id not in instructor_ids]
+
+        grade_rows = []
+        if assignment_ids:
+            grade_rows = (
+                await session.execute(
+                    select(
+                        Grade.auth_user,
+                        Grade.assignment,
+                        Grade.score,
+                        Grade.manual_total,
+                    ).where(Grade.assignment.in_(assignment_ids))
+                )
+            ).all()
+
+    for aid in assignment_ids:
+        _remember_course(aid, course_id)
+    assignment_index = {aid: col for col, aid in enumerate(assignment_ids)}
+    student_index = {s.id: row for row, s in enumerate(students)}
+    grades = {}
+    for auth_user, assignment_id, score, manual_total in grade_rows:
+        row = student_index.get(auth_user)
+        if row is not None:
+            grades[(row, assignment_index[assignment_id])] = (
+                score,
+                bool(manual_total),
+            )
+
+    return GradebookSnapshot(
+        course_id=course_id,
+        show_points=show_points,
+        assignments=[
+            {
+                "id": a.id,
+                "name": a.name,
+                "points": points_map.get(a.id, 0),
+                "duedate": a.duedate.isoformat() if a.duedate else None,
+                "released": bool(a.released),
+            }
+            for a in assignment_rows
+        ],
+        students=[{"sid": s.username, "name": _student_name(s)} for s in students],
+        assignment_index=assignment_index,
+        student_index=student_index,
+        grades=grades,
+    )
+
+
+async def fetch_gradebook_snapshot(course_id: int) -> GradebookSnapshot:
+    """
+    Return the course's gradebook from ``gradebook_cache``.
+
+    The snapshot is shared with other requests: read it, or encode it, but do
+    not change it.
+
+    :param course_id: int, the course id
+    :return: GradebookSnapshot
+    """
+    return await gradebook_cache.get(course_id, lambda: _load_gradebook(course_id))
+
+
+async def fetch_gradebook(course_name: str) -> dict:
+    """
+    Build the gradebook matrix for a course: every assignment, every enrolled
+    student (instructors excluded), and the per-(student, assignment) total score
+    from the ``grades`` table, plus the class average per assignment.
+
+    Read-only aggregation used only by the Assignment Builder grader, answered
+    from the course's cached :class:`GradebookSnapshot`.
+
+    :param course_name: str, the course name
+    :return: dict with ``assignments``, ``students``, ``cells``, ``averages`` and
+        ``show_points``
+    """
+    from .course import fetch_course
+
+    course = await fetch_course(course_name)
+    return (await fetch_gradebook_snapshot(course.id)).to_cells()
+
+
+def _remember_course(assignment_id: int, course_id: int) -> None:
+    if len(_assignment_courses) >= _ASSIGNMENT_COURSES_MAX:
+        _assignment_courses.clear()
+    _assignment_courses[assignment_id] = course_id
+
+
+async def _course_of_assignment(assignment_id: int) -> Optional[int]:
+    course_id = _assignment_courses.get(assignment_id)
+    if course_id is None:
+        query = select(Assignment.course).where(Assignment.id == assignment_id)
+        async with async_session() as session:
+            course_id = (await session.execute(query)).scalar_one_or_none()
+        if course_id is not None:
+            _remember_course(assignment_id, course_id)
+    return course_id
+
+
+async def record_grades(
+    assignment_id: int,
+    changes: Dict[int, Tuple[Optional[float], Optional[bool]]],
+) -> None:
+    """
+    Patch students' new totals on one assignment into the course's gradebook.
+
+    Call it after the write has committed.
+
+    :param assignment_id: int, the assignment id
+    :param changes: auth_user id -> (score, manual_total); a ``manual_total``
+        of None means the write left the flag as it was
+    """
+    if not changes:
+        return
+    course_id = await _course_of_assignment(assignment_id)
+    if course_id is None:
+        return
+    await gradebook_cache.patch(
+        course_id, lambda snapshot: snapshot.set_grades(assignment_id, changes)
+    )
+
+
+async def invalidate_gradebooks(course_ids: Iterable[Optional[int]]) -> None:
+    """Drop the cached gradebooks of the given courses on every worker."""
+    for course_id in set(course_ids):
+        if course_id is not None:
+            await gradebook_cache.invalidate(course_id)
+
+
+async def fetch_enrolled_course_ids(users) -> List[int]:
+    """
+    Return the ids of every course the matching users are enrolled in, whose
+    gradebooks list them.
+
+    :param users: a SQLAlchemy condition on ``AuthUser``, e.g.
+        ``AuthUser.id == user_id``
+    """
+    query = (
+        select(UserCourse.course_id)
+        .distinct()
+        .join(AuthUser, AuthUser.id == UserCourse.user_id)
+        .where(users)
+    )
+    async with async_session() as session:
+        return list((await session.execute(query)).scalars().all())
+
+
+class GradebookPageRows(NamedTuple):
+    """What the server-rendered instructor gradebook page is built from."""
+
+    #: (score, assignment id, auth_user id) for every grade on an assignment
+    #: that has points, instructors' excluded
+    scores: List[Tuple[Any, ...]]
+    #: (id, name, points) of every assignment, by due date
+    assignments: List[Tuple[Any, ...]]
+    #: (id, username, first_name, last_name, email) of every enrolled
+    #: student, by name, instructors excluded
+    students: List[Tuple[Any, ...]]
+
+
+async def fetch_gradebook_page_rows(course_id: int) -> GradebookPageRows:
+    """
+    Read the rows the server-rendered gradebook page pivots, in one session.
+
+    Unlike :class:`GradebookSnapshot` this uses each assignment's own
+    ``points`` and the students' separate name and email columns, as that
+    page always has.
+
+    :param course_id: int, the course id
+    :return: GradebookPageRows
+    """
+    instructors = select(CourseInstructor.instructor).where(
+        CourseInstructor.course == course_id
+    )
+    scores = (
+        select(Grade.score, Grade.assignment, Grade.auth_user)
+        .join(Assignment, Grade.assignment == Assignment.id)
+        .where(
+            Assignment.points.is_not(None)
+            & (Assignment.course == course_id)
+            & Grade.auth_user.not_in(instructors)
+        )
+    )
+    assignments = (
+        select(Assignment.id, Assignment.name, Assignment.points)
+        .where(Assignment.course == course_id)
+        .order_by(Assignment.duedate, Assignment.id)
+    )
+    students = (
+        select(
+            AuthUser.id,
+            AuthUser.username,
+            AuthUser.first_name,
+            AuthUser.last_name,
+            AuthUser.email,
+        )
+        .join(UserCourse, UserCourse.user_id == AuthUser.id)
+        .where((UserCourse.course_id == course_id) & AuthUser.id.not_in(instructors))
+        .order_by(AuthUser.last_name, AuthUser.first_name)
+    )
+    async with async_session() as session:
+        return GradebookPageRows(
+            scores=[tuple(r) for r in (await session.execute(scores)).all()],
+            assignments=[tuple(r) for r in (await session.execute(assignments)).all()],
+            students=[tuple(r) for r in (await session.execute(students)).all()],
+        )
+
+
+#: How many rows :func:`stream_gradebook_rows` asks the database cursor for at
+#: a time.
+GRADEBOOK_STREAM_BATCH = 500
+
+
+async def fetch_gradebook_columns(course_id: int) -> Tuple[bool, List[dict]]:
+    """
+    Return what a gradebook export needs before its first row: whether the
+    course shows raw points, and its assignments by due date as dicts with
+    ``id``, ``name`` and ``points``, counted as :class:`GradebookSnapshot` counts
+    them.
+
+    :param course_id: int, the course id
+    :return: tuple of ``show_points`` and the assignments
+    """
+    from .course_attrs import course_attr_is_true, fetch_all_course_attributes
+
+    course_attrs = await fetch_all_course_attributes(course_id)
+    async with async_session() as session:
+        assignment_rows, points_map = await _fetch_assignments(session, course_id)
+    return course_attr_is_true(course_attrs, "show_points"), [
+        {"id": a.id, "name": a.name, "points": points_map.get(a.id, 0)}
+        for a in assignment_rows
+    ]
+
+
+async def stream_gradebook_rows(
+    course_id: int,
+) -> AsyncIterator[Tuple[dict, Dict[int, Optional[float]]]]:
+    """
+    Yield a course's gradebook one student at a time, for exports too large to
+    hold in memory.
+
+    Students and their grades are read as one ordered join through a
+    server-side cursor, :data:`GRADEBOOK_STREAM_BATCH` rows at a time, rather
+    than from ``gradebook_cache``, so an export neither fills nor waits on the
+    cache. Students come in the order the gradebook lists them, instructors
+    left out.
+
+    :param course_id: int, the course id
+    :return: async iterator of (dict with ``sid`` and ``name``, assignment id ->
+        score) per student; assignments the student has no grade for are absent
+    """
+    instructors = select(CourseInstructor.instructor).where(
+        CourseInstructor.course == course_id
+    )
+    assignments = select(Assignment.id).where(Assignment.course == course_id)
+    query = (
+        select(
+            AuthUser.id,
+            AuthUser.username,
+            AuthUser.first_name,
+            AuthUser.last_name,
+            Grade.assignment,
+            Grade.score,
+        )
+        .join(UserCourse, UserCourse.user_id == AuthUser.id)
+        .outerjoin(
+            Grade,
+            (Grade.auth_user == AuthUser.id) & Grade.assignment.in_(assignments),
+        )
+        .where((UserCourse.course_id == course_id) & AuthUser.id.not_in(instructors))
+        .order_by(
+            AuthUser.last_name, AuthUser.first_name, AuthUser.username, AuthUser.id
+        )
+        .execution_options(yield_per=GRADEBOOK_STREAM_BATCH)
+    )
+    async with async_session() as session:
+        result = await session.stream(query)
+        student = None
+        scores: Dict[int, Optional[float]] = {}
+        async for row in result:
+            # Each student's rows are consecutive; a new id starts the next one.
+            if student is None or row.id != student.id:
+                if student is not None:
+                    yield _export_student(student), scores
+                student, scores = row, {}
+            if row.assignment is not None:
+                scores[row.assignment] = row.score
+        if student is not None:
+            yield _export_student(student), scores
+
+
+def _export_student(row) -> dict:
+    return {"sid": row.username, "name": _student_name(row)}
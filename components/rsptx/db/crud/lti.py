@@ -1,5 +1,5 @@
 import uuid
-from typing import List, Optional
+from typing import List, NamedTuple, Optional
 from rsptx.configuration import settings
 from pydal.validators import CRYPT
 from sqlalchemy import select, delete
@@ -23,6 +23,27 @@ from ..models import (
     PracticeGrade,
 )
 from ..async_session import async_session
+from ..cache import VersionedCache
+from .gradebook import record_grades
+
+
+# LTI cache
+# ---------
+# Every scored answer asks which LTI version its course uses, and every grade
+# push needs the course's LTI 1.1 key or LTI 1.3 grading link. None of these
+# change except when a course is linked to or unlinked from an LMS, so they
+# are kept in ``lti_cache``. It has one version counter for all its keys:
+# linking is rare and touches courses, platforms and assignments alike, so
+# every function below that writes LTI configuration simply calls
+# :func:`invalidate_lti_cache`, and every worker reloads what it needs.
+lti_cache = VersionedCache(
+    "lti", ttl=settings.lti_cache_seconds, maxsize=8192, per_key=False
+)
+
+
+async def invalidate_lti_cache() -> None:
+    """Drop every cached LTI lookup on every worker."""
+    await lti_cache.invalidate_all()
 
 
 # -----------------------------------------------------------------------
@@ -51,7 +72,8 @@ async def upsert_lti1p3_config(config: Lti1p3Conf) -> Lti1p3Conf:
             session.add(config)
             ret = config
         await session.commit()
-        return ret
+    await invalidate_lti_cache()
+    return ret
 
 
 async def fetch_lti1p3_config(id: int) -> Lti1p3Conf:
@@ -101,7 +123,8 @@ async def upsert_lti1p3_course(course: Lti1p3Course) -> Lti1p3Course:
             session.add(course)
             ret = course
         await session.commit()
-        return ret
+    await invalidate_lti_cache()
+    return ret
 
 
 async def delete_lti1p3_course(rs_course_id: int) -> int:
@@ -112,7 +135,8 @@ async def delete_lti1p3_course(rs_course_id: int) -> int:
     async with async_session() as session:
         res = await session.execute(query)
         await session.commit()
-        return res.rowcount
+    await invalidate_lti_cache()
+    return res.rowcount
 
 
 async def fetch_lti1p3_course(
@@ -292,7 +316,8 @@ async def upsert_lti1p3_assignment(assignment: Lti1p3Assignment) -> Lti1p3Assign
             session.add(new_assignment)
             ret = new_assignment
         await session.commit()
-        return ret
+    await invalidate_lti_cache()
+    return ret
 
 
 async def fetch_lti1p3_assignments_by_rs_assignment_id(
@@ -328,31 +353,63 @@ async def fetch_lti1p3_assignments_by_rs_course_id(
         return assignments
 
 
+class Lti1p3GradingData(NamedTuple):
+    """What it takes to send grades for one assignment to its LTI 1.3 platform."""
+
+    rs_assignment_id: int
+    lti_lineitem_id: str
+    #: with ``lti_config`` and ``rs_course`` loaded
+    lti1p3_course: Lti1p3Course
+    rs_assignment: Assignment
+
+
+async def _load_lti1p3_grading_link(
+    rs_assignment_id: int,
+) -> Optional[Lti1p3Assignment]:
+    query = (
+        select(Lti1p3Assignment)
+        .join(Lti1p3Course, Lti1p3Course.id == Lti1p3Assignment.lti1p3_course_id)
+        .where(Lti1p3Assignment.rs_assignment_id == rs_assignment_id)
+        .options(
+            joinedload(Lti1p3Assignment.lti1p3_course).joinedload(
+                Lti1p3Course.lti_config
+            ),
+            joinedload(Lti1p3Assignment.lti1p3_course).joinedload(
+                Lti1p3Course.rs_course
+            ),
+        )
+    )
+    async with async_session() as session:
+        res = await session.execute(query)
+        return res.scalars().one_or_none()
+
+
 async def fetch_lti1p3_grading_data_for_assignment(
     rs_assignment_id: int,
-) -> Lti1p3Assignment:
+) -> Optional[Lti1p3GradingData]:
     """
     Fetch data needed to submit grades for a particular assignment
+
+    The link to the platform -- line item, course and credentials -- comes from
+    ``lti_cache``. The assignment itself is read fresh, since whether it is
+    released and what it is worth change without any LTI write.
     """
+    link = await lti_cache.get(
+        ("lti1p3_link", rs_assignment_id),
+        lambda: _load_lti1p3_grading_link(rs_assignment_id),
+    )
+    if link is None:
+        return None
     async with async_session() as session:
-        query = (
-            select(Lti1p3Assignment)
-            .join(Lti1p3Course, Lti1p3Course.id == Lti1p3Assignment.lti1p3_course_id)
-            .where(Lti1p3Assignment.rs_assignment_id == rs_assignment_id)
-            .options(
-                joinedload(Lti1p3Assignment.rs_assignment),
-                joinedload(Lti1p3Assignment.lti1p3_course),
-                joinedload(Lti1p3Assignment.lti1p3_course).joinedload(
-                    Lti1p3Course.lti_config
-                ),
-                joinedload(Lti1p3Assignment.lti1p3_course).joinedload(
-                    Lti1p3Course.rs_course
-                ),
-            )
-        )
-        res = await session.execute(query)
-        assign = res.scalars().one_or_none()
-        return assign
+        rs_assignment = await session.get(Assignment, rs_assignment_id)
+    if rs_assignment is None:
+        return None
+    return Lti1p3GradingData(
+        rs_assignment_id=rs_assignment_id,
+        lti_lineitem_id=link.lti_lineitem_id,
+        lti1p3_course=link.lti1p3_course,
+        rs_assignment=rs_assignment,
+    )
 
 
 async def validate_user_credentials(
@@ -380,13 +437,7 @@ async def validate_user_credentials(
 # -----------------------------------------------------------------------
 
 
-async def fetch_lti_version(course_id: int) -> str:
-    """
-    Check if a course uses LTI 1.1, 1.3 or none
-
-    :param course_id: int, the id of the course
-    :return: str for LTI version (1.1 or 1.3) or None
-    """
+async def _load_lti_version(course_id: int) -> Optional[str]:
     query = select(CourseLtiMap).where(CourseLtiMap.course_id == course_id)
     query2 = select(Lti1p3Course).where(Lti1p3Course.rs_course_id == course_id)
     async with async_session() as session:
@@ -401,6 +452,20 @@ async def fetch_lti_version(course_id: int) -> str:
         return None
 
 
+async def fetch_lti_version(course_id: int) -> Optional[str]:
+    """
+    Check if a course uses LTI 1.1, 1.3 or none
+
+    Answered from ``lti_cache``, so it is cheap enough for the answer path.
+
+    :param course_id: int, the id of the course
+    :return: str for LTI version (1.1 or 1.3) or None
+    """
+    return await lti_cache.get(
+        ("version", course_id), lambda: _load_lti_version(course_id)
+    )
+
+
 async def create_lti_course(course_id: int, lti_id: str) -> CourseLtiMap:
     """
     Create a new course in the LTI map.
@@ -412,17 +477,12 @@ async def create_lti_course(course_id: int, lti_id: str) -> CourseLtiMap:
     new_entry = CourseLtiMap(course_id=course_id, lti_id=lti_id)
     async with async_session.begin() as session:
         session.add(new_entry)
+    await invalidate_lti_cache()
 
     return new_entry
 
 
-async def fetch_lti1p1_config(course_id: int) -> Optional[LtiKey]:
-    """
-    Fetch the LTI 1.1 key/secret associated with a course, if any.
-
-    :param course_id: int, the id of the course
-    :return: Optional[LtiKey], the LtiKey record for the course or None
-    """
+async def _load_lti1p1_config(course_id: int) -> Optional[LtiKey]:
     query = (
         select(LtiKey)
         .join(CourseLtiMap, CourseLtiMap.lti_id == LtiKey.id)
@@ -433,6 +493,20 @@ async def fetch_lti1p1_config(course_id: int) -> Optional[LtiKey]:
         return res.scalars().first()
 
 
+async def fetch_lti1p1_config(course_id: int) -> Optional[LtiKey]:
+    """
+    Fetch the LTI 1.1 key/secret associated with a course, if any.
+
+    Answered from ``lti_cache``; the record is shared and must not be modified.
+
+    :param course_id: int, the id of the course
+    :return: Optional[LtiKey], the LtiKey record for the course or None
+    """
+    return await lti_cache.get(
+        ("lti1p1_key", course_id), lambda: _load_lti1p1_config(course_id)
+    )
+
+
 async def create_lti1p1_config(course_name: str, course_id: int) -> LtiKey:
     """
     Generate an LTI 1.1 consumer key and secret, store them, and associate them
@@ -450,6 +524,7 @@ async def create_lti1p1_config(course_name: str, course_id: int) -> LtiKey:
         session.add(new_key)
         await session.flush()
         session.add(CourseLtiMap(course_id=course_id, lti_id=new_key.id))
+    await invalidate_lti_cache()
     return new_key
 
 
@@ -515,6 +590,7 @@ async def upsert_lti1p1_grade_link(
     async with async_session.begin() as session:
         res = await session.execute(query)
         grade = res.scalars().first()
+        created = grade is None
         if grade:
             first_link = not grade.lis_result_sourcedid and not grade.lis_outcome_url
             score = grade.score
@@ -533,6 +609,9 @@ async def upsert_lti1p1_grade_link(
                 lis_outcome_url=outcome_url,
             )
             session.add(grade)
+    if created:
+        # A new, ungraded cell in the gradebook.
+        await record_grades(assignment_id, {user_id: (None, False)})
     return score, first_link
 
 
@@ -593,5 +672,6 @@ async def delete_lti_course(course_id: int) -> bool:
     async with async_session.begin() as session:
         await session.execute(d_query1)
         await session.execute(d_query2)
+    await invalidate_lti_cache()
 
     return True
@@ -0,0 +1,213 @@
+"""
+The LTI score outbox: scores waiting to be sent to an LMS.
+
+``lti_score_outbox`` holds one row per (course, assignment, student) with the
+latest total still to be sent. It lives in the database so that scores survive
+a restart and every worker drains the same queue; the sending side is
+``rsptx.grading_helpers.lti_push``.
+
+A row is *due* once ``due_at`` has passed. A dispatcher claims due rows by
+pushing ``due_at`` into the future for the length of its lease, sends them, then
+either deletes them or schedules a retry. ``version`` tells it whether a newer
+score arrived while it was sending, in which case the row is kept for the next
+round rather than deleted.
+"""
+
+import datetime
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional
+
+from sqlalchemy import and_, case, delete, func, select, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+
+from ..models import LtiScoreOutbox
+from ..async_session import async_session
+from rsptx.response_helpers.core import canonical_utcnow
+
+
+@dataclass(frozen=True)
+class ClaimedScore:
+    """An outbox row claimed for sending."""
+
+    id: int
+    course_id: int
+    assignment_id: int
+    rs_user_id: int
+    score: Optional[float]
+    version: int
+    attempts: int
+    enqueued_at: datetime.datetime
+
+
+async def enqueue_lti_score(
+    course_id: int,
+    assignment_id: int,
+    rs_user_id: int,
+    score: Optional[float],
+    delay: float,
+) -> None:
+    """
+    Queue ``score`` to be sent no sooner than ``delay`` seconds from now.
+
+    If a score for the same student and assignment is already waiting it is
+    replaced, and keeps its place in the queue: a student answering quickly
+    produces one send with the latest total, not one per answer.
+    """
+    now = canonical_utcnow()
+    stmt = pg_insert(LtiScoreOutbox).values(
+        course_id=course_id,
+        assignment_id=assignment_id,
+        rs_user_id=rs_user_id,
+        score=score,
+        version=1,
+        enqueued_at=now,
+        updated_at=now,
+        due_at=now + datetime.timedelta(seconds=delay),
+        attempts=0,
+    )
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[
+            LtiScoreOutbox.course_id,
+            LtiScoreOutbox.assignment_id,
+            LtiScoreOutbox.rs_user_id,
+        ],
+        set_={
+            "score": stmt.excluded.score,
+            "version": LtiScoreOutbox.version + 1,
+            "updated_at": stmt.excluded.updated_at,
+        },
+    )
+    async with async_session.begin() as session:
+        await session.execute(stmt)
+
+
+async def claim_lti_scores(limit: int, lease: float) -> List[ClaimedScore]:
+    """
+    Claim up to ``limit`` due rows, oldest first, for ``lease`` seconds.
+
+    A claimed row is not due again until the lease runs out, so if the claimant
+    dies without finishing another dispatcher picks it up then.
+    """
+    now = canonical_utcnow()
+    async with async_session.begin() as session:
+        rows = (
+            await session.execute(
+                select(LtiScoreOutbox)
+                .where(LtiScoreOutbox.due_at <= now)
+                .order_by(LtiScoreOutbox.due_at)
+                .limit(limit)
+                .with_for_update(skip_locked=True)
+            )
+        ).scalars()
+        claimed = [
+            ClaimedScore(
+                id=r.id,
+                course_id=r.course_id,
+                assignment_id=r.assignment_id,
+                rs_user_id=r.rs_user_id,
+                score=r.score,
+                version=r.version,
+                attempts=r.attempts,
+                enqueued_at=r.enqueued_at,
+            )
+            for r in rows
+        ]
+        if claimed:
+            await session.execute(
+                update(LtiScoreOutbox)
+                .where(LtiScoreOutbox.id.in_([c.id for c in claimed]))
+                .values(due_at=now + datetime.timedelta(seconds=lease))
+            )
+    return claimed
+
+
+async def complete_lti_scores(
+    sent: Iterable[ClaimedScore], resend_delay: float
+) -> None:
+    """
+    Drop rows whose claimed score has been sent (or needs no sending).
+
+    A row whose score was replaced while it was being sent stays queued, due
+    ``resend_delay`` seconds from now.
+    """
+    now = canonical_utcnow()
+    async with async_session.begin() as session:
+        for c in sent:
+            res = await session.execute(
+                delete(LtiScoreOutbox).where(
+                    and_(
+                        LtiScoreOutbox.id == c.id,
+                        LtiScoreOutbox.version == c.version,
+                    )
+                )
+            )
+            if res.rowcount == 0:
+                await session.execute(
+                    update(LtiScoreOutbox)
+                    .where(LtiScoreOutbox.id == c.id)
+                    .values(
+                        due_at=now + datetime.timedelta(seconds=resend_delay),
+                        enqueued_at=LtiScoreOutbox.updated_at,
+                        attempts=0,
+                        last_error=None,
+                    )
+                )
+
+
+async def retry_lti_scores(failed: Dict[int, float], error: str) -> None:
+    """
+    Schedule claimed rows for another attempt.
+
+    :param failed: outbox row id -> seconds until the next attempt
+    :param error: why the send failed, kept on the row for diagnosis
+    """
+    now = canonical_utcnow()
+    async with async_session.begin() as session:
+        for row_id, delay in failed.items():
+            await session.execute(
+                update(LtiScoreOutbox)
+                .where(LtiScoreOutbox.id == row_id)
+                .values(
+                    due_at=now + datetime.timedelta(seconds=delay),
+                    attempts=LtiScoreOutbox.attempts + 1,
+                    last_error=error[:2000],
+                )
+            )
+
+
+async def discard_lti_scores(
+    abandoned: Iterable[ClaimedScore], resend_delay: float
+) -> None:
+    """
+    Drop rows whose claimed score will not be sent.
+
+    Only the claimed score is given up on: as in :func:`complete_lti_scores`, a
+    row whose score was replaced meanwhile stays queued, due ``resend_delay``
+    seconds from now, with a fresh count of attempts.
+    """
+    await complete_lti_scores(abandoned, resend_delay)
+
+
+async def fetch_lti_outbox_stats() -> Dict[str, object]:
+    """
+    Summarize the outbox for monitoring.
+
+    :return: dict with ``depth`` (rows waiting), ``due`` (rows ready to send
+        now), ``retrying`` (rows that have failed at least once) and
+        ``oldest_seconds`` (how long the oldest unsent score has waited)
+    """
+    now = canonical_utcnow()
+    query = select(
+        func.count(LtiScoreOutbox.id),
+        func.sum(case((LtiScoreOutbox.due_at <= now, 1), else_=0)),
+        func.sum(case((LtiScoreOutbox.attempts > 0, 1), else_=0)),
+        func.min(LtiScoreOutbox.enqueued_at),
+    )
+    async with async_session() as session:
+        depth, due, retrying, oldest = (await session.execute(query)).one()
+    return dict(
+        depth=depth,
+        due=due or 0,
+        retrying=retrying or 0,
+        oldest_seconds=(now - oldest).total_seconds() if oldest else 0.0,
+    )
@@ -0,0 +1,179 @@
+# ************************************************
+# |docname| - Everything a book page template needs
+# ************************************************
+#
+# ``serve_page`` is the hottest endpoint in the system, and it used to gather
+# its data with one awaited helper per value: the course, the instructor check,
+# the course attributes, the PreTeXt chapter lookup, the progress bar counts,
+# the reading assignment spec, the subchapter menu and the library entry. Each
+# await is a pool checkout plus a round trip, so page latency grew with the
+# number of helpers rather than with the work done.
+#
+# The loader here does the same work in two steps:
+#
+# 1. :func:`fetch_page_context` -- one query for the course row, its
+#    attributes, the instructor flag, the PreTeXt chapter and the book's main
+#    page. The caller needs the course before deciding whether to redirect, so
+#    nothing else is fetched yet.
+# 2. :func:`fetch_page_activity` -- the per-page queries, which are independent
+#    of one another and so run concurrently on separate pooled connections.
+
+import asyncio
+import os
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+from sqlalchemy import exists, select
+
+from ..models import (
+    Chapter,
+    CourseAttribute,
+    CourseInstructor,
+    Courses,
+    CoursesValidator,
+    Library,
+    SubChapter,
+)
+from ..async_session import async_session
+from .book import fetch_page_activity_counts, fetch_subchapters
+from .scoring import fetch_reading_assignment_spec
+
+
+class PageContext(NamedTuple):
+    """The database state a book page is rendered from."""
+
+    course: CoursesValidator
+    #: All course attributes; always a dict, even if empty.
+    course_attrs: Dict[str, str]
+    #: True when the user passed to :func:`fetch_page_context` teaches the course.
+    is_instructor: bool
+    #: ``markup_system`` course attribute, defaulting to ``RST``.
+    markup_system: str
+    chapter: Optional[str]
+    subchapter: str
+    #: The library entry's main page, used when the page path is empty.
+    main_page: Optional[str]
+    #: Progress bar data for the page; filled in by :func:`fetch_page_activity`.
+    activity_info: Optional[Dict[str, Any]] = None
+    #: ``(sub_chapter_label, sub_chapter_name)`` pairs for the chapter menu;
+    #: filled in by :func:`fetch_page_activity`.
+    subchapters: Optional[List[Tuple[str, str]]] = None
+
+
+async def fetch_page_context(
+    course_name: str, pagepath: str, user_id: Optional[int] = None
+) -> Optional[PageContext]:
+    """
+    Load the course-level context for a book page in a single query.
+
+    The chapter comes from the URL for RST books and from the ``chapter`` table
+    for PreTeXt books, whose flat page layout does not encode it.
+
+    :param course_name: str, the course named in the page URL
+    :param pagepath: str, the page path below the course in the URL
+    :param user_id: Optional[int], the logged in user's id, if any
+    :return: Optional[PageContext], None if the course does not exist
+    """
+    subchapter = os.path.basename(os.path.splitext(pagepath)[0])
+
+    instructor_q = (
+        exists()
+        .where(
+            (CourseInstructor.course == Courses.id)
+            & (CourseInstructor.instructor == user_id)
+        )
+        .correlate(Courses)
+    )
+    ptx_chapter_q = (
+        select(Chapter.chapter_label)
+        .join(SubChapter, Chapter.id == SubChapter.chapter_id)
+        .where(
+            (Chapter.course_id == Courses.base_course)
+            & (SubChapter.sub_chapter_label == subchapter)
+        )
+        .limit(1)
+        .correlate(Courses)
+        .scalar_subquery()
+    )
+    main_page_q = (
+        select(Library.main_page)
+        .where(Library.basecourse == Courses.base_course)
+        .limit(1)
+        .correlate(Courses)
+        .scalar_subquery()
+    )
+    # One row per course attribute (or a single row of NULLs when there are
+    # none); the course columns simply repeat on each row.
+    query = (
+        select(
+            Courses,
+            CourseAttribute.attr,
+            CourseAttribute.value,
+            instructor_q.label("is_instructor"),
+            ptx_chapter_q.label("ptx_chapter"),
+            main_page_q.label("main_page"),
+        )
+        .outerjoin(CourseAttribute, CourseAttribute.course_id == Courses.id)
+        .where(Courses.course_name == course_name)
+    )
+    async with async_session() as session:
+        rows = (await session.execute(query)).all()
+    if not rows:
+        return None
+
+    first = rows[0]
+    course_attrs = {row.attr: row.value for row in rows if row.attr is not None}
+    markup_system = course_attrs.get("markup_system", "RST")
+    if markup_system == "PreTeXt":
+        chapter = first.ptx_chapter
+    else:
+        chapter = os.path.split(os.path.split(pagepath)[0])[1]
+
+    return PageContext(
+        course=CoursesValidator.from_orm(first.Courses),
+        course_attrs=course_attrs,
+        is_instructor=bool(user_id is not None and first.is_instructor),
+        markup_system=markup_system,
+        chapter=chapter,
+        subchapter=subchapter,
+        main_page=first.main_page,
+    )
+
+
+async def fetch_page_activity(
+    ctx: PageContext, username: Optional[str] = None
+) -> PageContext:
+    """
+    Add the per-page data to a :class:`PageContext`.
+
+    The subchapter menu is always loaded; the progress bar counts and the
+    reading assignment spec only for a logged in user. The queries run
+    concurrently, each on its own pooled connection.
+
+    :param ctx: PageContext, as returned by :func:`fetch_page_context`
+    :param username: Optional[str], the logged in user's username, if any
+    :return: PageContext, a copy of ``ctx`` with ``activity_info`` and
+        ``subchapters`` filled in
+    """
+    base_course = ctx.course.base_course
+    if username:
+        subchapters, activity_info, assignment_spec = await asyncio.gather(
+            fetch_subchapters(base_course, ctx.chapter),
+            fetch_page_activity_counts(
+                ctx.chapter,
+                ctx.subchapter,
+                base_course,
+                ctx.course.course_name,
+                username,
+            ),
+            fetch_reading_assignment_spec(ctx.chapter, ctx.subchapter, ctx.course.id),
+        )
+        if assignment_spec:
+            activity_info["assignment_spec"] = dict(**assignment_spec._mapping)
+    else:
+        subchapters = await fetch_subchapters(base_course, ctx.chapter)
+        activity_info = {}
+
+    return ctx._replace(
+        activity_info=activity_info,
+        subchapters=[(row[0], row[1]) for row in subchapters],
+    )
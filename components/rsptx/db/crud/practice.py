@@ -1,9 +1,11 @@
 import datetime
-from typing import Optional
-from sqlalchemy import select, delete
+from typing import Dict, Optional
+from sqlalchemy import select, delete, func
 
 from ..models import (
     CoursePractice,
+    UserTopicPracticeCompletion,
+    UserTopicPracticeLog,
     UserTopicPractice,
     UserTopicPracticeValidator,
     AuthUserValidator,
@@ -14,12 +16,17 @@ from ..async_session import async_session
 from rsptx.logging import rslogger
 
 
-async def fetch_course_practice(course_name: str) -> Optional[CoursePractice]:
+async def fetch_course_practice(
+    course_name: str, with_end_date: bool = False
+) -> Optional[CoursePractice]:
     """
     Fetches the course practice row for a given course.
 
     :param course_name: The name of the course.
     :type course_name: str
+    :param with_end_date: only consider rows that set an end date, as grading
+        practice requires
+    :type with_end_date: bool
     :return: The CoursePractice object containing the configuration of the practice feature for the given course.
     :rtype: Optional[CoursePractice]
     """
@@ -28,11 +35,43 @@ async def fetch_course_practice(course_name: str) -> Optional[CoursePractice]:
         .where(CoursePractice.course_name == course_name)
         .order_by(CoursePractice.id.desc())
     )
+    if with_end_date:
+        query = query.where(CoursePractice.end_date.is_not(None))
     async with async_session() as session:
         res = await session.execute(query)
         return res.scalars().first()
 
 
+async def fetch_practice_completion_counts(
+    course_name: str, by_day: bool
+) -> Dict[int, int]:
+    """
+    Count each student's completed practice in a course, for grading it.
+
+    :param course_name: The name of the course.
+    :type course_name: str
+    :param by_day: count the days on which a student completed their practice
+        (for a course that spaces practice out) rather than the questions they
+        answered
+    :type by_day: bool
+    :return: the count by auth_user id, for students with any
+    :rtype: Dict[int, int]
+    """
+    if by_day:
+        table = UserTopicPracticeCompletion
+        query = select(table.user_id, func.count()).where(
+            table.course_name == course_name
+        )
+    else:
+        table = UserTopicPracticeLog
+        query = select(table.user_id, func.count()).where(
+            (table.course_name == course_name) & table.q.not_in([0, -1])
+        )
+    async with async_session() as session:
+        res = await session.execute(query.group_by(table.user_id))
+        return {user_id: count for user_id, count in res.all()}
+
+
 async def fetch_one_user_topic_practice(
     user: AuthUserValidator,
     last_page_chapter: str,
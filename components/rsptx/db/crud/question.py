@@ -1,5 +1,19 @@
-from typing import List, Optional, Tuple, Dict
-from sqlalchemy import select, and_, or_, func, asc, desc, not_, update, delete
+import re
+from typing import Dict, List, NamedTuple, Optional, Tuple
+from sqlalchemy import (
+    select,
+    and_,
+    or_,
+    func,
+    asc,
+    desc,
+    not_,
+    update,
+    delete,
+    column,
+    literal_column,
+    table,
+)
 from sqlalchemy.exc import IntegrityError
 
 from ..models import (
@@ -21,6 +35,8 @@ from ..models import (
     UserExperimentValidator,
 )
 from ..async_session import async_session
+from .crud import invalidate_server_feedback
+from rsptx.configuration.core import settings, DatabaseType
 from rsptx.validation import schemas
 from asyncpg.exceptions import UniqueViolationError
 from rsptx.logging import rslogger
@@ -115,7 +131,8 @@ async def delete_question_by_name(name: str, base_course: str) -> int:
 
     async with async_session.begin() as session:
         res = await session.execute(stmt)
-        return res.rowcount
+    await invalidate_server_feedback(base_course)
+    return res.rowcount
 
 
 async def count_matching_questions(name: str) -> int:
@@ -231,6 +248,66 @@ async def fetch_questions_by_search_criteria(
         return [QuestionValidator.from_orm(q) for q in res.scalars().fetchall()]
 
 
+# Exercise search
+# ---------------
+# The assignment builder's search box sends a "global" filter on every
+# keystroke. Matching it with ``ILIKE '%term%'`` across five columns, one of
+# them the question's whole HTML, read the entire questions table each time.
+# It is answered from the full-text indexes described with ``Question`` in
+# ``models.py`` instead: each word must start a word in the question's name,
+# author, topic, tags or HTML. A term can also match a fragment of the name,
+# which is how a partly typed div id is found; the trigram index on ``name``
+# serves that on PostgreSQL.
+
+#: Terms shorter than this are not looked for inside names. The trigram index
+#: cannot serve them, so they would scan the whole table.
+NAME_FRAGMENT_MIN_LENGTH = 3
+
+_questions_fts = table("questions_fts", column("rowid"), column("rank"))
+
+
+def _search_words(text: str) -> List[str]:
+    """Split search text into words the way the full-text indexes do."""
+    return re.findall(r"[^\W_]+", text.lower())
+
+
+def _full_text_match(words: List[str]):
+    """A condition on Question: every one of ``words`` starts an indexed word."""
+    if settings.database_type == DatabaseType.SQLite:
+        # The words hold only letters and digits, so quoting them is enough to
+        # keep FTS5 query syntax out.
+        query = " AND ".join(f'"{w}"*' for w in words)
+        return Question.id.in_(
+            select(_questions_fts.c.rowid).where(
+                literal_column("questions_fts").op("MATCH")(query)
+            )
+        )
+    query = " & ".join(f"{w}:*" for w in words)
+    return literal_column("questions.search_vector").op("@@")(
+        func.to_tsquery("simple", query)
+    )
+
+
+def _search_rank(words: List[str]):
+    """How well a question matches ``words``; lower sorts first."""
+    if settings.database_type == DatabaseType.SQLite:
+        # FTS5's rank is bm25, which is already better when lower.
+        query = " OR ".join(f'"{w}"*' for w in words)
+        rank = (
+            select(_questions_fts.c.rank)
+            .where(
+                literal_column("questions_fts").op("MATCH")(query),
+                _questions_fts.c.rowid == Question.id,
+            )
+            .scalar_subquery()
+        )
+        return func.coalesce(rank, 0)
+    query = " | ".join(f"{w}:*" for w in words)
+    return -func.ts_rank(
+        literal_column("questions.search_vector"), func.to_tsquery("simple", query)
+    )
+
+
 async def search_exercises(
     criteria: schemas.ExercisesSearchRequest,
     owner: str,
@@ -238,6 +315,9 @@ async def search_exercises(
     """
     Smart search for exercises with pagination, filtering, and sorting.
 
+    Results of a "global" search come best match first when sorted by
+    ``relevance`` (or not sorted at all).
+
     :param criteria: Search parameters including filters, pagination, and sorting
     :return: Dictionary with search results and pagination metadata
     """
@@ -267,6 +347,9 @@ async def search_exercises(
             )
         )
 
+    # Words of the "global" search, for ranking the results
+    ranked_words: List[str] = []
+
     # Process filters
     if criteria.filters:
         for field, filter_data in criteria.filters.items():
@@ -283,25 +366,19 @@ async def search_exercises(
 
             # Process global search (search in multiple fields)
             if field == "global":
-                search_fields = ["name", "author", "topic", "tags", "htmlsrc"]
-
-                search_terms = filter_value.strip().split()
-
-                if search_terms:
-                    and_conditions = []
-
-                    for term in search_terms:
-                        term_or_conditions = [
-                            getattr(Question, search_field).ilike(f"%{term}%")
-                            for search_field in search_fields
-                            if hasattr(Question, search_field)
-                        ]
-
-                        if term_or_conditions:
-                            and_conditions.append(or_(*term_or_conditions))
-
-                    if and_conditions:
-                        query = query.where(and_(*and_conditions))
+                # Every term must match, through the full-text index or as a
+                # fragment of the name.
+                for term in filter_value.strip().split():
+                    words = _search_words(term)
+                    term_conditions = []
+                    if words:
+                        term_conditions.append(_full_text_match(words))
+                        ranked_words.extend(words)
+                    if len(term) >= NAME_FRAGMENT_MIN_LENGTH or not words:
+                        term_conditions.append(
+                            Question.name.icontains(term, autoescape=True)
+                        )
+                    query = query.where(or_(*term_conditions))
 
             # Process specific field filters
             elif hasattr(Question, field):
@@ -336,6 +413,15 @@ async def search_exercises(
             column = getattr(Question, field)
             query = query.order_by(asc(column) if order == 1 else desc(column))
 
+    # Unless a column to sort by was chosen, a global search is ranked best
+    # match first and anything else is listed by name.
+    sort_field = criteria.sorting.get("field") if criteria.sorting else None
+    if not (sort_field and hasattr(Question, sort_field)):
+        if ranked_words:
+            query = query.order_by(_search_rank(ranked_words), Question.name)
+        else:
+            query = query.order_by(Question.name)
+
     # Count total results (before pagination)
     count_query = select(func.count()).select_from(query.subquery())
 
@@ -559,6 +645,64 @@ async def update_question_grade_entry(
     return QuestionGradeValidator.from_orm(new_qg)
 
 
+class QuestionGradeChange(NamedTuple):
+    """What :func:`rescore_question_grade` did to a question grade."""
+
+    #: the score the row held before, None if it had none
+    previous: Optional[float]
+    #: whether the new score was written
+    updated: bool
+
+
+async def rescore_question_grade(
+    sid: str,
+    course_name: str,
+    qid: str,
+    score: float,
+    only_if_higher: bool = False,
+) -> Optional[QuestionGradeChange]:
+    """
+    Replace a student's autograded score for a question, and say what it
+    replaced.
+
+    The row is read ``FOR UPDATE`` and written in the same transaction, so two
+    saves of the same question at once see each other's score rather than the
+    same old one, and the deltas their callers add to the assignment total
+    (see ``increment_grade_score``) add up to the real change.
+
+    :param sid: str, the student id
+    :param course_name: str, the course name
+    :param qid: str, the question id (div_id)
+    :param score: float, the new score
+    :param only_if_higher: bool, write only a score higher than the current one
+        (a missing score counting as 0), and only while the grade is still
+        ``autograded`` -- an instructor's comment gives them the last word
+    :return: QuestionGradeChange, or None if the student has no grade for the
+        question yet
+    """
+    query = (
+        select(QuestionGrade)
+        .where(
+            (QuestionGrade.sid == sid)
+            & (QuestionGrade.course_name == course_name)
+            & (QuestionGrade.div_id == qid)
+        )
+        .with_for_update()
+    )
+    async with async_session.begin() as session:
+        row = (await session.execute(query)).scalar_one_or_none()
+        if row is None:
+            return None
+        previous = row.score
+        if only_if_higher and not (
+            (previous or 0) < score and row.comment == "autograded"
+        ):
+            return QuestionGradeChange(previous, False)
+        row.score = score
+        row.comment = "autograded"
+    return QuestionGradeChange(previous, True)
+
+
 async def fetch_user_experiment(sid: str, ab_name: str) -> int:
     """
     When a question is part of an AB experiement (ab_name) get the experiment
@@ -687,6 +831,8 @@ async def create_question(question: QuestionValidator) -> QuestionValidator:
     async with async_session.begin() as session:
         new_question = Question(**question.dict())
         session.add(new_question)
+    if question.feedback:
+        await invalidate_server_feedback(question.base_course)
     return QuestionValidator.from_orm(new_question)
 
 
@@ -703,6 +849,7 @@ async def update_question(question: QuestionValidator) -> QuestionValidator:
             update(Question).where(Question.id == question.id).values(**question.dict())
         )
         await session.execute(stmt)
+    await invalidate_server_feedback(question.base_course)
     return question
 
 
@@ -1058,4 +1205,12 @@ async def copy_question(
             session.add(new_assignment_question)
 
         await session.commit()
-        return QuestionValidator.from_orm(new_question)
+        result = QuestionValidator.from_orm(new_question)
+
+    if result.feedback:
+        await invalidate_server_feedback(result.base_course)
+    if assignment_id:
+        from .assignment import _invalidate_scoring_specs_for
+
+        await _invalidate_scoring_specs_for([assignment_id])
+    return result
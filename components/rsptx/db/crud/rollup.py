@@ -0,0 +1,236 @@
+"""
+Incremental activity rollups for the chapter overview reports.
+
+The sccount / dividmin / dividmax / correctcount reports summarise each
+student's work on each question of a course. Rather than scanning every
+``useinfo`` and answer row for the course each time, they read
+``activity_rollup``, which holds one row per (course, student, question).
+
+:func:`refresh_activity_rollup` keeps it current. Each source table has a
+watermark in ``rollup_watermark``; a refresh folds in only the rows above it,
+one bounded chunk per transaction, so its cost follows the number of new rows
+rather than the length of the term.
+
+Rows written less than ``ROLLUP_SETTLE_SECONDS`` ago are left for the next
+refresh: ids are handed out before a transaction commits, so a row with a
+lower id may still become visible after one with a higher id, and moving the
+watermark past it would skip it for good. How long a row has been written is
+judged by its ``inserted_at``, which the database sets along with its id, and
+not by ``timestamp``: that is when the request was handled, and page views can
+reach the table much later. Only a transaction that stays open longer than
+``ROLLUP_SETTLE_SECONDS`` after writing a row can still lose it.
+
+The first refresh folds in every row ever logged. :func:`rollup_needs_backfill`
+tells the reports to leave that to ``rsmanage rollup`` rather than doing it
+while an instructor waits.
+"""
+
+import datetime
+
+from sqlalchemy import and_, case, func, or_, select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.exc import IntegrityError
+
+from ..models import (
+    ActivityRollup,
+    ClickableareaAnswers,
+    CodelensAnswers,
+    DragndropAnswers,
+    FitbAnswers,
+    MchoiceAnswers,
+    ParsonsAnswers,
+    RollupWatermark,
+    SpliceAnswers,
+    UnittestAnswers,
+    Useinfo,
+    db_utcnow,
+)
+from ..async_session import async_session
+from rsptx.logging import rslogger
+
+#: The most source rows folded in by one transaction.
+ROLLUP_CHUNK = 20000
+#: Rows newer than this are left for the next refresh; see the module docstring.
+ROLLUP_SETTLE_SECONDS = 60
+
+#: Answer tables whose correct answers set ``activity_rollup.correct``.
+ROLLUP_ANSWER_MODELS = [
+    MchoiceAnswers,
+    FitbAnswers,
+    ParsonsAnswers,
+    CodelensAnswers,
+    ClickableareaAnswers,
+    SpliceAnswers,
+    DragndropAnswers,
+    UnittestAnswers,
+]
+
+
+def _useinfo_upsert():
+    stmt = pg_insert(ActivityRollup)
+    excluded = stmt.excluded
+    return stmt.on_conflict_do_update(
+        index_elements=[
+            ActivityRollup.course_name,
+            ActivityRollup.sid,
+            ActivityRollup.div_id,
+        ],
+        set_={
+            "first_seen": case(
+                (
+                    or_(
+                        ActivityRollup.first_seen.is_(None),
+                        excluded.first_seen < ActivityRollup.first_seen,
+                    ),
+                    excluded.first_seen,
+                ),
+                else_=ActivityRollup.first_seen,
+            ),
+            "last_seen": case(
+                (
+                    or_(
+                        ActivityRollup.last_seen.is_(None),
+                        excluded.last_seen > ActivityRollup.last_seen,
+                    ),
+                    excluded.last_seen,
+                ),
+                else_=ActivityRollup.last_seen,
+            ),
+            "events": ActivityRollup.events + excluded.events,
+        },
+    )
+
+
+def _correct_upsert():
+    stmt = pg_insert(ActivityRollup)
+    return stmt.on_conflict_do_update(
+        index_elements=[
+            ActivityRollup.course_name,
+            ActivityRollup.sid,
+            ActivityRollup.div_id,
+        ],
+        set_={"correct": stmt.excluded.correct},
+    )
+
+
+async def _fold_chunk(model, settled_before: datetime.datetime) -> bool:
+    """Fold the next chunk of ``model``'s settled rows into the rollup.
+
+    :return: True if anything was folded in, so there may be more to do.
+    """
+    source = model.__tablename__
+    async with async_session.begin() as session:
+        # Holding the watermark row for the whole transaction keeps two
+        # refreshes from counting the same rows twice.
+        wm = (
+            await session.execute(
+                select(RollupWatermark)
+                .where(RollupWatermark.source == source)
+                .with_for_update()
+            )
+        ).scalar_one_or_none()
+        if wm is None:
+            wm = RollupWatermark(source=source, last_id=0)
+            session.add(wm)
+            await session.flush()
+
+        window = (
+            select(model.id, model.inserted_at)
+            .where(model.id > wm.last_id)
+            .order_by(model.id)
+            .limit(ROLLUP_CHUNK)
+            .subquery()
+        )
+        hi = (
+            await session.execute(
+                select(func.max(window.c.id)).where(
+                    window.c.inserted_at <= settled_before
+                )
+            )
+        ).scalar()
+        if hi is None:
+            return False
+        in_chunk = and_(model.id > wm.last_id, model.id <= hi)
+
+        if model is Useinfo:
+            query = (
+                select(
+                    Useinfo.course_id.label("course_name"),
+                    Useinfo.sid,
+                    Useinfo.div_id,
+                    func.min(Useinfo.timestamp).label("first_seen"),
+                    func.max(Useinfo.timestamp).label("last_seen"),
+                    func.count().label("events"),
+                )
+                .where(in_chunk)
+                .group_by(Useinfo.course_id, Useinfo.sid, Useinfo.div_id)
+            )
+            stmt = _useinfo_upsert()
+            extra = dict(correct=False)
+        else:
+            # A wrong answer changes nothing, so only correct ones are read.
+            query = (
+                select(model.course_name, model.sid, model.div_id)
+                .where(in_chunk & (model.correct == True))  # noqa: E712
+                .distinct()
+            )
+            stmt = _correct_upsert()
+            extra = dict(first_seen=None, last_seen=None, events=0, correct=True)
+
+        values = [
+            dict(row._mapping, **extra) for row in (await session.execute(query)).all()
+        ]
+        if values:
+            await session.execute(stmt, values)
+        wm.last_id = hi
+    return True
+
+
+async def rollup_needs_backfill() -> bool:
+    """
+    True if a source table holds rows but has never been folded in.
+
+    The refresh that folds them in reads the whole table, so it should be run
+    from ``rsmanage rollup`` rather than ahead of a report.
+    """
+    async with async_session() as session:
+        for model in [Useinfo] + ROLLUP_ANSWER_MODELS:
+            if (
+                await session.execute(
+                    select(
+                        select(model.id).exists()
+                        & ~select(RollupWatermark.id)
+                        .where(RollupWatermark.source == model.__tablename__)
+                        .exists()
+                    )
+                )
+            ).scalar():
+                return True
+    return False
+
+
+async def refresh_activity_rollup() -> None:
+    """
+    Fold every settled ``useinfo`` and answer row not yet counted into
+    ``activity_rollup``.
+
+    Safe to run from several processes at once: each chunk is claimed by
+    locking its source's watermark.
+    """
+    # By the database's clock, which sets inserted_at.
+    async with async_session() as session:
+        now = (await session.execute(select(db_utcnow()))).scalar_one()
+    settled_before = now - datetime.timedelta(seconds=ROLLUP_SETTLE_SECONDS)
+    for model in [Useinfo] + ROLLUP_ANSWER_MODELS:
+        chunks = 0
+        try:
+            while await _fold_chunk(model, settled_before):
+                chunks += 1
+        except IntegrityError:
+            # Two first-ever refreshes both created this source's watermark;
+            # the other one carries on from here.
+            rslogger.info(f"activity rollup: {model.__tablename__} is being refreshed")
+        if chunks:
+            rslogger.info(
+                f"activity rollup: folded {chunks} chunk(s) of {model.__tablename__}"
+            )
@@ -1,7 +1,9 @@
+import asyncio
 import logging
 import datetime
 from typing import Iterable, List, Optional
-from sqlalchemy import select, and_, func, text
+from sqlalchemy import insert, select, and_, func, text
+from sqlalchemy.exc import InterfaceError, OperationalError, StatementError
 
 from ..models import (
     Useinfo,
@@ -13,6 +15,7 @@ from ..models import (
     runestone_component_dict,
 )
 from ..async_session import async_session
+from rsptx.configuration import settings
 from rsptx.validation import schemas
 from .crud import EVENT2TABLE
 
@@ -39,6 +42,169 @@ async def create_useinfo_entry(log_entry: UseinfoValidation) -> UseinfoValidatio
     return UseinfoValidation.from_orm(new_entry)
 
 
+# Write-behind useinfo queue
+# --------------------------
+# Every page view used to cost its own transaction: one ``INSERT`` and one
+# commit into ``useinfo``, which made it the dominant write load on the
+# database. Page views do not need their row back, so they are buffered in
+# process and written in batches -- one multi-row ``INSERT`` and one commit per
+# flush -- when :attr:`UseinfoWriter.batch_size` rows have accumulated or
+# :attr:`UseinfoWriter.flush_seconds` have passed, whichever comes first.
+#
+# Callers that need the inserted row (``/bookevent`` reports failure when the
+# insert fails) keep using :func:`create_useinfo_entry`.
+class UseinfoWriter:
+    """A bounded, in-process buffer of ``useinfo`` rows flushed in batches.
+
+    Until :meth:`start` is called -- and after :meth:`stop` -- :meth:`put`
+    writes straight through with :func:`create_useinfo_entry`, so a server
+    that never starts the writer loses nothing.
+    """
+
+    def __init__(
+        self, batch_size: int = 200, flush_seconds: float = 1.0, max_buffer: int = 5000
+    ):
+        self.batch_size = batch_size
+        self.flush_seconds = flush_seconds
+        self.max_buffer = max(max_buffer, batch_size)
+        self._buffer: List[dict] = []
+        self._wakeup = asyncio.Event()
+        self._flush_lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+        self._stopping = False
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def __len__(self) -> int:
+        return len(self._buffer)
+
+    def start(self) -> None:
+        """Start the background flush loop on the running event loop."""
+        if not self.running:
+            # Events bind to the loop they are first awaited on, so make fresh
+            # ones for this loop.
+            self._wakeup = asyncio.Event()
+            self._flush_lock = asyncio.Lock()
+            self._stopping = False
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Stop the flush loop and drain whatever is still buffered."""
+        task = self._task
+        if task is not None:
+            # Let the loop finish a flush in progress rather than cancelling it
+            # halfway through a batch.
+            self._stopping = True
+            self._wakeup.set()
+            await task
+            self._task = None
+        await self.flush()
+
+    async def put(self, log_entry: UseinfoValidation) -> None:
+        """Queue a row for the next batch.
+
+        When the buffer is full the caller flushes it before returning, so a
+        stalled database slows page views down rather than growing memory
+        without bound.
+        """
+        if not self.running:
+            await create_useinfo_entry(log_entry)
+            return
+
+        row = log_entry.model_dump(exclude={"id"})
+        self._buffer.append(row)
+        if len(self._buffer) >= self.max_buffer:
+            await self.flush()
+        elif len(self._buffer) >= self.batch_size:
+            self._wakeup.set()
+
+    async def flush(self) -> int:
+        """Write every buffered row in one transaction; return how many."""
+        async with self._flush_lock:
+            rows, self._buffer = self._buffer, []
+            if not rows:
+                return 0
+            try:
+                async with async_session.begin() as session:
+                    await session.execute(insert(Useinfo), rows)
+            except StatementError as e:
+                if _is_outage(e):
+                    # These are page views; losing a batch to a database outage
+                    # is preferable to retrying forever and holding the rows in
+                    # memory.
+                    rslogger.error(f"useinfo writer: dropped {len(rows)} rows: {e}")
+                    return 0
+                # One bad row fails the whole INSERT; write the rest one at a
+                # time so only it is lost.
+                return await self._insert_each(rows)
+            except Exception as e:
+                rslogger.error(f"useinfo writer: dropped {len(rows)} rows: {e}")
+                return 0
+            rslogger.debug(f"useinfo writer: flushed {len(rows)} rows")
+            return len(rows)
+
+    async def _insert_each(self, rows: List[dict]) -> int:
+        written = 0
+        for row in rows:
+            try:
+                async with async_session.begin() as session:
+                    await session.execute(insert(Useinfo), [row])
+            except Exception as e:
+                rslogger.error(
+                    f"useinfo writer: dropped row sid={row.get('sid')} "
+                    f"div_id={row.get('div_id')}: {e}"
+                )
+                if isinstance(e, StatementError) and _is_outage(e):
+                    rslogger.error(
+                        f"useinfo writer: dropped {len(rows) - written - 1} more rows"
+                    )
+                    break
+            else:
+                written += 1
+        rslogger.debug(f"useinfo writer: flushed {written} of {len(rows)} rows")
+        return written
+
+    async def _run(self) -> None:
+        while not self._stopping:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.flush_seconds)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            try:
+                await self.flush()
+            except Exception as e:
+                rslogger.error(f"useinfo writer: flush failed: {e}")
+
+
+def _is_outage(e: StatementError) -> bool:
+    """Whether a failed write says the database is unreachable, rather than
+    that something in the rows was wrong."""
+    return isinstance(e, (OperationalError, InterfaceError)) or bool(
+        getattr(e, "connection_invalidated", False)
+    )
+
+
+#: The process-wide writer. Servers that log page views start it in their
+#: lifespan and stop it on shutdown.
+useinfo_writer = UseinfoWriter(
+    batch_size=settings.useinfo_batch_size,
+    flush_seconds=settings.useinfo_flush_seconds,
+    max_buffer=settings.useinfo_max_buffer,
+)
+
+
+async def queue_useinfo_entry(log_entry: UseinfoValidation) -> None:
+    """Fire-and-forget :func:`create_useinfo_entry` through :data:`useinfo_writer`.
+
+    :param log_entry: the row to add to the ``useinfo`` table
+    :type log_entry: UseinfoValidation
+    """
+    await useinfo_writer.put(log_entry)
+
+
 async def count_useinfo_for(
     div_id: str, course_name: str, start_date: datetime.datetime
 ) -> List[tuple]:
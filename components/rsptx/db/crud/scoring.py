@@ -1,6 +1,6 @@
 import datetime
-from typing import List, Optional
-from sqlalchemy import select, and_, or_
+from typing import Dict, List, NamedTuple, Optional
+from sqlalchemy import select, and_, or_, func
 
 from rsptx.response_helpers.core import canonical_utcnow
 
@@ -17,7 +17,7 @@ from ..async_session import async_session
 from rsptx.validation import schemas
 from .crud import EVENT2TABLE
 from rsptx.logging import rslogger
-from .assignment import is_assignment_visible_to_students
+from .assignment import is_assignment_visible_to_students, scoring_spec_cache
 
 
 async def fetch_answers(question_id: str, event: str, course_name: str, username: str):
@@ -43,6 +43,65 @@ async def fetch_answers(question_id: str, event: str, course_name: str, username
         return [a for a in res.scalars()]
 
 
+class _AssignedQuestion(NamedTuple):
+    """One (assignment, question) pair as ``is_assigned`` needs it."""
+
+    assignment_id: int
+    duedate: datetime.datetime
+    enforce_due: bool
+    visible: bool
+    visible_on: Optional[datetime.datetime]
+    hidden_on: Optional[datetime.datetime]
+    points: int
+    which_to_grade: str
+    autograde: str
+    reading_assignment: bool
+    question_id: int
+
+
+async def _load_scoring_specs(course_id: int) -> Dict[str, List[_AssignedQuestion]]:
+    """
+    Load every untimed assignment question in a course, keyed by question name.
+
+    Each list is ordered by due date, latest first, which is the order
+    ``is_assigned`` checks them in.
+
+    :param course_id: int, the id of the course
+    :return: Dict[str, List[_AssignedQuestion]]
+    """
+    query = (
+        select(
+            Question.name,
+            Assignment.id,
+            Assignment.duedate,
+            Assignment.enforce_due,
+            Assignment.visible,
+            Assignment.visible_on,
+            Assignment.hidden_on,
+            AssignmentQuestion.points,
+            AssignmentQuestion.which_to_grade,
+            AssignmentQuestion.autograde,
+            AssignmentQuestion.reading_assignment,
+            Question.id,
+        )
+        .where(
+            (AssignmentQuestion.question_id == Question.id)
+            & (AssignmentQuestion.assignment_id == Assignment.id)
+            & (Assignment.course == course_id)
+            & or_(
+                Assignment.is_timed == False,  # noqa: E712
+                Assignment.kind != "Timed",
+            )
+        )
+        .order_by(Assignment.duedate.desc())
+    )
+    specs: Dict[str, List[_AssignedQuestion]] = {}
+    async with async_session() as session:
+        for name, *fields in await session.execute(query):
+            specs.setdefault(name, []).append(_AssignedQuestion(*fields))
+    return specs
+
+
 async def is_assigned(
     question_id: str,
     course_id: int,
@@ -56,59 +115,46 @@ async def is_assigned(
     If the assignment is past due but the instructor has not enforced the due date -- no problem.
     If the assignment is past due but the instructor has not enforced the due date, but HAS released the assignment -- then no longer assigned.
 
+    The course's assignment questions come from ``scoring_spec_cache``, so a
+    graded answer normally costs no query here.
+
     :param question_id: str, the name of the question
     :param course_id: int, the id of the course
     :return: ScoringSpecification, the scoring specification object
     """
-    # select * from assignments join assignment_questions on assignment_questions.assignment_id = assignments.id join courses on courses.id = assignments.course where courses.course_name = 'overview'
-    clauses = [
-        (Question.name == question_id),
-        (AssignmentQuestion.question_id == Question.id),
-        (AssignmentQuestion.assignment_id == Assignment.id),
-        (Assignment.course == course_id),
-        or_(Assignment.is_timed == False, Assignment.kind != "Timed"),  # noqa: E712
-    ]
-    if assignment_id is not None:
-        clauses.append(Assignment.id == assignment_id)
-    query = (
-        select(Assignment, AssignmentQuestion, Question)
-        .where(and_(*clauses))
-        .order_by(Assignment.duedate.desc())
+    specs = await scoring_spec_cache.get(
+        course_id, lambda: _load_scoring_specs(course_id)
     )
     visible_exception = False
     if accommodation and accommodation.visible:
         visible_exception = True
     now = canonical_utcnow()
-    async with async_session() as session:
-        res = await session.execute(query)
-        for row in res:
-            scoringSpec = schemas.ScoringSpecification(
-                assigned=False,
-                max_score=row.AssignmentQuestion.points,
+    for spec in specs.get(question_id, ()):
+        if assignment_id is not None and spec.assignment_id != assignment_id:
+            continue
+        duedate = spec.duedate
+        if accommodation and accommodation.duedate:
+            duedate += datetime.timedelta(days=accommodation.duedate)
+        if now <= duedate:
+            assigned = is_assignment_visible_to_students(spec)
+        else:
+            assigned = not spec.enforce_due and (
+                is_assignment_visible_to_students(spec) or visible_exception
+            )
+        if assigned:
+            return schemas.ScoringSpecification(
+                assigned=True,
+                max_score=spec.points,
                 score=0,
-                assignment_id=row.Assignment.id,
-                which_to_grade=row.AssignmentQuestion.which_to_grade,
-                how_to_score=row.AssignmentQuestion.autograde,
-                is_reading=row.AssignmentQuestion.reading_assignment,
+                assignment_id=spec.assignment_id,
+                which_to_grade=spec.which_to_grade,
+                how_to_score=spec.autograde,
+                is_reading=spec.reading_assignment,
                 username="",
                 comment="",
-                question_id=row.Question.id,
+                question_id=spec.question_id,
             )
-            if accommodation and accommodation.duedate:
-                row.Assignment.duedate += datetime.timedelta(days=accommodation.duedate)
-            if now <= row.Assignment.duedate:
-                if is_assignment_visible_to_students(row.Assignment):
-                    scoringSpec.assigned = True
-                    return scoringSpec
-            else:
-                if not row.Assignment.enforce_due:
-                    if (
-                        is_assignment_visible_to_students(row.Assignment)
-                        or visible_exception
-                    ):
-                        scoringSpec.assigned = True
-                        return scoringSpec
-        return schemas.ScoringSpecification()
+    return schemas.ScoringSpecification()
 
 
 async def fetch_reading_assignment_spec(
@@ -204,3 +250,36 @@ async def fetch_assignment_scores(
         res = await session.execute(query)
         rslogger.debug(f"{res=}")
         return [QuestionGradeValidator.from_orm(q) for q in res.scalars()]
+
+
+async def fetch_assignment_score_totals(
+    assignment_id: int, course_name: str, sids: Optional[List[str]] = None
+) -> Dict[str, float]:
+    """
+    Sum every student's question grades for an assignment in one query.
+
+    This is the set-based form of :func:`fetch_assignment_scores`: it matches
+    the same rows, and a missing score counts as 0.
+
+    :param assignment_id: int, the id of the assignment
+    :param course_name: str, the course the question grades belong to
+    :param sids: Optional[List[str]], restrict to these students; None for all
+    :return: Dict[str, float], total by username; students with no question
+        grades are absent
+    """
+    clauses = [
+        (QuestionGrade.div_id == Question.name),
+        (Question.id == AssignmentQuestion.question_id),
+        (AssignmentQuestion.assignment_id == assignment_id),
+        (QuestionGrade.course_name == course_name),
+    ]
+    if sids is not None:
+        clauses.append(QuestionGrade.sid.in_(sids))
+    query = (
+        select(QuestionGrade.sid, func.sum(func.coalesce(QuestionGrade.score, 0)))
+        .where(and_(*clauses))
+        .group_by(QuestionGrade.sid)
+    )
+    async with async_session() as session:
+        res = await session.execute(query)
+        return {sid: total for sid, total in res}
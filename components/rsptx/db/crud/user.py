@@ -1,6 +1,6 @@
 import time
 import uuid
-from typing import Optional
+from typing import Iterable, Optional
 from pydal.validators import CRYPT
 from sqlalchemy import select, update, delete
 from fastapi import HTTPException
@@ -13,6 +13,8 @@ from ..models import (
     DeadlineException,
 )
 from ..async_session import async_session
+from ..cache import VersionedCache
+from .gradebook import fetch_enrolled_course_ids, invalidate_gradebooks
 from rsptx.configuration import settings
 from rsptx.response_helpers.core import http_422error_detail
 from rsptx.logging import rslogger
@@ -20,6 +22,46 @@ from rsptx.logging import rslogger
 
 # auth_user
 # ---------
+# Every authenticated request on every server loads its user by username (see
+# ``rsptx.auth.session``), which made it the most frequent query on the
+# database. Those loads go through ``user_cache`` instead. Every function here
+# that writes ``auth_user`` -- and the enrollment functions in ``course.py`` --
+# invalidates the users it touched, so another worker sees the change on its
+# next request.
+user_cache = VersionedCache(
+    "auth_user",
+    ttl=settings.session_cache_seconds,
+    maxsize=settings.session_cache_size,
+)
+
+
+async def invalidate_user_cache(user_ids: Iterable[int]) -> None:
+    """Drop the cached copies of the given users on every worker."""
+    user_ids = list(user_ids)
+    if not user_ids:
+        return
+    query = select(AuthUser.username).where(AuthUser.id.in_(user_ids))
+    async with async_session() as session:
+        usernames = (await session.execute(query)).scalars().all()
+    for username in usernames:
+        await user_cache.invalidate(username)
+
+
+async def fetch_session_user(user_name: str) -> Optional[AuthUserValidator]:
+    """
+    Retrieve the user an authenticated request belongs to, from ``user_cache``.
+
+    The same object is returned to every request that hits the cache, so treat
+    it as read-only. Anything that must see a change made moments ago by
+    another process -- a login's password check, for example -- should call
+    :func:`fetch_user` instead.
+
+    :param user_name: str, the username from the request's token
+    :return: AuthUserValidator, or None if there is no such user
+    """
+    return await user_cache.get(user_name, lambda: fetch_user(user_name))
+
+
 async def fetch_user(
     user_name: str, fallback_to_registration: bool = False
 ) -> AuthUserValidator:
@@ -83,6 +125,8 @@ async def create_user(user: AuthUserValidator) -> Optional[AuthUserValidator]:
     new_user.password = str(crypt(user.password)[0])
     async with async_session.begin() as session:
         session.add(new_user)
+    # A request for this username may have been answered "no such user".
+    await user_cache.invalidate(user.username)
     return AuthUserValidator.from_orm(new_user)
 
 
@@ -99,6 +143,12 @@ async def update_user(user_id: int, new_vals: dict):
     stmt = update(AuthUser).where((AuthUser.id == user_id)).values(**new_vals)
     async with async_session.begin() as session:
         await session.execute(stmt)
+    await invalidate_user_cache([user_id])
+    # Gradebooks list students by username and name.
+    if new_vals.keys() & {"username", "first_name", "last_name"}:
+        await invalidate_gradebooks(
+            await fetch_enrolled_course_ids(AuthUser.id == user_id)
+        )
     rslogger.debug("SUCCESS")
 
 
@@ -121,6 +171,8 @@ async def delete_user(username):
     delaccommodations = delete(DeadlineException).where(
         DeadlineException.sid == username
     )
+    # Read before the enrollments are deleted along with the user.
+    course_ids = await fetch_enrolled_course_ids(AuthUser.username == username)
     async with async_session.begin() as session:
         for stmt in stmt_list:
             await session.execute(stmt)
@@ -130,6 +182,8 @@ async def delete_user(username):
         await session.execute(deluser)
         # This will delete many other things as well based on the CASECADING
         # foreign keys
+    await user_cache.invalidate(username)
+    await invalidate_gradebooks(course_ids)
 
 
 async def fetch_user_by_email(email: str) -> Optional[AuthUserValidator]:
@@ -149,6 +203,7 @@ async def set_reset_token(user_id: int) -> str:
     )
     async with async_session.begin() as session:
         await session.execute(stmt)
+    await invalidate_user_cache([user_id])
     return token
 
 
@@ -168,4 +223,5 @@ async def consume_reset_token(token: str) -> Optional[AuthUserValidator]:
     stmt = update(AuthUser).where(AuthUser.id == user.id).values(reset_password_key="")
     async with async_session.begin() as session:
         await session.execute(stmt)
+    await user_cache.invalidate(user.username)
     return AuthUserValidator.from_orm(user)
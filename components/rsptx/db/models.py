@@ -34,6 +34,7 @@ from typing import Dict, Type, TypeAlias
 # -------------------
 from pydantic import field_validator
 from sqlalchemy import (
+    DDL,
     Column,
     ForeignKey,
     Index,
@@ -45,11 +46,14 @@ from sqlalchemy import (
     Text,
     types,
     Float,
+    event,
     inspect,
     LargeBinary,
     CHAR,
 )
+from sqlalchemy.ext.compiler import compiles
 from sqlalchemy.ext.declarative import declared_attr
+from sqlalchemy.sql.expression import FunctionElement
 
 from sqlalchemy.sql.schema import UniqueConstraint
 from sqlalchemy.types import TypeDecorator
@@ -144,6 +148,36 @@ class IdMixin:
     id = Column(Integer, primary_key=True)
 
 
+# db_utcnow
+# ---------
+# The database's clock, in UTC, read when each row is built -- so a column
+# defaulting to it is set at the same moment as the row's ``id``.
+class db_utcnow(FunctionElement):
+    type = DateTime()
+    inherit_cache = True
+
+
+@compiles(db_utcnow, "postgresql")
+def _pg_db_utcnow(element, compiler, **kw):
+    return "TIMEZONE('utc', CLOCK_TIMESTAMP())"
+
+
+# SQLite's ``CURRENT_TIMESTAMP`` is already UTC.
+@compiles(db_utcnow)
+def _db_utcnow(element, compiler, **kw):
+    return "CURRENT_TIMESTAMP"
+
+
+# InsertedMixin
+# -------------
+# When the row was written, by the database's clock. ``timestamp`` is when the
+# request was handled, which may be long before: page views are written behind
+# a queue that holds them through a database outage. The activity rollup relies
+# on this; see ``components/rsptx/db/crud/rollup.py``.
+class InsertedMixin:
+    inserted_at = Column(DateTime, nullable=False, server_default=db_utcnow())
+
+
 # DictableMixin - allows easy conversion of a SQLAlchemy model to a dictionary
 class DictableMixin:
     def from_dict(self, data: dict):
@@ -167,7 +201,7 @@ class DictableMixin:
 # from bogging down.
 #
 # User info logged by the `log_book_event endpoint`. See there for more info.
-class Useinfo(Base, IdMixin):
+class Useinfo(Base, IdMixin, InsertedMixin):
     __tablename__ = "useinfo"
     __table_args__ = (Index("sid_divid_idx", "sid", "div_id"),)
 
@@ -239,7 +273,7 @@ class CorrectAnswerMixin(AnswerMixin):
 
 # An answer to a multiple-choice question.
 @register_answer_table
-class MchoiceAnswers(Base, CorrectAnswerMixin):
+class MchoiceAnswers(Base, CorrectAnswerMixin, InsertedMixin):
     __tablename__ = "mchoice_answers"
     # _`answer`: The answer to this question. TODO: what is the format?
     answer = Column(String(50), nullable=False)
@@ -265,7 +299,7 @@ class MatchingAnswers(Base, CorrectAnswerMixin):
 
 # An answer to a fill-in-the-blank question.
 @register_answer_table
-class FitbAnswers(Base, CorrectAnswerMixin):
+class FitbAnswers(Base, CorrectAnswerMixin, InsertedMixin):
     __tablename__ = "fitb_answers"
     # See answer_. TODO: what is the format?
     answer = Column(String(512), nullable=False)
@@ -274,7 +308,7 @@ class FitbAnswers(Base, CorrectAnswerMixin):
 
 # An answer to a drag-and-drop question.
 @register_answer_table
-class DragndropAnswers(Base, CorrectAnswerMixin):
+class DragndropAnswers(Base, CorrectAnswerMixin, InsertedMixin):
     __tablename__ = "dragndrop_answers"
     # See answer_. TODO: what is the format?
     answer = Column(Text, nullable=False)
@@ -284,7 +318,7 @@ class DragndropAnswers(Base, CorrectAnswerMixin):
 
 # An answer to a drag-and-drop question.
 @register_answer_table
-class ClickableareaAnswers(Base, CorrectAnswerMixin):
+class ClickableareaAnswers(Base, CorrectAnswerMixin, InsertedMixin):
     __tablename__ = "clickablearea_answers"
     # See answer_. TODO: what is the format?
     answer = Column(String(512), nullable=False)
@@ -293,7 +327,7 @@ class ClickableareaAnswers(Base, CorrectAnswerMixin):
 
 # An answer to a Parsons problem.
 @register_answer_table
-class ParsonsAnswers(Base, CorrectAnswerMixin):
+class ParsonsAnswers(Base, CorrectAnswerMixin, InsertedMixin):
     __tablename__ = "parsons_answers"
     # See answer_. TODO: what is the format?
     answer = Column(String(512), nullable=False)
@@ -304,7 +338,7 @@ class ParsonsAnswers(Base, CorrectAnswerMixin):
 
 # An answer to a Code Lens problem.
 @register_answer_table
-class CodelensAnswers(Base, CorrectAnswerMixin):
+class CodelensAnswers(Base, CorrectAnswerMixin, InsertedMixin):
     __tablename__ = "codelens_answers"
     # See answer_. TODO: what is the format?
     answer = Column(String(512), nullable=False)
@@ -322,7 +356,7 @@ class ShortanswerAnswers(Base, AnswerMixin):
 
 
 @register_answer_table
-class UnittestAnswers(Base, CorrectAnswerMixin):
+class UnittestAnswers(Base, CorrectAnswerMixin, InsertedMixin):
     __tablename__ = "unittest_answers"
     answer = Column(Text, nullable=True)
     passed = Column(Integer, nullable=False)
@@ -343,7 +377,7 @@ class WebWorkAnswers(Base, CorrectAnswerMixin):
 
 
 @register_answer_table
-class SpliceAnswers(Base, CorrectAnswerMixin):
+class SpliceAnswers(Base, CorrectAnswerMixin, InsertedMixin):
     __tablename__ = "splice_answers"
     # answer contains the splice state data.
     answer = Column(JSON, nullable=False)
@@ -619,6 +653,85 @@ class Question(Base, IdMixin):
 
 QuestionValidator: TypeAlias = sqlalchemy_to_pydantic(Question)  # type: ignore
 
+# Exercise search
+# ---------------
+# ``search_exercises`` (in ``crud/question.py``) matches words against a
+# question's name, author, topic, tags and HTML through a full-text index, so
+# a search costs the same however large the question bank grows:
+#
+# * On PostgreSQL, ``questions.search_vector`` is a ``tsvector`` generated from
+#   those columns, weighted so a hit in the name outranks one in the HTML, with
+#   a GIN index on it. A trigram index on ``name`` serves the fallback that
+#   finds a fragment of a name, such as part of a div id.
+# * On SQLite, which is only used for development and tests, ``questions_fts``
+#   is an FTS5 index over the same columns, kept in step by triggers.
+#
+# Neither is mapped on ``Question``: the database maintains them, and code only
+# refers to them in ``search_exercises``. They are added here when
+# ``create_all`` makes the table, and to existing PostgreSQL databases by the
+# ``add_question_search_index`` migration.
+_QUESTION_SEARCH_DDL = {
+    "postgresql": [
+        """ALTER TABLE questions ADD COLUMN IF NOT EXISTS search_vector tsvector
+        GENERATED ALWAYS AS (
+            setweight(to_tsvector('simple', coalesce(name, '')), 'A')
+            || setweight(to_tsvector('simple', coalesce(topic, '') || ' '
+                || coalesce(tags, '') || ' ' || coalesce(author, '')), 'B')
+            || setweight(to_tsvector('simple',
+                left(coalesce(htmlsrc, ''), 200000)), 'D')
+        ) STORED""",
+        "CREATE INDEX IF NOT EXISTS questions_search_vector_idx "
+        "ON questions USING gin (search_vector)",
+        "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+        "CREATE INDEX IF NOT EXISTS questions_name_trgm_idx "
+        "ON questions USING gin (name gin_trgm_ops)",
+    ],
+    "sqlite": [
+        """CREATE VIRTUAL TABLE IF NOT EXISTS questions_fts USING fts5(
+            name, author, topic, tags, htmlsrc,
+            content='questions', content_rowid='id'
+        )""",
+        """CREATE TRIGGER IF NOT EXISTS questions_fts_insert
+        AFTER INSERT ON questions BEGIN
+            INSERT INTO questions_fts(rowid, name, author, topic, tags, htmlsrc)
+            VALUES (new.id, new.name, new.author, new.topic, new.tags, new.htmlsrc);
+        END""",
+        """CREATE TRIGGER IF NOT EXISTS questions_fts_delete
+        AFTER DELETE ON questions BEGIN
+            INSERT INTO questions_fts(
+                questions_fts, rowid, name, author, topic, tags, htmlsrc
+            ) VALUES (
+                'delete', old.id, old.name, old.author, old.topic, old.tags,
+                old.htmlsrc
+            );
+        END""",
+        """CREATE TRIGGER IF NOT EXISTS questions_fts_update
+        AFTER UPDATE ON questions BEGIN
+            INSERT INTO questions_fts(
+                questions_fts, rowid, name, author, topic, tags, htmlsrc
+            ) VALUES (
+                'delete', old.id, old.name, old.author, old.topic, old.tags,
+                old.htmlsrc
+            );
+            INSERT INTO questions_fts(rowid, name, author, topic, tags, htmlsrc)
+            VALUES (new.id, new.name, new.author, new.topic, new.tags, new.htmlsrc);
+        END""",
+    ],
+}
+for _dialect, _statements in _QUESTION_SEARCH_DDL.items():
+    for _statement in _statements:
+        event.listen(
+            Question.__table__,
+            "after_create",
+            DDL(_statement).execute_if(dialect=_dialect),
+        )
+# The triggers go with the table, but the FTS5 index would outlive it.
+event.listen(
+    Question.__table__,
+    "before_drop",
+    DDL("DROP TABLE IF EXISTS questions_fts").execute_if(dialect="sqlite"),
+)
+
 
 class Tag(Base, IdMixin):
     __tablename__ = "tags"
@@ -1359,3 +1472,74 @@ class Installation(Base, IdMixin):
 
 
 InstallationValidator: TypeAlias = sqlalchemy_to_pydantic(Installation)  # type: ignore
+
+
+# Activity rollups
+# ----------------
+# One row per (course, student, question) summarising that student's ``useinfo``
+# events for the question, and whether any of their answers to it was correct.
+# The chapter overview reports read these instead of scanning raw events; see
+# ``components/rsptx/db/crud/rollup.py``, which keeps them up to date.
+class ActivityRollup(Base, IdMixin):
+    __tablename__ = "activity_rollup"
+    __table_args__ = (
+        UniqueConstraint(
+            "course_name", "sid", "div_id", name="activity_rollup_course_sid_div_id"
+        ),
+    )
+    # The Courses ``course_name``, as in useinfo_.
+    course_name = Column(String(512), nullable=False)
+    sid = Column(String(512), nullable=False)
+    div_id = Column(String(512), nullable=False)
+    # Earliest and latest ``useinfo`` timestamp; NULL until an event is seen.
+    first_seen = Column(DateTime)
+    last_seen = Column(DateTime)
+    # How many ``useinfo`` events were recorded.
+    events = Column(Integer, nullable=False, default=0)
+    # True once any answer to the question was correct.
+    correct = Column(Web2PyBoolean, nullable=False, default=False)
+
+
+ActivityRollupValidator: TypeAlias = sqlalchemy_to_pydantic(ActivityRollup)  # type: ignore
+
+
+# How far each source table has been folded into ``activity_rollup``: every row
+# with an id up to ``last_id`` has been counted.
+class RollupWatermark(Base, IdMixin):
+    __tablename__ = "rollup_watermark"
+    source = Column(String(64), nullable=False, unique=True)
+    last_id = Column(Integer, nullable=False, default=0)
+
+
+# Scores waiting to be sent to a course's LMS; see
+# ``rsptx.grading_helpers.lti_push``. One row per (course, assignment, student)
+# holds the latest total, so scores queued faster than they are sent coalesce.
+class LtiScoreOutbox(Base, IdMixin):
+    __tablename__ = "lti_score_outbox"
+    __table_args__ = (
+        UniqueConstraint(
+            "course_id",
+            "assignment_id",
+            "rs_user_id",
+            name="lti_score_outbox_course_assignment_user",
+        ),
+    )
+    course_id = Column(Integer, nullable=False)
+    assignment_id = Column(Integer, nullable=False)
+    rs_user_id = Column(Integer, nullable=False)
+    score = Column(Float(53))
+    # Bumped whenever ``score`` is replaced, so a sender can tell whether the
+    # score it sent is still the latest.
+    version = Column(Integer, nullable=False, default=1)
+    # When the oldest unsent score in this row was queued, and the latest.
+    enqueued_at = Column(DateTime, nullable=False)
+    updated_at = Column(DateTime, nullable=False)
+    # The row is not sent before this time: the end of the coalescing window,
+    # a retry's backoff, or a dispatcher's claim on it.
+    due_at = Column(DateTime, nullable=False, index=True)
+    # Failed sends so far, and why the last one failed.
+    attempts = Column(Integer, nullable=False, default=0)
+    last_error = Column(Text)
+
+
+LtiScoreOutboxValidator: TypeAlias = sqlalchemy_to_pydantic(LtiScoreOutbox)  # type: ignore
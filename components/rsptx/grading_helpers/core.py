@@ -1,4 +1,5 @@
-from typing import Union, List
+import random
+from typing import Optional, Union, List
 from datetime import timedelta
 from rsptx.db.models import AuthUserValidator, DeadlineExceptionValidator
 from rsptx.db.crud import (
@@ -6,8 +7,8 @@ from rsptx.db.crud import (
     fetch_answers,
     create_question_grade_entry,
     fetch_grade,
-    fetch_question_grade,
-    update_question_grade_entry,
+    increment_grade_score,
+    rescore_question_grade,
     upsert_grade,
     fetch_assignment_scores,
     fetch_deadline_exception,
@@ -25,9 +26,9 @@ from rsptx.db.models import (
     GradeValidator,
     AssignmentValidator,
 )
+from rsptx.configuration import settings
 from rsptx.logging import rslogger
-from rsptx.lti1p3.core import attempt_lti1p3_score_update
-from rsptx.grading_helpers.lti_push import schedule_lti1p1_score_push
+from rsptx.grading_helpers.lti_push import schedule_lti_score_push
 from rsptx.grading_helpers.scoring import (
     score_answer_values,
     score_peer_values,
@@ -48,6 +49,9 @@ async def grade_submission(
     """
     # First figure out if the answer is part of an assignment
     update_total = False
+    # How much this answer moved the question's grade, when that is known for
+    # sure; None makes compute_total_score re-sum the whole assignment.
+    delta = None
     accommodation = await fetch_deadline_exception(
         user.course_id, user.username, submission.assignment_id
     )
@@ -86,20 +90,15 @@ async def grade_submission(
             # interaction and upsert the single question_grades row.
             scoreSpec.username = user.username
             scoreSpec.score = await score_one_answer(scoreSpec, submission)
-            answer = await fetch_question_grade(user.username, user.course_name, div_id)
-            if answer:
-                answer.score = scoreSpec.score
-                await update_question_grade_entry(
-                    user.username,
-                    user.course_name,
-                    div_id,
-                    scoreSpec.score,
-                    answer.id,
-                )
-            else:
-                await create_question_grade_entry(
-                    user.username, user.course_name, div_id, scoreSpec.score
-                )
+            change = await rescore_question_grade(
+                user.username, user.course_name, div_id, scoreSpec.score
+            )
+            if change:
+                delta = _score_delta(scoreSpec.score, change.previous)
+            elif await create_question_grade_entry(
+                user.username, user.course_name, div_id, scoreSpec.score
+            ):
+                delta = _score_delta(scoreSpec.score)
             update_total = True
         elif scoreSpec.which_to_grade == "first_answer":
             answers = await fetch_answers(
@@ -109,23 +108,21 @@ async def grade_submission(
                 return scoreSpec
             else:
                 scoreSpec.score = await score_one_answer(scoreSpec, submission)
-                await create_question_grade_entry(
+                if await create_question_grade_entry(
                     user.username, user.course_name, div_id, scoreSpec.score
-                )
+                ):
+                    delta = _score_delta(scoreSpec.score)
                 update_total = True
         elif scoreSpec.which_to_grade == "last_answer":
             scoreSpec.score = await score_one_answer(scoreSpec, submission)
-            answer = await fetch_question_grade(user.username, user.course_name, div_id)
-            if answer:
-                answer.score = scoreSpec.score
-                await update_question_grade_entry(
-                    user.username,
-                    user.course_name,
-                    div_id,
-                    scoreSpec.score,
-                    answer.id,
-                )
+            change = await rescore_question_grade(
+                user.username, user.course_name, div_id, scoreSpec.score
+            )
+            if change:
+                delta = _score_delta(scoreSpec.score, change.previous)
             else:
+                # Saved under submission.div_id, which differs from div_id for
+                # a selectquestion, so only a full re-sum sees it correctly.
                 await create_question_grade_entry(
                     user.username, user.course_name, submission.div_id, scoreSpec.score
                 )
@@ -140,35 +137,32 @@ async def grade_submission(
             rslogger.debug(
                 f"Scoring best answer with current score of {scoreSpec.score}"
             )
-            current_score = await fetch_question_grade(
-                user.username, user.course_name, div_id
-            )
             # Update the score unless the instructor has left a comment.
             # Instructors should have the last word?
-            if current_score:
-                if current_score.score is None:
-                    current_score.score = 0
-                    # maybe if there is no score we should update it regardless of the comment?
-                if (
-                    current_score.score < scoreSpec.score
-                ) and current_score.comment == "autograded":
-                    await update_question_grade_entry(
-                        user.username,
-                        user.course_name,
-                        div_id,
-                        scoreSpec.score,
-                        current_score.id,
-                    )
+            change = await rescore_question_grade(
+                user.username,
+                user.course_name,
+                div_id,
+                scoreSpec.score,
+                only_if_higher=True,
+            )
+            if change:
+                if change.updated:
+                    delta = _score_delta(scoreSpec.score, change.previous)
                     update_total = True
                 else:
-                    scoreSpec.score = current_score.score
+                    # maybe if there is no score we should update it regardless of the comment?
+                    scoreSpec.score = (
+                        change.previous if change.previous is not None else 0
+                    )
             else:
-                await create_question_grade_entry(
+                if await create_question_grade_entry(
                     user.username,
                     user.course_name,
                     div_id,
                     scoreSpec.score,
-                )
+                ):
+                    delta = _score_delta(scoreSpec.score)
                 update_total = True
         elif scoreSpec.which_to_grade == "all_answer":
             # This is a peer instruction question.
@@ -179,30 +173,26 @@ async def grade_submission(
                 scoreSpec.username = user.username
                 scoreSpec.score = await score_one_answer(scoreSpec, submission)
                 rslogger.debug(f"scoreSpec.score = {scoreSpec.score}")
-                answer = await fetch_question_grade(
-                    user.username, user.course_name, submission.div_id
+                change = await rescore_question_grade(
+                    user.username,
+                    user.course_name,
+                    submission.div_id,
+                    scoreSpec.score,
                 )
-                if answer:
-                    answer.score = scoreSpec.score
-                    await update_question_grade_entry(
-                        user.username,
-                        user.course_name,
-                        submission.div_id,
-                        scoreSpec.score,
-                        answer.id,
-                    )
-                else:
-                    await create_question_grade_entry(
-                        user.username,
-                        user.course_name,
-                        submission.div_id,
-                        scoreSpec.score,
-                    )
+                if change:
+                    delta = _score_delta(scoreSpec.score, change.previous)
+                elif await create_question_grade_entry(
+                    user.username,
+                    user.course_name,
+                    submission.div_id,
+                    scoreSpec.score,
+                ):
+                    delta = _score_delta(scoreSpec.score)
                 update_total = True
         if update_total:
             rslogger.debug("Updating total score")
             # Now compute the total
-            await compute_total_score(scoreSpec, user)
+            await compute_total_score(scoreSpec, user, delta=delta)
 
     return scoreSpec
 
@@ -245,56 +235,86 @@ async def score_one_answer(
     return score
 
 
-async def compute_total_score(
+def _score_delta(
+    new_score: Optional[float], old_score: Optional[float] = None
+) -> float:
+    """The change in a question grade, counting a missing score as 0."""
+    return (new_score or 0) - (old_score or 0)
+
+
+async def _sum_assignment_scores(
     scoreSpec: ScoringSpecification, user: AuthUserValidator
+) -> float:
+    res = await fetch_assignment_scores(
+        scoreSpec.assignment_id, user.course_name, user.username
+    )
+    return sum(row.score or 0 for row in res)
+
+
+async def compute_total_score(
+    scoreSpec: ScoringSpecification,
+    user: AuthUserValidator,
+    delta: Optional[float] = None,
 ) -> int:
     """
     Compute the total score for an assignment.
 
+    When ``delta`` -- how much the question just graded moved -- is given and
+    ``settings.incremental_totals`` is on, the total is adjusted by that amount
+    in a single UPDATE rather than re-summed from every question grade. A
+    sample of those updates (``settings.incremental_totals_verify_rate``) is
+    checked against the full sum. The full sum is used whenever the grades
+    row cannot simply be adjusted; see ``increment_grade_score``.
+
     :param scoreSpec: The scoring specification.
     :type scoreSpec: ScoringSpecification
     :param user: The user to compute the score for.
     :type user: AuthUserValidator
+    :param delta: The change in the graded question's score, if known.
+    :type delta: Optional[float]
     :rtype: int
     """
+    total = None
+    if delta is not None and settings.incremental_totals:
+        total = await increment_grade_score(user.id, scoreSpec.assignment_id, delta)
+        if (
+            total is not None
+            and random.random() < settings.incremental_totals_verify_rate
+        ):
+            full = await _sum_assignment_scores(scoreSpec, user)
+            if abs(full - total) > 1e-6:
+                rslogger.warning(
+                    f"Incremental total {total} for {user.username} on assignment "
+                    f"{scoreSpec.assignment_id} drifted from {full}; correcting"
+                )
+                total = None
 
-    res = await fetch_assignment_scores(
-        scoreSpec.assignment_id, user.course_name, user.username
-    )
-    total = 0
-    for row in res:
-        if row.score is None:
-            row.score = 0
-        total += row.score
-
-    rslogger.debug(f"total = {total} for assignment {scoreSpec.assignment_id}")
-    # Now update the grade table with the new total
-
-    grade = await fetch_grade(user.id, scoreSpec.assignment_id)
-    if grade:
-        grade.score = total
-        newGrade = grade
-    else:
-        newGrade = GradeValidator(
-            auth_user=user.id,
-            course_name=user.course_name,
-            assignment=scoreSpec.assignment_id,
-            score=total,
-            manual_total=False,
-        )
-    rslogger.debug(f"newGrade = {newGrade}")
-    res = await upsert_grade(newGrade)
-    # And send the grade off to whichever LTI tools are listening.
+    if total is None:
+        total = await _sum_assignment_scores(scoreSpec, user)
+        rslogger.debug(f"total = {total} for assignment {scoreSpec.assignment_id}")
+        # Now update the grade table with the new total
+        grade = await fetch_grade(user.id, scoreSpec.assignment_id)
+        if grade:
+            grade.score = total
+            newGrade = grade
+        else:
+            newGrade = GradeValidator(
+                auth_user=user.id,
+                course_name=user.course_name,
+                assignment=scoreSpec.assignment_id,
+                score=total,
+                manual_total=False,
+            )
+        rslogger.debug(f"newGrade = {newGrade}")
+        await upsert_grade(newGrade)
+    # And send the grade off to whichever LTI tool is listening.
     #
     # This runs on every scored student answer and every completed reading page
-    # -- the hottest path in the system -- so the two versions are dispatched
-    # differently. The 1.3 push is awaited inline as it always has been. The 1.1
-    # push only reaches an LMS for courses linked over 1.1 (a cached lookup, not
-    # a query per event) and is handed to a debounced background task, because
-    # its replaceResult POST is blocking and a student's save must not wait on a
-    # third-party LMS. See rsptx.grading_helpers.lti_push.
-    await attempt_lti1p3_score_update(user.id, scoreSpec.assignment_id, total)
-    await schedule_lti1p1_score_push(
+    # -- the hottest path in the system -- so the score is only queued here (a
+    # cached version lookup and one upsert) and sent by a debounced background
+    # dispatcher: a student's save must not wait on a third-party LMS. See
+    # rsptx.grading_helpers.lti_push.
+    await schedule_lti_score_push(
         user.id, user.course_id, scoreSpec.assignment_id, total
     )
     return total
@@ -315,23 +335,21 @@ async def score_reading_page(
     # for this reading page.
     score = reading_spec.points
     # get the question_id for this reading page
-    question_grade = await fetch_question_grade(
-        user.username, user.course_name, reading_spec.name
+    change = await rescore_question_grade(
+        user.username, user.course_name, reading_spec.name, score
     )
-    if question_grade:
-        question_grade.score = score
-        await update_question_grade_entry(
-            user.username, user.course_name, reading_spec.name, score, question_grade.id
-        )
-    else:
-        await create_question_grade_entry(
-            user.username, user.course_name, reading_spec.name, score
-        )
+    delta = None
+    if change:
+        delta = _score_delta(score, change.previous)
+    elif await create_question_grade_entry(
+        user.username, user.course_name, reading_spec.name, score
+    ):
+        delta = _score_delta(score)
 
     scoreSpec = ScoringSpecification(
         assigned=True, assignment_id=reading_spec.assignment_id
     )
-    await compute_total_score(scoreSpec, user)
+    await compute_total_score(scoreSpec, user, delta=delta)
 
 
 async def check_for_exceptions(
@@ -9,22 +9,32 @@
 # Two entry points, with deliberately different trade-offs:
 #
 # * :func:`attempt_lti_score_updates` -- instructor-triggered batches (regrade,
-#   recompute totals, manual override). Resolves the version fresh every time
-#   and awaits the send, so the instructor's request does not return until the
-#   LMS has the scores.
-# * :func:`schedule_lti1p1_score_push` -- real-time student activity. Runs on
-#   the hottest path in the system, so it leans on a cached version lookup and
-#   hands the (blocking) 1.1 outcomes POST to a debounced background task.
+#   recompute totals, manual override). Awaits the send, so the instructor's
+#   request does not return until the LMS has the scores.
+# * :func:`schedule_lti_score_push` -- real-time student activity. Runs on
+#   the hottest path in the system, so it only queues the score in a durable
+#   outbox that :class:`LtiOutboxDispatcher` drains in the background,
+#   whichever LTI version the course uses.
 
 import asyncio
-import time
-from typing import Dict, List, Optional, Tuple
+import collections
+import statistics
+from typing import Deque, Dict, List, Optional, Tuple
 
-from rsptx.db.crud import fetch_lti_version, fetch_one_assignment
+from rsptx.db.crud import (
+    claim_lti_scores,
+    complete_lti_scores,
+    discard_lti_scores,
+    enqueue_lti_score,
+    fetch_lti_version,
+    fetch_one_assignment,
+    retry_lti_scores,
+)
 from rsptx.db.models import AssignmentValidator
 from rsptx.logging import rslogger
 from rsptx.lti1p1.core import attempt_lti1p1_score_updates
-from rsptx.lti1p3.core import attempt_lti1p3_score_updates_for
+from rsptx.lti1p3.core import Lti1p3SyncReport, attempt_lti1p3_score_updates_for
+from rsptx.response_helpers.core import canonical_utcnow
 
 
 async def attempt_lti_score_updates(
@@ -33,7 +43,7 @@ async def attempt_lti_score_updates(
     updates: List[Tuple[int, Optional[float]]],
     force: bool = False,
     instructor_triggered: bool = False,
-) -> None:
+) -> Optional[Lti1p3SyncReport]:
     """Push a batch of ``(rs_user_id, score)`` updates to the course's LMS.
 
     Courses linked over LTI 1.1 used to be ignored by every grading path: the
@@ -41,14 +51,9 @@ async def attempt_lti_score_updates(
     of a released assignment, so a later regrade or manual override never
     reached the LMS.
 
-    ``fetch_lti_version`` costs two queries, and the 1.1/1.3 implementations
-    each resolve their per-course credentials once, so callers should hand over
-    the whole set of changed students in one call instead of looping.
-
-    The version is looked up fresh here rather than through
-    :func:`_cached_lti_version`: these callers are instructor-triggered and
-    rare, and an instructor who has just linked a course should not have to wait
-    out a cache TTL to see grades move.
+    The 1.1/1.3 implementations each read the grade rows or resolve the LTI
+    users once per call, so callers should hand over the whole set of changed
+    students in one call instead of looping.
 
     :param assignment: the assignment being graded
     :param course_id: the Runestone course id the assignment belongs to
@@ -57,9 +62,11 @@ async def attempt_lti_score_updates(
     :param instructor_triggered: report the score as submitted before the
         deadline so LMS late policies do not penalize an instructor's entry
         (LTI 1.3 only -- the 1.1 outcomes service carries no submission time)
+    :return: for an LTI 1.3 course, what happened to each student's score;
+        otherwise None
     """
     if not updates:
-        return
+        return None
 
     version = await fetch_lti_version(course_id)
     rslogger.debug(
@@ -69,126 +76,224 @@ async def attempt_lti_score_updates(
     if version == "1.1":
         await attempt_lti1p1_score_updates(assignment, course_id, updates, force=force)
     elif version == "1.3":
-        await attempt_lti1p3_score_updates_for(
+        return await attempt_lti1p3_score_updates_for(
             assignment.id,
             updates,
             force=force,
             instructor_triggered=instructor_triggered,
         )
+    return None
 
 
-# Real-time passback for LTI 1.1
-# ==============================
+# Real-time passback
+# ==================
 #
 # ``compute_total_score`` runs on every scored student answer and every
-# completed reading page, and it used to push to LTI 1.3 only -- so a 1.1 course
-# saw a student's total move in Runestone but not in the LMS until an instructor
-# ran a recompute. Two things kept 1.1 off that path, and both are handled here
-# rather than by skipping the push:
+# completed reading page. It used to push to LTI 1.3 only, and awaited that push
+# inline -- so a 1.1 course saw a student's total move in Runestone but not in
+# the LMS until an instructor ran a recompute, and on a 1.3 course a slow AGS
+# endpoint was added straight onto the student's save. Both are handled here:
 #
-# 1. ``fetch_lti_version`` costs two queries per event. The answer changes only
-#    when a course is linked to or unlinked from an LMS, so it is cached per
-#    course with a short TTL.
-# 2. The 1.1 ``replaceResult`` POST is blocking (oauth2/httplib2 under
-#    ``asyncio.to_thread``) and talks to a third-party LMS. Making a student's
-#    save wait on it would be unacceptable, so it is dispatched off the request
-#    path and debounced: a student working quickly through a page produces one
-#    POST carrying the latest total, not one per answer.
-
-#: How long a cached "which LTI version is this course?" answer stays good.
-#: Short enough that newly linked courses start pushing on their own.
-LTI_VERSION_CACHE_SECONDS = 300.0
-
-#: How long to wait for a student's score to settle before pushing it. Sends for
-#: one (course, assignment, student) are coalesced within this window.
-LTI1P1_DEBOUNCE_SECONDS = 5.0
-
-# course_id -> (version, monotonic timestamp of the lookup)
-_version_cache: Dict[int, Tuple[Optional[str], float]] = {}
+# 1. ``fetch_lti_version`` would cost two queries per event. The answer changes
+#    only when a course is linked to or unlinked from an LMS, so it comes from
+#    ``rsptx.db.crud.lti.lti_cache``, which the linking paths invalidate.
+# 2. Neither version's LMS round trip is made while the student waits. The
+#    score is written to the ``lti_score_outbox`` table and sent from there in
+#    the background: an LMS can take seconds to answer, and the 1.3 AGS calls
+#    need an OAuth token and a line item update before the score itself.
+#
+# The outbox is shared by every worker and survives restarts, so a deploy in
+# the middle of class no longer drops the scores that were waiting to go out.
+# It holds one row per (course, assignment, student): a student working
+# quickly through a page produces one POST carrying the latest total, not one
+# per answer. :class:`LtiOutboxDispatcher` claims due rows, sends them in one
+# batch per course and assignment -- so the course's credentials, grade rows
+# and, for 1.3, its line item update are dealt with once -- and retries failed
+# sends with exponential backoff.
 
-# (course_id, assignment_id, rs_user_id) -> most recent total awaiting a push
-_pending_scores: Dict[Tuple[int, int, int], Optional[float]] = {}
+#: How long a queued score waits before it is sent. Newer scores for the same
+#: (course, assignment, student) replace it within this window.
+LTI_DEBOUNCE_SECONDS = 5.0
 
-# The same key -> the task that will flush it. Also the strong reference that
-# keeps the task from being garbage collected mid-flight.
-_flush_tasks: Dict[Tuple[int, int, int], asyncio.Task] = {}
+#: The most outbox rows a dispatcher claims and sends in one round.
+LTI_OUTBOX_BATCH = 200
 
+#: How long a dispatcher's claim on a row lasts. If it dies mid-send, another
+#: dispatcher sends the row once the claim runs out.
+LTI_OUTBOX_LEASE_SECONDS = 120.0
 
-async def _cached_lti_version(course_id: int) -> Optional[str]:
-    """``fetch_lti_version`` with a short per-course TTL cache.
+#: How often an idle dispatcher looks for due rows.
+LTI_OUTBOX_POLL_SECONDS = 1.0
 
-    Only for the real-time path, where the two-query lookup would otherwise be
-    paid on every scored answer. The cache is per process, so each worker warms
-    its own copy and a stale entry costs at most
-    :data:`LTI_VERSION_CACHE_SECONDS` of missed (or wasted) pushes.
-    """
-    cached = _version_cache.get(course_id)
-    now = time.monotonic()
-    if cached is not None and now - cached[1] < LTI_VERSION_CACHE_SECONDS:
-        return cached[0]
+#: The wait before retrying a failed send; it doubles with each further failure,
+#: up to ``LTI_OUTBOX_MAX_RETRY_SECONDS``.
+LTI_OUTBOX_RETRY_SECONDS = 30.0
+LTI_OUTBOX_MAX_RETRY_SECONDS = 3600.0
 
-    version = await fetch_lti_version(course_id)
-    _version_cache[course_id] = (version, now)
-    return version
+#: Failed sends before a score is given up on. An instructor's recompute
+#: resends every changed total.
+LTI_OUTBOX_MAX_ATTEMPTS = 10
 
 
-async def schedule_lti1p1_score_push(
+async def schedule_lti_score_push(
     rs_user_id: int,
     course_id: int,
     assignment_id: int,
     score: Optional[float],
 ) -> None:
-    """Queue a real-time LTI 1.1 push for one student's assignment total.
+    """Queue a real-time LTI push for one student's assignment total.
 
-    Returns as soon as the score is recorded -- the LMS round trip happens in a
-    background task after :data:`LTI1P1_DEBOUNCE_SECONDS` of quiet. Repeated
-    calls for the same student and assignment replace the pending score instead
-    of queueing another POST.
+    Returns as soon as the score is in the outbox -- the LMS round trip is made
+    by :class:`LtiOutboxDispatcher` after :data:`LTI_DEBOUNCE_SECONDS`.
+    Repeated calls for the same student and assignment replace the waiting
+    score instead of queueing another request.
 
-    Does nothing for courses that are not linked over LTI 1.1; LTI 1.3 courses
-    are served by ``attempt_lti1p3_score_update`` on the same path, which is
-    already non-blocking enough to await inline.
-
-    Nothing is retried: a push lost to an LMS outage or a server restart is
-    repaired by the instructor's recompute, which resends every changed total.
+    Does nothing for courses that are not linked to an LMS.
     """
-    if await _cached_lti_version(course_id) != "1.1":
+    if await fetch_lti_version(course_id) not in ("1.1", "1.3"):
         return
 
-    key = (course_id, assignment_id, rs_user_id)
-    # No await between here and the task check, so a concurrent caller cannot
-    # slip in and leave a pending score with nothing scheduled to flush it.
-    _pending_scores[key] = score
-    if key not in _flush_tasks:
-        _flush_tasks[key] = asyncio.create_task(_flush_pending_score(key))
+    try:
+        await enqueue_lti_score(
+            course_id, assignment_id, rs_user_id, score, LTI_DEBOUNCE_SECONDS
+        )
+    except Exception as e:
+        # The student's answer is already saved; failing it now would not help.
+        # The instructor's recompute resends any total that was missed.
+        rslogger.error(
+            f"LTI - could not queue score for user {rs_user_id} "
+            f"on assignment {assignment_id}: {e}"
+        )
+
+
+def _retry_delay(attempts: int) -> float:
+    """Seconds to wait after the ``attempts``-th failed send of a score."""
+    return min(
+        LTI_OUTBOX_RETRY_SECONDS * 2 ** (attempts - 1), LTI_OUTBOX_MAX_RETRY_SECONDS
+    )
 
 
-async def _flush_pending_score(key: Tuple[int, int, int]) -> None:
-    """Wait for the debounce window, then push the latest score for ``key``.
+class LtiOutboxDispatcher:
+    """Sends the scores waiting in ``lti_score_outbox`` to each course's LMS.
 
-    Loops rather than exiting after one send so that scores arriving *during* a
-    send are picked up by the same task: pushes for one student stay serialized,
-    and the LMS never receives an older total after a newer one.
+    Any number of dispatchers may run -- every book server worker starts one --
+    since each row is claimed before it is sent. :meth:`stats` reports what
+    this one has sent; ``fetch_lti_outbox_stats`` reports the queue itself.
     """
-    course_id, assignment_id, rs_user_id = key
-    try:
-        while key in _pending_scores:
-            await asyncio.sleep(LTI1P1_DEBOUNCE_SECONDS)
-            score = _pending_scores.pop(key, None)
+
+    def __init__(self, latency_samples: int = 1000):
+        self.sent = 0
+        self.failed = 0
+        self.abandoned = 0
+        # Seconds from queueing to sending, for the most recent sends.
+        self.latencies: Deque[float] = collections.deque(maxlen=latency_samples)
+        self._task: Optional[asyncio.Task] = None
+        self._stopping = False
+        self._wakeup = asyncio.Event()
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def start(self) -> None:
+        """Start draining the outbox on the running event loop."""
+        if not self.running:
+            self._wakeup = asyncio.Event()
+            self._stopping = False
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Stop after the round in progress; unsent rows stay in the outbox."""
+        if self._task is not None:
+            self._stopping = True
+            self._wakeup.set()
+            await self._task
+            self._task = None
+
+    def stats(self) -> Dict[str, float]:
+        """Counts of sends by this dispatcher, and their recent latency."""
+        latencies = sorted(self.latencies)
+        return dict(
+            sent=self.sent,
+            failed=self.failed,
+            abandoned=self.abandoned,
+            latency_p50=statistics.median(latencies) if latencies else 0.0,
+            latency_max=latencies[-1] if latencies else 0.0,
+        )
+
+    async def _run(self) -> None:
+        while not self._stopping:
+            claimed = 0
             try:
-                assignment = await fetch_one_assignment(assignment_id)
-                await attempt_lti1p1_score_updates(
-                    assignment, course_id, [(rs_user_id, score)]
-                )
+                claimed = await self.dispatch_once()
             except Exception as e:
-                # A background task's exception would otherwise surface only
-                # when the task is garbage collected.
-                rslogger.error(
-                    f"LTI1.1 - real-time score push failed for user {rs_user_id} "
-                    f"on assignment {assignment_id}: {e}"
+                rslogger.error(f"LTI outbox - dispatch failed: {e}")
+            if claimed < LTI_OUTBOX_BATCH:
+                # Nothing more is due; a full batch means there may be.
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), LTI_OUTBOX_POLL_SECONDS)
+                except asyncio.TimeoutError:
+                    pass
+
+    async def dispatch_once(self) -> int:
+        """Claim one batch of due scores and send it; return how many were claimed."""
+        claimed = await claim_lti_scores(LTI_OUTBOX_BATCH, LTI_OUTBOX_LEASE_SECONDS)
+        groups = collections.defaultdict(list)
+        for row in claimed:
+            groups[(row.course_id, row.assignment_id)].append(row)
+        for (course_id, assignment_id), rows in groups.items():
+            await self._send_group(course_id, assignment_id, rows)
+        return len(claimed)
+
+    async def _send_group(self, course_id: int, assignment_id: int, rows) -> None:
+        failed_users: List[int] = []
+        updates = [(row.rs_user_id, row.score) for row in rows]
+        error = "the LMS did not accept the score"
+        try:
+            # The course may have been relinked since the score was queued;
+            # anything but 1.1 or 1.3 means there is nowhere to send it.
+            version = await fetch_lti_version(course_id)
+            if version == "1.1":
+                assignment = await fetch_one_assignment(assignment_id)
+                if assignment is not None:
+                    await attempt_lti1p1_score_updates(
+                        assignment, course_id, updates, failed=failed_users
+                    )
+            elif version == "1.3":
+                await attempt_lti1p3_score_updates_for(
+                    assignment_id, updates, failed=failed_users
                 )
-    finally:
-        # Runs with no await since the last loop check, so a caller that sees
-        # the key absent from _flush_tasks also sees it absent from
-        # _pending_scores and will schedule a fresh task.
-        _flush_tasks.pop(key, None)
+        except Exception as e:
+            failed_users = [row.rs_user_id for row in rows]
+            error = str(e)
+            rslogger.error(
+                f"LTI - score push failed for assignment {assignment_id}: {e}"
+            )
+
+        done = [row for row in rows if row.rs_user_id not in failed_users]
+        failed = [row for row in rows if row.rs_user_id in failed_users]
+        await complete_lti_scores(done, LTI_DEBOUNCE_SECONDS)
+        now = canonical_utcnow()
+        self.sent += len(done)
+        self.latencies.extend((now - row.enqueued_at).total_seconds() for row in done)
+
+        retry = {
+            row.id: _retry_delay(row.attempts + 1)
+            for row in failed
+            if row.attempts + 1 < LTI_OUTBOX_MAX_ATTEMPTS
+        }
+        abandoned = [row for row in failed if row.id not in retry]
+        self.failed += len(retry)
+        self.abandoned += len(abandoned)
+        await retry_lti_scores(retry, error)
+        if abandoned:
+            await discard_lti_scores(abandoned, LTI_DEBOUNCE_SECONDS)
+            rslogger.error(
+                f"LTI - gave up on {len(abandoned)} score(s) for assignment "
+                f"{assignment_id} after {LTI_OUTBOX_MAX_ATTEMPTS} attempts"
+            )
+
+
+#: The process-wide dispatcher. Servers that grade answers start it in their
+#: lifespan and stop it on shutdown.
+lti_outbox_dispatcher = LtiOutboxDispatcher()
@@ -1,25 +1,35 @@
-from typing import Dict, List, Optional, Union
+import asyncio
+from typing import Callable, Dict, Iterable, List, Optional, Union
 
 from pydantic import BaseModel
-from sqlalchemy import and_, select
+from sqlalchemy import and_, insert, select, update
+from sqlalchemy.exc import IntegrityError
 
 from rsptx.db.async_session import async_session
 from rsptx.db.crud import (
+    fetch_all_grades_for_assignment,
+    fetch_assignment_score_totals,
     fetch_assignment_scores,
     fetch_deadline_exception,
     fetch_grade,
     fetch_question_grade,
     fetch_users_for_course,
+    is_interaction_event,
     upsert_grade,
+    upsert_grade_totals,
 )
 from rsptx.db.models import (
     AssignmentValidator,
     AuthUserValidator,
     CoursesValidator,
+    DeadlineException,
     GradeValidator,
+    Question,
     QuestionGrade,
     QuestionValidator,
     SelectedQuestion,
+    Useinfo,
+    runestone_component_dict,
 )
 from rsptx.grading_helpers.lti_push import attempt_lti_score_updates
 from rsptx.logging import rslogger
@@ -113,6 +123,42 @@ def _effective_deadline(assignment: AssignmentValidator, accommodation):
     return deadline
 
 
+def _before_deadline(rows, deadline):
+    """Keep the submissions made on or before ``deadline`` (None keeps all)."""
+    if deadline is None:
+        return rows
+    return [r for r in rows if r.timestamp is not None and r.timestamp <= deadline]
+
+
+def _interaction_score(aq) -> float:
+    """The score for having interacted with a video or poll at all."""
+    new_score = score_answer_values(
+        how_to_score=aq.autograde,
+        max_score=aq.points or 0,
+        correct=None,
+        percent=None,
+    )
+    if new_score == PEER_SCORE_SENTINEL or new_score is None:
+        # Peer policies are not offered for these types; treat as unscorable
+        # rather than writing a sentinel string into the grade.
+        new_score = 0
+    return float(new_score)
+
+
+async def _select_answer_score(which: str, rows, score_of) -> float:
+    """Score ``rows`` (oldest first) under a ``which_to_grade`` policy."""
+    if which == "first_answer":
+        new_score = await score_of(rows[0])
+    elif which == "best_answer":
+        scores = [await score_of(r) for r in rows]
+        new_score = max(scores) if scores else 0
+    else:
+        new_score = await score_of(rows[-1])
+    if new_score is None:
+        new_score = 0
+    return float(new_score)
+
+
 async def _score_row(
     how_to_score: Optional[str],
     max_score: Union[int, float],
@@ -176,30 +222,16 @@ async def _regrade_interaction_question(
 
     if options.enforce_deadline:
         accommodation = await fetch_deadline_exception(course.id, sid, assignment.id)
-        deadline = _effective_deadline(assignment, accommodation)
-        if deadline is not None:
-            rows = [
-                r for r in rows if r.timestamp is not None and r.timestamp <= deadline
-            ]
+        rows = _before_deadline(rows, _effective_deadline(assignment, accommodation))
 
     if not rows:
         item.skipped = "no_submission"
         return item
 
-    new_score = score_answer_values(
-        how_to_score=aq.autograde,
-        max_score=aq.points or 0,
-        correct=None,
-        percent=None,
-    )
-    if new_score == PEER_SCORE_SENTINEL or new_score is None:
-        # Peer policies are not offered for these types; treat as unscorable
-        # rather than writing a sentinel string into the grade.
-        new_score = 0
-    item.new_score = float(new_score)
+    item.new_score = _interaction_score(aq)
 
     if not dry_run:
-        await _upsert_autograde(sid, course.course_name, div_id, new_score)
+        await _upsert_autograde(sid, course.course_name, div_id, item.new_score)
     return item
 
 
@@ -276,13 +308,9 @@ async def regrade_one(
             accommodation = await fetch_deadline_exception(
                 course.id, sid, assignment.id
             )
-            deadline = _effective_deadline(assignment, accommodation)
-            if deadline is not None:
-                rows = [
-                    r
-                    for r in rows
-                    if r.timestamp is not None and r.timestamp <= deadline
-                ]
+            rows = _before_deadline(
+                rows, _effective_deadline(assignment, accommodation)
+            )
 
         if not rows:
             item.skipped = "no_submission"
@@ -302,17 +330,8 @@ async def regrade_one(
                 course.course_name,
             )
 
-        if which == "first_answer":
-            new_score = await score_of(rows[0])
-        elif which == "best_answer":
-            scores = [await score_of(r) for r in rows]
-            new_score = max(scores) if scores else 0
-        else:
-            new_score = await score_of(rows[-1])
-
-        if new_score is None:
-            new_score = 0
-        item.new_score = float(new_score)
+        new_score = await _select_answer_score(which, rows, score_of)
+        item.new_score = new_score
 
         if not dry_run:
             await _upsert_autograde(sid, course.course_name, div_id, new_score)
@@ -491,12 +510,18 @@ async def _push_total_changes(
             updates.append((user.id, c.new_score))
 
     if updates:
-        await attempt_lti_score_updates(
+        report = await attempt_lti_score_updates(
             assignment,
             course.id,
             updates,
             instructor_triggered=instructor_triggered,
         )
+        if report and report.failed:
+            rslogger.warning(
+                f"LTI - {len(report.failed)} of {len(updates)} recomputed totals "
+                f"for assignment {assignment.id} did not reach the LMS; "
+                f"recompute with push_unchanged to resend them"
+            )
 
 
 async def recompute_totals_detail(
@@ -513,8 +538,12 @@ async def recompute_totals_detail(
     When ``sids`` is empty/None every student in the course is recomputed. Under
     ``dry_run`` nothing is written -- the returned changes describe what a real
     run would do. With ``only_existing`` students who have no ``grades`` row are
-    reported as skipped rather than having one created. Students whose roll-up
-    raises are logged and omitted.
+    reported as skipped rather than having one created.
+
+    The roll-up follows the same rules as ``_recompute_total_for_user`` but is
+    set-based: every student's total comes from one ``GROUP BY`` query, the
+    existing rows from one more, and the totals that moved are written in a
+    single transaction.
 
     Totals that moved are pushed to the course's LMS in a single batch once the
     recompute finishes; ``push_unchanged`` resends every student's total instead
@@ -528,22 +557,52 @@ async def recompute_totals_detail(
     else:
         targets = list(user_map.values())
 
+    totals = await fetch_assignment_score_totals(
+        assignment.id,
+        course.course_name,
+        [u.username for u in targets] if sids else None,
+    )
+    grades = {
+        g.auth_user: g for g in await fetch_all_grades_for_assignment(assignment.id)
+    }
+
     changes: List[TotalChange] = []
+    updates: Dict[int, float] = {}
+    inserts: Dict[int, float] = {}
     for user in targets:
-        try:
+        grade = grades.get(user.id)
+        if grade and grade.manual_total:
             changes.append(
-                await _recompute_total_for_user(
-                    user,
-                    assignment,
-                    course.course_name,
-                    dry_run=dry_run,
-                    only_existing=only_existing,
+                TotalChange(
+                    sid=user.username,
+                    old_score=grade.score,
+                    new_score=grade.score,
+                    skipped_manual=True,
                 )
             )
-        except Exception as e:  # pragma: no cover - defensive
-            rslogger.error(f"recompute totals failed sid={user.username}: {e}")
+            continue
+        if grade is None and only_existing:
+            changes.append(TotalChange(sid=user.username, skipped_no_grade_row=True))
+            continue
+
+        total = apply_threshold_score(
+            totals.get(user.username, 0), assignment.points, assignment.threshold_pct
+        )
+        changes.append(
+            TotalChange(
+                sid=user.username,
+                old_score=grade.score if grade else None,
+                new_score=total,
+            )
+        )
+        if grade is None:
+            inserts[user.id] = total
+        elif grade.score != total:
+            updates[user.id] = total
 
     if not dry_run:
+        if updates or inserts:
+            await upsert_grade_totals(assignment.id, updates, inserts)
         await _push_total_changes(
             course,
             assignment,
@@ -626,26 +685,358 @@ async def regrade_batch(
                 report.changed += 1
 
     if not dry_run and options.recompute_totals and processed_sids:
-        users = await fetch_users_for_course(course.course_name)
-        user_map: Dict[str, AuthUserValidator] = {u.username: u for u in users}
-        changes: List[TotalChange] = []
-        for sid in processed_sids:
-            user = user_map.get(sid)
-            if user is not None:
-                try:
-                    changes.append(
-                        await _recompute_total_for_user(
-                            user, assignment, course.course_name
-                        )
+        await _recompute_regraded_totals(
+            course, assignment, processed_sids, instructor_triggered
+        )
+
+    return report
+
+
+async def _recompute_regraded_totals(
+    course: CoursesValidator,
+    assignment: AssignmentValidator,
+    sids: Iterable[str],
+    instructor_triggered: bool,
+) -> None:
+    """Roll up the totals of the students a re-grade touched and push them."""
+    users = await fetch_users_for_course(course.course_name)
+    user_map: Dict[str, AuthUserValidator] = {u.username: u for u in users}
+    changes: List[TotalChange] = []
+    for sid in sids:
+        user = user_map.get(sid)
+        if user is not None:
+            try:
+                changes.append(
+                    await _recompute_total_for_user(
+                        user, assignment, course.course_name
                     )
-                except Exception as e:  # pragma: no cover - defensive
-                    rslogger.error(f"recompute totals failed sid={sid}: {e}")
-        await _push_total_changes(
-            course,
-            assignment,
-            changes,
-            user_map,
-            instructor_triggered=instructor_triggered,
+                )
+            except Exception as e:  # pragma: no cover - defensive
+                rslogger.error(f"recompute totals failed sid={sid}: {e}")
+    await _push_total_changes(
+        course,
+        assignment,
+        changes,
+        user_map,
+        instructor_triggered=instructor_triggered,
+    )
+
+
+# Bulk re-grade
+# =============
+#
+# ``regrade_batch`` walks the student x question matrix one pair at a time, and
+# every pair costs several queries of its own: the existing grade, the selected
+# question, the accommodation, the answer rows, and the write. That is fine for
+# one student finishing a timed exam, but an instructor re-grading a whole
+# assignment for a large course waited on tens of thousands of round trips.
+#
+# ``regrade_bulk`` produces the same report. It splits the roster into chunks
+# of students and, per chunk, loads each of those inputs with one query (one
+# per answer table for the answers), scores in memory, and writes the grades in
+# two bulk statements. A few chunks run at once.
+
+#: Students loaded, scored and written together by :func:`regrade_bulk`.
+BULK_REGRADE_CHUNK = 50
+#: How many chunks :func:`regrade_bulk` works on at once.
+BULK_REGRADE_CONCURRENCY = 4
+
+
+def _first_by(rows, key) -> dict:
+    """Map ``key(row)`` to the first row with that key."""
+    found: dict = {}
+    for row in rows:
+        found.setdefault(key(row), row)
+    return found
+
+
+def _group_by(rows, key) -> dict:
+    """Map ``key(row)`` to the list of rows with that key, in order."""
+    groups: dict = {}
+    for row in rows:
+        groups.setdefault(key(row), []).append(row)
+    return groups
+
+
+async def _regrade_chunk(
+    course: CoursesValidator,
+    sids: List[str],
+    questions: List[tuple],
+    assignment: AssignmentValidator,
+    options: RegradeOptions,
+    dry_run: bool,
+) -> List[RegradeDiffItem]:
+    """Re-grade every question for a chunk of students; see :func:`regrade_one`."""
+    course_name = course.course_name
+    div_ids = [question.name for question, _ in questions]
+    selectors = [q.name for q, _ in questions if q.question_type == "selectquestion"]
+
+    async with async_session() as session:
+        res = await session.execute(
+            select(QuestionGrade).where(
+                QuestionGrade.course_name == course_name,
+                QuestionGrade.div_id.in_(div_ids),
+                QuestionGrade.sid.in_(sids),
+            )
         )
+        existing = _first_by(res.scalars(), lambda g: (g.sid, g.div_id))
+
+        selected: dict = {}
+        real_types: dict = {}
+        if selectors:
+            res = await session.execute(
+                select(
+                    SelectedQuestion.selector_id,
+                    SelectedQuestion.sid,
+                    SelectedQuestion.selected_id,
+                ).where(
+                    SelectedQuestion.selector_id.in_(selectors),
+                    SelectedQuestion.sid.in_(sids),
+                )
+            )
+            for selector_id, sid, selected_id in res:
+                if selected_id:
+                    selected.setdefault((selector_id, sid), selected_id)
+            if selected:
+                res = await session.execute(
+                    select(Question.name, Question.question_type).where(
+                        Question.name.in_(set(selected.values()))
+                    )
+                )
+                for name, question_type in res:
+                    real_types.setdefault(name, question_type)
+
+        accommodations: dict = {}
+        if options.enforce_deadline:
+            res = await session.execute(
+                select(DeadlineException)
+                .where(
+                    DeadlineException.course_id == course.id,
+                    DeadlineException.assignment_id == assignment.id,
+                    DeadlineException.sid.in_(sids),
+                )
+                .order_by(DeadlineException.id.desc())
+            )
+            accommodations = _first_by(res.scalars(), lambda d: d.sid)
+
+        # Work out where each pair's submissions live, then read each answer
+        # table (and useinfo, per set of interaction events) once for the chunk.
+        plan = {}
+        by_table: Dict[str, set] = {}
+        by_events: Dict[frozenset, set] = {}
+        for sid in sids:
+            for question, aq in questions:
+                scoring_div_id = question.name
+                scoring_type = question.question_type
+                resolved = selected.get((question.name, sid))
+                if resolved:
+                    scoring_div_id = resolved
+                    scoring_type = real_types.get(resolved, scoring_type)
+                events = interaction_events_for(scoring_type)
+                if events:
+                    source = ("useinfo", frozenset(events))
+                    by_events.setdefault(source[1], set()).add(scoring_div_id)
+                else:
+                    tbl, table_name = _answer_table_for(scoring_type)
+                    source = (table_name, tbl)
+                    if tbl is not None:
+                        by_table.setdefault(table_name, set()).add(scoring_div_id)
+                plan[(sid, question.name)] = (scoring_div_id, source)
+
+        submissions: dict = {}
+        for table_name, divs in by_table.items():
+            tbl = runestone_component_dict[table_name].model
+            res = await session.execute(
+                select(tbl)
+                .where(
+                    tbl.div_id.in_(divs),
+                    tbl.course_name == course_name,
+                    tbl.sid.in_(sids),
+                )
+                .order_by(tbl.timestamp.asc())
+            )
+            for key, rows in _group_by(
+                res.scalars(), lambda r: (r.sid, r.div_id)
+            ).items():
+                submissions[(table_name,) + key] = rows
+        for events, divs in by_events.items():
+            res = await session.execute(
+                select(Useinfo)
+                .where(
+                    Useinfo.div_id.in_(divs),
+                    Useinfo.course_id == course_name,
+                    Useinfo.event.in_(list(events)),
+                    Useinfo.sid.in_(sids),
+                )
+                .order_by(Useinfo.timestamp.asc())
+            )
+            for key, rows in _group_by(
+                res.scalars(), lambda r: (r.sid, r.div_id)
+            ).items():
+                submissions[(events,) + key] = rows
+
+    items: List[RegradeDiffItem] = []
+    writes: List[tuple] = []
+    for sid in sids:
+        deadline = None
+        if options.enforce_deadline:
+            deadline = _effective_deadline(assignment, accommodations.get(sid))
+        for question, aq in questions:
+            div_id = question.name
+            item = RegradeDiffItem(sid=sid, question_id=question.id, div_id=div_id)
+            items.append(item)
+            try:
+                current = existing.get((sid, div_id))
+                if current is not None and current.score is not None:
+                    item.old_score = float(current.score)
+                    if (
+                        current.comment != MANUAL_COMMENT
+                        and not options.overwrite_manual
+                    ):
+                        item.skipped = "manual"
+                        item.new_score = item.old_score
+                        continue
+
+                scoring_div_id, (kind, tbl) = plan[(sid, div_id)]
+                if kind == "useinfo":
+                    rows = [
+                        r
+                        for r in submissions.get((tbl, sid, scoring_div_id), [])
+                        if is_interaction_event(r.event, r.act)
+                    ]
+                elif tbl is None:
+                    item.skipped = "no_table"
+                    continue
+                else:
+                    rows = submissions.get((kind, sid, scoring_div_id), [])
+                rows = _before_deadline(rows, deadline)
+                if not rows:
+                    item.skipped = "no_submission"
+                    continue
+
+                if kind == "useinfo":
+                    item.new_score = _interaction_score(aq)
+                else:
+                    which = options.which_to_grade_override or aq.which_to_grade
+
+                    async def score_of(row):
+                        return await _score_row(
+                            aq.autograde,
+                            aq.points or 0,
+                            row,
+                            kind,
+                            sid,
+                            scoring_div_id,
+                            course_name,
+                        )
+
+                    item.new_score = await _select_answer_score(which, rows, score_of)
+                writes.append((sid, div_id, item.new_score, current))
+            except Exception as e:  # pragma: no cover - defensive
+                rslogger.error(f"regrade failed sid={sid} div={div_id}: {e}")
+                item.error = str(e)
 
+    if writes and not dry_run:
+        await _write_autogrades(course_name, writes)
+    return items
+
+
+async def _write_autogrades(course_name: str, writes: List[tuple]) -> None:
+    """Store ``(sid, div_id, score, existing_row)`` grades in two bulk statements.
+
+    A student can answer while a re-grade runs and so create a grade this chunk
+    loaded as missing; if the bulk insert collides with one, the chunk is
+    written again row by row.
+    """
+    updates = [
+        {"id": current.id, "score": score, "comment": MANUAL_COMMENT}
+        for _, _, score, current in writes
+        if current is not None
+    ]
+    inserts = [
+        {
+            "sid": sid,
+            "course_name": course_name,
+            "div_id": div_id,
+            "score": score,
+            "comment": MANUAL_COMMENT,
+        }
+        for sid, div_id, score, current in writes
+        if current is None
+    ]
+    try:
+        async with async_session.begin() as session:
+            if updates:
+                await session.execute(update(QuestionGrade), updates)
+            if inserts:
+                await session.execute(insert(QuestionGrade), inserts)
+    except IntegrityError:
+        for sid, div_id, score, _ in writes:
+            await _upsert_autograde(sid, course_name, div_id, score)
+
+
+async def regrade_bulk(
+    course: CoursesValidator,
+    sids: List[str],
+    questions: List[tuple],
+    assignment: AssignmentValidator,
+    options: RegradeOptions,
+    dry_run: bool = False,
+    instructor_triggered: bool = False,
+    progress: Optional[Callable[[int, int], None]] = None,
+    chunk_size: int = BULK_REGRADE_CHUNK,
+    concurrency: int = BULK_REGRADE_CONCURRENCY,
+) -> RegradeReport:
+    """Re-grade the student x question matrix with bulk reads and writes.
+
+    Takes the same arguments and returns the same report as
+    :func:`regrade_batch`, items in the same order. ``progress``, if given, is
+    called as ``progress(done, total)`` in (student, question) pairs each time a
+    chunk of students finishes.
+    """
+    chunks = [sids[i : i + chunk_size] for i in range(0, len(sids), chunk_size)]
+    total = len(sids) * len(questions)
+    done = 0
+    limit = asyncio.Semaphore(concurrency)
+
+    async def run(chunk: List[str]) -> List[RegradeDiffItem]:
+        nonlocal done
+        async with limit:
+            try:
+                items = await _regrade_chunk(
+                    course, chunk, questions, assignment, options, dry_run
+                )
+            except Exception as e:  # pragma: no cover - defensive
+                rslogger.error(f"regrade chunk failed sids={chunk}: {e}")
+                items = [
+                    RegradeDiffItem(
+                        sid=sid, question_id=q.id, div_id=q.name, error=str(e)
+                    )
+                    for sid in chunk
+                    for q, _ in questions
+                ]
+        done += len(items)
+        if progress is not None:
+            progress(done, total)
+        return items
+
+    report = RegradeReport()
+    for items in await asyncio.gather(*(run(chunk) for chunk in chunks)):
+        for item in items:
+            report.items.append(item)
+            report.total += 1
+            if item.error:
+                report.errors += 1
+            elif item.skipped == "manual":
+                report.skipped_manual += 1
+            elif item.skipped == "no_submission":
+                report.no_submission += 1
+            elif item.new_score != item.old_score:
+                report.changed += 1
+
+    # As in regrade_batch, every student regraded gets a fresh total.
+    if not dry_run and options.recompute_totals and questions and sids:
+        await recompute_totals_detail(
+            course, assignment, sids, instructor_triggered=instructor_triggered
+        )
     return report
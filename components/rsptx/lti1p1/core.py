@@ -6,6 +6,12 @@
 # (replaceResult) for outgoing scores.  These are plain functions with no web
 # framework or web2py dependencies so they can be unit tested and reused by the
 # admin and assignment servers.
+#
+# Grades are sent on one shared ``aiohttp`` session, which keeps a pool of
+# keep-alive connections to each LMS and caps how many are open to any one of
+# them. A recompute that pushes a whole roster sends its ``replaceResult``\ s
+# concurrently over those connections rather than one at a time, each on a new
+# connection in a worker thread, as the blocking oauth2/httplib2 client did.
 
 # Imports
 # =======
@@ -16,6 +22,7 @@ from typing import List, Optional, Tuple
 
 # Third-party imports
 # -------------------
+import aiohttp
 import oauth2
 
 # Local application imports
@@ -30,6 +37,41 @@ from rsptx.db.models import AssignmentValidator
 from rsptx.logging import rslogger
 from .outcome_request import OutcomeRequest, OutcomeResponse
 
+#: Grades in flight at once for one batch.
+LTI1P1_SEND_CONCURRENCY = 16
+
+#: Connections kept open to any one LMS. The LMS sees at most this many
+#: concurrent requests from each worker.
+LTI1P1_CONNECTIONS_PER_HOST = 8
+
+#: Give up on a replaceResult after this many seconds.
+LTI1P1_REQUEST_TIMEOUT = 30
+
+_http_session: Optional[aiohttp.ClientSession] = None
+
+
+def _lti1p1_http_session() -> aiohttp.ClientSession:
+    """The shared session for outcome requests, created on first use."""
+    global _http_session
+    if (
+        _http_session is None
+        or _http_session.closed
+        or _http_session._loop is not asyncio.get_running_loop()
+    ):
+        _http_session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit_per_host=LTI1P1_CONNECTIONS_PER_HOST),
+            timeout=aiohttp.ClientTimeout(total=LTI1P1_REQUEST_TIMEOUT),
+        )
+    return _http_session
+
+
+async def close_lti1p1_http_session() -> None:
+    """Close the shared outcomes session; call from a server's shutdown."""
+    global _http_session
+    if _http_session is not None and not _http_session.closed:
+        await _http_session.close()
+    _http_session = None
+
 
 def param_converter(param):
     """
@@ -91,7 +133,7 @@ def verify_lti1p1_signature(
         return False
 
 
-def send_lti1p1_grade(
+async def send_lti1p1_grade(
     assignment_points: float,
     score: Optional[float],
     consumer: str,
@@ -103,7 +145,8 @@ def send_lti1p1_grade(
     Send an LTI 1.1 grade back to the LMS via a signed replaceResult request.
     The LMS expects a fraction between 0.0 and 1.0.
 
-    Ported from ``rs_grading.send_lti_grade`` in the web2py server.
+    Ported from ``rs_grading.send_lti_grade`` in the web2py server. Raises if
+    the LMS cannot be reached or answers with an HTTP error.
     """
     pct = score / float(assignment_points) if score and assignment_points else 0.0
     if pct > 1.0:
@@ -125,7 +168,7 @@ def send_lti1p1_grade(
             "lis_result_sourcedid": result_sourcedid,
         }
     )
-    resp = request.post_replace_result(pct)
+    resp = await request.post_replace_result_async(pct, _lti1p1_http_session())
     rslogger.debug(f"LTI1.1 grade passback pct={pct} success={resp.is_success()}")
     return resp
 
@@ -135,6 +178,7 @@ async def attempt_lti1p1_score_updates(
     course_id: int,
     updates: List[Tuple[int, Optional[float]]],
     force: bool = False,
+    failed: Optional[List[int]] = None,
 ) -> int:
     """Push a batch of scores back to an LTI 1.1 consumer.
 
@@ -153,9 +197,12 @@ async def attempt_lti1p1_score_updates(
     for an unreleased assignment, or when the course sets
     ``no_lti_auto_grade_update``, unless ``force`` is set.
 
-    NOTE: the underlying ``replaceResult`` POST is blocking (oauth2/httplib2),
-    so each send is handed to a worker thread. Sends are still serialized; a
-    roster-sized batch should be dispatched off the request path.
+    If ``failed`` is given, the ids of students whose send failed (the LMS
+    could not be reached, or did not report success) are appended to it, so
+    the caller can retry them.
+
+    Up to :data:`LTI1P1_SEND_CONCURRENCY` grades are in flight at once, over
+    the shared session's pooled connections.
     """
     if not updates:
         return 0
@@ -187,7 +234,35 @@ async def attempt_lti1p1_score_updates(
         grades = await fetch_all_grades_for_assignment(assignment.id)
         grade_map = {g.auth_user: g for g in grades}
 
-    sent = 0
+    limit = asyncio.Semaphore(LTI1P1_SEND_CONCURRENCY)
+
+    async def send(rs_user_id: int, score: Optional[float], grade) -> bool:
+        async with limit:
+            try:
+                resp = await send_lti1p1_grade(
+                    assignment.points,
+                    score,
+                    lti_key.consumer,
+                    lti_key.secret,
+                    grade.lis_outcome_url,
+                    grade.lis_result_sourcedid,
+                )
+            except Exception as e:
+                # One student's LMS failure must not abandon the rest of the batch.
+                error = f"{e}"
+            else:
+                if resp.is_success():
+                    return True
+                error = f"{resp.code_major}: {resp.description}"
+        if failed is not None:
+            failed.append(rs_user_id)
+        rslogger.error(
+            f"LTI1.1 - grade passback failed for user {rs_user_id} on "
+            f"assignment {assignment.id}: {error}"
+        )
+        return False
+
+    sends = []
     for rs_user_id, score in updates:
         grade = grade_map.get(rs_user_id)
         if not grade or not grade.lis_result_sourcedid or not grade.lis_outcome_url:
@@ -196,23 +271,8 @@ async def attempt_lti1p1_score_updates(
                 f"for user {rs_user_id}: no grade passback identifiers recorded"
             )
             continue
-        try:
-            await asyncio.to_thread(
-                send_lti1p1_grade,
-                assignment.points,
-                score,
-                lti_key.consumer,
-                lti_key.secret,
-                grade.lis_outcome_url,
-                grade.lis_result_sourcedid,
-            )
-            sent += 1
-        except Exception as e:
-            # One student's LMS failure must not abandon the rest of the batch.
-            rslogger.error(
-                f"LTI1.1 - grade passback failed for user {rs_user_id} on "
-                f"assignment {assignment.id}: {e}"
-            )
+        sends.append(send(rs_user_id, score, grade))
+    sent = sum(await asyncio.gather(*sends))
     rslogger.debug(
         f"LTI1.1 - sent {sent} of {len(updates)} score updates for "
         f"assignment {assignment.id}"
@@ -9,15 +9,23 @@
 #
 # Only the pieces Runestone actually uses (sending a grade back to the LMS) are
 # kept here.  The parsing helpers are retained so we can report success/failure.
+#
+# A request can be sent two ways. :meth:`OutcomeRequest.post_outcome_request`
+# blocks, on a fresh oauth2/httplib2 connection. The ``_async`` methods sign the
+# same request and send it on a caller-supplied ``aiohttp`` session, so a batch
+# of grades shares keep-alive connections instead of opening one per POST.
 
 # Imports
 # =======
 # Standard library
 # ----------------
 from collections import defaultdict
+from typing import Dict, Tuple
+from urllib.parse import urlparse, urlunparse
 
 # Third-party imports
 # -------------------
+import aiohttp
 import oauth2
 from lxml import etree, objectify
 
@@ -45,6 +53,10 @@ class InvalidLTIConfigError(Exception):
     """Raised when an OutcomeRequest is missing required attributes."""
 
 
+class OutcomeServiceError(Exception):
+    """Raised when the outcome service answers with an HTTP error status."""
+
+
 class OutcomeResponse:
     """Parses the POX response returned by the LMS outcome service."""
 
@@ -115,6 +127,15 @@ class OutcomeRequest:
                 )
         return self.post_outcome_request()
 
+    async def post_replace_result_async(
+        self, score, session: aiohttp.ClientSession, result_data=None
+    ):
+        """:meth:`post_replace_result`, sent on ``session`` without blocking."""
+        self.operation = REPLACE_REQUEST
+        self.score = score
+        self.result_data = result_data
+        return await self.post_outcome_request_async(session)
+
     def has_required_attributes(self):
         return (
             self.consumer_key is not None
@@ -162,6 +183,47 @@ class OutcomeRequest:
         self.outcome_response = OutcomeResponse.from_post_response(response, content)
         return self.outcome_response
 
+    def signed_request(self) -> Tuple[bytes, Dict[str, str]]:
+        """
+        Build the request body and its OAuth1 headers, signed with HMAC-SHA1
+        and an ``oauth_body_hash`` exactly as ``oauth2.Client`` would sign them.
+
+        :return: (body, headers) ready to POST to ``lis_outcome_service_url``
+        """
+        if not self.has_required_attributes():
+            raise InvalidLTIConfigError(
+                "OutcomeRequest does not have all required attributes"
+            )
+        body = self.generate_request_xml()
+        consumer = oauth2.Consumer(key=self.consumer_key, secret=self.consumer_secret)
+        request = oauth2.Request.from_consumer_and_token(
+            consumer,
+            http_method="POST",
+            http_url=self.lis_outcome_service_url,
+            body=body,
+            is_form_encoded=False,
+        )
+        request.sign_request(oauth2.SignatureMethod_HMAC_SHA1(), consumer, None)
+        scheme, netloc, *_ = urlparse(self.lis_outcome_service_url)
+        # The header name keeps its capital A; some LMSes reject it otherwise.
+        headers = request.to_header(realm=urlunparse((scheme, netloc, "", "", "", "")))
+        headers["Content-Type"] = "application/xml"
+        return body, headers
+
+    async def post_outcome_request_async(self, session: aiohttp.ClientSession):
+        """POST an OAuth-signed request to the Tool Consumer on ``session``."""
+        body, headers = self.signed_request()
+        async with session.post(
+            self.lis_outcome_service_url, data=body, headers=headers
+        ) as response:
+            content = await response.read()
+            if response.status >= 400:
+                raise OutcomeServiceError(
+                    f"{self.lis_outcome_service_url} answered HTTP {response.status}"
+                )
+        self.outcome_response = OutcomeResponse.from_post_response(response, content)
+        return self.outcome_response
+
     def generate_request_xml(self):
         root = etree.Element("imsx_POXEnvelopeRequest", xmlns=_OMS_NS)
 
@@ -1,25 +1,128 @@
+import asyncio
+import contextlib
 import datetime
+from dataclasses import dataclass, field
 
 import aiohttp
-from typing import List, Tuple
+from typing import Dict, List, Optional, Set, Tuple
 
+from rsptx.configuration import settings
 from rsptx.db.crud import (
     fetch_all_grades_for_assignment,
     fetch_lti1p3_grading_data_for_assignment,
     fetch_all_course_attributes,
     fetch_lti1p3_user,
     fetch_lti1p3_users_for_course,
+    Lti1p3GradingData,
 )
 
-from rsptx.db.models import Assignment, Courses, Lti1p3Assignment, Lti1p3User
+from rsptx.db.models import Assignment, Courses, Lti1p3User
 from rsptx.logging import rslogger
 
 from rsptx.lti1p3.tool_conf_rs import ToolConfRS
 from rsptx.lti1p3.pylti1p3.grade import Grade
 from rsptx.lti1p3.pylti1p3.lineitem import LineItem
-from rsptx.lti1p3.pylti1p3.service_connector import ServiceConnector
+from rsptx.lti1p3.pylti1p3.service_connector import (
+    REQUESTS_USER_AGENT,
+    ServiceConnector,
+    TAccessTokenCache,
+)
 from rsptx.lti1p3.pylti1p3.assignments_grades import AssignmentsGradesService
 
+#: Connections kept open to any one platform.
+LTI1P3_CONNECTIONS_PER_HOST = 16
+
+#: Give up on an AGS request after this many seconds.
+LTI1P3_REQUEST_TIMEOUT = 30
+
+# Score pushes reuse one HTTP session -- and so one pool of keep-alive
+# connections per platform -- and each platform's OAuth access token until it
+# expires, rather than paying a TLS handshake and a token request per batch.
+_http_session: Optional[aiohttp.ClientSession] = None
+_access_tokens: TAccessTokenCache = {}
+
+
+class _PlatformLimiter:
+    """
+    Paces the AGS requests made to one platform.
+
+    At most ``concurrency`` are in flight at once and, if ``per_second`` is
+    above zero, they start no closer together than ``1 / per_second`` seconds.
+    """
+
+    def __init__(self, concurrency: int, per_second: float):
+        self.loop = asyncio.get_running_loop()
+        self._slots = asyncio.Semaphore(max(concurrency, 1))
+        self._interval = 1.0 / per_second if per_second > 0 else 0.0
+        self._next_start = 0.0
+
+    @contextlib.asynccontextmanager
+    async def request(self):
+        async with self._slots:
+            if self._interval:
+                # Book the next start time before sleeping so concurrent
+                # callers queue up behind each other rather than all waking
+                # at once.
+                now = self.loop.time()
+                start = max(now, self._next_start)
+                self._next_start = start + self._interval
+                if start > now:
+                    await asyncio.sleep(start - now)
+            yield
+
+
+_platform_limiters: Dict[str, _PlatformLimiter] = {}
+
+
+def _platform_limiter(issuer: str) -> _PlatformLimiter:
+    """The limiter shared by every batch sent to ``issuer`` from this worker."""
+    limiter = _platform_limiters.get(issuer)
+    if limiter is None or limiter.loop is not asyncio.get_running_loop():
+        limiter = _PlatformLimiter(
+            settings.lti1p3_send_concurrency, settings.lti1p3_requests_per_second
+        )
+        _platform_limiters[issuer] = limiter
+    return limiter
+
+
+@dataclass
+class Lti1p3SyncReport:
+    """
+    What happened to each score in a batch sent to an LTI 1.3 platform.
+
+    Every dict is keyed by rs_user_id: ``sent`` holds the score the platform
+    accepted (after any conversion to a percentage), ``failed`` and ``skipped``
+    the reason the score did not reach it.
+    """
+
+    sent: Dict[int, float] = field(default_factory=dict)
+    failed: Dict[int, str] = field(default_factory=dict)
+    skipped: Dict[int, str] = field(default_factory=dict)
+
+
+def _lti1p3_http_session() -> aiohttp.ClientSession:
+    """The shared session for AGS requests, created on first use."""
+    global _http_session
+    if (
+        _http_session is None
+        or _http_session.closed
+        or _http_session._loop is not asyncio.get_running_loop()
+    ):
+        _http_session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit_per_host=LTI1P3_CONNECTIONS_PER_HOST),
+            headers={"User-Agent": REQUESTS_USER_AGENT},
+            timeout=aiohttp.ClientTimeout(total=LTI1P3_REQUEST_TIMEOUT),
+        )
+    return _http_session
+
+
+async def close_lti1p3_http_session() -> None:
+    """Close the shared AGS session; call from a server's shutdown."""
+    global _http_session
+    if _http_session is not None and not _http_session.closed:
+        await _http_session.close()
+    _http_session = None
+
 
 def get_assignment_score_resource_id(course, assignment):
     """
@@ -105,19 +208,12 @@ async def attempt_lti1p3_score_update(
     :param score: The score to send
     :param force: If True, will send the score even if the grades are not yet released in RS or the course is set to not auto-update grades
     :param instructor_triggered: If True, report submission.submittedAt as just before the assignment deadline.
+    :return: What happened to the score, or None if the assignment is not linked to an LTI 1.3 line item.
     """
     rslogger.debug("LTI1p3 - attempt_lti1p3_score_update")
-    lti_assign = await fetch_lti1p3_grading_data_for_assignment(rs_assign_id)
-    if not lti_assign:
-        return
-    rslogger.debug(f"LTI1p3 - {lti_assign.rs_assignment_id}")
-
-    updates = [
-        (await fetch_lti1p3_user(rs_user_id, lti_assign.lti1p3_course.id), score)
-    ]
-    await _send_lti1p3_score_updates(
-        lti_assign=lti_assign,
-        updates=updates,
+    return await attempt_lti1p3_score_updates_for(
+        rs_assign_id,
+        [(rs_user_id, score)],
         force=force,
         instructor_triggered=instructor_triggered,
     )
@@ -125,21 +221,28 @@ async def attempt_lti1p3_score_update(
 
 async def attempt_lti1p3_score_updates(
     rs_assign_id: int, force: bool = False, instructor_triggered: bool = False
-):
+) -> Optional[Lti1p3SyncReport]:
     """
-    Attempt to send a score update to any linked LTI 1.3 tools for a given assignment.
-    Will return early if no LTI 1.3 data is found for the assignment.
+    Sync every graded student's score on an assignment to its LTI 1.3 line item.
+
+    This is the bulk path behind "send all LTI scores": the line item is
+    updated and an access token obtained once, the students' LTI mappings and
+    grades are read in one query each, and the scores are posted concurrently
+    within the platform's limits (see :func:`_platform_limiter`).
 
     :param rs_assign_id: The Runestone assignment id
     :param force: If True, will send the score even if the grades are not yet released in RS or the course is set to not auto-update grades
     :param instructor_triggered: If True, report submission.submittedAt as just before the assignment deadline.
+    :return: What happened to each student's score, or None if the assignment is not linked to an LTI 1.3 line item.
     """
     rslogger.debug("LTI1p3 - attempt_lti1p3_score_updates")
     lti_assign = await fetch_lti1p3_grading_data_for_assignment(rs_assign_id)
     if not lti_assign:
-        return
+        return None
 
-    all_users = await fetch_lti1p3_users_for_course(lti_assign.lti1p3_course.id)
+    all_users = await fetch_lti1p3_users_for_course(
+        lti_assign.lti1p3_course.id, with_rsuser=False
+    )
     all_grades_list = await fetch_all_grades_for_assignment(rs_assign_id)
     grades_dict = {g.auth_user: g.score for g in all_grades_list if g.score is not None}
 
@@ -148,8 +251,7 @@ async def attempt_lti1p3_score_updates(
         if u.rs_user_id in grades_dict:
             updates.append((u, grades_dict[u.rs_user_id]))
 
-    # updates = [(u, grades_dict.get(u.rs_user_id)) for u in all_users if u.rs_user_id in grades_dict]
-    await _send_lti1p3_score_updates(
+    return await _send_lti1p3_score_updates(
         lti_assign=lti_assign,
         updates=updates,
         force=force,
@@ -162,54 +264,83 @@ async def attempt_lti1p3_score_updates_for(
     updates: List[Tuple[int, float]],
     force: bool = False,
     instructor_triggered: bool = False,
-):
+    failed: Optional[List[int]] = None,
+) -> Optional[Lti1p3SyncReport]:
     """
     Attempt to send score updates for an explicit set of users.
 
     Unlike :func:`attempt_lti1p3_score_updates`, which pushes every graded
     student on the assignment, this sends only the users named in ``updates``
-    -- while still resolving the assignment's grading data (and therefore the
-    OAuth token and HTTP session) once for the whole batch rather than once per
+    -- while still resolving the assignment's grading data, the students' LTI
+    mappings and the OAuth token once for the whole batch rather than once per
     student, as repeated :func:`attempt_lti1p3_score_update` calls would.
 
     :param rs_assign_id: The Runestone assignment id
     :param updates: List of tuples (rs_user_id, score) to send
     :param force: If True, will send the score even if the grades are not yet released in RS or the course is set to not auto-update grades
     :param instructor_triggered: If True, report submission.submittedAt as just before the assignment deadline.
+    :param failed: If given, the rs_user_id of every update the platform did not accept is appended to it.
+    :return: What happened to each score, or None if the assignment is not linked to an LTI 1.3 line item.
     """
     rslogger.debug("LTI1p3 - attempt_lti1p3_score_updates_for")
     if not updates:
-        return
+        return None
     lti_assign = await fetch_lti1p3_grading_data_for_assignment(rs_assign_id)
     if not lti_assign:
-        return
+        return None
+
+    # Real-time pushes name one student; anything bigger reads the course's
+    # mappings in one query rather than one per student.
+    lti1p3_course_id = lti_assign.lti1p3_course.id
+    if len(updates) == 1:
+        lti_user = await fetch_lti1p3_user(updates[0][0], lti1p3_course_id)
+        lti_users = {lti_user.rs_user_id: lti_user} if lti_user else {}
+    else:
+        lti_users = {
+            u.rs_user_id: u
+            for u in await fetch_lti1p3_users_for_course(
+                lti1p3_course_id, with_rsuser=False
+            )
+        }
 
     resolved = []
+    unmapped = {}
     for rs_user_id, score in updates:
-        lti_user = await fetch_lti1p3_user(rs_user_id, lti_assign.lti1p3_course.id)
+        lti_user = lti_users.get(rs_user_id)
+        if lti_user is None:
+            # Never launched through the LMS, or enrolled directly: there is
+            # no LTI user id to send to.
+            unmapped[rs_user_id] = "no LTI user mapping for this student"
+            continue
         resolved.append((lti_user, score))
 
-    await _send_lti1p3_score_updates(
+    report = await _send_lti1p3_score_updates(
         lti_assign=lti_assign,
         updates=resolved,
         force=force,
         instructor_triggered=instructor_triggered,
+        failed=failed,
     )
+    report.skipped.update(unmapped)
+    return report
 
 
 async def _send_lti1p3_score_updates(
-    lti_assign: Lti1p3Assignment,
+    lti_assign: Lti1p3GradingData,
     updates: List[Tuple[Lti1p3User, int]],
     force: bool = False,
     instructor_triggered: bool = False,
-):
+    failed: Optional[List[int]] = None,
+) -> Lti1p3SyncReport:
     """
     Attempt to send a set of 1+ updates to any linked LTI 1.3 tools for a given assignment.
 
-    :param lti_assign: The Lti1p3Assignment object - must have the LTI 1.3 course and rs assignment linked. LTIcourse should have rs_course and lti_config linked.
+    :param lti_assign: The assignment's grading data, from fetch_lti1p3_grading_data_for_assignment. Its LTI 1.3 course must have rs_course and lti_config loaded.
     :param updates: List of tuples (Lti1p3User, score) to send
     :param force: If True, will send the score even if the grades are not yet released in RS or the course is set to not auto-update grades
     :param instructor_triggered: If True, set submission.submittedAt just before the assignment deadline so LMS late policies don't mark instructor-entered grades late.
+    :param failed: If given, the rs_user_id of every update that could not be sent is appended to it.
+    :return: What happened to each mapped user's score.
     """
     rslogger.debug(f"LTI1p3 - _send_lti1p3_score_updates {updates}")
 
@@ -218,13 +349,20 @@ async def _send_lti1p3_score_updates(
     rs_assignment = lti_assign.rs_assignment
 
     course_attributes = await fetch_all_course_attributes(rs_course.id)
+    report = Lti1p3SyncReport()
 
     # Check if we should be sending the score yet
-    if (
-        not rs_assignment.released
-        or course_attributes.get("no_lti_auto_grade_update") == "true"
-    ) and not force:
-        return
+    if not force:
+        reason = None
+        if not rs_assignment.released:
+            reason = "grades are not released"
+        elif course_attributes.get("no_lti_auto_grade_update") == "true":
+            reason = "automatic LMS grade updates are off for this course"
+        if reason:
+            for lti_user, _ in updates:
+                if lti_user is not None:
+                    report.skipped[lti_user.rs_user_id] = reason
+            return report
 
     # Check if we should be using points or percentages, determine max_score
     use_pts = course_attributes.get("show_points") == "true"
@@ -232,103 +370,131 @@ async def _send_lti1p3_score_updates(
     if not use_pts:
         max_score = 100
 
+    # rs_user_ids whose scores the platform has not yet accepted
+    unsent: Set[int] = set()
     try:
-        async with aiohttp.ClientSession() as session:
-            # Get the LTI 1.3 registration data for the course and make a service connector
-            lti_conf = lti_assign.lti1p3_course.lti_config
-            reg = ToolConfRS.registration_from_lti_config(lti_conf)
-            sc = ServiceConnector(reg, session)
-
-            # Set up the AGS service
-            service_data = {
-                "lineitem": lti_assign.lti_lineitem_id,
-                "scope": [
-                    "https://purl.imsglobal.org/spec/lti-ags/scope/score",
-                    "https://purl.imsglobal.org/spec/lti-ags/scope/result.readonly",
-                    "https://purl.imsglobal.org/spec/lti-ags/scope/lineitem",
-                    "https://purl.imsglobal.org/spec/lti-ags/scope/lineitem.readonly",
-                ],
-            }
-            ags = AssignmentsGradesService(sc, service_data)
-
-            # Update the line item to ensure the LMS assignment shows the right max score
-            line_item = LineItem().set_id(lti_assign.lti_lineitem_id)
-            update_line_item_from_assignment(
-                line_item, rs_assignment, rs_course, use_pts
-            )
+        # Get the LTI 1.3 registration data for the course and make a service connector
+        lti_conf = lti_assign.lti1p3_course.lti_config
+        reg = ToolConfRS.registration_from_lti_config(lti_conf)
+        sc = ServiceConnector(reg, _lti1p3_http_session(), _access_tokens)
+        limiter = _platform_limiter(reg.get_issuer())
+
+        # Set up the AGS service
+        service_data = {
+            "lineitem": lti_assign.lti_lineitem_id,
+            "scope": [
+                "https://purl.imsglobal.org/spec/lti-ags/scope/score",
+                "https://purl.imsglobal.org/spec/lti-ags/scope/result.readonly",
+                "https://purl.imsglobal.org/spec/lti-ags/scope/lineitem",
+                "https://purl.imsglobal.org/spec/lti-ags/scope/lineitem.readonly",
+            ],
+        }
+        ags = AssignmentsGradesService(sc, service_data)
+
+        # Update the line item to ensure the LMS assignment shows the right max score
+        line_item = LineItem().set_id(lti_assign.lti_lineitem_id)
+        update_line_item_from_assignment(line_item, rs_assignment, rs_course, use_pts)
+
+        rslogger.debug(
+            f"LTI1p3 - Update LineItem {lti_assign.lti_lineitem_id} for assignment {rs_assignment.id}"
+        )
+        try:
+            async with limiter.request():
+                await ags.update_lineitem(line_item)
+        except Exception as e:
+            rslogger.error(f"LTI1p3 - update_lineitem failed: {e}")
+
+        grades = []
+        for lti_user, score in updates:
+            # A student with no LTI mapping in this course (never launched
+            # through the LMS, or enrolled directly) has no user id to send
+            # to. Skip them rather than dereferencing None -- this used to
+            # raise out to the handler below and abandon every remaining
+            # user in the batch.
+            if lti_user is None:
+                rslogger.warning(
+                    f"LTI1p3 - skipping score update on assignment "
+                    f"{rs_assignment.id}: no LTI user mapping for this student"
+                )
+                continue
 
             rslogger.debug(
-                f"LTI1p3 - Update LineItem {lti_assign.lti_lineitem_id} for assignment {rs_assignment.id}"
+                f"LTI1p3 - Sending LTI grade update for RS user id {lti_user.rs_user_id} on assignment {rs_assignment.id}, score {score}"
             )
-            try:
-                await ags.update_lineitem(line_item)
-            except Exception as e:
-                rslogger.error(f"LTI1p3 - update_lineitem failed: {e}")
-
-            for lti_user, score in updates:
-                # A student with no LTI mapping in this course (never launched
-                # through the LMS, or enrolled directly) has no user id to send
-                # to. Skip them rather than dereferencing None -- this used to
-                # raise out to the handler below and abandon every remaining
-                # user in the batch.
-                if lti_user is None:
+
+            if not use_pts:
+                # An assignment worth 0 points has no percentage to express;
+                # sending a raw score against a max of 100 would be wrong, so
+                # report it and move on.
+                if not rs_assignment.points:
                     rslogger.warning(
-                        f"LTI1p3 - skipping score update on assignment "
-                        f"{rs_assignment.id}: no LTI user mapping for this student"
+                        f"LTI1p3 - skipping score update for RS user id "
+                        f"{lti_user.rs_user_id}: assignment {rs_assignment.id} "
+                        f"is worth 0 points, cannot compute a percentage"
+                    )
+                    report.skipped[lti_user.rs_user_id] = (
+                        "the assignment is worth 0 points"
                     )
                     continue
-
-                rslogger.debug(
-                    f"LTI1p3 - Sending LTI grade update for RS user id {lti_user.rs_user_id} on assignment {rs_assignment.id}, score {score}"
+                score = score / rs_assignment.points * 100
+
+            # The total is the raw sum of question_grades, which exceeds the
+            # assignment's points whenever its questions add up to more than
+            # assignment.points. The LMS rejects scoreGiven > scoreMaximum
+            # with a 422, so clamp and say so -- the underlying mismatch is
+            # an authoring problem to fix on the assignment, not here.
+            if max_score is not None and score > max_score:
+                rslogger.warning(
+                    f"LTI1p3 - clamping score {score} to {max_score} for RS "
+                    f"user id {lti_user.rs_user_id} on assignment "
+                    f"{rs_assignment.id}; the computed total exceeds the "
+                    f"assignment's points"
                 )
+                score = max_score
 
-                if not use_pts:
-                    # An assignment worth 0 points has no percentage to express;
-                    # sending a raw score against a max of 100 would be wrong, so
-                    # report it and move on.
-                    if not rs_assignment.points:
-                        rslogger.warning(
-                            f"LTI1p3 - skipping score update for RS user id "
-                            f"{lti_user.rs_user_id}: assignment {rs_assignment.id} "
-                            f"is worth 0 points, cannot compute a percentage"
-                        )
-                        continue
-                    score = score / rs_assignment.points * 100
-
-                # The total is the raw sum of question_grades, which exceeds the
-                # assignment's points whenever its questions add up to more than
-                # assignment.points. The LMS rejects scoreGiven > scoreMaximum
-                # with a 422, so clamp and say so -- the underlying mismatch is
-                # an authoring problem to fix on the assignment, not here.
-                if max_score is not None and score > max_score:
-                    rslogger.warning(
-                        f"LTI1p3 - clamping score {score} to {max_score} for RS "
-                        f"user id {lti_user.rs_user_id} on assignment "
-                        f"{rs_assignment.id}; the computed total exceeds the "
-                        f"assignment's points"
-                    )
-                    score = max_score
+            # Build the grade
+            score_timestamp = time_now()
+            submitted_at = _submitted_at_for_score(
+                rs_assignment, score_timestamp, instructor_triggered
+            )
+            g = (
+                Grade()
+                .set_score_given(score)
+                .set_score_maximum(max_score)
+                .set_user_id(lti_user.lti_user_id)
+                .set_timestamp(score_timestamp)
+                .set_activity_progress("Completed")
+                .set_grading_progress("FullyGraded")
+                .set_extra_claims({"submission": {"submittedAt": submitted_at}})
+            )
+            grades.append((lti_user.rs_user_id, score, g))
+            unsent.add(lti_user.rs_user_id)
 
-                # Send the grade
-                score_timestamp = time_now()
-                submitted_at = _submitted_at_for_score(
-                    rs_assignment, score_timestamp, instructor_triggered
-                )
-                g = (
-                    Grade()
-                    .set_score_given(score)
-                    .set_score_maximum(max_score)
-                    .set_user_id(lti_user.lti_user_id)
-                    .set_timestamp(score_timestamp)
-                    .set_activity_progress("Completed")
-                    .set_grading_progress("FullyGraded")
-                    .set_extra_claims({"submission": {"submittedAt": submitted_at}})
+        # AGS takes one score per request, so a batch is sent as concurrent
+        # requests over the shared connections rather than one after another,
+        # paced by the platform's limiter.
+        async def put_grade(rs_user_id, score, g):
+            try:
+                async with limiter.request():
+                    await ags.put_grade(g, line_item)
+                unsent.discard(rs_user_id)
+                report.sent[rs_user_id] = score
+            except Exception as e:
+                report.failed[rs_user_id] = f"{e}"
+                rslogger.error(
+                    f"LTI1p3 - put_grade failed: {e}. RS user id {rs_user_id} on assignment {rs_assignment.id}, score {score}."
                 )
-                try:
-                    _ = await ags.put_grade(g, line_item)
-                except Exception as e:
-                    rslogger.error(
-                        f"LTI1p3 - put_grade failed: {e}. RS user id {lti_user.rs_user_id} on assignment {rs_assignment.id}, score {score}."
-                    )
+
+        await asyncio.gather(*(put_grade(*grade) for grade in grades))
     except Exception as e:
         rslogger.error(f"LTI1p3 - grade update failed: {e}")
+        unsent.update(
+            lti_user.rs_user_id
+            for lti_user, _ in updates
+            if lti_user is not None and lti_user.rs_user_id not in report.skipped
+        )
+        for rs_user_id in unsent:
+            report.failed.setdefault(rs_user_id, f"{e}")
+    if failed is not None:
+        failed.extend(unsent)
+    return report
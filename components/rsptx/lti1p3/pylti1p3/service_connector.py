@@ -25,18 +25,36 @@ TServiceConnectorResponse = te.TypedDict(
 REQUESTS_USER_AGENT = "PyLTI1p3-client"
 
 
+# Seconds before a token's stated expiry that it stops being reused, so a
+# request is never sent with a token that lapses on the way.
+ACCESS_TOKEN_EXPIRY_MARGIN = 60
+
+# Lifetime assumed for a token whose response gives no expires_in.
+ACCESS_TOKEN_DEFAULT_LIFETIME = 3600
+
+TAccessTokenCache = t.MutableMapping[str, t.Tuple[str, float]]
+
+
 class ServiceConnector:
     _registration: Registration
-    _access_tokens: t.Dict[str, str]
+    _access_tokens: TAccessTokenCache
     _own_session: bool
 
     def __init__(
         self,
         registration: Registration,
         requests_session: t.Optional[aiohttp.ClientSession] = None,
+        access_token_cache: t.Optional[TAccessTokenCache] = None,
     ):
+        """
+        :param registration: the platform registration to authenticate as
+        :param requests_session: aiohttp session to send requests with
+        :param access_token_cache: mapping to keep access tokens in. Pass the
+            same mapping to every connector to reuse a platform's tokens until
+            they expire, instead of fetching a new one per connector.
+        """
         self._registration = registration
-        self._access_tokens = {}
+        self._access_tokens = {} if access_token_cache is None else access_token_cache
         if requests_session:
             self._own_session = False
             self._requests_session = requests_session
@@ -70,10 +88,11 @@ class ServiceConnector:
         scopes_str: str = "|".join(scopes)
         scopes_bytes = scopes_str.encode("utf-8")
 
-        scope_key = hashlib.md5(scopes_bytes).hexdigest()
+        scope_key = self._token_key(scopes_bytes)
 
-        if scope_key in self._access_tokens:
-            return self._access_tokens[scope_key]
+        cached = self._access_tokens.get(scope_key)
+        if cached is not None and cached[1] > time.time():
+            return cached[0]
 
         # Build up JWT to exchange for an auth token
         client_id = self._registration.get_client_id()
@@ -129,8 +148,33 @@ class ServiceConnector:
                 r.reason = "JSON decode error"
                 raise LtiServiceException(r)
 
-        self._access_tokens[scope_key] = response["access_token"]
-        return self._access_tokens[scope_key]
+        try:
+            lifetime = int(response.get("expires_in", ACCESS_TOKEN_DEFAULT_LIFETIME))
+        except (TypeError, ValueError):
+            lifetime = ACCESS_TOKEN_DEFAULT_LIFETIME
+        self._access_tokens[scope_key] = (
+            response["access_token"],
+            time.time() + lifetime - ACCESS_TOKEN_EXPIRY_MARGIN,
+        )
+        return response["access_token"]
+
+    def _token_key(self, scopes_bytes: bytes) -> str:
+        # The cache may be shared between registrations, so the key names the
+        # platform and client as well as the scopes.
+        return hashlib.md5(
+            b"|".join(
+                [
+                    str(self._registration.get_issuer()).encode("utf-8"),
+                    str(self._registration.get_client_id()).encode("utf-8"),
+                    scopes_bytes,
+                ]
+            )
+        ).hexdigest()
+
+    def forget_access_token(self, scopes: t.Sequence[str]) -> None:
+        """Drop the cached token for ``scopes``, e.g. after the platform rejects it."""
+        scopes_bytes = "|".join(sorted(scopes)).encode("utf-8")
+        self._access_tokens.pop(self._token_key(scopes_bytes), None)
 
     def encode_jwt(
         self,
@@ -153,23 +197,18 @@ class ServiceConnector:
         accept: str = "application/json",
         case_insensitive_headers: bool = False,
     ) -> TServiceConnectorResponse:
-        access_token = await self.get_access_token(scopes)
-        headers = {"Authorization": "Bearer " + access_token, "Accept": accept}
+        r = await self._send_service_request(
+            scopes, url, method, data, content_type, accept
+        )
+        if r.status == 401:
+            # A reused token the platform has revoked early; fetch a fresh one.
+            r.release()
+            self.forget_access_token(scopes)
+            r = await self._send_service_request(
+                scopes, url, method, data, content_type, accept
+            )
 
-        r = None
-        if method == "GET":
-            r = await self._requests_session.get(url, headers=headers)
-        elif method == "POST":
-            headers["Content-Type"] = content_type
-            post_data = data or None
-            r = await self._requests_session.post(url, data=post_data, headers=headers)
-        elif method == "PUT":
-            headers["Content-Type"] = content_type
-            put_data = data or None
-            r = await self._requests_session.put(url, data=put_data, headers=headers)
-        elif method == "DELETE":
-            headers["Content-Type"] = content_type
-            r = await self._requests_session.delete(url, headers=headers)
+        if method == "DELETE":
             if not r.ok:
                 raise LtiServiceException(r)
             return {
@@ -178,8 +217,6 @@ class ServiceConnector:
                 "next_page_url": None,
             }
             # todo  - think about that return for delete
-        else:
-            raise LtiException("Unsupported HTTP method: " + method)
 
         if not r.ok:
             raise LtiServiceException(r)
@@ -207,3 +244,33 @@ class ServiceConnector:
             "body": json_body if r.content else None,
             "next_page_url": next_page_url if next_page_url else None,
         }
+
+    async def _send_service_request(
+        self,
+        scopes: t.Sequence[str],
+        url: str,
+        method: str,
+        data: t.Optional[str],
+        content_type: str,
+        accept: str,
+    ) -> aiohttp.ClientResponse:
+        access_token = await self.get_access_token(scopes)
+        headers = {"Authorization": "Bearer " + access_token, "Accept": accept}
+
+        r = None
+        if method == "GET":
+            r = await self._requests_session.get(url, headers=headers)
+        elif method == "POST":
+            headers["Content-Type"] = content_type
+            post_data = data or None
+            r = await self._requests_session.post(url, data=post_data, headers=headers)
+        elif method == "PUT":
+            headers["Content-Type"] = content_type
+            put_data = data or None
+            r = await self._requests_session.put(url, data=put_data, headers=headers)
+        elif method == "DELETE":
+            headers["Content-Type"] = content_type
+            r = await self._requests_session.delete(url, headers=headers)
+        else:
+            raise LtiException("Unsupported HTTP method: " + method)
+        return r
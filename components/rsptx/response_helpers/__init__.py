@@ -1,4 +1,4 @@
 from rsptx.response_helpers import core
-from rsptx.response_helpers.core import construct_course_url, safe_join
+from rsptx.response_helpers.core import construct_course_url, peer_channel, safe_join
 
-__all__ = ["core", "construct_course_url", "safe_join"]
+__all__ = ["core", "construct_course_url", "peer_channel", "safe_join"]
@@ -162,6 +162,15 @@ def construct_course_url(course: Any, *args: str) -> str:
     return f"/ns/books/published/{course.course_name}/{rest}"
 
 
+def peer_channel(course_name: str) -> str:
+    """The Redis pub/sub channel that carries a course's peer instruction messages.
+
+    Each course gets its own channel so a book server worker only receives
+    traffic for the courses its students are connected to.
+    """
+    return f"peermessages:{course_name}"
+
+
 # This is copied verbatim from
 # https://github.com/pallets/werkzeug/blob/master/werkzeug/security.py#L30.
 _os_alt_seps = [sep for sep in [os.path.sep, os.path.altsep] if sep not in (None, "/")]
@@ -1,15 +1,19 @@
 from pathlib import Path
 from rsptx.templates import core
 from rsptx.templates.core import (
+    clear_book_templates,
     format_course_datetime,
+    get_book_templates,
     get_jinja_templates,
     get_shared_templates,
     install_filters,
 )
 
 __all__ = [
+    "clear_book_templates",
     "core",
     "format_course_datetime",
+    "get_book_templates",
     "get_jinja_templates",
     "get_shared_templates",
     "install_filters",
@@ -1,6 +1,8 @@
 import datetime
+import os
+from collections import OrderedDict
 from pathlib import Path
-from typing import Optional, Union
+from typing import Any, Dict, Optional, Tuple, Union
 from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
 
 import jinja2
@@ -158,3 +160,136 @@ def get_jinja_templates(book_path: str) -> Jinja2Templates:
     )
     install_filters(env)
     return Jinja2Templates(env=env)
+
+
+# Book page environments
+# ======================
+# Book pages are themselves Jinja templates, one per page, built by Runestone
+# or PreTeXt. Constructing a ``Jinja2Templates`` per request throws away the
+# environment's template cache, so every page view re-read and re-compiled the
+# page from disk. Environments are instead kept in a small process-wide LRU
+# pool keyed by ``(base_course, markup_system)``.
+#
+# Staleness is handled at two levels. Jinja's ``auto_reload`` already checks
+# the mtime of each cached page before reusing it, which covers a rebuild that
+# rewrites pages in place. A rebuild or deploy that adds or removes pages also
+# touches the book directory itself, so the directory's mtime is recorded as
+# the entry's build stamp and a changed stamp discards the whole environment.
+
+#: How many book environments a process keeps before evicting the least
+#: recently used one.
+BOOK_TEMPLATE_POOL_SIZE = 64
+
+# (base_course, markup_system) -> (templates, build stamp of the book directory)
+_book_templates: "OrderedDict[Tuple[str, str], Tuple[Jinja2Templates, float]]" = (
+    OrderedDict()
+)
+
+# One bytecode cache per directory; Jinja keys its entries by the template's
+# absolute filename and checks a source checksum, so books can share it. The
+# key says nothing about the delimiters a page was compiled with, so each set
+# of delimiters gets its own subdirectory.
+_bytecode_caches: Dict[str, jinja2.BytecodeCache] = {}
+
+# Delimiters PreTeXt books are built with; see _make_book_templates.
+_PRETEXT_DELIMITERS = dict(
+    variable_start_string="~._",
+    variable_end_string="_.~",
+    comment_start_string="@@#",
+    comment_end_string="#@@",
+)
+
+
+def _book_build_stamp(directory: Union[str, Path]) -> float:
+    """Return the mtime of a published book directory, or 0 if it is missing."""
+    try:
+        return os.stat(directory).st_mtime
+    except OSError:
+        return 0.0
+
+
+def _get_bytecode_cache(directory: str) -> jinja2.BytecodeCache:
+    cache = _bytecode_caches.get(directory)
+    if cache is None:
+        os.makedirs(directory, exist_ok=True)
+        cache = jinja2.FileSystemBytecodeCache(directory)
+        _bytecode_caches[directory] = cache
+    return cache
+
+
+def _make_book_templates(
+    directory: Union[str, Path],
+    markup_system: str,
+    bytecode_cache_dir: Optional[str],
+    extra_globals: Optional[Dict[str, Any]],
+) -> Jinja2Templates:
+    options: Dict[str, Any] = {}
+    # Books built with lots of LaTeX math in them are troublesome as they tend
+    # to have many instances of ``{{`` and ``}}`` which conflict with the
+    # default Jinja2 delimiters. Rather than escaping all of the math, PreTeXt
+    # books are built with different delimiters.
+    if markup_system == "PreTeXt":
+        options.update(_PRETEXT_DELIMITERS)
+    if bytecode_cache_dir:
+        options["bytecode_cache"] = _get_bytecode_cache(
+            os.path.join(
+                bytecode_cache_dir, "pretext" if markup_system == "PreTeXt" else "jinja"
+            )
+        )
+    env = jinja2.Environment(
+        loader=jinja2.FileSystemLoader(directory),
+        autoescape=True,
+        auto_reload=True,
+        **options,
+    )
+    if extra_globals:
+        env.globals.update(extra_globals)
+    return Jinja2Templates(env=env)
+
+
+def get_book_templates(
+    base_course: str,
+    markup_system: str,
+    directory: Union[str, Path],
+    bytecode_cache_dir: Optional[str] = None,
+    pool_size: int = BOOK_TEMPLATE_POOL_SIZE,
+    extra_globals: Optional[Dict[str, Any]] = None,
+) -> Jinja2Templates:
+    """Return the pooled ``Jinja2Templates`` for a book's published pages.
+
+    The environment, and therefore its cache of compiled pages, is reused
+    across requests until the book directory changes or the entry is evicted.
+
+    :param base_course: the base course the book is published under
+    :param markup_system: ``"PreTeXt"`` selects the PreTeXt delimiters; anything
+        else gets the Jinja defaults
+    :param directory: the published book directory to load pages from
+    :param bytecode_cache_dir: if given, compiled pages are also cached on disk
+        here so a new worker (or a rebuilt environment) skips compilation
+    :param pool_size: the most environments to keep in this process
+    :param extra_globals: globals installed when the environment is created
+    """
+    key = (base_course, markup_system)
+    stamp = _book_build_stamp(directory)
+    entry = _book_templates.get(key)
+    if entry is not None and entry[1] == stamp:
+        _book_templates.move_to_end(key)
+        return entry[0]
+
+    templates = _make_book_templates(
+        directory, markup_system, bytecode_cache_dir, extra_globals
+    )
+    _book_templates[key] = (templates, stamp)
+    _book_templates.move_to_end(key)
+    while len(_book_templates) > max(pool_size, 1):
+        _book_templates.popitem(last=False)
+    return templates
+
+
+def clear_book_templates(base_course: Optional[str] = None) -> None:
+    """Drop pooled book environments, for one base course or all of them."""
+    if base_course is None:
+        _book_templates.clear()
+        return
+    for key in [k for k in _book_templates if k[0] == base_course]:
+        del _book_templates[key]
@@ -454,10 +454,11 @@ function getStatus(taskID) {
             if (taskStatus === "SUCCESS" || taskStatus === "FAILURE" || taskStatus === "COMPLETE") {
                 if (
                     res.task_result.current == "csv.zip file created" ||
+                    res.task_result.current == "parquet file created" ||
                     res.task_result.current == "Ready for download"
                 ) {
                     let kind = "datashop";
-                    if (res.task_result.current == "csv.zip file created") {
+                    if (res.task_result.current != "Ready for download") {
                         kind = "logfiles";
                     }
                     // Get the list of files for download and add to the list.
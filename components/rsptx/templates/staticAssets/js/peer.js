@@ -474,8 +474,13 @@ async function sendLtiScores(event) {
     });
     let resp = await fetch(request);
     let spec = await resp.json();
-    if (spec !== "success") {
-        alert(`Scores not sent! ${spec}`);
+    if (!spec.ok) {
+        let reason = spec.error;
+        if (!reason) {
+            let failed = Object.entries(spec.failed).map(([sid, why]) => `${sid}: ${why}`);
+            reason = `${spec.sent} sent, ${failed.length} rejected by the LMS:\n${failed.join("\n")}`;
+        }
+        alert(`Scores not sent! ${reason}`);
     } else {
         // success
         let butt = document.querySelector("#sendScores");
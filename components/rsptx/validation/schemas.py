@@ -69,6 +69,10 @@ def sqlalchemy_to_pydantic(
         name = column.key
         if name in exclude:
             continue
+        # A required column the database fills in itself can't be given as
+        # None, so leave it to the database.
+        if column.server_default is not None and not column.nullable:
+            continue
 
         # Determine the Python type of the column.
         python_type = column.type.python_type
@@ -294,9 +298,10 @@ class ExercisesSearchRequest(BaseModel):
     page: int = 0
     limit: int = 20
 
-    # Sorting
+    # Sorting -- a questions column, or "relevance" to rank the results of a
+    # "global" text search best match first
     sorting: Dict[str, Any] = Field(
-        default_factory=lambda: {"field": "name", "order": 1}
+        default_factory=lambda: {"field": "relevance", "order": 1}
     )
 
     # Filters - consolidated JSON object for all filter types
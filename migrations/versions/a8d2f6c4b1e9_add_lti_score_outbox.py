@@ -0,0 +1,53 @@
+"""add lti_score_outbox
+
+Real-time LTI 1.1 grade pushes were queued in each worker's memory, so a
+deploy or restart dropped whatever was still waiting. lti_score_outbox
+keeps them in the database until they are sent, shared by every worker.
+
+Revision ID: a8d2f6c4b1e9
+Revises: c4e1a7b9d2f3
+Create Date: 2026-10-18 00:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision: str = 'a8d2f6c4b1e9'
+down_revision: Union[str, None] = 'c4e1a7b9d2f3'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'lti_score_outbox',
+        sa.Column('course_id', sa.Integer(), nullable=False),
+        sa.Column('assignment_id', sa.Integer(), nullable=False),
+        sa.Column('rs_user_id', sa.Integer(), nullable=False),
+        sa.Column('score', sa.Float(precision=53), nullable=True),
+        sa.Column('version', sa.Integer(), nullable=False),
+        sa.Column('enqueued_at', sa.DateTime(), nullable=False),
+        sa.Column('updated_at', sa.DateTime(), nullable=False),
+        sa.Column('due_at', sa.DateTime(), nullable=False),
+        sa.Column('attempts', sa.Integer(), nullable=False),
+        sa.Column('last_error', sa.Text(), nullable=True),
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint(
+            'course_id',
+            'assignment_id',
+            'rs_user_id',
+            name='lti_score_outbox_course_assignment_user',
+        ),
+    )
+    op.create_index(
+        op.f('ix_lti_score_outbox_due_at'), 'lti_score_outbox', ['due_at'], unique=False
+    )
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_lti_score_outbox_due_at'), table_name='lti_score_outbox')
+    op.drop_table('lti_score_outbox')
@@ -0,0 +1,55 @@
+"""add question search index
+
+The assignment builder's exercise search matched every keystroke with
+ILIKE '%term%' across questions.name, author, topic, tags and htmlsrc,
+which reads the whole table each time. This adds a generated tsvector
+column over those columns with a GIN index, and a trigram index on name for
+matching fragments of a name.
+
+Adding a stored generated column rewrites the questions table, so expect
+this to take a while, holding a lock on the table, on a large database.
+
+Revision ID: b3f7e2a9c5d1
+Revises: a8d2f6c4b1e9
+Create Date: 2026-10-18 00:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+revision: str = 'b3f7e2a9c5d1'
+down_revision: Union[str, None] = 'a8d2f6c4b1e9'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.execute(
+        """
+        ALTER TABLE questions ADD COLUMN IF NOT EXISTS search_vector tsvector
+        GENERATED ALWAYS AS (
+            setweight(to_tsvector('simple', coalesce(name, '')), 'A')
+            || setweight(to_tsvector('simple', coalesce(topic, '') || ' '
+                || coalesce(tags, '') || ' ' || coalesce(author, '')), 'B')
+            || setweight(to_tsvector('simple',
+                left(coalesce(htmlsrc, ''), 200000)), 'D')
+        ) STORED
+        """
+    )
+    op.execute(
+        "CREATE INDEX IF NOT EXISTS questions_search_vector_idx "
+        "ON questions USING gin (search_vector)"
+    )
+    op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    op.execute(
+        "CREATE INDEX IF NOT EXISTS questions_name_trgm_idx "
+        "ON questions USING gin (name gin_trgm_ops)"
+    )
+
+
+def downgrade() -> None:
+    op.execute("DROP INDEX IF EXISTS questions_name_trgm_idx")
+    op.execute("DROP INDEX IF EXISTS questions_search_vector_idx")
+    op.execute("ALTER TABLE questions DROP COLUMN IF EXISTS search_vector")
@@ -0,0 +1,57 @@
+"""add activity_rollup and rollup_watermark
+
+The chapter overview reports pivoted over every useinfo row for a course,
+so they got slower all term. activity_rollup keeps one row per course,
+student and question, folded in incrementally from useinfo and the answer
+tables; rollup_watermark records how far each source has been read.
+
+Both start empty: ``rsmanage rollup`` backfills them.
+
+Revision ID: c4e1a7b9d2f3
+Revises: f3b8d5c2a710
+Create Date: 2026-10-18 00:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from rsptx.db.models import Web2PyBoolean
+
+
+revision: str = 'c4e1a7b9d2f3'
+down_revision: Union[str, None] = 'f3b8d5c2a710'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'activity_rollup',
+        sa.Column('course_name', sa.String(length=512), nullable=False),
+        sa.Column('sid', sa.String(length=512), nullable=False),
+        sa.Column('div_id', sa.String(length=512), nullable=False),
+        sa.Column('first_seen', sa.DateTime(), nullable=True),
+        sa.Column('last_seen', sa.DateTime(), nullable=True),
+        sa.Column('events', sa.Integer(), nullable=False),
+        sa.Column('correct', Web2PyBoolean(length=1), nullable=False),
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint('id'),
+        # Reports always filter on the course first, so this also serves them.
+        sa.UniqueConstraint(
+            'course_name', 'sid', 'div_id', name='activity_rollup_course_sid_div_id'
+        ),
+    )
+    op.create_table(
+        'rollup_watermark',
+        sa.Column('source', sa.String(length=64), nullable=False),
+        sa.Column('last_id', sa.Integer(), nullable=False),
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('source'),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('rollup_watermark')
+    op.drop_table('activity_rollup')
@@ -0,0 +1,61 @@
+"""add inserted_at to the activity rollup's source tables
+
+The activity rollup decided a row was safe to fold in from its timestamp,
+which is when the request was handled. Page views are written behind a
+queue, so a row can arrive long after that, and the watermark could move
+past a lower id that had not been committed yet. inserted_at is set by the
+database when the row gets its id.
+
+Existing rows get a constant value first, so the tables are not rewritten;
+they were all committed before this migration could take its locks.
+
+Revision ID: d6a1c8e3f0b7
+Revises: b3f7e2a9c5d1
+Create Date: 2026-10-18 00:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision: str = 'd6a1c8e3f0b7'
+down_revision: Union[str, None] = 'b3f7e2a9c5d1'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+TABLES = [
+    'useinfo',
+    'mchoice_answers',
+    'fitb_answers',
+    'parsons_answers',
+    'codelens_answers',
+    'clickablearea_answers',
+    'splice_answers',
+    'dragndrop_answers',
+    'unittest_answers',
+]
+
+
+def upgrade() -> None:
+    for table in TABLES:
+        op.add_column(
+            table,
+            sa.Column(
+                'inserted_at',
+                sa.DateTime(),
+                server_default=sa.text("'1970-01-01 00:00:00'"),
+                nullable=False,
+            ),
+        )
+        op.alter_column(
+            table,
+            'inserted_at',
+            server_default=sa.text("TIMEZONE('utc', CLOCK_TIMESTAMP())"),
+        )
+
+
+def downgrade() -> None:
+    for table in TABLES:
+        op.drop_column(table, 'inserted_at')
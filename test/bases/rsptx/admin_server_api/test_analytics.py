@@ -7,6 +7,8 @@ import pandas as pd
 from rsptx.admin_server_api.routers.analytics import (
     _format_duedate,
     _pad_with_enrolled,
+    _shape_activity_table,
+    _shape_correct_count,
     _student_label,
 )
 
@@ -101,3 +103,185 @@ def test_format_duedate_omits_any_timezone_label():
     stamp = pd.Timestamp("2026-09-02 04:59:00")
     assert _format_duedate(stamp, "America/Chicago") == "2026-09-01"
     assert "CDT" not in _format_duedate(stamp, "America/Chicago")
+
+
+# Report shaping
+# --------------
+# The expected records below are what the reports produced when they were
+# built with per-row apply/iterrows calls, so the column-wise shaping has to
+# match them cell for cell -- including the blank (None) cells a pivot leaves
+# where a student has done nothing in a subchapter others have worked in.
+
+ERIN = "Kussman, Erin (ekussman)"
+ELIJAH = "Cline, Elijah (elijahcline)"
+BO = "Adams, Bo (badams)"
+
+
+def _activity(timestamp="first_seen"):
+    # Erin worked on q1 and q2 in sub1 and q3 in sub2; Elijah only on q1.
+    rows = pd.DataFrame(
+        {
+            "sid": ["ekussman", "ekussman", "ekussman", "elijahcline"],
+            "first_name": ["Erin", "Erin", "Erin", "Elijah"],
+            "last_name": ["Kussman", "Kussman", "Kussman", "Cline"],
+            "first_seen": pd.to_datetime(
+                [
+                    "2026-01-05 09:00",
+                    "2026-01-05 09:15",
+                    "2026-01-07 20:00",
+                    "2026-01-05 23:30",
+                ]
+            ),
+            "last_seen": pd.to_datetime(
+                [
+                    "2026-01-06 10:30",
+                    "2026-01-05 09:20",
+                    "2026-01-07 21:00",
+                    "2026-01-08 08:00",
+                ]
+            ),
+            "events": [3, 1, 2, 5],
+            "div_id": ["q1", "q2", "q3", "q1"],
+            "chapter": "ch1",
+            "subchapter": ["sub1", "sub1", "sub2", "sub1"],
+        }
+    )
+    return rows[
+        ["sid", "first_name", "last_name", timestamp, "events"]
+        + ["div_id", "chapter", "subchapter"]
+    ].rename(columns={timestamp: "timestamp"})
+
+
+def _enrolled():
+    # Bo is enrolled but has done nothing.
+    return pd.DataFrame(
+        {
+            "username": ["ekussman", "elijahcline", "badams"],
+            "first_name": ["Erin", "Elijah", "Bo"],
+            "last_name": ["Kussman", "Cline", "Adams"],
+        }
+    )
+
+
+def _shape(tablekind):
+    timestamp = "last_seen" if tablekind == "dividmax" else "first_seen"
+    cmap = pd.DataFrame(
+        {
+            "chapter_num": [1, 1, 2],
+            "sub_chapter_num": [1, 2, 1],
+            "chapter_label": ["ch1", "ch1", "ch2"],
+            "sub_chapter_label": ["sub1", "sub2", "sub1"],
+        }
+    )
+    # ch1/sub2 has no count of its own, so its label shows "?".
+    act_count = pd.DataFrame(
+        {"chapter": ["ch1", "ch2"], "subchapter": ["sub1", "sub1"], "act_count": [3, 2]}
+    )
+    return _shape_activity_table(
+        _activity(timestamp), _enrolled(), cmap, act_count, tablekind, -5.0
+    )
+
+
+def _row(label, bo, elijah, erin, **div_id):
+    return {"chapter_label": label, BO: bo, ELIJAH: elijah, ERIN: erin, **div_id}
+
+
+def _iso(stamp):
+    return f"2026-01-{stamp}:00.000"
+
+
+def test_sccount_cells_match_the_row_by_row_report():
+    assert _shape("sccount") == [
+        _row("1.1 ch1/sub1 (2)", 0.0, 1.0, 2.0),
+        _row("1.2 ch1/sub2 (?)", 0.0, None, 1.0),
+        _row("2.1 ch2/sub1 (1)", None, None, None),
+    ]
+
+
+def test_dividmin_cells_are_shifted_first_visits():
+    # A course at UTC-5: times are shifted forward five hours, as before.
+    assert _shape("dividmin") == [
+        _row("1.1 ch1/sub1", None, _iso("06T04:30"), _iso("05T14:00"), div_id="q1"),
+        _row("1.1 ch1/sub1", None, None, _iso("05T14:15"), div_id="q2"),
+        _row("1.2 ch1/sub2", None, None, _iso("08T01:00"), div_id="q3"),
+        _row("2.1 ch2/sub1", None, None, None, div_id=None),
+    ]
+
+
+def test_dividmax_cells_are_shifted_last_visits():
+    assert _shape("dividmax") == [
+        _row("1.1 ch1/sub1", None, _iso("08T13:00"), _iso("06T15:30"), div_id="q1"),
+        _row("1.1 ch1/sub1", None, None, _iso("05T14:20"), div_id="q2"),
+        _row("1.2 ch1/sub2", None, None, _iso("08T02:00"), div_id="q3"),
+        _row("2.1 ch2/sub1", None, None, None, div_id=None),
+    ]
+
+
+def test_count_cells_are_event_totals():
+    assert _shape("count") == [
+        _row("1.1 ch1/sub1", None, 5.0, 3.0, div_id="q1"),
+        _row("1.1 ch1/sub1", None, None, 1.0, div_id="q2"),
+        _row("1.2 ch1/sub2", None, None, 2.0, div_id="q3"),
+        _row("2.1 ch2/sub1", None, None, None, div_id=None),
+    ]
+
+
+def test_correct_count_cells_match_the_row_by_row_report():
+    correct = pd.DataFrame(
+        {
+            "div_id": ["q1", "q2", "q1", "q3"],
+            "sid": ["ekussman", "ekussman", "elijahcline", "ekussman"],
+            "correct": "T",
+            "chapter": "ch1",
+            "subchapter": ["sub1", "sub1", "sub1", "sub2"],
+        }
+    )
+    assert _shape_correct_count(correct, _enrolled()) == [
+        {"chapter_label": "sub1", "badams": 0, "ekussman": 2, "elijahcline": 1},
+        {"chapter_label": "sub2", "badams": 0, "ekussman": 1, "elijahcline": 0},
+    ]
+
+
+# bench_analytics
+# ---------------
+# The benchmark harness is run by hand; a tiny course keeps it from rotting.
+
+
+def test_benchmark_harness_runs_on_a_small_course():
+    from .bench_analytics import TABLEKINDS, run, synthetic_course
+
+    course = synthetic_course(students=5, events=2000, chapters=2, subchapters=2)
+    results = run(course)
+
+    assert set(results) == set(TABLEKINDS) | {"correctcount"}
+    # One row per subchapter, or per question for the per-question tables.
+    assert results["sccount"]["rows"] == 4
+    assert results["dividmin"]["rows"] == 40
+    assert results["correctcount"]["rows"] == 2
+
+    # Each sccount cell is the number of distinct questions the student
+    # touched in that subchapter, counted here straight from the events.
+    activity = course["activity"].rename(columns={"first_seen": "timestamp"})
+    records = _shape_activity_table(
+        activity.copy(),
+        course["enrolled"],
+        course["cmap"],
+        course["act_count"],
+        "sccount",
+        0.0,
+    )
+    expected = (
+        activity.assign(
+            label=_student_label(
+                activity["last_name"], activity["first_name"], activity["sid"]
+            )
+        )
+        .groupby(["chapter", "subchapter", "label"])["div_id"]
+        .nunique()
+    )
+    for record, (chapter, subchapter) in zip(
+        records,
+        course["cmap"][["chapter_label", "sub_chapter_label"]].itertuples(index=False),
+    ):
+        for label, count in expected.loc[(chapter, subchapter)].items():
+            assert record[label] == count
@@ -2,9 +2,12 @@
 Test the admin_server_api core module including the assessment reset functionality.
 """
 
+from unittest.mock import AsyncMock, patch
+
 import pytest
 from fastapi.testclient import TestClient
 
+from rsptx.admin_server_api import core
 from rsptx.admin_server_api.core import app
 
 
@@ -14,6 +17,19 @@ def test_app_creation():
     assert hasattr(app, "include_router")
 
 
+def test_shutdown_closes_the_lti_http_sessions():
+    """Test that stopping the app releases the pooled LTI HTTP clients."""
+    with (
+        patch.object(core, "close_lti1p1_http_session", AsyncMock()) as close_1p1,
+        patch.object(core, "close_lti1p3_http_session", AsyncMock()) as close_1p3,
+    ):
+        with TestClient(app):
+            close_1p1.assert_not_awaited()
+            close_1p3.assert_not_awaited()
+    close_1p1.assert_awaited_once()
+    close_1p3.assert_awaited_once()
+
+
 def test_instructor_router_included():
     """Test that the instructor router is included in the app."""
     # Check that instructor routes are in the app
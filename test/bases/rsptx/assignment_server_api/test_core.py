@@ -5,9 +5,12 @@ Verifies route registration and that unauthenticated requests return the
 expected auth error codes (401/422), not 500. No database is required.
 """
 
+from unittest.mock import AsyncMock, patch
+
 import pytest
 from fastapi.testclient import TestClient
 
+from rsptx.assignment_server_api import core
 from rsptx.assignment_server_api.core import app
 
 
@@ -25,6 +28,18 @@ def test_app_exists():
     assert app is not None
 
 
+def test_shutdown_closes_the_lti_http_sessions():
+    with (
+        patch.object(core, "close_lti1p1_http_session", AsyncMock()) as close_1p1,
+        patch.object(core, "close_lti1p3_http_session", AsyncMock()) as close_1p3,
+    ):
+        with TestClient(app):
+            close_1p1.assert_not_awaited()
+            close_1p3.assert_not_awaited()
+    close_1p1.assert_awaited_once()
+    close_1p3.assert_awaited_once()
+
+
 def test_routes_registered():
     paths = {r.path for r in app.routes}
     assert any("/student" in p for p in paths)
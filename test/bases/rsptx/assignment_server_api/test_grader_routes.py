@@ -105,6 +105,53 @@ async def test_gradebook_returns_matrix_shape(auth_instructor_client):
         }
 
 
+async def test_gradebook_answers_a_matching_etag_with_304(auth_instructor_client):
+    """An unchanged gradebook is revalidated rather than sent again, and a
+    change to it gives it a new ETag."""
+    await _create_assignment(auth_instructor_client, "gradebook_etag_test")
+
+    resp = await auth_instructor_client.get("/instructor/grader/gradebook/data")
+    assert resp.status_code == 200
+    etag = resp.headers["etag"]
+    assert "no-cache" in resp.headers["cache-control"]
+
+    again = await auth_instructor_client.get(
+        "/instructor/grader/gradebook/data", headers={"If-None-Match": etag}
+    )
+    assert again.status_code == 304
+    assert again.content == b""
+    assert again.headers["etag"] == etag
+
+    await _create_assignment(auth_instructor_client, "gradebook_etag_test_2")
+    changed = await auth_instructor_client.get(
+        "/instructor/grader/gradebook/data", headers={"If-None-Match": etag}
+    )
+    assert changed.status_code == 200
+    assert changed.headers["etag"] != etag
+
+
+async def test_gradebook_columnar_format(auth_instructor_client):
+    """format=columnar sends the same gradebook with the cells as arrays."""
+    cells = (
+        await auth_instructor_client.get("/instructor/grader/gradebook/data")
+    ).json()["detail"]
+    resp = await auth_instructor_client.get(
+        "/instructor/grader/gradebook/data", params={"format": "columnar"}
+    )
+    assert resp.status_code == 200
+    detail = resp.json()["detail"]
+    assert detail["assignments"] == cells["assignments"]
+    assert detail["students"] == cells["students"]
+    assert set(detail["cells"]) == {"student", "assignment", "score", "manual_total"}
+    assert len(detail["cells"]["score"]) == len(cells["cells"])
+    assert len(detail["averages"]) == len(cells["assignments"])
+
+    bad = await auth_instructor_client.get(
+        "/instructor/grader/gradebook/data", params={"format": "rows"}
+    )
+    assert bad.status_code == 422
+
+
 async def test_gradebook_rejects_non_instructor(auth_student_client):
     """A non-instructor (student) is rejected by @instructor_role_required()."""
     resp = await auth_student_client.get("/instructor/grader/gradebook/data")
@@ -126,6 +173,31 @@ async def test_gradebook_csv_is_text_csv(auth_instructor_client):
     assert "gradebook_csv_test (%)" in first_line
 
 
+async def test_gradebook_csv_streams_gzip_when_accepted(auth_instructor_client):
+    """The streamed export has the same rows as the in-memory rendering, and is
+    gzip-encoded only for a client that accepts it."""
+    from rsptx.assignment_server_api.routers.grader import _gradebook_to_csv
+    from rsptx.db.crud import fetch_gradebook
+
+    await _create_assignment(auth_instructor_client, "gradebook_csv_gzip_test")
+    expected = _gradebook_to_csv(await fetch_gradebook("test_course_1"))
+
+    resp = await auth_instructor_client.get(
+        "/instructor/grader/gradebook.csv", headers={"Accept-Encoding": "gzip"}
+    )
+    assert resp.status_code == 200
+    assert resp.headers["content-encoding"] == "gzip"
+    assert resp.headers["vary"] == "Accept-Encoding"
+    assert resp.text == expected
+
+    resp = await auth_instructor_client.get(
+        "/instructor/grader/gradebook.csv",
+        headers={"Accept-Encoding": "gzip;q=0, identity"},
+    )
+    assert "content-encoding" not in resp.headers
+    assert resp.text == expected
+
+
 async def test_gradebook_units_toggle_persists_the_course_attribute(
     auth_instructor_client,
 ):
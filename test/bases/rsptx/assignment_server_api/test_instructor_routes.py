@@ -555,7 +555,9 @@ async def test_search_can_be_limited_to_the_callers_own_courses(
     wide = await auth_instructor_client.post(
         "/instructor/assignments/search", json={"page": 0, "limit": 50}
     )
-    assert "route_shared_hw" in [a["name"] for a in wide.json()["detail"]["assignments"]]
+    assert "route_shared_hw" in [
+        a["name"] for a in wide.json()["detail"]["assignments"]
+    ]
 
     narrowed = await auth_instructor_client.post(
         "/instructor/assignments/search",
@@ -792,3 +794,66 @@ async def test_a_private_assignment_on_a_book_is_still_importable(
         f"/instructor/assignments/{base_course_private_assignment.id}/import"
     )
     assert resp.status_code == 201
+
+
+# ---------------------------------------------------------------------------
+# GET /instructor/gradebook
+# ---------------------------------------------------------------------------
+
+
+async def test_gradebook_page_renders(auth_instructor_client):
+    """The server-rendered gradebook builds its table from the async pool."""
+    resp = await auth_instructor_client.get("/instructor/gradebook")
+    assert resp.status_code == 200
+    assert 'id="table"' in resp.text
+
+
+async def test_gradebook_page_pivot():
+    """Scores become one column per graded assignment, in percent unless the
+    course shows points, and every enrolled student gets a row."""
+    from rsptx.assignment_server_api.routers.instructor import (
+        _practice_grades,
+        _shape_assignment_gradebook,
+    )
+    from rsptx.db.crud import GradebookPageRows
+
+    rows = GradebookPageRows(
+        scores=[(8.0, 1, 10), (None, 1, 11), (3.0, 2, 11)],
+        assignments=[(1, "HW1", 10), (2, "HW2", 5), (3, "HW3", None)],
+        students=[
+            (10, "ada", "Ada", "Lovelace", "ada@example.com"),
+            (11, "alan", "Alan", "Turing", "alan@example.com"),
+            (12, "grace", "Grace", "Hopper", "grace@example.com"),
+        ],
+    )
+    practice = (
+        20.0,
+        _practice_grades({10: 3, 12: 9}, 4.0, 5, 20.0, show_points=False),
+    )
+
+    html, names, column_ids = _shape_assignment_gradebook(rows, False, practice)
+    assert column_ids == {"HW1 (%)": 1, "HW2 (%)": 2}
+    assert names == {
+        "grace": "Grace Hopper",
+        "ada": "Ada Lovelace",
+        "alan": "Alan Turing",
+    }
+    # Sorted by last name, with the practice column after the name columns.
+    assert html.index("Hopper") < html.index("Lovelace") < html.index("Turing")
+    assert "<th>Practice (%)</th>" in html
+    assert "<td>80.00</td>" in html  # Ada: 8 of 10 points
+    assert "<td>60.00</td>" in html  # Ada: 3 practice days at 4 of 20 points
+    assert "<td>100.00</td>" in html  # Grace: practice capped at 5 days
+
+    html, _, column_ids = _shape_assignment_gradebook(rows, True, None)
+    assert column_ids == {"HW1 (10 pts)": 1, "HW2 (5 pts)": 2}
+    assert "Practice" not in html
+
+
+async def test_practice_grades_without_points_are_blank():
+    from rsptx.assignment_server_api.routers.instructor import _practice_grades
+
+    grades = _practice_grades({1: 4}, 0.0, 5, 0.0, show_points=True)
+    assert grades.to_dict() == {1: ""}
+    grades = _practice_grades({1: 4, 2: 7}, 1.5, 5, 7.5, show_points=True)
+    assert grades.to_dict() == {1: "6.00", 2: "7.50"}
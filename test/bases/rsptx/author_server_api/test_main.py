@@ -0,0 +1,62 @@
+"""
+The export endpoints check the requested format before queuing a task, and
+the download lists leave out exports that are still being written.
+"""
+
+from types import SimpleNamespace
+from unittest.mock import MagicMock, patch
+
+import httpx
+import pytest
+
+pytestmark = pytest.mark.asyncio(loop_scope="session")
+
+from rsptx.auth.session import auth_manager  # noqa: E402
+from rsptx.author_server_api import main  # noqa: E402
+
+
+@pytest.fixture
+async def client():
+    main.app.dependency_overrides[auth_manager] = lambda: SimpleNamespace(
+        username="testuser1"
+    )
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as c:
+        yield c
+    main.app.dependency_overrides.pop(auth_manager, None)
+
+
+@pytest.mark.parametrize(
+    "url, task",
+    [("/author/dumpUseinfo", "useinfo_to_csv"), ("/author/dumpCode", "code_to_csv")],
+)
+async def test_an_unknown_export_format_is_rejected_before_queuing(client, url, task):
+    with patch.object(main, task) as queued:
+        resp = await client.post(url, json={"classname": "c1", "format": "xlsx"})
+    assert resp.status_code == 400
+    assert "xlsx" in resp.json()["detail"]
+    queued.delay.assert_not_called()
+
+
+@pytest.mark.parametrize("fmt", ["csv", "parquet", None])
+async def test_a_known_export_format_is_queued(client, fmt):
+    payload = {"classname": "c1"} if fmt is None else {"classname": "c1", "format": fmt}
+    with patch.object(main, "useinfo_to_csv") as queued:
+        queued.delay.return_value = MagicMock(id="task-1")
+        resp = await client.post("/author/dumpUseinfo", json=payload)
+    assert resp.status_code == 200
+    assert resp.json() == {"task_id": "task-1"}
+    queued.delay.assert_called_once_with("c1", "testuser1", fmt or "csv")
+
+
+async def test_the_download_list_leaves_out_partial_exports(
+    client, tmp_path, monkeypatch
+):
+    monkeypatch.chdir(tmp_path)
+    user_dir = tmp_path / "downloads" / "logfiles" / "testuser1"
+    user_dir.mkdir(parents=True)
+    (user_dir / "c1_useinfo.csv.zip").write_bytes(b"")
+    (user_dir / "c1_code.parquet.partial").write_bytes(b"")
+
+    resp = await client.get("/author/dlsAvailable/logfiles")
+    assert resp.json() == {"ready_files": ["c1_useinfo.csv.zip"]}
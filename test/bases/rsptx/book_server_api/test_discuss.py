@@ -0,0 +1,135 @@
+"""
+Delivery rules of the peer-instruction fan-out hub.
+
+The hub is driven directly with published messages; redis is not needed
+because the partner map is stubbed.
+"""
+
+import pytest
+
+from rsptx.book_server_api.routers import discuss
+from rsptx.book_server_api.routers.discuss import ConnectionManager, PeerHub
+from rsptx.response_helpers import peer_channel
+
+pytestmark = pytest.mark.asyncio(loop_scope="session")
+
+COURSE = "test_course_1"
+
+
+class FakeSocket:
+    def __init__(self, fail=False):
+        self.sent = []
+        self.fail = fail
+
+    async def send_json(self, message):
+        if self.fail:
+            raise RuntimeError("closed")
+        self.sent.append(message)
+
+
+def _hub(sockets, partners, courses=None):
+    manager = ConnectionManager()
+    for user, sock in sockets.items():
+        manager.active_connections[user] = sock
+        manager.courses[user] = (courses or {}).get(user, COURSE)
+    hub = PeerHub(manager)
+
+    async def fake_partners(course_name, sid, max_age=None):
+        return partners.get(sid)
+
+    hub.partners = fake_partners
+    return hub
+
+
+def _message(**kw):
+    data = {
+        "type": "text",
+        "from": "s1",
+        "message": "hello",
+        "broadcast": False,
+        "course_name": COURSE,
+        "div_id": "q1",
+    }
+    data.update(kw)
+    return data
+
+
+@pytest.fixture
+def logged(monkeypatch):
+    entries = []
+
+    async def fake_log(entry):
+        entries.append(entry)
+
+    monkeypatch.setattr(discuss, "create_useinfo_entry", fake_log)
+    return entries
+
+
+async def test_broadcast_stays_in_course(logged):
+    a, b, c = FakeSocket(), FakeSocket(), FakeSocket(fail=True)
+    hub = _hub({"a": a, "b": b, "c": c}, {}, courses={"b": "other_course"})
+    await hub.dispatch(_message(broadcast=True, type="control"))
+    assert len(a.sent) == 1 and b.sent == []
+    # A socket that fails to send is dropped.
+    assert "c" not in hub.connections.active_connections
+
+
+async def test_partner_message_goes_to_local_partners(logged):
+    s1, s2 = FakeSocket(), FakeSocket()
+    hub = _hub({"s1": s1, "s2": s2}, {"s1": ["s2", "elsewhere"]})
+    await hub.dispatch(_message())
+    assert s1.sent == []
+    assert [m["message"] for m in s2.sent] == ["hello"]
+    assert [e.act for e in logged] == ["to:s2:hello"]
+
+
+async def test_missing_partner_is_reported_to_sender(logged):
+    s1 = FakeSocket()
+    hub = _hub({"s1": s1}, {})
+    await hub.dispatch(_message())
+    assert [m["message"] for m in s1.sent] == ["Could not find a partner for you"]
+    await hub.dispatch(_message(message="enableFaceChat", to="s1", type="control"))
+    assert s1.sent[-1]["message"] == "enableFaceChat"
+    assert len(s1.sent) == 2
+    assert logged == []
+
+
+async def test_disconnect_keeps_replacement_socket():
+    manager = ConnectionManager()
+    old, new = FakeSocket(), FakeSocket()
+    manager.active_connections["s1"] = new
+    manager.disconnect("s1", old)
+    assert manager.active_connections["s1"] is new
+    manager.disconnect("s1", new)
+    assert "s1" not in manager.active_connections
+
+
+class FakePubSub:
+    def __init__(self):
+        self.channels = []
+
+    async def subscribe(self, *channels):
+        self.channels.extend(channels)
+
+    async def unsubscribe(self, *channels):
+        for c in channels:
+            self.channels.remove(c)
+
+
+async def test_course_subscription_follows_sockets():
+    hub = PeerHub(ConnectionManager())
+    hub.ensure_started = lambda: None
+    hub._pubsub = pubsub = FakePubSub()
+    hub._partners[COURSE] = (0.0, {})
+
+    await hub.join(COURSE)
+    await hub.join(COURSE)
+    await hub.join("other_course")
+    assert pubsub.channels == [peer_channel(COURSE), peer_channel("other_course")]
+
+    await hub.leave(COURSE)
+    assert peer_channel(COURSE) in pubsub.channels
+    await hub.leave(COURSE)
+    assert pubsub.channels == [peer_channel("other_course")]
+    # The course's partner map is dropped with its last socket.
+    assert COURSE not in hub._partners
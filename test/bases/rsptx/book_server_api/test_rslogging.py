@@ -114,6 +114,7 @@ async def _assign_interaction_question(
     import datetime
 
     from rsptx.db.async_session import async_session
+    from rsptx.db.crud import invalidate_scoring_specs
     from rsptx.db.models import Assignment, AssignmentQuestion, Question
 
     async with async_session.begin() as session:
@@ -154,7 +155,10 @@ async def _assign_interaction_question(
                 sorting_priority=1,
             )
         )
-        return assignment.id
+    # Seeded behind the crud layer's back, so drop the cached scoring specs
+    # the way the crud writers do.
+    await invalidate_scoring_specs(student_user.course_id)
+    return assignment.id
 
 
 async def _question_grade(div_id):
@@ -0,0 +1,188 @@
+"""
+The Anonymizer's vectorized steps, run on small hand-built frames.
+"""
+
+import pandas as pd
+
+from rsptx.data_extract.anonymizeCourseData import DATASHOP_COLUMNS, Anonymizer
+
+
+def _anonymizer(**kw):
+    a = Anonymizer("thinkcspy", "sqlite://", **kw)
+    a.user_map = {"alice": 1, "bob": 2, "prof": "REMOVEME"}
+    a.course_map = {"c1": 1}
+    return a
+
+
+def _ts(text):
+    return pd.Timestamp(f"2024-09-02 {text}")
+
+
+def test_peer_acts_are_anonymized():
+    a = _anonymizer()
+    useinfo = pd.DataFrame(
+        {
+            "event": ["sendmessage", "ratepeer", "peergroup", "peergroup", "page"],
+            "act": [
+                "to:bob:hi: there",
+                "alice:good",
+                "grouplist:alice,zed,bob",
+                "grouplist",
+                "alice:bob",
+            ],
+        }
+    )
+
+    assert a.anonymize_peer_acts(useinfo).tolist() == [
+        "to:2:hi: there",
+        "1:good",
+        "grouplist:1,Anonymous,2",
+        "grouplist",
+        "alice:bob",
+    ]
+
+
+def test_sessionize_data_splits_on_gaps_and_students():
+    a = _anonymizer()
+    a.useinfo = pd.DataFrame(
+        {
+            "sid": [2, 1, 1, 1, 1],
+            "timestamp": [
+                _ts("10:00"),
+                _ts("09:00"),
+                _ts("09:30"),
+                _ts("10:31"),
+                _ts("10:40"),
+            ],
+            "div_id": ["q1", "q1", "q2", "q1", "q1"],
+        }
+    )
+
+    a.sessionize_data()
+
+    assert a.useinfo.sid.tolist() == [1, 1, 1, 1, 2]
+    assert a.useinfo.session.tolist() == [1, 1, 2, 2, 3]
+    assert a.useinfo.problem_view.tolist() == [1, 1, 2, 3, 1]
+
+    # The next course's sessions carry on from where this one stopped.
+    a.useinfo = a.useinfo.iloc[:1][["sid", "timestamp", "div_id"]]
+    a.sessionize_data()
+    assert a.useinfo.session.tolist() == [4]
+
+
+def test_create_datashop_data_attaches_the_nearest_code():
+    a = _anonymizer()
+    a.user_df = pd.DataFrame(
+        {
+            "anon_user": [1],
+            "anon_course": [1],
+            "term_start_date": [pd.Timestamp("2024-08-26")],
+            "anon_institution": ["college"],
+        }
+    )
+    a.useinfo = pd.DataFrame(
+        {
+            "timestamp": [_ts("09:00:00"), _ts("09:10:00"), _ts("09:20:00")],
+            "sid": [1, 1, 1],
+            "event": ["activecode", "activecode", "page"],
+            "act": ["run", "run", "view"],
+            "div_id": ["ac1", "ac1", "ch1/intro.html"],
+            "course_id": [1, 1, 1],
+            "chapter": [None, None, None],
+            "subchapter": [None, None, None],
+        }
+    )
+    a.all_answers = pd.DataFrame(
+        columns=["timestamp", "sid", "course_name", "div_id", "answer", "correct"]
+    ).astype({"timestamp": "datetime64[ns]", "sid": "int64", "course_name": "int64"})
+    a.code_withnames = pd.DataFrame(
+        {
+            "acid": ["ac1", "ac1", "ac1"],
+            "anon_code": ["print(1)", "print(2)", "x = 1\nprint(x)"],
+            "sid": [1, 1, 1],
+            "course_name_y": [1, 1, 1],
+            # 2s, 4s and 5s after the events: only the first two are close enough.
+            "timestamp": [_ts("08:59:58"), _ts("09:00:04"), _ts("09:10:05")],
+            "emessage": [None, "NameError: x", None],
+        }
+    )
+    a.sessionize_data()
+
+    a.create_datashop_data()
+
+    ds = a.datashop.reset_index(drop=True)
+    assert list(ds.columns) == DATASHOP_COLUMNS
+    assert ds["CF (Code)"].tolist() == ["print(1)", "", ""]
+    assert ds["Level (Chapter)"].tolist()[2] == "ch1"
+    assert ds["Level (SubChapter)"].tolist()[2] == "intro"
+    assert ds["CF (Week No)"].tolist() == [1, 1, 1]
+
+
+class SyntheticAnonymizer(Anonymizer):
+    """Makes up each course's activity rather than reading it from a database."""
+
+    def get_user_activities(self, courses=None):
+        (course,) = courses
+        cid = self.course_map[course]
+        n = 3 * cid
+        self.useinfo = pd.DataFrame(
+            {
+                "timestamp": [
+                    _ts("09:00") + pd.Timedelta(minutes=120 * (i // 2) + i)
+                    for i in range(n)
+                ],
+                "sid": [1 + i % 2 for i in range(n)],
+                "event": "page",
+                "act": "view",
+                "div_id": [f"ch{cid}/page{i % 3}.html" for i in range(n)],
+                "course_id": cid,
+                "chapter": None,
+                "subchapter": None,
+            }
+        )
+        if course == "empty":
+            self.useinfo = self.useinfo.iloc[:0]
+        self.all_answers = pd.DataFrame(
+            columns=["timestamp", "sid", "course_name", "div_id", "answer", "correct"]
+        ).astype(
+            {"timestamp": "datetime64[ns]", "sid": "int64", "course_name": "int64"}
+        )
+        self.code_withnames = pd.DataFrame(
+            columns=["acid", "anon_code", "sid", "course_name_y", "timestamp"]
+            + ["emessage"]
+        )
+
+
+def _synthetic(courses):
+    a = SyntheticAnonymizer("thinkcspy", "sqlite://", specific_course=courses)
+    a.chosen_courses = courses
+    a.course_map = {c: i for i, c in enumerate(courses, start=1)}
+    a.user_df = pd.DataFrame(
+        {
+            "anon_user": [1, 2] * len(courses),
+            "anon_course": [a.course_map[c] for c in courses for _ in range(2)],
+            "term_start_date": pd.Timestamp("2024-08-26"),
+            "anon_institution": "college",
+        }
+    )
+    return a
+
+
+def test_export_datashop_in_parallel_matches_one_process(tmp_path):
+    courses = ["c1", "empty", "c3", "c4"]
+    serial, parallel = tmp_path / "serial", tmp_path / "parallel"
+    serial.mkdir()
+    parallel.mkdir()
+    seen = []
+
+    one = _synthetic(courses).export_datashop(serial)
+    many = _synthetic(courses).export_datashop(
+        parallel, progress=lambda *args: seen.append(args), workers=3
+    )
+
+    expected = pd.read_csv(one, sep="\t")
+    assert len(expected) == 3 * (1 + 3 + 4)
+    # Session ids run on from one course to the next without overlapping.
+    assert expected["Session Id"].max() == expected["Session Id"].nunique() > 1
+    pd.testing.assert_frame_equal(pd.read_csv(many, sep="\t"), expected)
+    assert seen == [(i, 4, c) for i, c in enumerate(courses, start=1)]
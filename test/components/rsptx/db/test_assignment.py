@@ -15,9 +15,19 @@ from rsptx.db.crud import (
     create_assignment_question,
     create_question,
     fetch_assignment_questions,
+    create_question_grade_entry,
+    fetch_assignment_score_totals,
+    fetch_grade,
+    increment_grade_score,
+    is_assigned,
+    set_manual_total,
+    upsert_grade,
+    upsert_grade_totals,
 )
+from rsptx.db.crud.assignment import scoring_spec_cache
 from rsptx.db.models import (
     AssignmentValidator,
+    GradeValidator,
     AssignmentQuestionValidator,
     QuestionValidator,
 )
@@ -173,3 +183,135 @@ async def test_fetch_visible_assignments(test_assignment):
     visible = await fetch_assignments(COURSE_NAME, is_visible=True)
     names = [a.name for a in visible]
     assert ASSIGN_NAME in names
+
+
+CACHED_Q_NAME = "crud_assign_cached_question"
+
+
+@pytest.fixture(scope="session")
+async def regular_assignment(test_course):
+    """An untimed assignment; ``is_assigned`` skips timed ones."""
+    return await create_assignment(
+        AssignmentValidator(
+            course=test_course.id,
+            name="crud_cached_spec_assignment",
+            points=3,
+            released=False,
+            description="is_assigned cache test assignment",
+            duedate=datetime.datetime(2099, 1, 1),
+            visible=True,
+            from_source=False,
+            is_peer=False,
+            is_timed=False,
+            kind="Regular",
+            current_index=0,
+            peer_async_visible=False,
+        )
+    )
+
+
+@pytest.fixture(scope="session")
+async def assigned_question(regular_assignment):
+    """A question on ``regular_assignment``, for the ``is_assigned`` tests."""
+    question = await create_question(
+        QuestionValidator(
+            base_course=COURSE_NAME,
+            name=CACHED_Q_NAME,
+            chapter="ch1",
+            subchapter="sub1",
+            author="testuser1",
+            question="Cached scoring spec question?",
+            timestamp=canonical_utcnow(),
+            question_type="mchoice",
+            is_private=False,
+            from_source=False,
+            review_flag=False,
+        )
+    )
+    await create_assignment_question(
+        AssignmentQuestionValidator(
+            assignment_id=regular_assignment.id,
+            question_id=question.id,
+            points=3,
+            activities_required=0,
+            reading_assignment=False,
+            sorting_priority=0,
+            which_to_grade="best_answer",
+            autograde="pct_correct",
+        )
+    )
+    return question
+
+
+async def test_is_assigned_reuses_cached_specs(
+    test_course, regular_assignment, assigned_question
+):
+    """A second lookup for the same course is answered without a reload."""
+    spec = await is_assigned(CACHED_Q_NAME, test_course.id)
+    assert spec.assigned
+    assert spec.assignment_id == regular_assignment.id
+    assert spec.max_score == 3
+
+    misses = scoring_spec_cache.misses
+    again = await is_assigned(CACHED_Q_NAME, test_course.id)
+    assert again == spec
+    assert scoring_spec_cache.misses == misses
+
+
+async def test_is_assigned_sees_assignment_edits(
+    test_course, regular_assignment, assigned_question
+):
+    """Editing an assignment invalidates the cached specs for its course."""
+    assert (await is_assigned(CACHED_Q_NAME, test_course.id)).assigned
+
+    hidden = AssignmentValidator(**regular_assignment.dict())
+    hidden.visible = False
+    await update_assignment(hidden)
+    assert not (await is_assigned(CACHED_Q_NAME, test_course.id)).assigned
+
+    await update_assignment(AssignmentValidator(**regular_assignment.dict()))
+    assert (await is_assigned(CACHED_Q_NAME, test_course.id)).assigned
+
+
+async def test_increment_grade_score(test_user, test_course, regular_assignment):
+    """A total is adjusted in place, but never created or moved once pinned."""
+    assert await increment_grade_score(test_user.id, regular_assignment.id, 2) is None
+
+    await upsert_grade(
+        GradeValidator(
+            auth_user=test_user.id,
+            assignment=regular_assignment.id,
+            score=1,
+            manual_total=False,
+        )
+    )
+    assert await increment_grade_score(test_user.id, regular_assignment.id, 2) == 3
+    assert await increment_grade_score(test_user.id, regular_assignment.id, -1) == 2
+
+    await set_manual_total(test_user.id, regular_assignment.id, COURSE_NAME, 9)
+    assert await increment_grade_score(test_user.id, regular_assignment.id, 2) is None
+    assert (await fetch_grade(test_user.id, regular_assignment.id)).score == 9
+
+
+async def test_set_based_totals(
+    test_user, test_assignment, regular_assignment, assigned_question
+):
+    """Totals are summed per student in SQL and written in one call."""
+    await create_question_grade_entry(
+        test_user.username, COURSE_NAME, CACHED_Q_NAME, 2.5
+    )
+    totals = await fetch_assignment_score_totals(regular_assignment.id, COURSE_NAME)
+    assert totals == {test_user.username: 2.5}
+    assert (
+        await fetch_assignment_score_totals(
+            regular_assignment.id, COURSE_NAME, ["nobody"]
+        )
+        == {}
+    )
+
+    await upsert_grade_totals(test_assignment.id, {}, {test_user.id: 4})
+    assert (await fetch_grade(test_user.id, test_assignment.id)).score == 4
+    await upsert_grade_totals(test_assignment.id, {test_user.id: 6}, {})
+    grade = await fetch_grade(test_user.id, test_assignment.id)
+    assert grade.score == 6
+    assert grade.manual_total is False
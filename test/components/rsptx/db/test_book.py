@@ -1,5 +1,6 @@
 """
-Tests for book CRUD operations (page progress counts, chapters, subchapters).
+Tests for book CRUD operations (page progress counts, chapters, subchapters,
+and the page context loader).
 """
 
 import pytest
@@ -9,7 +10,9 @@ pytestmark = pytest.mark.asyncio(loop_scope="session")
 from rsptx.db.crud import (
     create_question,
     create_useinfo_entry,
+    fetch_page_activity,
     fetch_page_activity_counts,
+    fetch_page_context,
 )
 from rsptx.db.models import QuestionValidator, UseinfoValidation
 from rsptx.response_helpers.core import canonical_utcnow
@@ -93,3 +96,36 @@ async def test_interacted_activities_are_marked(progress_page):
     # logged under the page's path -- so the page entry is always 0. The client
     # counts the page as attempted on its own.
     assert counts["page"] == 0
+
+
+# Page context loader
+# -------------------
+
+
+async def test_page_context_for_missing_course_is_none(init_test_db):
+    assert await fetch_page_context("no_such_course", "ch/page.html") is None
+
+
+async def test_page_context_takes_rst_chapter_from_the_path(progress_page, test_user):
+    ctx = await fetch_page_context(
+        COURSE, f"{CHAPTER}/{SUBCHAPTER}.html", user_id=test_user.id
+    )
+    assert ctx.course.course_name == COURSE
+    assert ctx.markup_system == "RST"
+    assert (ctx.chapter, ctx.subchapter) == (CHAPTER, SUBCHAPTER)
+    assert isinstance(ctx.course_attrs, dict)
+    # testuser1 does not teach test_course_1.
+    assert ctx.is_instructor is False
+
+
+async def test_page_activity_matches_the_individual_helpers(progress_page):
+    ctx = await fetch_page_context(COURSE, f"{CHAPTER}/{SUBCHAPTER}.html")
+    ctx = await fetch_page_activity(ctx, username=USER)
+    assert ctx.activity_info == await _counts()
+    assert isinstance(ctx.subchapters, list)
+
+
+async def test_page_activity_for_anonymous_reader_has_no_progress(progress_page):
+    ctx = await fetch_page_context(COURSE, f"{CHAPTER}/{SUBCHAPTER}.html")
+    ctx = await fetch_page_activity(ctx)
+    assert ctx.activity_info == {}
@@ -7,7 +7,13 @@ import pytest
 
 pytestmark = pytest.mark.asyncio(loop_scope="session")
 
-from rsptx.db.crud import fetch_course, fetch_course_by_id, create_course
+from rsptx.db.crud import (
+    course_cache,
+    create_course,
+    fetch_course,
+    fetch_course_by_id,
+    update_course_settings,
+)
 from rsptx.db.models import CoursesValidator
 
 NEW_COURSE_NAME = "crud_test_course"
@@ -167,3 +173,15 @@ async def test_results_are_ordered_by_term_start(dated_courses):
     rows = await fetch_courses_by_start_date(since=datetime.date(2019, 1, 1))
     dates = [c.term_start_date for c in rows]
     assert dates == sorted(dates)
+
+
+async def test_a_course_is_cached_until_its_settings_change(new_course):
+    first = await fetch_course(NEW_COURSE_NAME)
+    misses = course_cache.misses
+    assert await fetch_course(NEW_COURSE_NAME) is first
+    assert course_cache.misses == misses
+
+    await update_course_settings(first.id, "allow_pairs", "true")
+    assert (await fetch_course(NEW_COURSE_NAME)).allow_pairs
+    await update_course_settings(first.id, "allow_pairs", "false")
+    assert not (await fetch_course(NEW_COURSE_NAME)).allow_pairs
@@ -4,6 +4,7 @@ Smoke tests for the top-level crud module (create_initial_courses_users, etc.).
 The detailed per-domain tests live in test_user.py, test_course.py,
 test_rslogging.py, test_question.py, and test_assignment.py.
 """
+
 import pytest
 
 pytestmark = pytest.mark.asyncio(loop_scope="session")
@@ -31,3 +32,84 @@ async def test_seeded_user_exists(init_test_db):
     assert user is not None
     assert user.username == "testuser1"
     assert user.email == "testuser1@example.com"
+
+
+FEEDBACK_COURSE = "crud_feedback_course"
+FEEDBACK_BOOK = "crud_feedback_book"
+
+
+async def test_server_feedback_cache(init_test_db):
+    """is_server_feedback answers from a per-book cache that edits invalidate."""
+    import datetime
+    import json
+
+    from rsptx.db.crud import (
+        create_course,
+        create_question,
+        is_server_feedback,
+        server_feedback_cache,
+        update_question,
+    )
+    from rsptx.db.models import CoursesValidator, QuestionValidator
+    from rsptx.response_helpers.core import canonical_utcnow
+
+    # Asked about before the course exists; that answer must not outlive it.
+    assert await is_server_feedback("crud_fb_server", FEEDBACK_COURSE) is None
+
+    # The book is its own base course, and must exist before a course can
+    # name it as its base.
+    for course_name in (FEEDBACK_BOOK, FEEDBACK_COURSE):
+        await create_course(
+            CoursesValidator(
+                course_name=course_name,
+                base_course=FEEDBACK_BOOK,
+                term_start_date=datetime.date(2024, 1, 1),
+                login_required=True,
+                allow_pairs=False,
+                downloads_enabled=False,
+                courselevel="",
+                institution="Test University",
+                new_server=True,
+            )
+        )
+
+    def question(name, feedback):
+        return QuestionValidator(
+            base_course=FEEDBACK_BOOK,
+            name=name,
+            chapter="ch1",
+            subchapter="sub1",
+            question="Fill in the blank",
+            timestamp=canonical_utcnow(),
+            question_type="fillintheblank",
+            is_private=False,
+            from_source=False,
+            review_flag=False,
+            feedback=feedback,
+        )
+
+    graded = await create_question(
+        question("crud_fb_server", json.dumps([[{"regex": "2"}]]))
+    )
+    await create_question(question("crud_fb_client", None))
+    await create_question(question("crud_fb_broken", "{not json"))
+
+    misses = server_feedback_cache.misses
+    assert await is_server_feedback("crud_fb_server", FEEDBACK_COURSE) == [
+        [{"regex": "2"}]
+    ]
+    assert await is_server_feedback("crud_fb_client", FEEDBACK_COURSE) is None
+    assert await is_server_feedback("crud_fb_broken", FEEDBACK_COURSE) is None
+    # One load serves every question in the book.
+    assert server_feedback_cache.misses == misses + 1
+
+    # Editing a question reloads the book's feedback.
+    await update_question(
+        graded.model_copy(update={"feedback": json.dumps([[{"regex": "3"}]])})
+    )
+    assert await is_server_feedback("crud_fb_server", FEEDBACK_COURSE) == [
+        [{"regex": "3"}]
+    ]
+
+    # Courses that don't require a login grade on the client.
+    assert await is_server_feedback("crud_fb_server", "test_course_1") is None
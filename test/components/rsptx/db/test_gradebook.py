@@ -0,0 +1,257 @@
+"""
+Tests for the cached gradebook: grade writes patch a course's snapshot in place,
+other changes to what it shows make it reload, and both encodings agree.
+"""
+
+import datetime
+
+import pytest
+
+pytestmark = pytest.mark.asyncio(loop_scope="session")
+
+from rsptx.db import cache as cache_module
+from rsptx.db.cache import VersionedCache
+from rsptx.db.crud import (
+    create_assignment,
+    create_course,
+    create_user,
+    create_user_course_entry,
+    fetch_course,
+    fetch_gradebook,
+    fetch_gradebook_columns,
+    fetch_gradebook_page_rows,
+    fetch_gradebook_snapshot,
+    fetch_practice_completion_counts,
+    fetch_user,
+    gradebook_cache,
+    set_manual_total,
+    stream_gradebook_rows,
+    update_user,
+    upsert_grade_totals,
+)
+from rsptx.db.async_session import async_session
+from rsptx.db.models import (
+    AssignmentValidator,
+    AuthUserValidator,
+    CoursesValidator,
+    UserTopicPracticeLog,
+)
+
+COURSE_NAME = "crud_gradebook_course"
+
+
+def _user(username):
+    return AuthUserValidator(
+        username=username,
+        first_name="Grade",
+        last_name=username,
+        password="testpass",
+        email=f"{username}@example.com",
+        course_name=COURSE_NAME,
+        course_id=1,
+        donated=False,
+        active=True,
+        accept_tcp=True,
+        created_on=datetime.datetime(2024, 1, 1),
+        modified_on=datetime.datetime(2024, 1, 1),
+        registration_key="",
+        registration_id="",
+        reset_password_key="",
+    )
+
+
+@pytest.fixture(scope="session")
+async def gradebook_course(init_test_db):
+    await create_course(
+        CoursesValidator(
+            course_name=COURSE_NAME,
+            base_course="overview",
+            term_start_date=datetime.date(2024, 1, 1),
+            login_required=False,
+            allow_pairs=False,
+            downloads_enabled=False,
+            courselevel="",
+            institution="Test University",
+            new_server=True,
+        )
+    )
+    course = await fetch_course(COURSE_NAME)
+    student = await create_user(_user("gradebook_student_a"))
+    await create_user_course_entry(student.id, course.id)
+    assignment = await create_assignment(
+        AssignmentValidator(
+            course=course.id,
+            name="crud_gradebook_assignment",
+            points=10,
+            released=True,
+            description="",
+            duedate=datetime.datetime(2099, 1, 1),
+            visible=True,
+            from_source=False,
+            is_peer=False,
+            current_index=0,
+            peer_async_visible=False,
+        )
+    )
+    return course, student, assignment
+
+
+async def test_grade_writes_patch_the_snapshot(gradebook_course):
+    course, student, assignment = gradebook_course
+    snapshot = await fetch_gradebook_snapshot(course.id)
+    _, etag = snapshot.encode()
+    misses = gradebook_cache.misses
+
+    await set_manual_total(student.id, assignment.id, COURSE_NAME, 7.5)
+    data = await fetch_gradebook(COURSE_NAME)
+    cell = next(c for c in data["cells"] if c["sid"] == student.username)
+    assert cell["score"] == 7.5
+    assert cell["manual_total"] is True
+    assert cell["released"] is True
+    assert data["averages"][str(assignment.id)] == 7.5
+    assert snapshot.encode()[1] != etag
+
+    # A bulk write changes the score and leaves the manual flag alone.
+    await upsert_grade_totals(assignment.id, {student.id: 9.0}, {})
+    cell = next(
+        c
+        for c in (await fetch_gradebook(COURSE_NAME))["cells"]
+        if c["sid"] == student.username
+    )
+    assert cell["score"] == 9.0
+    assert cell["manual_total"] is True
+    assert gradebook_cache.misses == misses
+
+
+async def test_enrolling_and_renaming_reload_the_gradebook(gradebook_course):
+    course, _, _ = gradebook_course
+    await fetch_gradebook(COURSE_NAME)
+    newcomer = await create_user(_user("gradebook_student_b"))
+    await create_user_course_entry(newcomer.id, course.id)
+    data = await fetch_gradebook(COURSE_NAME)
+    assert "gradebook_student_b" in [s["sid"] for s in data["students"]]
+
+    await update_user(newcomer.id, {"first_name": "Renamed"})
+    data = await fetch_gradebook(COURSE_NAME)
+    names = {s["sid"]: s["name"] for s in data["students"]}
+    assert names["gradebook_student_b"] == "Renamed gradebook_student_b"
+    assert (await fetch_user("gradebook_student_b")).first_name == "Renamed"
+
+
+async def test_columnar_encoding_matches_the_cells(gradebook_course):
+    course, _, _ = gradebook_course
+    snapshot = await fetch_gradebook_snapshot(course.id)
+    cells = snapshot.to_cells()
+    columnar = snapshot.to_columnar()
+
+    assert columnar["students"] == cells["students"]
+    assert columnar["assignments"] == cells["assignments"]
+    cols = columnar["cells"]
+    rebuilt = [
+        {
+            "sid": columnar["students"][cols["student"][i]]["sid"],
+            "assignment_id": columnar["assignments"][cols["assignment"][i]]["id"],
+            "score": cols["score"][i],
+            "released": columnar["assignments"][cols["assignment"][i]]["released"],
+            "manual_total": i in cols["manual_total"],
+        }
+        for i in range(len(cols["score"]))
+    ]
+    assert rebuilt == cells["cells"]
+    assert columnar["averages"] == [
+        cells["averages"][str(a["id"])] for a in cells["assignments"]
+    ]
+    with pytest.raises(ValueError):
+        snapshot.encode("rows")
+
+
+async def test_gradebook_page_rows(gradebook_course):
+    course, student, assignment = gradebook_course
+    await set_manual_total(student.id, assignment.id, COURSE_NAME, 6.0)
+    rows = await fetch_gradebook_page_rows(course.id)
+
+    assert (6.0, assignment.id, student.id) in rows.scores
+    assert (assignment.id, "crud_gradebook_assignment", 10) in rows.assignments
+    assert (
+        student.id,
+        student.username,
+        "Grade",
+        student.username,
+        student.email,
+    ) in rows.students
+
+
+async def test_streamed_rows_match_the_snapshot(gradebook_course):
+    course, student, assignment = gradebook_course
+    await set_manual_total(student.id, assignment.id, COURSE_NAME, 4.0)
+    data = await fetch_gradebook(COURSE_NAME)
+    show_points, assignments = await fetch_gradebook_columns(course.id)
+
+    assert show_points == data["show_points"]
+    assert assignments == [
+        {k: a[k] for k in ("id", "name", "points")} for a in data["assignments"]
+    ]
+    rows = [row async for row in stream_gradebook_rows(course.id)]
+    assert [s for s, _ in rows] == data["students"]
+    streamed = {
+        (s["sid"], aid): score for s, scores in rows for aid, score in scores.items()
+    }
+    assert streamed == {
+        (c["sid"], c["assignment_id"]): c["score"] for c in data["cells"]
+    }
+
+
+async def test_practice_completion_counts(gradebook_course):
+    _, student, _ = gradebook_course
+    async with async_session.begin() as session:
+        for q in (-1, 0, 3, 5):
+            session.add(
+                UserTopicPracticeLog(
+                    user_id=student.id,
+                    course_name=COURSE_NAME,
+                    question_name="q1",
+                    i_interval=0,
+                    e_factor=2.5,
+                    q=q,
+                    trials_num=1,
+                )
+            )
+
+    # Only answered questions count; -1 and 0 are not answers.
+    assert await fetch_practice_completion_counts(COURSE_NAME, by_day=False) == {
+        student.id: 2
+    }
+    assert await fetch_practice_completion_counts(COURSE_NAME, by_day=True) == {}
+
+
+async def test_a_patch_is_applied_only_to_an_up_to_date_copy(monkeypatch):
+    counters = {}
+
+    async def fetch(name):
+        return str(counters.get(name, 0))
+
+    async def bump(name):
+        counters[name] = counters.get(name, 0) + 1
+        return str(counters[name])
+
+    monkeypatch.setattr(cache_module, "fetch_shared_version", fetch)
+    monkeypatch.setattr(cache_module, "bump_shared_version", bump)
+    cache = VersionedCache("test_patch", ttl=60)
+    loads = 0
+
+    async def load():
+        nonlocal loads
+        loads += 1
+        return []
+
+    value = await cache.get("key", load)
+    await cache.patch("key", lambda v: v.append("a"))
+    assert await cache.get("key", load) == ["a"]
+    assert loads == 1
+
+    # A write this worker never saw: its copy cannot be patched, so it reloads.
+    await bump("rs:cachever:test_patch:key")
+    await cache.patch("key", lambda v: v.append("b"))
+    assert value == ["a"]
+    assert await cache.get("key", load) == []
+    assert loads == 2
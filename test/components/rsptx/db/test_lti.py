@@ -0,0 +1,143 @@
+"""
+Tests for the cached LTI lookups: the version, LTI 1.1 key and LTI 1.3 grading
+link of a course are read once and reloaded after any LTI write.
+"""
+
+import asyncio
+import datetime
+
+import pytest
+
+pytestmark = pytest.mark.asyncio(loop_scope="session")
+
+from rsptx.db.async_session import async_session
+from rsptx.db.cache import VersionedCache
+from rsptx.db.crud import (
+    create_assignment,
+    create_lti1p1_config,
+    delete_lti_course,
+    delete_lti1p3_course,
+    fetch_lti_version,
+    fetch_lti1p1_config,
+    fetch_lti1p3_grading_data_for_assignment,
+    lti_cache,
+    update_assignment,
+    upsert_lti1p3_assignment,
+    upsert_lti1p3_config,
+    upsert_lti1p3_course,
+)
+from rsptx.db.models import (
+    AssignmentValidator,
+    Lti1p3Assignment,
+    Lti1p3Conf,
+    Lti1p3Course,
+)
+
+
+async def test_the_lti_version_is_cached_until_a_course_is_linked(test_course):
+    assert await fetch_lti_version(test_course.id) is None
+    misses = lti_cache.misses
+    assert await fetch_lti_version(test_course.id) is None
+    assert lti_cache.misses == misses
+
+    key = await create_lti1p1_config(test_course.course_name, test_course.id)
+    try:
+        assert await fetch_lti_version(test_course.id) == "1.1"
+        assert (await fetch_lti1p1_config(test_course.id)).secret == key.secret
+    finally:
+        await delete_lti_course(test_course.id)
+
+    assert await fetch_lti_version(test_course.id) is None
+    assert await fetch_lti1p1_config(test_course.id) is None
+
+
+async def test_lti1p3_grading_data_reads_the_assignment_fresh(test_course):
+    assignment = await create_assignment(
+        AssignmentValidator(
+            course=test_course.id,
+            name="crud_lti1p3_cached_assignment",
+            points=10,
+            released=False,
+            description="",
+            duedate=datetime.datetime(2099, 1, 1),
+            visible=True,
+            from_source=False,
+            is_peer=False,
+            current_index=0,
+            peer_async_visible=False,
+        )
+    )
+    conf = await upsert_lti1p3_config(
+        Lti1p3Conf(issuer="https://lms.example", client_id="crud-lti-cache")
+    )
+    lti_course = await upsert_lti1p3_course(
+        Lti1p3Course(
+            rs_course_id=test_course.id,
+            lti1p3_config_id=conf.id,
+            lti1p3_course_id="lms-course-1",
+            deployment_id="deployment-1",
+        )
+    )
+    try:
+        assert await fetch_lti1p3_grading_data_for_assignment(assignment.id) is None
+        await upsert_lti1p3_assignment(
+            Lti1p3Assignment(
+                rs_assignment_id=assignment.id,
+                lti1p3_course_id=lti_course.id,
+                lti_lineitem_id="https://lms.example/lineitems/1",
+            )
+        )
+        data = await fetch_lti1p3_grading_data_for_assignment(assignment.id)
+        assert data.lti_lineitem_id == "https://lms.example/lineitems/1"
+        assert data.lti1p3_course.lti_config.client_id == "crud-lti-cache"
+        assert data.lti1p3_course.rs_course.id == test_course.id
+        assert not data.rs_assignment.released
+        assert await fetch_lti_version(test_course.id) == "1.3"
+
+        # Releasing the assignment is not an LTI write, but must be seen.
+        misses = lti_cache.misses
+        await update_assignment(
+            AssignmentValidator(**{**assignment.model_dump(), "released": True})
+        )
+        data = await fetch_lti1p3_grading_data_for_assignment(assignment.id)
+        assert data.rs_assignment.released
+        assert lti_cache.misses == misses
+    finally:
+        await delete_lti1p3_course(test_course.id)
+        async with async_session.begin() as session:
+            await session.delete(await session.get(Lti1p3Conf, conf.id))
+
+    assert await fetch_lti1p3_grading_data_for_assignment(assignment.id) is None
+    assert await fetch_lti_version(test_course.id) is None
+
+
+async def test_concurrent_misses_share_one_load():
+    """A cold cache must not send one identical query per waiting request."""
+    cache = VersionedCache("test_single_flight", ttl=60)
+    loads = 0
+
+    async def load():
+        nonlocal loads
+        loads += 1
+        await asyncio.sleep(0.01)
+        return "value"
+
+    results = await asyncio.gather(*(cache.get("key", load) for _ in range(20)))
+
+    assert results == ["value"] * 20
+    assert loads == 1
+    assert cache.coalesced == 19
+
+
+async def test_a_failed_load_is_not_cached():
+    cache = VersionedCache("test_single_flight_error", ttl=60)
+
+    async def fail():
+        raise RuntimeError("database went away")
+
+    async def load():
+        return "value"
+
+    with pytest.raises(RuntimeError):
+        await cache.get("key", fail)
+    assert await cache.get("key", load) == "value"
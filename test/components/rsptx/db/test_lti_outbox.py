@@ -0,0 +1,300 @@
+"""
+Tests for real-time LTI passback through the ``lti_score_outbox`` table.
+
+``compute_total_score`` pushed to LTI 1.3 only, so a student who answered a
+question or finished a reading page on an LTI 1.1 course saw their total move
+in Runestone but not in the LMS until an instructor ran a recompute. The 1.3
+push it did make was awaited inline, so a slow LMS slowed the student's save.
+
+Scores now wait in the ``lti_score_outbox`` table; these tests run the
+dispatcher by hand with ``dispatch_once`` rather than starting its loop.
+"""
+
+import asyncio
+import contextlib
+import datetime
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, patch
+
+import pytest
+from sqlalchemy import delete, select
+
+pytestmark = pytest.mark.asyncio(loop_scope="session")
+
+from rsptx.db.async_session import async_session
+from rsptx.db.crud import fetch_lti_outbox_stats
+from rsptx.db.models import LtiScoreOutbox
+from rsptx.grading_helpers import lti_push
+
+
+def _assignment():
+    return SimpleNamespace(id=42, points=10, released=True)
+
+
+@pytest.fixture
+async def outbox(init_test_db):
+    """An empty outbox, and a dispatcher with nothing sent yet."""
+
+    async def _clear():
+        async with async_session.begin() as session:
+            await session.execute(delete(LtiScoreOutbox))
+
+    await _clear()
+    yield lti_push.LtiOutboxDispatcher()
+    await _clear()
+
+
+@contextlib.contextmanager
+def _patch_realtime(version, debounce=0.0):
+    """Patch the dispatcher's dependencies and shorten the debounce window."""
+    with (
+        patch.object(
+            lti_push, "fetch_lti_version", AsyncMock(return_value=version)
+        ) as version_lookup,
+        patch.object(
+            lti_push, "fetch_one_assignment", AsyncMock(return_value=_assignment())
+        ),
+        patch.object(lti_push, "attempt_lti1p1_score_updates", AsyncMock()) as push11,
+        patch.object(
+            lti_push, "attempt_lti1p3_score_updates_for", AsyncMock()
+        ) as push13,
+        patch.object(lti_push, "LTI_DEBOUNCE_SECONDS", debounce),
+    ):
+        yield version_lookup, push11, push13
+
+
+async def _rows():
+    async with async_session() as session:
+        return (
+            (await session.execute(select(LtiScoreOutbox).order_by(LtiScoreOutbox.id)))
+            .scalars()
+            .all()
+        )
+
+
+async def _make_due():
+    """Skip any retry wait, as if its time had come."""
+    async with async_session.begin() as session:
+        await session.execute(
+            LtiScoreOutbox.__table__.update().values(
+                due_at=datetime.datetime(2000, 1, 1)
+            )
+        )
+
+
+async def test_a_reading_page_on_an_lti1p1_course_reaches_the_lms(outbox):
+    with _patch_realtime("1.1") as (_, push11, _):
+        await lti_push.schedule_lti_score_push(7, 5, 42, 3.0)
+        assert await outbox.dispatch_once() == 1
+
+    push11.assert_awaited_once()
+    assignment, course_id, updates = push11.await_args.args
+    assert (assignment.id, course_id, updates) == (42, 5, [(7, 3.0)])
+    assert await _rows() == []
+    assert outbox.stats()["sent"] == 1
+
+
+async def test_the_student_does_not_wait_for_the_lms(outbox):
+    """Scheduling returns once the score is queued, before any POST is made."""
+    with _patch_realtime("1.1", debounce=30.0) as (_, push11, _):
+        await lti_push.schedule_lti_score_push(7, 5, 42, 3.0)
+        # Not due until the debounce window has passed.
+        assert await outbox.dispatch_once() == 0
+
+    push11.assert_not_awaited()
+    [row] = await _rows()
+    assert (row.course_id, row.assignment_id, row.rs_user_id, row.score) == (
+        5,
+        42,
+        7,
+        3.0,
+    )
+
+
+async def test_a_burst_of_answers_produces_one_push_with_the_latest_total(outbox):
+    """A student working quickly should not generate a POST per answer."""
+    with _patch_realtime("1.1") as (_, push11, _):
+        for score in (1.0, 2.0, 3.0, 4.0):
+            await lti_push.schedule_lti_score_push(7, 5, 42, score)
+        await outbox.dispatch_once()
+
+    push11.assert_awaited_once()
+    assert push11.await_args.args[2] == [(7, 4.0)]
+
+
+async def test_students_on_one_assignment_are_sent_in_one_batch(outbox):
+    """The course's credentials and grade rows are read once per batch."""
+    with _patch_realtime("1.1") as (_, push11, _):
+        await lti_push.schedule_lti_score_push(7, 5, 42, 3.0)
+        await lti_push.schedule_lti_score_push(8, 5, 42, 9.0)
+        await outbox.dispatch_once()
+
+    push11.assert_awaited_once()
+    assert sorted(push11.await_args.args[2]) == [(7, 3.0), (8, 9.0)]
+
+
+async def test_a_score_replaced_while_sending_is_sent_again(outbox):
+    async def answer_again(*args, **kwargs):
+        await lti_push.enqueue_lti_score(5, 42, 7, 5.0, 0.0)
+
+    with _patch_realtime("1.1") as (_, push11, _):
+        await lti_push.schedule_lti_score_push(7, 5, 42, 3.0)
+        push11.side_effect = answer_again
+        await outbox.dispatch_once()
+        [row] = await _rows()
+        assert row.score == 5.0
+
+        push11.side_effect = None
+        await _make_due()
+        await outbox.dispatch_once()
+
+    assert push11.await_args.args[2] == [(7, 5.0)]
+    assert await _rows() == []
+
+
+async def test_an_lti1p3_course_is_queued_not_pushed_inline(outbox):
+    """A slow AGS endpoint must not add to the student's save."""
+    with _patch_realtime("1.3", debounce=30.0) as (_, push11, push13):
+        await lti_push.schedule_lti_score_push(7, 5, 42, 3.0)
+
+    push13.assert_not_awaited()
+    assert len(await _rows()) == 1
+
+
+async def test_an_lti1p3_course_gets_one_batch_per_assignment(outbox):
+    with _patch_realtime("1.3") as (_, push11, push13):
+        await lti_push.schedule_lti_score_push(7, 5, 42, 3.0)
+        await lti_push.schedule_lti_score_push(8, 5, 42, 9.0)
+        await lti_push.schedule_lti_score_push(7, 5, 42, 4.0)
+        await outbox.dispatch_once()
+
+    push11.assert_not_awaited()
+    push13.assert_awaited_once()
+    assignment_id, updates = push13.await_args.args
+    assert assignment_id == 42
+    assert sorted(updates) == [(7, 4.0), (8, 9.0)]
+    assert await _rows() == []
+
+
+async def test_an_lti1p3_student_the_lms_rejected_is_retried(outbox):
+    async def one_fails(assignment_id, updates, failed):
+        failed.append(8)
+
+    with _patch_realtime("1.3") as (_, _, push13):
+        push13.side_effect = one_fails
+        await lti_push.schedule_lti_score_push(7, 5, 42, 3.0)
+        await lti_push.schedule_lti_score_push(8, 5, 42, 9.0)
+        await outbox.dispatch_once()
+
+    [row] = await _rows()
+    assert (row.rs_user_id, row.attempts) == (8, 1)
+
+
+async def test_a_course_with_no_lms_pushes_nothing(outbox):
+    with _patch_realtime(None) as (_, push11, _):
+        await lti_push.schedule_lti_score_push(7, 5, 42, 3.0)
+        await outbox.dispatch_once()
+
+    push11.assert_not_awaited()
+    assert await _rows() == []
+
+
+async def test_a_failing_push_is_kept_and_retried_later(outbox):
+    """An LMS outage must not lose the score, nor escape as an exception."""
+    with _patch_realtime("1.1") as (_, push11, _):
+        push11.side_effect = RuntimeError("LMS is down")
+        with patch.object(lti_push.rslogger, "error") as log_error:
+            await lti_push.schedule_lti_score_push(7, 5, 42, 3.0)
+            await outbox.dispatch_once()
+            # Backing off, so not due again straight away.
+            assert await outbox.dispatch_once() == 0
+
+    assert "LMS is down" in log_error.call_args.args[0]
+    [row] = await _rows()
+    assert row.attempts == 1
+    assert row.last_error == "LMS is down"
+    assert outbox.stats()["failed"] == 1
+
+    stats = await fetch_lti_outbox_stats()
+    assert (stats["depth"], stats["due"], stats["retrying"]) == (1, 0, 1)
+
+    with _patch_realtime("1.1") as (_, push11, _):
+        await _make_due()
+        await outbox.dispatch_once()
+
+    assert push11.await_args.args[2] == [(7, 3.0)]
+    assert await _rows() == []
+
+
+async def test_only_the_students_whose_send_failed_are_retried(outbox):
+    async def one_fails(assignment, course_id, updates, failed):
+        failed.append(8)
+
+    with _patch_realtime("1.1") as (_, push11, _):
+        push11.side_effect = one_fails
+        await lti_push.schedule_lti_score_push(7, 5, 42, 3.0)
+        await lti_push.schedule_lti_score_push(8, 5, 42, 9.0)
+        await outbox.dispatch_once()
+
+    [row] = await _rows()
+    assert (row.rs_user_id, row.attempts) == (8, 1)
+
+
+async def test_a_score_is_given_up_on_after_too_many_failures(outbox):
+    with (
+        _patch_realtime("1.1") as (_, push11, _),
+        patch.object(lti_push, "LTI_OUTBOX_MAX_ATTEMPTS", 2),
+    ):
+        push11.side_effect = RuntimeError("LMS is down")
+        await lti_push.schedule_lti_score_push(7, 5, 42, 3.0)
+        await outbox.dispatch_once()
+        await _make_due()
+        await outbox.dispatch_once()
+
+    assert push11.await_count == 2
+    assert await _rows() == []
+    assert outbox.stats()["abandoned"] == 1
+
+
+async def test_giving_up_keeps_a_score_that_arrived_during_the_last_try(outbox):
+    async def newer_score_then_fail(assignment, course_id, updates, failed):
+        await lti_push.schedule_lti_score_push(7, 5, 42, 4.0)
+        raise RuntimeError("LMS is down")
+
+    with (
+        _patch_realtime("1.1") as (_, push11, _),
+        patch.object(lti_push, "LTI_OUTBOX_MAX_ATTEMPTS", 1),
+    ):
+        push11.side_effect = newer_score_then_fail
+        await lti_push.schedule_lti_score_push(7, 5, 42, 3.0)
+        await outbox.dispatch_once()
+
+    assert outbox.stats()["abandoned"] == 1
+    [row] = await _rows()
+    assert (row.score, row.attempts) == (4.0, 0)
+
+    with _patch_realtime("1.1") as (_, push11, _):
+        await outbox.dispatch_once()
+
+    assert push11.await_args.args[2] == [(7, 4.0)]
+    assert await _rows() == []
+
+
+async def test_the_retry_wait_backs_off_up_to_a_limit():
+    assert lti_push._retry_delay(1) == lti_push.LTI_OUTBOX_RETRY_SECONDS
+    assert lti_push._retry_delay(2) == 2 * lti_push.LTI_OUTBOX_RETRY_SECONDS
+    assert lti_push._retry_delay(50) == lti_push.LTI_OUTBOX_MAX_RETRY_SECONDS
+
+
+async def test_a_running_dispatcher_drains_the_outbox(outbox):
+    with _patch_realtime("1.1") as (_, push11, _):
+        await lti_push.schedule_lti_score_push(7, 5, 42, 3.0)
+        outbox.start()
+        for _i in range(50):
+            if not await _rows():
+                break
+            await asyncio.sleep(0.1)
+        await outbox.stop()
+
+    push11.assert_awaited_once()
+    assert not outbox.running
@@ -12,11 +12,12 @@ from rsptx.db.crud import (
     create_question,
     create_question_grade_entry,
     fetch_question_grade,
+    rescore_question_grade,
     update_question_grade_entry,
 )
 from rsptx.db.crud.question import copy_question
 from rsptx.db.async_session import async_session
-from rsptx.db.models import Chapter, QuestionValidator, SubChapter
+from rsptx.db.models import Chapter, QuestionGrade, QuestionValidator, SubChapter
 from rsptx.response_helpers.core import canonical_utcnow
 
 BASE_COURSE = "test_course_1"
@@ -95,6 +96,39 @@ async def test_update_question_grade(test_question):
     assert updated.score == 100
 
 
+async def test_rescore_question_grade_reports_the_score_it_replaced(test_question):
+    """The previous score comes from the same locked read as the write, so the
+    caller's delta is against what was really there."""
+    qid = "test_rescore_question"
+    assert await rescore_question_grade(USER, BASE_COURSE, qid, 3) is None
+    await create_question_grade_entry(USER, BASE_COURSE, qid, 3)
+
+    change = await rescore_question_grade(USER, BASE_COURSE, qid, 5)
+    assert (change.previous, change.updated) == (3, True)
+    # Only a better score replaces a best-answer grade.
+    change = await rescore_question_grade(
+        USER, BASE_COURSE, qid, 4, only_if_higher=True
+    )
+    assert (change.previous, change.updated) == (5, False)
+    assert (await fetch_question_grade(USER, BASE_COURSE, qid)).score == 5
+
+    # Nor does it replace a grade an instructor has commented on.
+    async with async_session.begin() as session:
+        await session.execute(
+            QuestionGrade.__table__.update()
+            .where(QuestionGrade.div_id == qid)
+            .values(comment="see me")
+        )
+    change = await rescore_question_grade(
+        USER, BASE_COURSE, qid, 9, only_if_higher=True
+    )
+    assert change.updated is False
+    change = await rescore_question_grade(USER, BASE_COURSE, qid, 2)
+    assert (change.previous, change.updated) == (5, True)
+    grade = await fetch_question_grade(USER, BASE_COURSE, qid)
+    assert (grade.score, grade.comment) == (2, "autograded")
+
+
 @pytest.fixture(scope="session")
 async def target_book_toc(init_test_db):
     """Give BASE_COURSE a one-section toc for copies to land in."""
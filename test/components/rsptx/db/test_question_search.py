@@ -0,0 +1,132 @@
+"""
+Tests for exercise search: the "global" filter is answered from the full-text
+index, which has to follow inserts, updates and deletes of questions.
+"""
+
+import pytest
+
+pytestmark = pytest.mark.asyncio(loop_scope="session")
+
+from rsptx.db.crud import create_question, search_exercises, update_question
+from rsptx.db.crud.question import delete_question_by_name
+from rsptx.db.models import QuestionValidator
+from rsptx.response_helpers.core import canonical_utcnow
+from rsptx.validation.schemas import ExercisesSearchRequest
+
+BASE_COURSE = "search_test_book"
+
+
+def _question(name, htmlsrc="", **kwargs):
+    return QuestionValidator(
+        base_course=BASE_COURSE,
+        name=name,
+        chapter="ch1",
+        subchapter="sub1",
+        author=kwargs.pop("author", "Search Author"),
+        htmlsrc=htmlsrc,
+        timestamp=canonical_utcnow(),
+        question_type="mchoice",
+        is_private=False,
+        from_source=True,
+        review_flag=False,
+        **kwargs,
+    )
+
+
+@pytest.fixture(scope="module")
+async def questions(init_test_db):
+    created = [
+        await create_question(
+            _question(
+                "loops_while_1",
+                "<p>Which statement repeats while a condition holds?</p>",
+                topic="Loops",
+            )
+        ),
+        await create_question(
+            _question(
+                "recursion_base_2",
+                "<p>Every recursive function needs a base case. Loops are "
+                "not required.</p>",
+                topic="Recursion",
+            )
+        ),
+        await create_question(
+            _question(
+                "dict_lookup_3",
+                "<p>What does a dictionary lookup return?</p>",
+                tags="dictionaries,mapping",
+            )
+        ),
+        await create_question(
+            _question(
+                "array_sum_4",
+                "<p>Sum the numbers in an array without using loops.</p>",
+            )
+        ),
+    ]
+    yield created
+    for q in created:
+        await delete_question_by_name(q.name, BASE_COURSE)
+
+
+async def _search(text, sorting=None):
+    criteria = ExercisesSearchRequest(
+        base_course=BASE_COURSE,
+        filters={"global": {"value": text}},
+        limit=50,
+    )
+    if sorting is not None:
+        criteria.sorting = sorting
+    result = await search_exercises(criteria, owner="testuser1")
+    return [q.name for q in result["exercises"]], result["pagination"]["total"]
+
+
+async def test_words_match_as_prefixes_across_columns(questions):
+    assert (await _search("recurs"))[0] == ["recursion_base_2"]
+    assert (await _search("dictionar"))[0] == ["dict_lookup_3"]
+    assert (await _search("mapping"))[0] == ["dict_lookup_3"]
+
+
+async def test_every_term_has_to_match(questions):
+    names, total = await _search("loops base")
+    assert names == ["recursion_base_2"]
+    assert total == 1
+
+
+async def test_a_fragment_of_the_name_matches(questions):
+    assert (await _search("ict_look"))[0] == ["dict_lookup_3"]
+
+
+async def test_results_are_ranked_when_sorted_by_relevance(questions):
+    # All three mention loops; only one is about them.
+    names, _ = await _search("loops", sorting={"field": "relevance"})
+    assert names[0] == "loops_while_1"
+    names, _ = await _search("loops", sorting={"field": "name", "order": -1})
+    assert names == ["recursion_base_2", "loops_while_1", "array_sum_4"]
+
+
+async def test_results_are_ranked_unless_a_column_is_chosen(questions):
+    assert (await _search("loops"))[0][0] == "loops_while_1"
+    names, _ = await _search("loops", sorting={"field": "name", "order": 1})
+    assert names == ["array_sum_4", "loops_while_1", "recursion_base_2"]
+
+
+async def test_browsing_without_a_search_lists_by_name(questions):
+    names, _ = await _search("")
+    assert names == [
+        "array_sum_4",
+        "dict_lookup_3",
+        "loops_while_1",
+        "recursion_base_2",
+    ]
+
+
+async def test_the_index_follows_edits(questions):
+    edited = questions[2].model_copy(update={"htmlsrc": "<p>Hash tables</p>"})
+    await update_question(edited)
+    try:
+        assert (await _search("hash"))[0] == ["dict_lookup_3"]
+        assert (await _search("lookup return"))[0] == []
+    finally:
+        await update_question(questions[2])
@@ -0,0 +1,155 @@
+"""
+regrade_bulk must report exactly what regrade_batch does, pair for pair.
+"""
+
+import datetime
+import pytest
+
+pytestmark = pytest.mark.asyncio(loop_scope="session")
+
+from rsptx.db.async_session import async_session
+from rsptx.db.crud import fetch_course, fetch_question_grade
+from rsptx.db.models import (
+    Assignment,
+    AssignmentQuestion,
+    AssignmentValidator,
+    MchoiceAnswers,
+    Question,
+    QuestionGrade,
+    QuestionValidator,
+    Useinfo,
+)
+from rsptx.grading_helpers.regrade import RegradeOptions, regrade_batch, regrade_bulk
+
+COURSE_NAME = "test_course_1"
+SIDS = ["bulk_s1", "bulk_s2", "bulk_s3", "bulk_s4"]
+MC = "bulk_regrade_mc"
+VIDEO = "bulk_regrade_video"
+
+
+@pytest.fixture(scope="session")
+async def regrade_setup(init_test_db):
+    """An assignment with a multiple choice question and a video, and four
+    students: two who answered, one with a manual grade, one who did nothing."""
+    course = await fetch_course(COURSE_NAME)
+    when = datetime.datetime(2024, 6, 1, 12, 0, 0)
+    async with async_session.begin() as session:
+        questions = []
+        for name, qtype in ((MC, "mchoice"), (VIDEO, "youtube")):
+            q = Question(
+                base_course=COURSE_NAME,
+                name=name,
+                chapter="ch1",
+                subchapter="sub1",
+                question_type=qtype,
+                timestamp=when,
+                from_source=False,
+            )
+            session.add(q)
+            questions.append(q)
+        assignment = Assignment(
+            course=course.id,
+            name="bulk_regrade_assignment",
+            points=10,
+            released=False,
+            duedate=datetime.datetime(2099, 1, 1),
+            visible=True,
+            from_source=False,
+        )
+        session.add(assignment)
+        await session.flush()
+        aqs = [
+            AssignmentQuestion(
+                assignment_id=assignment.id,
+                question_id=q.id,
+                points=4,
+                autograde=auto,
+                which_to_grade="best_answer",
+                reading_assignment=False,
+                sorting_priority=i,
+            )
+            for i, (q, auto) in enumerate(zip(questions, ["pct_correct", "interact"]))
+        ]
+        session.add_all(aqs)
+
+        for sid, correct in (("bulk_s1", False), ("bulk_s1", True), ("bulk_s2", False)):
+            session.add(
+                MchoiceAnswers(
+                    timestamp=when,
+                    div_id=MC,
+                    sid=sid,
+                    course_name=COURSE_NAME,
+                    answer="0",
+                    correct=correct,
+                )
+            )
+        for sid, act in (("bulk_s1", "play:3.5"), ("bulk_s2", "ready")):
+            session.add(
+                Useinfo(
+                    timestamp=when,
+                    sid=sid,
+                    event="video",
+                    act=act,
+                    div_id=VIDEO,
+                    course_id=COURSE_NAME,
+                )
+            )
+        session.add(
+            QuestionGrade(
+                sid="bulk_s3",
+                course_name=COURSE_NAME,
+                div_id=MC,
+                score=1,
+                comment="See me",
+            )
+        )
+        await session.flush()
+        pairs = [(QuestionValidator.from_orm(q), aq) for q, aq in zip(questions, aqs)]
+        assignment = AssignmentValidator.from_orm(assignment)
+    return course, assignment, pairs
+
+
+def _options(**kw):
+    return RegradeOptions(recompute_totals=False, **kw)
+
+
+@pytest.mark.parametrize("overwrite_manual", [False, True])
+async def test_bulk_dry_run_matches_batch(regrade_setup, overwrite_manual):
+    course, assignment, questions = regrade_setup
+    options = _options(overwrite_manual=overwrite_manual)
+    expected = await regrade_batch(
+        course, SIDS, questions, assignment, options, dry_run=True
+    )
+    got = await regrade_bulk(
+        course, SIDS, questions, assignment, options, dry_run=True, chunk_size=3
+    )
+    assert got == expected
+    assert await fetch_question_grade("bulk_s1", COURSE_NAME, MC) is None
+
+
+async def test_bulk_run_writes_grades_and_reports_progress(regrade_setup):
+    course, assignment, questions = regrade_setup
+    calls = []
+    report = await regrade_bulk(
+        course,
+        SIDS,
+        questions,
+        assignment,
+        _options(),
+        chunk_size=2,
+        progress=lambda done, total: calls.append((done, total)),
+    )
+    assert report.total == len(SIDS) * len(questions)
+    assert sorted(calls) == [(4, 8), (8, 8)]
+
+    assert (await fetch_question_grade("bulk_s1", COURSE_NAME, MC)).score == 4
+    assert (await fetch_question_grade("bulk_s1", COURSE_NAME, VIDEO)).score == 4
+    # A "ready" is not a real interaction, and manual grades are left alone.
+    assert await fetch_question_grade("bulk_s2", COURSE_NAME, VIDEO) is None
+    assert (await fetch_question_grade("bulk_s3", COURSE_NAME, MC)).score == 1
+
+    # Everything written is exactly what the per-pair re-grader would write.
+    again = await regrade_batch(
+        course, SIDS, questions, assignment, _options(), dry_run=True
+    )
+    assert again.changed == 0
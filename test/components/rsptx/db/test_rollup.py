@@ -0,0 +1,146 @@
+"""
+Tests for the incremental activity rollup behind the chapter overview reports.
+"""
+
+import datetime
+
+import pytest
+from sqlalchemy import delete, select
+
+pytestmark = pytest.mark.asyncio(loop_scope="session")
+
+from rsptx.db.async_session import async_session
+from rsptx.db.crud import refresh_activity_rollup, rollup_needs_backfill
+from rsptx.db.models import ActivityRollup, MchoiceAnswers, RollupWatermark, Useinfo
+from rsptx.response_helpers.core import canonical_utcnow
+
+COURSE = "test_course_1"
+SID = "rollup_student"
+
+
+async def _add(*rows):
+    async with async_session.begin() as session:
+        session.add_all(rows)
+
+
+# Rows are written as if long ago unless a test says otherwise; the rollup
+# only waits on rows the database received recently.
+LONG_AGO = datetime.datetime(2020, 1, 1)
+
+
+def _event(div_id, when, inserted_at=LONG_AGO):
+    """``inserted_at=None`` leaves it to the database, as the app does."""
+    row = Useinfo(
+        timestamp=when,
+        sid=SID,
+        event="mChoice",
+        act="answer:0:correct",
+        div_id=div_id,
+        course_id=COURSE,
+    )
+    if inserted_at is not None:
+        row.inserted_at = inserted_at
+    return row
+
+
+def _answer(div_id, when, correct):
+    return MchoiceAnswers(
+        timestamp=when,
+        sid=SID,
+        course_name=COURSE,
+        div_id=div_id,
+        answer="0",
+        correct=correct,
+        inserted_at=LONG_AGO,
+    )
+
+
+async def _rollup():
+    async with async_session() as session:
+        rows = (
+            await session.execute(
+                select(ActivityRollup).where(ActivityRollup.sid == SID)
+            )
+        ).scalars()
+        return {row.div_id: row for row in rows}
+
+
+async def test_refresh_folds_in_only_new_settled_rows(init_test_db):
+    t0 = canonical_utcnow() - datetime.timedelta(hours=2)
+    minute = datetime.timedelta(minutes=1)
+    await _add(
+        _event("rollup_q1", t0),
+        _event("rollup_q1", t0 + 2 * minute),
+        _event("rollup_q2", t0 + minute),
+        _answer("rollup_q1", t0, False),
+        _answer("rollup_q2", t0 + minute, True),
+    )
+    await refresh_activity_rollup()
+
+    rollup = await _rollup()
+    assert rollup["rollup_q1"].events == 2
+    assert rollup["rollup_q1"].first_seen == t0
+    assert rollup["rollup_q1"].last_seen == t0 + 2 * minute
+    assert not rollup["rollup_q1"].correct
+    assert rollup["rollup_q2"].events == 1
+    assert rollup["rollup_q2"].correct
+
+    # A second refresh with nothing new changes nothing.
+    await refresh_activity_rollup()
+    assert (await _rollup())["rollup_q1"].events == 2
+
+    # New rows extend the summary; a row that has not settled yet waits.
+    await _add(
+        _event("rollup_q1", t0 - minute),
+        _answer("rollup_q1", t0 + 3 * minute, True),
+        # A correct answer with no logged event gets a row without events.
+        _answer("rollup_q3", t0, True),
+    )
+    # Judged by when the database received it, not by its timestamp: a page
+    # view queued through an outage arrives with an old one.
+    await _add(_event("rollup_q1", t0, inserted_at=None))
+    await refresh_activity_rollup()
+
+    rollup = await _rollup()
+    assert rollup["rollup_q1"].events == 3
+    assert rollup["rollup_q1"].first_seen == t0 - minute
+    assert rollup["rollup_q1"].last_seen == t0 + 2 * minute
+    assert rollup["rollup_q1"].correct
+    assert rollup["rollup_q3"].events == 0 and rollup["rollup_q3"].correct
+
+    async with async_session() as session:
+        unsettled = (
+            await session.execute(select(Useinfo.id).order_by(Useinfo.id.desc()))
+        ).scalar()
+        watermark = (
+            await session.execute(
+                select(RollupWatermark.last_id).where(
+                    RollupWatermark.source == "useinfo"
+                )
+            )
+        ).scalar()
+    assert watermark < unsettled
+
+
+async def test_a_backfill_is_needed_until_every_source_has_a_watermark(init_test_db):
+    await _add(_event("rollup_q4", canonical_utcnow()))
+    await refresh_activity_rollup()
+    assert not await rollup_needs_backfill()
+
+    async with async_session.begin() as session:
+        saved = [
+            (wm.source, wm.last_id)
+            for wm in (await session.execute(select(RollupWatermark))).scalars()
+        ]
+        await session.execute(
+            delete(RollupWatermark).where(RollupWatermark.source == "useinfo")
+        )
+    try:
+        assert await rollup_needs_backfill()
+    finally:
+        async with async_session.begin() as session:
+            await session.execute(delete(RollupWatermark))
+            session.add_all(
+                RollupWatermark(source=source, last_id=last_id)
+                for source, last_id in saved
+            )
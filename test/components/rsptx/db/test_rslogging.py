@@ -1,12 +1,18 @@
 """
 Tests for rslogging CRUD operations (useinfo, answer tables).
 """
+
 import datetime
 import pytest
 
 pytestmark = pytest.mark.asyncio(loop_scope="session")
 
-from rsptx.db.crud import create_useinfo_entry, count_useinfo_for, fetch_poll_summary
+from rsptx.db.crud import (
+    UseinfoWriter,
+    create_useinfo_entry,
+    count_useinfo_for,
+    fetch_poll_summary,
+)
 from rsptx.db.models import UseinfoValidation
 from rsptx.response_helpers.core import canonical_utcnow
 
@@ -14,7 +20,9 @@ COURSE = "test_course_1"
 USER = "testuser1"
 
 
-def _useinfo(div_id: str, event: str = "mChoice", act: str = "answer:1") -> UseinfoValidation:
+def _useinfo(
+    div_id: str, event: str = "mChoice", act: str = "answer:1"
+) -> UseinfoValidation:
     return UseinfoValidation(
         timestamp=canonical_utcnow(),
         sid=USER,
@@ -69,3 +77,73 @@ async def test_create_useinfo_poll_event(init_test_db):
     summary = await fetch_poll_summary(div_id, COURSE)
     acts = [row[0] for row in summary]
     assert "2" in acts or "1" in acts
+
+
+async def _total(div_id: str) -> int:
+    rows = await count_useinfo_for(div_id, COURSE, datetime.datetime(2000, 1, 1))
+    return sum(row[1] for row in rows)
+
+
+async def test_useinfo_writer_writes_through_when_not_started(init_test_db):
+    """A writer nobody started must not sit on rows."""
+    writer = UseinfoWriter()
+    await writer.put(_useinfo("test_writer_passthrough", event="page", act="view"))
+    assert len(writer) == 0
+    assert await _total("test_writer_passthrough") == 1
+
+
+async def test_useinfo_writer_buffers_until_flushed(init_test_db):
+    """Rows are held until a flush, then written in a single batch."""
+    writer = UseinfoWriter(batch_size=100, flush_seconds=60)
+    writer.start()
+    try:
+        for _ in range(3):
+            await writer.put(_useinfo("test_writer_batch", event="page", act="view"))
+        assert len(writer) == 3
+        assert await _total("test_writer_batch") == 0
+        assert await writer.flush() == 3
+        assert await _total("test_writer_batch") == 3
+    finally:
+        await writer.stop()
+
+
+async def test_useinfo_writer_full_buffer_flushes_inline(init_test_db):
+    """Backpressure: the caller that fills the buffer pays for the flush."""
+    writer = UseinfoWriter(batch_size=2, flush_seconds=60, max_buffer=2)
+    writer.start()
+    try:
+        await writer.put(_useinfo("test_writer_full", event="page", act="view"))
+        await writer.put(_useinfo("test_writer_full", event="page", act="view"))
+        assert len(writer) == 0
+        assert await _total("test_writer_full") == 2
+    finally:
+        await writer.stop()
+
+
+async def test_useinfo_writer_stop_drains_the_buffer(init_test_db):
+    writer = UseinfoWriter(batch_size=100, flush_seconds=60)
+    writer.start()
+    await writer.put(_useinfo("test_writer_drain", event="page", act="view"))
+    await writer.stop()
+    assert not writer.running
+    assert await _total("test_writer_drain") == 1
+
+
+async def test_useinfo_writer_drops_only_the_bad_row(init_test_db):
+    """A row the database rejects must not take the rest of its batch with it."""
+    writer = UseinfoWriter(batch_size=100, flush_seconds=60)
+    writer.start()
+    try:
+        await writer.put(_useinfo("test_writer_bad_row", event="page", act="view"))
+        # act is NOT NULL; model_construct skips the validation that would
+        # otherwise catch this before the insert.
+        await writer.put(
+            UseinfoValidation.model_construct(
+                **{**_useinfo("test_writer_bad_row").model_dump(), "act": None}
+            )
+        )
+        await writer.put(_useinfo("test_writer_bad_row", event="page", act="view"))
+        assert await writer.flush() == 2
+        assert await _total("test_writer_bad_row") == 2
+    finally:
+        await writer.stop()
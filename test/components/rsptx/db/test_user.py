@@ -7,7 +7,16 @@ import pytest
 
 pytestmark = pytest.mark.asyncio(loop_scope="session")
 
-from rsptx.db.crud import fetch_user, create_user, update_user, delete_user
+from rsptx.db.crud import (
+    create_user,
+    create_user_course_entry,
+    delete_user,
+    delete_user_course_entry,
+    fetch_session_user,
+    fetch_user,
+    update_user,
+    user_cache,
+)
 from rsptx.db.models import AuthUserValidator
 
 TEST_USERNAME = "crud_test_user"
@@ -161,3 +170,36 @@ async def test_create_duplicate_user_raises(new_user):
                 reset_password_key="",
             )
         )
+
+
+async def test_session_user_is_cached_until_it_is_updated(new_user):
+    """An authenticated request reuses the cached user; a write is seen next."""
+    first = await fetch_session_user(TEST_USERNAME)
+    misses = user_cache.misses
+    assert await fetch_session_user(TEST_USERNAME) is first
+    assert user_cache.misses == misses
+
+    await update_user(new_user.id, {"course_name": "test_course_1"})
+    assert (await fetch_session_user(TEST_USERNAME)).course_name == "test_course_1"
+    assert user_cache.misses == misses + 1
+
+
+async def test_enrollment_changes_reload_the_session_user(new_user, test_course):
+    await fetch_session_user(TEST_USERNAME)
+    misses = user_cache.misses
+    await create_user_course_entry(new_user.id, test_course.id)
+    await fetch_session_user(TEST_USERNAME)
+    await delete_user_course_entry(new_user.id, test_course.id)
+    await fetch_session_user(TEST_USERNAME)
+    assert user_cache.misses == misses + 2
+
+
+async def test_a_new_user_is_not_shadowed_by_a_cached_miss(init_test_db):
+    username = "crud_session_cache_user"
+    assert not await fetch_session_user(username)
+    await create_user(_user_kwargs(username, ""))
+    try:
+        assert (await fetch_session_user(username)).username == username
+    finally:
+        await delete_user(username)
+    assert not await fetch_session_user(username)
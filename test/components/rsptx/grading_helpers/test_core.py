@@ -1,3 +1,4 @@
+import contextlib
 from datetime import datetime
 from types import SimpleNamespace
 from unittest.mock import AsyncMock, patch
@@ -82,3 +83,73 @@ async def test_due_date_is_not_shifted_by_any_timezone():
     with a, d, h as has_submissions:
         await core.has_late_submission("student1", 42)
     assert has_submissions.call_args.args[2] == duedate
+
+
+# Incremental totals
+# ==================
+
+
+def _total_spec_and_user():
+    spec = core.ScoringSpecification(assigned=True, assignment_id=7)
+    user = SimpleNamespace(
+        id=3, username="student1", course_name="course1", course_id=1
+    )
+    return spec, user
+
+
+@contextlib.contextmanager
+def _patch_totals(increment_result, question_scores, verify_rate=0.0):
+    """Patch the total roll-up's crud and LTI calls; yield the mocks by name."""
+    rows = [SimpleNamespace(score=s) for s in question_scores]
+    mocks = dict(
+        increment_grade_score=AsyncMock(return_value=increment_result),
+        fetch_assignment_scores=AsyncMock(return_value=rows),
+        fetch_grade=AsyncMock(return_value=None),
+        upsert_grade=AsyncMock(),
+        schedule_lti_score_push=AsyncMock(),
+    )
+    with contextlib.ExitStack() as stack:
+        for name, mock in mocks.items():
+            stack.enter_context(patch.object(core, name, mock))
+        stack.enter_context(patch.object(core.settings, "incremental_totals", True))
+        stack.enter_context(
+            patch.object(core.settings, "incremental_totals_verify_rate", verify_rate)
+        )
+        yield SimpleNamespace(**mocks)
+
+
+async def test_total_is_adjusted_by_delta_without_resumming():
+    spec, user = _total_spec_and_user()
+    with _patch_totals(12.0, [5, 7]) as m:
+        total = await core.compute_total_score(spec, user, delta=2)
+    assert total == 12.0
+    m.increment_grade_score.assert_awaited_once_with(3, 7, 2)
+    m.fetch_assignment_scores.assert_not_called()
+    m.upsert_grade.assert_not_called()
+    assert m.schedule_lti_score_push.call_args.args[-1] == 12.0
+
+
+async def test_total_falls_back_to_full_sum_without_a_grade_row():
+    spec, user = _total_spec_and_user()
+    with _patch_totals(None, [5, None, 2]) as m:
+        total = await core.compute_total_score(spec, user, delta=2)
+    assert total == 7
+    m.fetch_assignment_scores.assert_awaited_once()
+    assert m.upsert_grade.call_args.args[0].score == 7
+
+
+async def test_unknown_delta_always_resums():
+    spec, user = _total_spec_and_user()
+    with _patch_totals(12.0, [4, 4]) as m:
+        total = await core.compute_total_score(spec, user)
+    assert total == 8
+    m.increment_grade_score.assert_not_called()
+    assert m.upsert_grade.call_args.args[0].score == 8
+
+
+async def test_verified_sample_corrects_a_drifted_total():
+    spec, user = _total_spec_and_user()
+    with _patch_totals(15.0, [5, 7], verify_rate=1.0) as m:
+        total = await core.compute_total_score(spec, user, delta=2)
+    assert total == 12
+    assert m.upsert_grade.call_args.args[0].score == 12
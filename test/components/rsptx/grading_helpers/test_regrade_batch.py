@@ -221,24 +221,31 @@ def test_effective_deadline_does_not_apply_a_timezone_shift():
 
 
 def _patch_rollup(grade, question_scores):
-    """Patch what _recompute_total_for_user reads and writes.
+    """Patch what recompute_totals_detail reads and writes.
 
-    ``grade`` is the existing grades row (or None), ``question_scores`` the
-    per-question scores that should roll up into the total.
+    ``grade`` is student1's existing grades row (or None), ``question_scores``
+    the per-question scores that should roll up into the total. The roll-up is
+    set-based, so the scores arrive already summed per student and the writes
+    go out in one ``upsert_grade_totals`` call.
     """
+    if grade is not None:
+        grade.auth_user = 1
+    totals = {"student1": sum(question_scores)} if question_scores else {}
     return (
         patch.object(
             regrade,
             "fetch_users_for_course",
             AsyncMock(return_value=_users("student1")),
         ),
-        patch.object(regrade, "fetch_grade", AsyncMock(return_value=grade)),
         patch.object(
             regrade,
-            "fetch_assignment_scores",
-            AsyncMock(return_value=[SimpleNamespace(score=s) for s in question_scores]),
+            "fetch_all_grades_for_assignment",
+            AsyncMock(return_value=[grade] if grade is not None else []),
         ),
-        patch.object(regrade, "upsert_grade", AsyncMock()),
+        patch.object(
+            regrade, "fetch_assignment_score_totals", AsyncMock(return_value=totals)
+        ),
+        patch.object(regrade, "upsert_grade_totals", AsyncMock()),
         patch.object(regrade, "attempt_lti_score_updates", AsyncMock()),
     )
 
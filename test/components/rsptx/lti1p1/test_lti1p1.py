@@ -4,11 +4,15 @@ These exercise the security-critical OAuth1 signature verification and the
 outcome-request XML generation without touching the database or network.
 """
 
+import asyncio
+import base64
+import hashlib
 from types import SimpleNamespace
 from unittest.mock import AsyncMock, MagicMock, patch
 
 import oauth2
 import pytest
+from aiohttp import web
 from lxml import etree
 
 from rsptx.lti1p1 import core
@@ -132,6 +136,9 @@ def _grade(auth_user, sourcedid="sourced-1", outcome_url="https://lms/outcomes")
     )
 
 
+_SUCCESS = SimpleNamespace(is_success=lambda: True)
+
+
 def _patch_push(
     grades, lti_key=SimpleNamespace(consumer=KEY, secret=SECRET), attrs=None
 ):
@@ -154,7 +161,7 @@ def _patch_push(
                 )
             ),
         ),
-        patch.object(core, "send_lti1p1_grade", MagicMock()),
+        patch.object(core, "send_lti1p1_grade", AsyncMock(return_value=_SUCCESS)),
     )
 
 
@@ -238,7 +245,7 @@ async def test_one_students_failure_does_not_abandon_the_batch():
         [_grade(1), _grade(2, "sourced-2")]
     )
     with cfg, attrs, grades, one_grade, send as send_mock:
-        send_mock.side_effect = [RuntimeError("LMS down"), None]
+        send_mock.side_effect = [RuntimeError("LMS down"), _SUCCESS]
         sent = await core.attempt_lti1p1_score_updates(
             _assignment(), 5, [(1, 7.0), (2, 3.0)]
         )
@@ -247,15 +254,18 @@ async def test_one_students_failure_does_not_abandon_the_batch():
     assert send_mock.call_count == 2
 
 
-def test_a_total_above_the_assignment_points_is_clamped_to_full_credit():
+async def test_a_total_above_the_assignment_points_is_clamped_to_full_credit():
     """The spec only allows 0.0..1.0; an LMS rejects anything above it."""
-    with patch.object(core, "OutcomeRequest") as req:
-        req.return_value.post_replace_result.return_value = SimpleNamespace(
-            is_success=lambda: True
+    with (
+        patch.object(core, "OutcomeRequest") as req,
+        patch.object(core, "_lti1p1_http_session"),
+    ):
+        req.return_value.post_replace_result_async = AsyncMock(
+            return_value=SimpleNamespace(is_success=lambda: True)
         )
-        core.send_lti1p1_grade(10, 12, KEY, SECRET, "https://lms/outcomes", "s-1")
+        await core.send_lti1p1_grade(10, 12, KEY, SECRET, "https://lms/outcomes", "s-1")
 
-    assert req.return_value.post_replace_result.call_args.args[0] == 1.0
+    assert req.return_value.post_replace_result_async.call_args.args[0] == 1.0
 
 
 # ---------------------------------------------------------------------------
@@ -487,7 +497,7 @@ async def test_a_single_student_push_does_not_read_the_whole_roster():
         patch.object(
             core, "fetch_all_grades_for_assignment", AsyncMock(return_value=[])
         ) as all_grades,
-        patch.object(core, "send_lti1p1_grade") as send,
+        patch.object(core, "send_lti1p1_grade", return_value=_SUCCESS) as send,
     ):
         sent = await core.attempt_lti1p1_score_updates(assignment, 5, [(7, 8.0)])
 
@@ -518,7 +528,7 @@ async def test_a_batch_still_reads_the_roster_once():
         patch.object(
             core, "fetch_all_grades_for_assignment", AsyncMock(return_value=grades)
         ) as all_grades,
-        patch.object(core, "send_lti1p1_grade"),
+        patch.object(core, "send_lti1p1_grade", return_value=_SUCCESS),
     ):
         sent = await core.attempt_lti1p1_score_updates(
             assignment, 5, [(7, 8.0), (8, 9.0)]
@@ -527,3 +537,117 @@ async def test_a_batch_still_reads_the_roster_once():
     assert sent == 2
     all_grades.assert_awaited_once()
     one_grade.assert_not_awaited()
+
+
+async def test_an_lms_failure_response_is_reported_for_retry():
+    """A replaceResult the LMS answers with codeMajor=failure did not land."""
+    cfg, attrs, grades, one_grade, send = _patch_push(
+        [_grade(1), _grade(2, "sourced-2")]
+    )
+    with cfg, attrs, grades, one_grade, send as send_mock:
+        send_mock.side_effect = [
+            SimpleNamespace(
+                is_success=lambda: False, code_major="failure", description="no"
+            ),
+            _SUCCESS,
+        ]
+        failed = []
+        sent = await core.attempt_lti1p1_score_updates(
+            _assignment(), 5, [(1, 7.0), (2, 3.0)], failed=failed
+        )
+
+    assert sent == 1
+    assert failed == [1]
+
+
+async def test_a_batch_is_sent_concurrently_up_to_the_limit():
+    in_flight = peak = 0
+
+    async def slow_send(*args):
+        nonlocal in_flight, peak
+        in_flight += 1
+        peak = max(peak, in_flight)
+        await asyncio.sleep(0.01)
+        in_flight -= 1
+        return SimpleNamespace(is_success=lambda: True)
+
+    cfg, attrs, grades, one_grade, send = _patch_push(
+        [_grade(i, f"sourced-{i}") for i in range(10)]
+    )
+    with (
+        cfg,
+        attrs,
+        grades,
+        one_grade,
+        send as send_mock,
+        patch.object(core, "LTI1P1_SEND_CONCURRENCY", 4),
+    ):
+        send_mock.side_effect = slow_send
+        sent = await core.attempt_lti1p1_score_updates(
+            _assignment(), 5, [(i, 1.0) for i in range(10)]
+        )
+
+    assert sent == 10
+    assert peak == 4
+
+
+_SUCCESS_XML = b"""<?xml version="1.0" encoding="UTF-8"?>
+<imsx_POXEnvelopeResponse xmlns="http://www.imsglobal.org/services/ltiv1p1/xsd/imsoms_v1p0">
+  <imsx_POXHeader><imsx_POXResponseHeaderInfo>
+    <imsx_version>V1.0</imsx_version>
+    <imsx_messageIdentifier>1</imsx_messageIdentifier>
+    <imsx_statusInfo>
+      <imsx_codeMajor>success</imsx_codeMajor>
+      <imsx_severity>status</imsx_severity>
+    </imsx_statusInfo>
+  </imsx_POXResponseHeaderInfo></imsx_POXHeader>
+  <imsx_POXBody><replaceResultResponse/></imsx_POXBody>
+</imsx_POXEnvelopeResponse>"""
+
+
+async def test_grades_are_signed_and_share_connections():
+    """Talk to a real outcome service: each POST must carry a valid OAuth1
+    signature over a matching body hash, and a batch must reuse connections."""
+    received = []
+    peers = set()
+
+    async def outcomes(request):
+        body = await request.read()
+        header = request.headers["Authorization"]
+        params = oauth2.Request._split_header(header)
+        assert params["oauth_body_hash"] == base64.b64encode(
+            hashlib.sha1(body).digest()
+        ).decode("ascii")
+        signed = oauth2.Request("POST", str(request.url), params)
+        signed["oauth_signature"] = signed["oauth_signature"].encode("utf-8")
+        server = oauth2.Server()
+        server.add_signature_method(oauth2.SignatureMethod_HMAC_SHA1())
+        server.verify_request(signed, oauth2.Consumer(KEY, SECRET), None)
+        received.append(etree.fromstring(body))
+        peers.add(request.transport.get_extra_info("peername"))
+        return web.Response(body=_SUCCESS_XML, content_type="application/xml")
+
+    app = web.Application()
+    app.router.add_post("/outcomes", outcomes)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    url = f"http://127.0.0.1:{port}/outcomes"
+    try:
+        for _round in range(3):
+            responses = await asyncio.gather(
+                *(
+                    core.send_lti1p1_grade(10, i, KEY, SECRET, url, f"s-{i}")
+                    for i in range(5)
+                )
+            )
+            assert all(r.is_success() for r in responses)
+    finally:
+        await core.close_lti1p1_http_session()
+        await runner.cleanup()
+
+    assert len(received) == 15
+    # Later rounds reuse the connections the first one opened.
+    assert len(peers) <= 5
@@ -7,6 +7,7 @@ mapping, an assignment worth zero points, and a computed total larger than the
 assignment's points (which the LMS rejects with a 422).
 """
 
+import asyncio
 import datetime
 import json
 from types import SimpleNamespace
@@ -190,3 +191,182 @@ async def test_percentage_mode_converts_a_normal_score():
     sent = await _send([(_lti_user(), 5)], show_points="false")
 
     assert sent == [("lms-user-1", 50.0, 100)]
+
+
+async def test_users_the_platform_rejects_are_reported_as_failed():
+    """The outbox retries exactly the students whose score did not land."""
+    lti_assign = _lti_assign()
+    failed = []
+
+    async def fake_put_grade(grade, line_item):
+        if grade.get_user_id() == "u2":
+            raise RuntimeError("422")
+        return {}
+
+    ags = MagicMock()
+    ags.update_lineitem = AsyncMock()
+    ags.put_grade = AsyncMock(side_effect=fake_put_grade)
+    with (
+        patch.object(
+            core,
+            "fetch_all_course_attributes",
+            AsyncMock(return_value={"show_points": "true"}),
+        ),
+        patch.object(core, "aiohttp"),
+        patch.object(core, "ToolConfRS"),
+        patch.object(core, "ServiceConnector"),
+        patch.object(core, "AssignmentsGradesService", return_value=ags),
+    ):
+        await core._send_lti1p3_score_updates(
+            lti_assign,
+            [(_lti_user(1, "u1"), 1), (_lti_user(2, "u2"), 2), (None, 3)],
+            failed=failed,
+        )
+
+    assert ags.put_grade.await_count == 2
+    assert failed == [2]
+
+
+# Access tokens
+# =============
+
+
+class _TokenResponse:
+    ok = True
+    content_type = "application/json"
+
+    def __init__(self, token, expires_in):
+        self._body = {"access_token": token, "expires_in": expires_in}
+
+    async def json(self):
+        return self._body
+
+
+def _connector(cache, expires_in=3600):
+    from rsptx.lti1p3.pylti1p3.service_connector import ServiceConnector
+
+    registration = MagicMock()
+    registration.get_issuer.return_value = "https://lms.example"
+    registration.get_client_id.return_value = "client-1"
+    registration.get_auth_token_url.return_value = "https://lms.example/token"
+    registration.get_auth_audience.return_value = None
+    registration.get_kid.return_value = None
+    session = MagicMock()
+    tokens = iter(f"token-{i}" for i in range(10))
+    session.post = AsyncMock(
+        side_effect=lambda *a, **k: _TokenResponse(next(tokens), expires_in)
+    )
+    connector = ServiceConnector(registration, session, cache)
+    connector.encode_jwt = MagicMock(return_value="signed")
+    return connector, session
+
+
+async def test_an_access_token_is_reused_across_connectors():
+    """Each batch makes a new connector; the platform should not see a token
+    request from every one of them."""
+    cache = {}
+    first, first_session = _connector(cache)
+    second, second_session = _connector(cache)
+
+    assert await first.get_access_token(["score"]) == "token-0"
+    assert await second.get_access_token(["score"]) == "token-0"
+    assert second_session.post.await_count == 0
+
+
+async def test_an_expiring_access_token_is_replaced():
+    cache = {}
+    # Inside the expiry margin from the start, so never reused.
+    connector, session = _connector(cache, expires_in=30)
+
+    assert await connector.get_access_token(["score"]) == "token-0"
+    assert await connector.get_access_token(["score"]) == "token-1"
+    assert session.post.await_count == 2
+
+
+# Bulk sync
+# =========
+
+
+async def test_the_sync_report_says_what_happened_to_each_score():
+    async def fake_put_grade(grade, line_item):
+        if grade.get_user_id() == "u2":
+            raise RuntimeError("422")
+        return {}
+
+    ags = MagicMock()
+    ags.update_lineitem = AsyncMock()
+    ags.put_grade = AsyncMock(side_effect=fake_put_grade)
+    users = [_lti_user(1, "u1"), _lti_user(2, "u2")]
+    with (
+        patch.object(
+            core,
+            "fetch_lti1p3_grading_data_for_assignment",
+            AsyncMock(return_value=_lti_assign()),
+        ),
+        patch.object(
+            core, "fetch_lti1p3_users_for_course", AsyncMock(return_value=users)
+        ) as mappings,
+        patch.object(core, "fetch_lti1p3_user", AsyncMock()) as one_mapping,
+        patch.object(
+            core,
+            "fetch_all_course_attributes",
+            AsyncMock(return_value={"show_points": "true"}),
+        ),
+        patch.object(core, "ToolConfRS"),
+        patch.object(core, "ServiceConnector"),
+        patch.object(core, "AssignmentsGradesService", return_value=ags),
+    ):
+        report = await core.attempt_lti1p3_score_updates_for(
+            7, [(1, 4.0), (2, 5.0), (3, 6.0)]
+        )
+
+    assert report.sent == {1: 4.0}
+    assert report.failed == {2: "422"}
+    assert report.skipped == {3: "no LTI user mapping for this student"}
+    # The whole batch's mappings come from one query.
+    mappings.assert_awaited_once_with(3, with_rsuser=False)
+    one_mapping.assert_not_awaited()
+    # The line item is updated once for the batch, not once per student.
+    ags.update_lineitem.assert_awaited_once()
+
+
+async def test_unreleased_grades_are_reported_as_skipped():
+    with patch.object(core, "fetch_all_course_attributes", AsyncMock(return_value={})):
+        report = await core._send_lti1p3_score_updates(
+            _lti_assign(released=False), [(_lti_user(1), 5), (_lti_user(2), 6)]
+        )
+
+    assert report.sent == {}
+    assert report.skipped == {
+        1: "grades are not released",
+        2: "grades are not released",
+    }
+
+
+async def test_a_platform_limiter_caps_concurrency_and_rate():
+    limiter = core._PlatformLimiter(concurrency=2, per_second=50)
+    in_flight = peak = 0
+    starts = []
+
+    async def request():
+        nonlocal in_flight, peak
+        async with limiter.request():
+            starts.append(limiter.loop.time())
+            in_flight += 1
+            peak = max(peak, in_flight)
+            # Longer than the 20ms spacing, so requests overlap.
+            await asyncio.sleep(0.05)
+            in_flight -= 1
+
+    await asyncio.gather(*(request() for _ in range(6)))
+
+    assert peak == 2
+    # Six requests at 50 per second start over at least 5 intervals of 20ms.
+    assert starts[-1] - starts[0] >= 5 * 0.02 - 0.005
+
+
+async def test_batches_to_one_platform_share_its_limiter():
+    with patch.object(core, "_platform_limiters", {}):
+        first = core._platform_limiter("https://lms.example")
+        assert core._platform_limiter("https://lms.example") is first
+        assert core._platform_limiter("https://other.example") is not first
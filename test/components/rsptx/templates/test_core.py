@@ -1,3 +1,4 @@
+import os
 from types import SimpleNamespace
 
 import pytest
@@ -9,8 +10,10 @@ import jinja2
 
 from rsptx.templates import core
 from rsptx.templates.core import (
+    clear_book_templates,
     course_datetime_tag,
     format_course_datetime,
+    get_book_templates,
     get_shared_templates,
     install_filters,
 )
@@ -217,3 +220,67 @@ def test_tag_is_registered_as_a_jinja_global():
     )
     # Markup, so the element is not escaped into text.
     assert rendered.startswith("<time ")
+
+
+# get_book_templates
+# ------------------
+# Book page environments are pooled so compiled pages survive between requests.
+
+
+@pytest.fixture
+def book_dir(tmp_path):
+    clear_book_templates()
+    (tmp_path / "page.html").write_text("{{ a }}|~._ a _.~")
+    yield tmp_path
+    clear_book_templates()
+
+
+def test_book_templates_are_reused_between_calls(book_dir):
+    first = get_book_templates("thinkcspy", "RST", book_dir)
+    assert get_book_templates("thinkcspy", "RST", book_dir) is first
+
+
+def test_pretext_books_get_their_own_delimiters(book_dir):
+    rst = get_book_templates("thinkcspy", "RST", book_dir)
+    ptx = get_book_templates("thinkcspy", "PreTeXt", book_dir)
+    assert rst is not ptx
+    assert rst.env.get_template("page.html").render(a=1) == "1|~._ a _.~"
+    assert ptx.env.get_template("page.html").render(a=1) == "{{ a }}|1"
+
+
+def test_book_templates_pool_evicts_least_recently_used(book_dir):
+    a = get_book_templates("a", "RST", book_dir, pool_size=2)
+    get_book_templates("b", "RST", book_dir, pool_size=2)
+    # Touch "a" so "b" is the one evicted.
+    assert get_book_templates("a", "RST", book_dir, pool_size=2) is a
+    get_book_templates("c", "RST", book_dir, pool_size=2)
+    assert get_book_templates("a", "RST", book_dir, pool_size=2) is a
+    assert len(core._book_templates) == 2
+    assert ("b", "RST") not in core._book_templates
+
+
+def test_rebuilt_book_gets_a_fresh_environment(book_dir):
+    first = get_book_templates("thinkcspy", "RST", book_dir)
+    stat = book_dir.stat()
+    os.utime(book_dir, (stat.st_atime, stat.st_mtime + 10))
+    assert get_book_templates("thinkcspy", "RST", book_dir) is not first
+
+
+def test_book_templates_bytecode_cache(book_dir, tmp_path_factory):
+    cache_dir = tmp_path_factory.mktemp("bytecode")
+    templates = get_book_templates(
+        "thinkcspy", "RST", book_dir, bytecode_cache_dir=str(cache_dir)
+    )
+    assert templates.env.get_template("page.html").render(a=2).startswith("2|")
+    assert any(cache_dir.iterdir())
+
+
+def test_each_markup_system_gets_its_own_bytecode(book_dir, tmp_path_factory):
+    cache_dir = str(tmp_path_factory.mktemp("bytecode"))
+    rst = get_book_templates("thinkcspy", "RST", book_dir, bytecode_cache_dir=cache_dir)
+    assert rst.env.get_template("page.html").render(a=3) == "3|~._ a _.~"
+    # Same page, same cache directory, other delimiters.
+    ptx = get_book_templates(
+        "thinkcspy", "PreTeXt", book_dir, bytecode_cache_dir=cache_dir
+    )
+    assert ptx.env.get_template("page.html").render(a=3) == "{{ a }}|3"